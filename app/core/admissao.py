@@ -0,0 +1,196 @@
+# app/core/admissao.py
+"""
+Controlo de admissão por classe de rota.
+
+O processamento de PDFs e a renderização de gráficos são endpoints síncronos que
+ocupam threads do threadpool do Starlette; uma rajada de pedidos de gráficos
+esgotava-o e atrasava rotas baratas como /empresas/. Cada classe de rota pesada
+tem agora um limite de pedidos em execução e uma fila de espera limitada:
+
+- com vaga, o pedido entra de imediato;
+- sem vaga, espera na fila (por ordem de chegada) até ADMISSAO_ESPERA_MAX_S;
+- com a fila cheia, ou esgotada a espera, recebe logo 503 com Retry-After.
+
+As rotas que não pertencem a nenhuma classe passam sem qualquer controlo. Cada
+classe regista a profundidade da fila, os pedidos admitidos e rejeitados e o
+histograma do tempo de espera, expostos em /metricas/admissao.
+"""
+
+import asyncio
+import re
+import time
+from collections import deque
+from typing import Any, Dict, List, Tuple
+
+from starlette.responses import JSONResponse
+
+from app.core.config import settings
+
+# Limites superiores (segundos) do histograma do tempo de espera
+LIMITES_ESPERA_S = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class SobrecargaError(RuntimeError):
+    """A classe de rota está no limite e não há lugar (ou tempo) na fila de espera."""
+
+
+class ClasseAdmissao:
+    """
+    Limite de concorrência com fila de espera limitada para uma classe de rotas.
+    Usada só a partir do event loop (não é thread-safe, nem precisa de ser).
+    """
+
+    def __init__(self, nome: str, *, limite: int, tamanho_fila: int, espera_max_s: float):
+        self.nome = nome
+        self.limite = limite
+        self.tamanho_fila = tamanho_fila
+        self.espera_max_s = espera_max_s
+        self.em_execucao = 0
+        self._fila: deque = deque()
+        # Métricas
+        self.admitidos = 0
+        self.rejeitados_fila_cheia = 0
+        self.rejeitados_tempo_esgotado = 0
+        self.espera_total_s = 0.0
+        self.espera_max_observada_s = 0.0
+        self._histograma = [0] * (len(LIMITES_ESPERA_S) + 1)
+
+    @property
+    def em_espera(self) -> int:
+        return len(self._fila)
+
+    def _registar_espera(self, segundos: float) -> None:
+        self.admitidos += 1
+        self.espera_total_s += segundos
+        self.espera_max_observada_s = max(self.espera_max_observada_s, segundos)
+        indice = next((i for i, limite in enumerate(LIMITES_ESPERA_S) if segundos <= limite), len(LIMITES_ESPERA_S))
+        self._histograma[indice] += 1
+
+    async def entrar(self) -> None:
+        """Ocupa uma vaga, esperando na fila se preciso. Levanta SobrecargaError se não houver lugar."""
+        if self.em_execucao < self.limite and not self._fila:
+            self.em_execucao += 1
+            self._registar_espera(0.0)
+            return
+        if len(self._fila) >= self.tamanho_fila:
+            self.rejeitados_fila_cheia += 1
+            raise SobrecargaError(f"Serviço sobrecarregado ({self.nome}): fila de espera cheia.")
+
+        vez = asyncio.get_running_loop().create_future()
+        self._fila.append(vez)
+        inicio = time.perf_counter()
+        try:
+            await asyncio.wait({vez}, timeout=self.espera_max_s)
+        except asyncio.CancelledError:  # O cliente desistiu enquanto esperava
+            self._desistir(vez)
+            raise
+        if not vez.done():
+            self._desistir(vez)
+            self.rejeitados_tempo_esgotado += 1
+            raise SobrecargaError(f"Serviço sobrecarregado ({self.nome}): tempo de espera esgotado.")
+        self._registar_espera(time.perf_counter() - inicio)
+
+    def _desistir(self, vez: asyncio.Future) -> None:
+        if vez.done():
+            # A vaga já tinha sido passada a este pedido: devolve-a
+            self.sair()
+        else:
+            vez.cancel()
+            self._fila.remove(vez)
+
+    def sair(self) -> None:
+        """Liberta a vaga, passando-a diretamente ao primeiro da fila (se houver)."""
+        while self._fila:
+            vez = self._fila.popleft()
+            if not vez.done():
+                vez.set_result(None)
+                return
+        self.em_execucao -= 1
+
+    def metricas(self) -> Dict[str, Any]:
+        return {
+            "limite": self.limite,
+            "tamanho_fila": self.tamanho_fila,
+            "em_execucao": self.em_execucao,
+            "em_espera": self.em_espera,
+            "admitidos": self.admitidos,
+            "rejeitados_fila_cheia": self.rejeitados_fila_cheia,
+            "rejeitados_tempo_esgotado": self.rejeitados_tempo_esgotado,
+            "espera_media_s": self.espera_total_s / self.admitidos if self.admitidos else 0.0,
+            "espera_max_s": self.espera_max_observada_s,
+            "histograma_espera_s": {
+                **{f"<={limite:g}": total for limite, total in zip(LIMITES_ESPERA_S, self._histograma)},
+                "+inf": self._histograma[-1],
+            },
+        }
+
+
+class ControloAdmissao:
+    """Conjunto das classes de rota e regras (método, padrão do caminho) que as atribuem."""
+
+    def __init__(self, classes: List[ClasseAdmissao], regras: List[Tuple[str, str, str]], *, retry_after_s: int):
+        self.classes = {classe.nome: classe for classe in classes}
+        self.regras = [(metodo, re.compile(padrao), nome) for metodo, padrao, nome in regras]
+        self.retry_after_s = retry_after_s
+
+    def classificar(self, metodo: str, caminho: str) -> ClasseAdmissao | None:
+        for metodo_regra, padrao, nome in self.regras:
+            if metodo == metodo_regra and padrao.match(caminho):
+                return self.classes[nome]
+        return None
+
+    def metricas(self) -> Dict[str, Any]:
+        return {nome: classe.metricas() for nome, classe in self.classes.items()}
+
+
+class MiddlewareAdmissao:
+    """
+    Middleware ASGI: a vaga fica ocupada até a resposta ter sido enviada por inteiro,
+    incluindo o ficheiro de uma FileResponse.
+    """
+
+    def __init__(self, app, controlo: ControloAdmissao):
+        self.app = app
+        self.controlo = controlo
+
+    async def __call__(self, scope, receive, send):
+        classe = self.controlo.classificar(scope.get("method", ""), scope.get("path", "")) if scope["type"] == "http" else None
+        if classe is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await classe.entrar()
+        except SobrecargaError as e:
+            resposta = JSONResponse(
+                status_code=503, content={"detail": str(e)},
+                headers={"Retry-After": str(self.controlo.retry_after_s)},
+            )
+            await resposta(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            classe.sair()
+
+
+# --- Instância da aplicação ---
+
+REGRAS_ADMISSAO = [
+    ("POST", r"^/upload/", "documentos"),
+    ("POST", r"^/documentos/\d+/processar$", "documentos"),
+    # /charts/arquivo só serve ficheiros já renderizados: fica de fora
+    ("GET", r"^/charts/(?!arquivo/)", "graficos"),
+    # Os relatórios renderizam todos os gráficos do regime
+    ("GET", r"^/relatorios/", "graficos"),
+]
+
+controlo_admissao = ControloAdmissao(
+    [
+        ClasseAdmissao("documentos", limite=settings.ADMISSAO_DOCUMENTOS_LIMITE,
+                       tamanho_fila=settings.ADMISSAO_DOCUMENTOS_FILA, espera_max_s=settings.ADMISSAO_ESPERA_MAX_S),
+        ClasseAdmissao("graficos", limite=settings.ADMISSAO_GRAFICOS_LIMITE,
+                       tamanho_fila=settings.ADMISSAO_GRAFICOS_FILA, espera_max_s=settings.ADMISSAO_ESPERA_MAX_S),
+    ],
+    REGRAS_ADMISSAO,
+    retry_after_s=settings.ADMISSAO_RETRY_AFTER_S,
+)
@@ -18,5 +18,72 @@ class Settings(BaseSettings):
     # .parent -> pasta raiz do projeto
     BASE_DIR: Path = Path(__file__).resolve().parent.parent.parent
 
+    # Espaço máximo ocupado pelas imagens em cache de static/charts (bytes)
+    CHARTS_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+
+    # Manutenção periódica da cache de gráficos (0 = desligada; ver manutencao_graficos.py)
+    CHARTS_MANUTENCAO_INTERVALO_S: float = 3600.0
+    CHARTS_MAX_IDADE_DIAS: int = 30  # Gráficos sem acesso há mais tempo são apagados
+    CHARTS_ORFAOS_CARENCIA_S: float = 600.0  # Idade mínima de um ficheiro sem registo para ser apagado
+
+    # Pool de renderização de gráficos (0 workers = renderizar no processo do pedido)
+    CHARTS_RENDER_WORKERS: int = 2
+    CHARTS_RENDER_QUEUE: int = 32
+    CHARTS_RENDER_TIMEOUT_S: float = 30.0
+    # Backend das imagens: "kaleido" (Chromium, fidelidade total ao Plotly) ou
+    # "matplotlib" (Agg, sem navegador; requer o pacote matplotlib)
+    CHARTS_RENDER_BACKEND: str = "kaleido"
+
+    # Cache-Control das rotas de gráficos: os dados de um período podem mudar (novos
+    # documentos), por isso o cliente revalida sempre com o ETag e recebe 304 sem corpo
+    CHARTS_HTTP_CACHE_CONTROL: str = "private, no-cache"
+    # URL das imagens já renderizadas (nome = hash do conteúdo, ver graficos_estaticos.py):
+    # um nome nunca muda de conteúdo, por isso a cache do navegador/CDN não precisa de revalidar
+    CHARTS_STATIC_URL: str = "/static/charts"
+    CHARTS_STATIC_CACHE_CONTROL: str = "public, max-age=31536000, immutable"
+
+    # Controlo de admissão das rotas pesadas: pedidos em execução e fila de espera por
+    # classe (o threadpool do Starlette tem 40 threads, partilhadas por todas as rotas)
+    ADMISSAO_DOCUMENTOS_LIMITE: int = 4
+    ADMISSAO_DOCUMENTOS_FILA: int = 16
+    ADMISSAO_GRAFICOS_LIMITE: int = 8
+    ADMISSAO_GRAFICOS_FILA: int = 32
+    ADMISSAO_ESPERA_MAX_S: float = 10.0
+    ADMISSAO_RETRY_AFTER_S: int = 2
+
+    # Coalescência de cálculos idênticos em curso (app/services/voo_unico.py)
+    VOO_UNICO_ENTRE_WORKERS: bool = True  # Bloqueio consultivo na tabela bloqueio_calculo
+    VOO_UNICO_ESPERA_MAX_S: float = 30.0  # Espera máxima pelo cálculo de outro worker
+    VOO_UNICO_TTL_S: float = 120.0  # Validade de um bloqueio cujo dono não o concluiu
+    VOO_UNICO_RESULTADO_TTL_S: float = 5.0  # Tempo em que o resultado publicado fica legível
+
+    # Pré-cálculo dos gráficos depois de gravar dados fiscais (app/services/precomputacao.py)
+    PRECOMPUTACAO_ATIVA: bool = True
+    PRECOMPUTACAO_ATRASO_S: float = 2.0  # Agrupa os uploads seguidos da mesma empresa e ano
+
+    # Envio dos relatórios por email (app/services/email_sender.py)
+    SMTP_HOST: str = "localhost"
+    SMTP_PORT: int = 25
+    SMTP_USUARIO: str | None = None
+    SMTP_SENHA: str | None = None
+    SMTP_STARTTLS: bool = False
+    SMTP_SSL: bool = False  # SMTP sobre TLS implícito (porta 465)
+    SMTP_TIMEOUT_S: float = 30.0
+    SMTP_LIGACOES: int = 4  # Ligações persistentes no pool (= envios em paralelo)
+    SMTP_MENSAGENS_POR_LIGACAO: int = 100  # Renova a ligação depois de N mensagens
+    EMAIL_REMETENTE: str = "relatorios@lucid-count.local"
+    EMAIL_TAXA_POR_DOMINIO: float = 5.0  # Mensagens por segundo para o mesmo domínio
+    EMAIL_RAJADA_POR_DOMINIO: int = 10
+    EMAIL_TENTATIVAS: int = 3  # Por mensagem, só para erros temporários (4xx, ligação perdida)
+    EMAIL_ESPERA_BASE_S: float = 2.0  # Espera antes da 2.ª tentativa; duplica a cada nova tentativa
+
+    # Resumo em texto dos KPIs (app/services/resumidor.py)
+    RESUMO_BACKEND: str = "modelo"  # "modelo" (frases fixas, offline) ou "openai"
+    RESUMO_NO_RELATORIO: bool = True  # Inclui o resumo no relatório mensal (report_generator)
+    RESUMO_PEDIDOS_PARALELOS: int = 8  # Pedidos simultâneos ao backend num lote
+    RESUMO_TIMEOUT_S: float = 60.0
+    RESUMO_OPENAI_MODELO: str = "gpt-4o"
+    OPENAI_API_KEY: str | None = None
+
 settings = Settings()
 # Exemplo de uso do BASE_DIR
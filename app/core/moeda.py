@@ -0,0 +1,188 @@
+# Em: app/core/moeda.py
+"""
+Valores monetários: uma única regra de leitura de valores em BRL, partilhada pela
+extração, pelo CRUD e pelas análises, e operações em massa sobre centavos inteiros.
+
+Regra de leitura (texto em BRL, como sai dos PDFs, XMLs e planilhas):
+  - "R$", espaços e o sinal (+/-) são tratados à parte;
+  - havendo vírgula, pontos são milhares e a vírgula é decimal ("1.234,56" -> 1234.56);
+  - sem vírgula, o ponto é separador de milhares quando o texto tem "R$", quando há
+    vários pontos ou quando é seguido de exatamente 3 dígitos ("R$ 1.234" -> 1234,
+    "1.500" -> 1500); nos restantes casos é a casa decimal ("28.5" -> 28.5).
+
+Os valores guardados pela própria aplicação (str(Decimal) no JSON dos impostos, ex.:
+"1234.500" ou o Fator R "0.285") não são BRL: lêem-se com converter_decimal_armazenado.
+
+Nos caminhos de agregação os valores circulam como centavos int64: somas e
+percentagens são exatas e o Decimal só aparece na fronteira (base de dados e API).
+"""
+
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Any, Iterable
+
+import numpy as np
+
+CEM = Decimal(100)
+
+
+def _normalizar(valor: Any) -> tuple[bool, str, str] | None:
+    """Decompõe um valor textual em (negativo, parte inteira, parte decimal) segundo a regra do módulo."""
+    texto = str(valor)
+    s = "".join(texto.replace("R$", "").split())
+    if not s or not s.isascii():
+        return None
+    negativo = s[0] == "-"
+    if s[0] in "+-":
+        s = s[1:]
+
+    if "," in s:
+        s = s.replace(".", "").replace(",", ".")
+    elif "." in s and ("R$" in texto or s.count(".") > 1 or len(s.rpartition(".")[2]) == 3):
+        s = s.replace(".", "")
+
+    inteiro, _, fracao = s.partition(".")
+    if not (inteiro or fracao):
+        return None
+    if (inteiro and not inteiro.isdigit()) or (fracao and not fracao.isdigit()):
+        return None
+    return negativo, inteiro or "0", fracao
+
+
+def _decimal_de_texto_livre(valor: Any) -> Decimal | None:
+    """Último recurso para notações que a regra rápida não cobre (ex.: '1E+2')."""
+    try:
+        numero = Decimal(str(valor).strip())
+    except (InvalidOperation, ValueError):
+        return None
+    return numero if numero.is_finite() else None
+
+
+def converter_decimal(valor: Any) -> Decimal | None:
+    """
+    Converte um valor monetário (texto BRL, Decimal, int ou float) para Decimal,
+    mantendo todas as casas decimais. Devolve None se não for um número.
+    """
+    if valor is None or isinstance(valor, bool):
+        return None
+    if isinstance(valor, Decimal):
+        return valor if valor.is_finite() else None
+    if isinstance(valor, int):
+        return Decimal(valor)
+    if isinstance(valor, float):
+        return _decimal_de_texto_livre(repr(valor))
+
+    partes = _normalizar(valor)
+    if partes is None:
+        return _decimal_de_texto_livre(valor)
+    negativo, inteiro, fracao = partes
+    return Decimal(f"{'-' if negativo else ''}{inteiro}.{fracao or '0'}")
+
+
+def converter_decimal_armazenado(valor: Any) -> Decimal | None:
+    """
+    Converte um valor guardado pela aplicação (str(Decimal) no JSON, onde o ponto é
+    sempre a casa decimal: "1234.500", "0.285") para Decimal. Texto em BRL, como os
+    valores que a extração deixou por converter, segue a regra de converter_decimal.
+    """
+    if isinstance(valor, str) and "," not in valor and "R$" not in valor:
+        numero = _decimal_de_texto_livre(valor)
+        if numero is not None:
+            return numero
+    return converter_decimal(valor)
+
+
+def para_centavos(valor: Any) -> int | None:
+    """
+    Converte um valor monetário diretamente para centavos inteiros, com
+    arredondamento half-up na terceira casa. Devolve None se não for um número.
+    """
+    if valor is None or isinstance(valor, bool):
+        return None
+    if isinstance(valor, int):
+        return valor * 100
+    if isinstance(valor, (Decimal, float)):
+        numero = converter_decimal(valor)
+        return None if numero is None else int((numero * CEM).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+    partes = _normalizar(valor)
+    if partes is None:
+        return para_centavos(_decimal_de_texto_livre(valor))
+    negativo, inteiro, fracao = partes
+    centavos = int(inteiro) * 100 + int((fracao + "00")[:2])
+    if len(fracao) > 2 and fracao[2] >= "5":
+        centavos += 1
+    return -centavos if negativo else centavos
+
+
+def centavos_para_decimal(centavos: int) -> Decimal:
+    """Converte centavos inteiros para Decimal com 2 casas."""
+    return (Decimal(int(centavos)) / CEM).quantize(Decimal("0.01"))
+
+
+# --- Operações em massa (NumPy) ---
+
+def centavos_array(valores: Iterable[Any]) -> np.ndarray:
+    """Converte uma sequência de valores monetários num array int64 de centavos (inválidos contam como 0)."""
+    return np.fromiter((para_centavos(v) or 0 for v in valores), dtype=np.int64)
+
+
+def dividir_arredondado(numerador: np.ndarray, denominador: np.ndarray) -> np.ndarray:
+    """
+    Divisão inteira com arredondamento half-up (afastando do zero), elemento a elemento.
+    Onde o denominador é zero devolve 0; quem chama decide como marcar esses casos.
+    """
+    numerador = np.asarray(numerador, dtype=np.int64)
+    denominador = np.asarray(denominador, dtype=np.int64)
+    sinal = np.sign(numerador) * np.sign(denominador)
+    num, den = np.abs(numerador), np.abs(denominador)
+    den_seguro = np.where(den == 0, 1, den)
+    return sinal * ((2 * num + den_seguro) // (2 * den_seguro))
+
+
+def percentual_centesimos(parte: Any, todo: Any) -> np.ndarray:
+    """Percentagem parte/todo em centésimos de ponto (1234 = 12,34%), exata e half-up; 0 onde o todo é 0."""
+    return dividir_arredondado(np.asarray(parte, dtype=np.int64) * 10000, todo)
+
+
+def _separar_milhares(inteiros: np.ndarray) -> np.ndarray:
+    """
+    Texto de inteiros não negativos com '.' como separador de milhares ('1.234.567'),
+    montado grupo a grupo de 3 dígitos com operações de array (numpy.strings).
+    """
+    grupos = max(1, (len(str(int(inteiros.max()))) + 2) // 3)
+    resultado = np.full(len(inteiros), "", dtype="U32")
+    for j in range(grupos - 1, -1, -1):
+        potencia = 1000 ** j
+        parte = ((inteiros // potencia) % 1000).astype("U3")
+        tem_acima = inteiros >= potencia * 1000
+        segmento = np.where(tem_acima, np.strings.zfill(parte, 3), parte)
+        if j > 0:
+            segmento = np.strings.add(segmento, ".")
+        resultado = np.strings.add(resultado, np.where((inteiros >= potencia) | (j == 0), segmento, ""))
+    return resultado
+
+
+def formatar_brl_array(centavos: Any) -> np.ndarray:
+    """
+    Formata centavos inteiros como 'R$ 1.234,56' para o array inteiro, sem float nem
+    f-strings linha a linha.
+    """
+    centavos = np.asarray(centavos, dtype=np.int64)
+    if centavos.size == 0:
+        return np.array([], dtype=object)
+    absoluto = np.abs(centavos)
+    reais = _separar_milhares(absoluto // 100)
+    fracao = np.strings.zfill((absoluto % 100).astype("U2"), 2)
+    prefixo = np.where(centavos < 0, "R$ -", "R$ ")
+    return np.strings.add(np.strings.add(np.strings.add(prefixo, reais), ","), fracao).astype(object)
+
+
+def formatar_percentual_array(centesimos: Any, validos: Any) -> np.ndarray:
+    """Formata centésimos de ponto percentual como '12.34%'; inválidos saem como '0.00%'."""
+    centesimos = np.where(validos, np.asarray(centesimos, dtype=np.int64), 0)
+    if centesimos.size == 0:
+        return np.array([], dtype=object)
+    absoluto = np.abs(centesimos)
+    inteiro = np.strings.add(np.where(centesimos < 0, "-", ""), (absoluto // 100).astype(str))
+    fracao = np.strings.add(np.strings.zfill((absoluto % 100).astype("U2"), 2), "%")
+    return np.strings.add(np.strings.add(inteiro, "."), fracao).astype(object)
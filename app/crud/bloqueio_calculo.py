@@ -0,0 +1,66 @@
+# Em: app/crud/bloqueio_calculo.py
+
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.bloqueio_calculo import BloqueioCalculo
+
+def _agora() -> datetime:
+    """Instante atual em UTC, sem fuso (as colunas guardam UTC)."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def adquirir_bloqueio(db: Session, chave: str, dono: str, ttl_s: float) -> bool:
+    """
+    Tenta tomar o bloqueio da chave. Um bloqueio expirado (dono que morreu, ou
+    resultado já fora de prazo) é removido primeiro. Retorna False se outro worker
+    o tem.
+    """
+    agora = _agora()
+    db.query(BloqueioCalculo).filter(
+        BloqueioCalculo.chave == chave, BloqueioCalculo.expira_em < agora
+    ).delete(synchronize_session=False)
+    db.add(BloqueioCalculo(chave=chave, dono=dono, expira_em=agora + timedelta(seconds=ttl_s)))
+    try:
+        db.commit()
+        return True
+    except IntegrityError:
+        db.rollback()
+        return False
+
+def obter_bloqueio(db: Session, chave: str):
+    """
+    Estado atual do bloqueio: linha simples (concluido_em, resultado), ou None se não
+    existir. Não é um objeto da sessão, por isso continua legível mesmo que o dono o
+    liberte ou expire entretanto.
+    """
+    estado = db.query(BloqueioCalculo.concluido_em, BloqueioCalculo.resultado).filter(BloqueioCalculo.chave == chave).first()
+    db.commit()  # Termina a transação de leitura para a próxima sondagem ver dados novos
+    return estado
+
+def concluir_bloqueio(db: Session, chave: str, dono: str, resultado: bytes | None, ttl_resultado_s: float) -> None:
+    """Marca o cálculo como concluído e publica o resultado durante ttl_resultado_s."""
+    agora = _agora()
+    db.query(BloqueioCalculo).filter(
+        BloqueioCalculo.chave == chave, BloqueioCalculo.dono == dono
+    ).update(
+        {"resultado": resultado, "concluido_em": agora, "expira_em": agora + timedelta(seconds=ttl_resultado_s)},
+        synchronize_session=False,
+    )
+    db.commit()
+
+def libertar_bloqueio(db: Session, chave: str, dono: str) -> None:
+    """Remove o bloqueio (cálculo falhado): o próximo a pedir calcula de novo."""
+    db.query(BloqueioCalculo).filter(
+        BloqueioCalculo.chave == chave, BloqueioCalculo.dono == dono
+    ).delete(synchronize_session=False)
+    db.commit()
+
+def apagar_bloqueios_expirados(db: Session) -> int:
+    """Limpa os bloqueios e resultados já expirados."""
+    apagados = db.query(BloqueioCalculo).filter(
+        BloqueioCalculo.expira_em < _agora()
+    ).delete(synchronize_session=False)
+    db.commit()
+    return apagados
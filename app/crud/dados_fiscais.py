@@ -1,7 +1,9 @@
 # Em: app/crud/dados_fiscais.py
-from typing import Dict, Any
+from typing import Dict, Any, Iterator
 from sqlalchemy.orm import Session
 from app.models import dados_fiscais as models
+from app.crud import fato_mensal as crud_fato_mensal
+from app.core.moeda import converter_decimal
 from decimal import Decimal
 from datetime import date
 from sqlalchemy import and_
@@ -15,10 +17,11 @@ def _unificar_e_mapear_dados(dados_extraidos: dict) -> dict:
     Prepara os dados extraídos para serem salvos, convertendo tipos e
     identificando a data de competência.
     """
-    valor_total = dados_extraidos.get('receita_bruta_pa') or \
-                  dados_extraidos.get('valor_total') or \
-                  dados_extraidos.get('valor_total_entradas') or \
-                  Decimal("0.00")
+    valor_total = converter_decimal(
+        dados_extraidos.get('receita_bruta_pa') or
+        dados_extraidos.get('valor_total') or
+        dados_extraidos.get('valor_total_entradas')
+    ) or Decimal("0.00")
 
     data_competencia = None
     periodo_str = dados_extraidos.get("periodo")
@@ -46,6 +49,24 @@ def _unificar_e_mapear_dados(dados_extraidos: dict) -> dict:
         "data_competencia": data_competencia,
     }
 
+def _atualizar_fato_do_documento(db: Session, documento_id: int):
+    """Atualiza a linha da tabela fato_mensal afetada pelos dados fiscais de um documento."""
+    chave = crud_fato_mensal.obter_chave_do_documento(db, documento_id)
+    if chave:
+        (cnpj, competencia, tipo_documento), empresa_id = chave
+        crud_fato_mensal.atualizar_fato_mensal(
+            db, cnpj=cnpj, competencia=competencia, tipo_documento=tipo_documento, empresa_id=empresa_id
+        )
+    return chave
+
+def _agendar_precomputacao(chave) -> None:
+    """Depois do commit: aquece em segundo plano os gráficos da empresa e ano afetados."""
+    # Importação local: o serviço de pré-cálculo depende dos serviços de gráficos, que dependem deste CRUD
+    from app.services import precomputacao
+    if chave:
+        (cnpj, competencia, _), _ = chave
+        precomputacao.agendar(cnpj, competencia)
+
 def salvar_dados_fiscais(db: Session, *, documento_id: int, dados_extraidos: dict):
     """Salva os dados fiscais extraídos, vinculados a um documento."""
     
@@ -65,7 +86,10 @@ def salvar_dados_fiscais(db: Session, *, documento_id: int, dados_extraidos: dic
         data_competencia=dados_mapeados["data_competencia"]
     )
     db.add(db_dados_fiscais)
+    db.flush()
+    chave = _atualizar_fato_do_documento(db, documento_id)
     db.commit()
+    _agendar_precomputacao(chave)
     db.refresh(db_dados_fiscais)
     return db_dados_fiscais
 
@@ -74,13 +98,26 @@ def atualizar_dados_fiscais(db: Session, db_dados_fiscais: models.DadosFiscais,
     """Atualiza um registo de dados fiscais com os dados validados pelo utilizador."""
     
     dados_mapeados = _unificar_e_mapear_dados(dados_atualizados)
+    # Guarda a chave antiga: se o CNPJ ou a competência mudarem, o facto antigo também muda
+    chave_anterior = crud_fato_mensal.obter_chave_do_documento(db, db_dados_fiscais.documento_id)
 
     db_dados_fiscais.cnpj = dados_mapeados["cnpj"]
     db_dados_fiscais.valor_total = dados_mapeados["valor_total"]
     db_dados_fiscais.impostos = dados_mapeados["impostos"]
     db_dados_fiscais.data_competencia = dados_mapeados["data_competencia"]
-    
+    db.flush()
+
+    chave_nova = _atualizar_fato_do_documento(db, db_dados_fiscais.documento_id)
+    if chave_anterior and chave_anterior != chave_nova:
+        (cnpj, competencia, tipo_documento), empresa_id = chave_anterior
+        crud_fato_mensal.atualizar_fato_mensal(
+            db, cnpj=cnpj, competencia=competencia, tipo_documento=tipo_documento, empresa_id=empresa_id
+        )
+
     db.commit()
+    _agendar_precomputacao(chave_nova)
+    if chave_anterior and chave_anterior != chave_nova:
+        _agendar_precomputacao(chave_anterior)
     db.refresh(db_dados_fiscais)
     return db_dados_fiscais
 
@@ -97,4 +134,51 @@ def obter_dados_por_periodo(db: Session, *, cnpj: str, data_inicio: date, data_f
     )
     if tipos_documento:
         query = query.filter(models.Documento.tipo_documento.in_(tipos_documento))
-    return query.all()
\ No newline at end of file
+    return query.all()
+
+def iterar_dados_por_periodo(
+    db: Session,
+    *,
+    cnpj: str | list[str] | None = None,
+    data_inicio: date | None = None,
+    data_fim: date | None = None,
+    tipos_documento: list[str] | None = None,
+    tamanho_lote: int = 500,
+) -> Iterator[Any]:
+    """
+    Variante em fluxo de obter_dados_por_periodo, para janelas longas e grupos de empresas.
+
+    Usa um cursor do lado do servidor (stream_results) e lê 'tamanho_lote' linhas de
+    cada vez (yield_per), devolvendo só as colunas necessárias às agregações em vez
+    de objetos ORM. A memória fica constante, seja qual for a largura da janela.
+
+    As linhas vêm ordenadas por (cnpj, tipo_documento, data_competencia), de modo que
+    cada chave de factos e cada série mensal chegam contíguas.
+    """
+    query = (
+        db.query(
+            models.DadosFiscais.cnpj,
+            models.DadosFiscais.data_competencia,
+            models.Documento.tipo_documento,
+            models.Documento.empresa_id,
+            models.DadosFiscais.valor_total,
+            models.DadosFiscais.impostos,
+        )
+        .join(models.Documento, models.DadosFiscais.documento_id == models.Documento.id)
+        .filter(models.DadosFiscais.cnpj.isnot(None), models.DadosFiscais.data_competencia.isnot(None))
+    )
+    if isinstance(cnpj, str):
+        query = query.filter(models.DadosFiscais.cnpj == cnpj)
+    elif cnpj:
+        query = query.filter(models.DadosFiscais.cnpj.in_(cnpj))
+    if data_inicio:
+        query = query.filter(models.DadosFiscais.data_competencia >= data_inicio)
+    if data_fim:
+        query = query.filter(models.DadosFiscais.data_competencia <= data_fim)
+    if tipos_documento:
+        query = query.filter(models.Documento.tipo_documento.in_(tipos_documento))
+
+    query = query.order_by(
+        models.DadosFiscais.cnpj, models.Documento.tipo_documento, models.DadosFiscais.data_competencia
+    )
+    yield from query.execution_options(stream_results=True).yield_per(tamanho_lote)
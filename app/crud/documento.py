@@ -3,6 +3,7 @@
 from sqlalchemy.orm import Session
 from app.schemas.documento import DocumentoCreate
 from app.models.documento import Documento
+from app.crud import fato_mensal as crud_fato_mensal
 import os
 from pathlib import Path
 def obter_documento_por_id(db: Session, documento_id: int):
@@ -76,9 +77,19 @@ def apagar_documento_por_id(db: Session, documento_id: int) -> Documento | None:
     if caminho_arquivo.exists():
         os.remove(caminho_arquivo)
 
+    # Guarda a chave do facto mensal antes de apagar os dados fiscais do documento
+    chave_fato = crud_fato_mensal.obter_chave_do_documento(db, documento_id)
+
     # Apaga o registo do documento. A base de dados irá apagar os registos
     # dependentes em 'dados_fiscais' e 'graficos' automaticamente.
     db.delete(db_documento)
+    db.flush()
+
+    if chave_fato:
+        (cnpj, competencia, tipo_documento), empresa_id = chave_fato
+        crud_fato_mensal.atualizar_fato_mensal(
+            db, cnpj=cnpj, competencia=competencia, tipo_documento=tipo_documento, empresa_id=empresa_id
+        )
     db.commit()
     
     return db_documento
@@ -0,0 +1,48 @@
+# Em: app/crud/envio_email.py
+
+from datetime import datetime, timezone
+from typing import Iterable
+
+from sqlalchemy.orm import Session
+
+from app.models.envio_email import EnvioEmail
+
+ESTADO_ENVIADO = "enviado"
+ESTADO_FALHADO = "falhado"
+
+def _agora() -> datetime:
+    """Instante atual em UTC, sem fuso (as colunas guardam UTC)."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def chaves_enviadas(db: Session, chaves: Iterable[str], tamanho_bloco: int = 500) -> set[str]:
+    """Das chaves indicadas, as que já têm envio concluído (consultas em blocos, para listas longas)."""
+    chaves = list(dict.fromkeys(chaves))
+    enviadas: set[str] = set()
+    for inicio in range(0, len(chaves), tamanho_bloco):
+        bloco = chaves[inicio:inicio + tamanho_bloco]
+        enviadas.update(
+            chave for (chave,) in db.query(EnvioEmail.chave).filter(
+                EnvioEmail.chave.in_(bloco), EnvioEmail.estado == ESTADO_ENVIADO
+            )
+        )
+    return enviadas
+
+def registar_envio(db: Session, *, chave: str, destinatario: str, assunto: str | None,
+                   estado: str, tentativas: int, erro: str | None = None) -> EnvioEmail:
+    """Cria ou atualiza o registo da chave com o resultado de mais uma execução."""
+    agora = _agora()
+    envio = db.query(EnvioEmail).filter(EnvioEmail.chave == chave).first()
+    if envio is None:
+        envio = EnvioEmail(chave=chave, tentativas=0)
+        db.add(envio)
+    envio.destinatario = destinatario
+    envio.dominio = destinatario.rsplit("@", 1)[-1].lower()
+    envio.assunto = assunto
+    envio.estado = estado
+    envio.tentativas = (envio.tentativas or 0) + tentativas
+    envio.erro = erro
+    envio.atualizado_em = agora
+    if estado == ESTADO_ENVIADO:
+        envio.enviado_em = agora
+    db.commit()
+    return envio
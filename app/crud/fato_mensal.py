@@ -0,0 +1,461 @@
+# Em: app/crud/fato_mensal.py
+
+import hashlib
+import json
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from itertools import groupby
+from typing import Any, Dict, Iterable, Iterator, Tuple
+
+from sqlalchemy import Date, Numeric, and_, case, func
+from sqlalchemy.orm import Session
+
+from app.core.moeda import converter_decimal_armazenado
+from app.models.dados_fiscais import DadosFiscais
+from app.models.documento import Documento
+from app.models.empresa import Empresa
+from app.models.fato_mensal import FatoMensal
+
+# Tributos com coluna própria na tabela de factos (nome igual à chave do JSON de impostos)
+COLUNAS_TRIBUTOS = [
+    "irpj", "csll", "cofins", "pis_pasep", "inss_cpp", "icms", "ipi", "iss", "iss_devido", "iss_retido"
+]
+
+ChaveFato = Tuple[str, date, str]  # (cnpj, competência, tipo de documento)
+
+
+def _agregar_registos(registos: Iterable[Tuple[str, Decimal | None, Dict[str, Any] | None]]) -> Dict[str, Any]:
+    """
+    Consolida os registos (tipo_documento, valor_total, impostos) de uma mesma chave
+    nos valores de uma linha da tabela de factos.
+    """
+    faturamento = Decimal(0)
+    total_tributos = Decimal(0)
+    qtd_nfse = 0
+    tributos = defaultdict(Decimal)
+    detalhe = defaultdict(Decimal)
+    qtd_registos = 0
+
+    for tipo_documento, valor_total, impostos in registos:
+        qtd_registos += 1
+        impostos = impostos or {}
+        faturamento += valor_total or Decimal(0)
+
+        valores = {chave: converter_decimal_armazenado(valor) or Decimal(0) for chave, valor in impostos.items()}
+        for chave, valor in valores.items():
+            detalhe[chave] += valor
+        for coluna in COLUNAS_TRIBUTOS:
+            tributos[coluna] += valores.get(coluna, Decimal(0))
+
+        # Mesma regra das KPIs: o PGDAS declara o seu total; nos outros soma-se o JSON.
+        if tipo_documento == "PGDAS":
+            total_tributos += valores.get("total_debitos_tributos", Decimal(0))
+        else:
+            total_tributos += sum(valores.values(), Decimal(0))
+
+        if tipo_documento == "Encerramento ISS":
+            qtd_nfse += int(impostos.get("qtd_nfse_emitidas", 0) or 0)
+
+    return {
+        "faturamento": faturamento,
+        "total_tributos": total_tributos,
+        "qtd_nfse_emitidas": qtd_nfse,
+        **{coluna: tributos[coluna] for coluna in COLUNAS_TRIBUTOS},
+        "detalhe_impostos": {chave: str(valor) for chave, valor in detalhe.items()},
+        "qtd_registos": qtd_registos,
+    }
+
+
+def _somar_meses(competencia: date, meses: int) -> date:
+    """Desloca uma competência (primeiro dia do mês) um número de meses, para a frente ou para trás."""
+    total = competencia.year * 12 + (competencia.month - 1) + meses
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def _calcular_acumulados(linhas: list[FatoMensal], a_partir_de: date | None = None) -> None:
+    """
+    Preenche as somas acumuladas (no ano e em 12 meses) de uma série de factos
+    da mesma empresa e do mesmo tipo de documento, ordenada por competência.
+    Só as linhas a partir de 'a_partir_de' são alteradas; a série tem de incluir
+    os 11 meses anteriores a essa competência.
+    """
+    for i, linha in enumerate(linhas):
+        if a_partir_de and linha.competencia < a_partir_de:
+            continue
+        inicio_12m = _somar_meses(linha.competencia, -11)
+        faturamento_ano = tributos_ano = faturamento_12m = tributos_12m = Decimal(0)
+        for anterior in linhas[:i + 1]:
+            if anterior.competencia >= inicio_12m:
+                faturamento_12m += anterior.faturamento or Decimal(0)
+                tributos_12m += anterior.total_tributos or Decimal(0)
+            if anterior.competencia.year == linha.competencia.year:
+                faturamento_ano += anterior.faturamento or Decimal(0)
+                tributos_ano += anterior.total_tributos or Decimal(0)
+        linha.faturamento_acumulado_ano = faturamento_ano
+        linha.tributos_acumulado_ano = tributos_ano
+        linha.faturamento_12m = faturamento_12m
+        linha.tributos_12m = tributos_12m
+
+
+def _atualizar_acumulados(db: Session, *, cnpj: str, competencia: date, tipo_documento: str) -> None:
+    """
+    Acerta as somas acumuladas afetadas pela alteração de um mês: o resto desse ano
+    e os 11 meses seguintes. Lê no máximo cerca de dois anos de linhas da série.
+    """
+    inicio = _somar_meses(competencia, -11)
+    fim = max(date(competencia.year, 12, 1), _somar_meses(competencia, 11))
+    linhas = db.query(FatoMensal).filter(
+        FatoMensal.cnpj == cnpj,
+        FatoMensal.tipo_documento == tipo_documento,
+        FatoMensal.competencia >= inicio,
+        FatoMensal.competencia <= fim
+    ).order_by(FatoMensal.competencia).all()
+    _calcular_acumulados(linhas, a_partir_de=competencia)
+    db.flush()
+
+
+def _atualizar_snapshots(db: Session, *, cnpj: str, competencia: date) -> None:
+    """Propaga a alteração de um mês aos snapshots de KPIs (o mês e os que dele dependem)."""
+    # Importação local: crud.snapshot_kpi importa este módulo
+    from app.crud import snapshot_kpi as crud_snapshot_kpi
+
+    crud_snapshot_kpi.atualizar_snapshots(db, cnpj=cnpj, competencia=competencia)
+
+
+def obter_chave_do_documento(db: Session, documento_id: int) -> Tuple[ChaveFato, int | None] | None:
+    """Devolve a chave do facto afetado pelos dados fiscais de um documento, e o empresa_id."""
+    linha = (
+        db.query(DadosFiscais.cnpj, DadosFiscais.data_competencia, Documento.tipo_documento, Documento.empresa_id)
+        .join(Documento, DadosFiscais.documento_id == Documento.id)
+        .filter(DadosFiscais.documento_id == documento_id)
+        .first()
+    )
+    if not linha or not linha.cnpj or not linha.data_competencia:
+        return None
+    return (linha.cnpj, linha.data_competencia, linha.tipo_documento), linha.empresa_id
+
+
+def atualizar_fato_mensal(db: Session, *, cnpj: str, competencia: date, tipo_documento: str, empresa_id: int | None = None) -> FatoMensal | None:
+    """
+    Recalcula a linha de factos de uma chave a partir dos seus registos fiscais.
+
+    Só os registos dessa chave são lidos, pelo que o custo não depende do histórico.
+    Não faz commit: é chamada dentro da mesma transação que alterou os dados fiscais.
+    """
+    registos = (
+        db.query(Documento.tipo_documento, DadosFiscais.valor_total, DadosFiscais.impostos, Documento.empresa_id)
+        .join(Documento, DadosFiscais.documento_id == Documento.id)
+        .filter(
+            and_(
+                DadosFiscais.cnpj == cnpj,
+                DadosFiscais.data_competencia == competencia,
+                Documento.tipo_documento == tipo_documento
+            )
+        )
+        .all()
+    )
+
+    db_fato = db.query(FatoMensal).filter(
+        FatoMensal.cnpj == cnpj,
+        FatoMensal.competencia == competencia,
+        FatoMensal.tipo_documento == tipo_documento
+    ).first()
+
+    if not registos:
+        if db_fato:
+            db.delete(db_fato)
+            db.flush()
+            _atualizar_acumulados(db, cnpj=cnpj, competencia=competencia, tipo_documento=tipo_documento)
+            _atualizar_snapshots(db, cnpj=cnpj, competencia=competencia)
+        return None
+
+    valores = _agregar_registos((tipo, valor, impostos) for tipo, valor, impostos, _ in registos)
+    if empresa_id is None:
+        empresa_id = next((r.empresa_id for r in registos if r.empresa_id is not None), None)
+
+    if not db_fato:
+        db_fato = FatoMensal(cnpj=cnpj, competencia=competencia, tipo_documento=tipo_documento)
+        db.add(db_fato)
+    db_fato.empresa_id = empresa_id
+    for campo, valor in valores.items():
+        setattr(db_fato, campo, valor)
+    db.flush()
+    _atualizar_acumulados(db, cnpj=cnpj, competencia=competencia, tipo_documento=tipo_documento)
+    _atualizar_snapshots(db, cnpj=cnpj, competencia=competencia)
+    return db_fato
+
+
+def agregar_em_fluxo(linhas: Iterable[Any]) -> Iterator[Tuple[ChaveFato, int | None, Dict[str, Any]]]:
+    """
+    Consolida um fluxo de registos fiscais (cnpj, data_competencia, tipo_documento,
+    empresa_id, valor_total, impostos) nos valores das linhas de factos, uma chave de
+    cada vez. As linhas têm de vir agrupadas por chave (como as devolve
+    iterar_dados_por_periodo); só os registos da chave atual ficam em memória.
+    """
+    for (cnpj, competencia, tipo), grupo in groupby(
+        linhas, key=lambda linha: (linha.cnpj, linha.data_competencia, linha.tipo_documento)
+    ):
+        empresa_id = None
+        registos = []
+        for linha in grupo:
+            registos.append((linha.tipo_documento, linha.valor_total, linha.impostos))
+            if empresa_id is None:
+                empresa_id = linha.empresa_id
+        yield (cnpj, competencia, tipo), empresa_id, _agregar_registos(registos)
+
+
+def reconstruir_fato_mensal(db: Session, cnpjs: list[str] | None = None, tamanho_lote: int = 1000) -> int:
+    """
+    Apaga e recalcula a tabela de factos a partir de todos os dados fiscais
+    (ou apenas dos CNPJs indicados). Usado em cargas iniciais e correções.
+
+    Os registos são lidos em fluxo, ordenados por (cnpj, tipo, competência): cada
+    série fica completa antes de começar a seguinte, os acumulados são calculados
+    nesse momento e as linhas são gravadas e libertadas da sessão. A memória depende
+    do tamanho de uma série, não do volume total.
+    Retorna o número de linhas criadas.
+    """
+    # Importação local: crud.dados_fiscais importa este módulo
+    from app.crud.dados_fiscais import iterar_dados_por_periodo
+
+    apagar = db.query(FatoMensal)
+    if cnpjs:
+        apagar = apagar.filter(FatoMensal.cnpj.in_(cnpjs))
+    apagar.delete(synchronize_session=False)
+
+    total = 0
+    pendentes: list[FatoMensal] = []
+    serie: list[FatoMensal] = []
+
+    def fechar_serie() -> None:
+        _calcular_acumulados(serie)
+        pendentes.extend(serie)
+        serie.clear()
+        if len(pendentes) >= tamanho_lote:
+            gravar_pendentes()
+
+    def gravar_pendentes() -> None:
+        db.add_all(pendentes)
+        db.flush()
+        for db_fato in pendentes:
+            db.expunge(db_fato)
+        pendentes.clear()
+
+    linhas = iterar_dados_por_periodo(db, cnpj=cnpjs, tamanho_lote=tamanho_lote)
+    for (cnpj, competencia, tipo), empresa_id, valores in agregar_em_fluxo(linhas):
+        if serie and (serie[-1].cnpj, serie[-1].tipo_documento) != (cnpj, tipo):
+            fechar_serie()
+        serie.append(FatoMensal(cnpj=cnpj, competencia=competencia, tipo_documento=tipo, empresa_id=empresa_id, **valores))
+        total += 1
+    fechar_serie()
+    gravar_pendentes()
+
+    # Os snapshots de KPIs derivam dos factos: reconstroem-se na mesma transação
+    from app.crud import snapshot_kpi as crud_snapshot_kpi
+    crud_snapshot_kpi.reconstruir_snapshots(db, cnpjs=cnpjs)
+
+    db.commit()
+    return total
+
+
+def obter_fatos_por_periodo(db: Session, *, cnpj: str, data_inicio: date, data_fim: date, tipos_documento: list[str] | None = None) -> list[FatoMensal]:
+    """Obtém as linhas de factos de um CNPJ num período, ordenadas por competência."""
+    query = db.query(FatoMensal).filter(
+        and_(
+            FatoMensal.cnpj == cnpj,
+            FatoMensal.competencia >= data_inicio,
+            FatoMensal.competencia <= data_fim
+        )
+    )
+    if tipos_documento:
+        query = query.filter(FatoMensal.tipo_documento.in_(tipos_documento))
+    return query.order_by(FatoMensal.competencia, FatoMensal.tipo_documento).all()
+
+
+def versao_dos_fatos(db: Session, *, cnpj: str, data_inicio: date, data_fim: date) -> str:
+    """
+    Impressão digital (sha256) das linhas de factos de um CNPJ num período: muda
+    sempre que uma linha é criada, apagada ou recalculada. Serve de versão dos dados
+    para as caches de resultados derivados (ex: relatórios).
+    """
+    colunas = [
+        FatoMensal.competencia, FatoMensal.tipo_documento, FatoMensal.qtd_registos,
+        FatoMensal.faturamento, FatoMensal.total_tributos, FatoMensal.qtd_nfse_emitidas,
+        *(getattr(FatoMensal, coluna) for coluna in COLUNAS_TRIBUTOS),
+        FatoMensal.faturamento_acumulado_ano, FatoMensal.tributos_acumulado_ano,
+        FatoMensal.faturamento_12m, FatoMensal.tributos_12m, FatoMensal.detalhe_impostos,
+    ]
+    linhas = (
+        db.query(*colunas)
+        .filter(and_(FatoMensal.cnpj == cnpj, FatoMensal.competencia >= data_inicio, FatoMensal.competencia <= data_fim))
+        .order_by(FatoMensal.competencia, FatoMensal.tipo_documento)
+        .all()
+    )
+    return hashlib.sha256(json.dumps([list(linha) for linha in linhas], sort_keys=True, default=str).encode()).hexdigest()
+
+
+def obter_fatos_para_lote(db: Session, *, data_inicio: date, data_fim: date, cnpjs: list[str] | None = None):
+    """
+    Obtém, numa única consulta, os factos mensais de várias empresas num período,
+    acompanhados do regime tributário de cada empresa.
+
+    Retorna tuplas (cnpj, regime_tributario, tipo_documento, competencia, faturamento, total_tributos, qtd_nfse_emitidas).
+    """
+    query = (
+        db.query(
+            FatoMensal.cnpj,
+            Empresa.regime_tributario,
+            FatoMensal.tipo_documento,
+            FatoMensal.competencia,
+            FatoMensal.faturamento,
+            FatoMensal.total_tributos,
+            FatoMensal.qtd_nfse_emitidas,
+        )
+        .join(Empresa, FatoMensal.empresa_id == Empresa.id)
+        .filter(
+            and_(
+                FatoMensal.competencia >= data_inicio,
+                FatoMensal.competencia <= data_fim
+            )
+        )
+    )
+    if cnpjs:
+        query = query.filter(FatoMensal.cnpj.in_(cnpjs))
+    return query.all()
+
+
+def obter_fatos_de_empresas(db: Session, *, cnpjs: list[str], data_inicio: date, data_fim: date) -> list[FatoMensal]:
+    """
+    Pré-carrega, numa única consulta, todas as linhas de factos de um conjunto de
+    empresas num período (ex.: relatórios mensais em lote).
+    """
+    if not cnpjs:
+        return []
+    return (
+        db.query(FatoMensal)
+        .filter(
+            FatoMensal.cnpj.in_(cnpjs),
+            FatoMensal.competencia >= data_inicio,
+            FatoMensal.competencia <= data_fim
+        )
+        .order_by(FatoMensal.cnpj, FatoMensal.competencia, FatoMensal.tipo_documento)
+        .all()
+    )
+
+
+def obter_acumulados(db: Session, *, cnpj: str, competencia: date, tipos_documento: list[str]) -> list[FatoMensal]:
+    """
+    Para cada tipo de documento, obtém a última linha de factos do ano até à competência.
+    As suas somas acumuladas respondem ao faturamento e tributos no exercício sem
+    percorrer o intervalo desde janeiro.
+    """
+    inicio_ano = date(competencia.year, 1, 1)
+    ultimas = (
+        db.query(FatoMensal.tipo_documento, func.max(FatoMensal.competencia).label("competencia"))
+        .filter(
+            FatoMensal.cnpj == cnpj,
+            FatoMensal.tipo_documento.in_(tipos_documento),
+            FatoMensal.competencia >= inicio_ano,
+            FatoMensal.competencia <= competencia
+        )
+        .group_by(FatoMensal.tipo_documento)
+        .subquery()
+    )
+    return (
+        db.query(FatoMensal)
+        .join(ultimas, and_(
+            FatoMensal.tipo_documento == ultimas.c.tipo_documento,
+            FatoMensal.competencia == ultimas.c.competencia
+        ))
+        .filter(FatoMensal.cnpj == cnpj)
+        .all()
+    )
+
+
+def obter_totais_12_meses(db: Session, *, cnpj: str, competencia: date, tipos_documento: list[str]) -> Tuple[Decimal, Decimal]:
+    """
+    Soma faturamento e tributos dos 12 meses terminados na competência.
+
+    Quando existe linha para a própria competência, usa as colunas acumuladas
+    (uma linha por tipo); caso contrário, soma o intervalo na base de dados.
+    """
+    competencia = competencia.replace(day=1)
+    linhas = db.query(FatoMensal).filter(
+        FatoMensal.cnpj == cnpj,
+        FatoMensal.competencia == competencia,
+        FatoMensal.tipo_documento.in_(tipos_documento)
+    ).all()
+    tipos_com_linha = {linha.tipo_documento for linha in linhas}
+    faturamento = sum((linha.faturamento_12m or Decimal(0) for linha in linhas), Decimal(0))
+    tributos = sum((linha.tributos_12m or Decimal(0) for linha in linhas), Decimal(0))
+
+    tipos_sem_linha = [tipo for tipo in tipos_documento if tipo not in tipos_com_linha]
+    if tipos_sem_linha:
+        soma_faturamento, soma_tributos = db.query(
+            func.coalesce(func.sum(FatoMensal.faturamento), 0),
+            func.coalesce(func.sum(FatoMensal.total_tributos), 0)
+        ).filter(
+            FatoMensal.cnpj == cnpj,
+            FatoMensal.tipo_documento.in_(tipos_sem_linha),
+            FatoMensal.competencia >= _somar_meses(competencia, -11),
+            FatoMensal.competencia <= competencia
+        ).one()
+        faturamento += Decimal(str(soma_faturamento))
+        tributos += Decimal(str(soma_tributos))
+
+    return faturamento, tributos
+
+
+def obter_serie_mensal(db: Session, *, cnpj: str, data_inicio: date, data_fim: date, tipos_documento: list[str]):
+    """
+    Série mensal de faturamento e tributos de um CNPJ numa única consulta.
+
+    Os tipos de documento são somados por competência e, sobre essa série, as funções
+    de janela dão o mês anterior (LAG) e os totais acumulados no intervalo (SUM OVER).
+    A leitura começa um mês antes de 'data_inicio' para que o primeiro mês também
+    tenha valor anterior; 'competencia_anterior' permite detetar meses em falta.
+    """
+    data_inicio = data_inicio.replace(day=1)
+    mensal = (
+        db.query(
+            FatoMensal.competencia.label("competencia"),
+            func.sum(FatoMensal.faturamento).label("faturamento"),
+            func.sum(FatoMensal.total_tributos).label("tributos"),
+            func.sum(FatoMensal.qtd_nfse_emitidas).label("qtd_nfse_emitidas")
+        )
+        .filter(
+            FatoMensal.cnpj == cnpj,
+            FatoMensal.tipo_documento.in_(tipos_documento),
+            FatoMensal.competencia >= _somar_meses(data_inicio, -1),
+            FatoMensal.competencia <= data_fim
+        )
+        .group_by(FatoMensal.competencia)
+        .subquery()
+    )
+
+    ordem = mensal.c.competencia
+    no_intervalo = mensal.c.competencia >= data_inicio
+    janela = (
+        db.query(
+            mensal.c.competencia,
+            mensal.c.faturamento,
+            mensal.c.tributos,
+            mensal.c.qtd_nfse_emitidas,
+            func.lag(mensal.c.competencia, type_=Date).over(order_by=ordem).label("competencia_anterior"),
+            func.lag(mensal.c.faturamento, type_=Numeric(16, 2)).over(order_by=ordem).label("faturamento_anterior"),
+            func.lag(mensal.c.tributos, type_=Numeric(16, 2)).over(order_by=ordem).label("tributos_anterior"),
+            func.sum(case((no_intervalo, mensal.c.faturamento), else_=0), type_=Numeric(16, 2))
+                .over(order_by=ordem, rows=(None, 0)).label("faturamento_acumulado"),
+            func.sum(case((no_intervalo, mensal.c.tributos), else_=0), type_=Numeric(16, 2))
+                .over(order_by=ordem, rows=(None, 0)).label("tributos_acumulado")
+        )
+        .subquery()
+    )
+
+    return (
+        db.query(janela)
+        .filter(janela.c.competencia >= data_inicio)
+        .order_by(janela.c.competencia)
+        .all()
+    )
@@ -1,8 +1,10 @@
 # Em: app/crud/grafico.py
 
+from pathlib import Path
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from app.models.grafico import Grafico
-from datetime import datetime
+from datetime import datetime, timezone
 
 def get_grafico_por_tipo_e_documento(db: Session, tipo_grafico: str, documento_id: int) -> Grafico | None:
     """Busca um gráfico específico pelo seu tipo e pelo ID do documento associado."""
@@ -15,22 +17,116 @@ def get_graficos_por_documento_id(db: Session, documento_id: int) -> list[Grafic
     """Retorna uma lista de todos os gráficos associados a um documento."""
     return db.query(Grafico).filter(Grafico.documento_id == documento_id).all()
 
-def criar_grafico(db: Session, tipo_grafico: str, caminho_arquivo: str, documento_id: int) -> Grafico:
+def get_grafico_por_chave(db: Session, chave_cache: str) -> Grafico | None:
+    """Busca o gráfico em cache com o hash de conteúdo indicado."""
+    return db.query(Grafico).filter(Grafico.chave_cache == chave_cache).first()
+
+def criar_grafico(
+    db: Session,
+    tipo_grafico: str,
+    caminho_arquivo: str,
+    documento_id: int | None = None,
+    *,
+    cnpj: str | None = None,
+    chave_cache: str | None = None,
+    tamanho_bytes: int = 0,
+) -> Grafico:
     """Cria um novo registro de gráfico no banco de dados."""
     db_grafico = Grafico(
         tipo_grafico=tipo_grafico,
         caminho_arquivo=caminho_arquivo,
-        documento_id=documento_id
+        documento_id=documento_id,
+        cnpj=cnpj,
+        chave_cache=chave_cache,
+        tamanho_bytes=tamanho_bytes
     )
     db.add(db_grafico)
     db.commit()
     db.refresh(db_grafico)
     return db_grafico
 
+def registar_acesso(db: Session, db_grafico: Grafico) -> None:
+    """Atualiza o último acesso de um gráfico em cache (ordem do despejo LRU)."""
+    db_grafico.data_ultimo_acesso = datetime.now(timezone.utc)
+    db.commit()
+
+def despejar_por_tamanho(db: Session, limite_bytes: int, manter: str | None = None) -> int:
+    """
+    Apaga as imagens em cache acedidas há mais tempo (ficheiro e registo) até o total
+    ficar dentro do limite. A entrada 'manter' (a acabada de gerar) nunca é despejada.
+    Retorna o número de gráficos removidos.
+    """
+    total = db.query(func.coalesce(func.sum(Grafico.tamanho_bytes), 0)).filter(Grafico.chave_cache.isnot(None)).scalar()
+    if total <= limite_bytes:
+        return 0
+
+    candidatos = db.query(Grafico.id, Grafico.caminho_arquivo, Grafico.tamanho_bytes).filter(Grafico.chave_cache.isnot(None))
+    if manter:
+        candidatos = candidatos.filter(Grafico.chave_cache != manter)
+
+    ids_removidos = []
+    for id_grafico, caminho_arquivo, tamanho_bytes in candidatos.order_by(Grafico.data_ultimo_acesso, Grafico.id):
+        if total <= limite_bytes:
+            break
+        Path(caminho_arquivo).unlink(missing_ok=True)
+        total -= tamanho_bytes or 0
+        ids_removidos.append(id_grafico)
+
+    apagar_por_ids(db, ids_removidos)
+    return len(ids_removidos)
+
+def apagar_por_ids(db: Session, ids: list[int], tamanho_lote: int = 500) -> int:
+    """Apaga os registos indicados com DELETEs por lotes (um IN por lote, sem carregar objetos)."""
+    for inicio in range(0, len(ids), tamanho_lote):
+        db.query(Grafico).filter(Grafico.id.in_(ids[inicio:inicio + tamanho_lote])).delete(synchronize_session=False)
+        db.commit()
+    return len(ids)
+
+def apagar_por_caminhos(db: Session, caminhos: list[str], tamanho_lote: int = 500) -> int:
+    """Apaga, por lotes, os registos cujas imagens já não existem."""
+    apagados = 0
+    for inicio in range(0, len(caminhos), tamanho_lote):
+        apagados += db.query(Grafico).filter(
+            Grafico.caminho_arquivo.in_(caminhos[inicio:inicio + tamanho_lote])
+        ).delete(synchronize_session=False)
+        db.commit()
+    return apagados
+
+def caminhos_registados(db: Session, caminhos: list[str], tamanho_lote: int = 500) -> set[str]:
+    """Dos caminhos indicados, os que têm registo (uma consulta por lote)."""
+    registados = set()
+    for inicio in range(0, len(caminhos), tamanho_lote):
+        registados.update(c for (c,) in db.query(Grafico.caminho_arquivo).filter(
+            Grafico.caminho_arquivo.in_(caminhos[inicio:inicio + tamanho_lote])
+        ))
+    return registados
+
+def iterar_caminhos(db: Session, tamanho_lote: int = 500):
+    """Percorre os caminhos de todos os registos em fluxo, sem carregar a tabela inteira."""
+    for (caminho,) in db.query(Grafico.caminho_arquivo).execution_options(stream_results=True).yield_per(tamanho_lote):
+        yield caminho
+
+def apagar_graficos_expirados(db: Session, data_limite: datetime, tamanho_lote: int = 500) -> int:
+    """
+    Apaga (ficheiro e registo) os gráficos sem acesso desde data_limite (ou, sem
+    acessos registados, criados antes dela), um lote de cada vez.
+    """
+    ultimo_uso = func.coalesce(Grafico.data_ultimo_acesso, Grafico.data_criacao)
+    total = 0
+    while True:
+        lote = db.query(Grafico.id, Grafico.caminho_arquivo).filter(ultimo_uso < data_limite).order_by(Grafico.id).limit(tamanho_lote).all()
+        if not lote:
+            return total
+        for _, caminho_arquivo in lote:
+            Path(caminho_arquivo).unlink(missing_ok=True)
+        db.query(Grafico).filter(Grafico.id.in_([id_grafico for id_grafico, _ in lote])).delete(synchronize_session=False)
+        db.commit()
+        total += len(lote)
+
 def remover_graficos_antigos(db: Session, data_limite: datetime) -> int:
     """Remove registros de gráficos mais antigos que a data limite e retorna a contagem."""
     query = db.query(Grafico).filter(Grafico.data_criacao < data_limite)
     num_removidos = query.count()
     query.delete(synchronize_session=False)
     db.commit()
-    return num_removidos
\ No newline at end of file
+    return num_removidos
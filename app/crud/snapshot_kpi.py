@@ -0,0 +1,167 @@
+# Em: app/crud/snapshot_kpi.py
+
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.crud.fato_mensal import _somar_meses
+from app.models.empresa import Empresa
+from app.models.fato_mensal import FatoMensal
+from app.models.snapshot_kpi import SnapshotKpi
+
+# (faturamento, tributos, notas emitidas) de um mês, já segundo as regras do regime
+ValoresMes = Tuple[Decimal, Decimal, int]
+
+
+def _regras_do_regime(regime: str | None) -> Tuple[list[str], list[str]] | None:
+    """Tipos de documento do regime e os que contam para faturamento e tributos; None se o regime não tiver KPIs."""
+    # Importação local: o serviço de analytics importa os módulos de CRUD
+    from app.services.analytics_service import GRUPOS_POR_REGIME, tipos_para_totais
+
+    if regime not in GRUPOS_POR_REGIME:
+        return None
+    return GRUPOS_POR_REGIME[regime], tipos_para_totais(regime)
+
+
+def _percentual(valor: Decimal) -> Decimal:
+    return valor.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+def _valores_mensais(db: Session, *, cnpj: str, regime: str, inicio: date | None = None, fim: date | None = None) -> Dict[date, ValoresMes]:
+    """
+    Totais por competência a partir do fato_mensal: no Simples Nacional só o PGDAS
+    conta para valores; as notas vêm sempre do Encerramento ISS.
+    """
+    tipos_regime, tipos_totais = _regras_do_regime(regime)
+    query = db.query(
+        FatoMensal.competencia, FatoMensal.tipo_documento,
+        FatoMensal.faturamento, FatoMensal.total_tributos, FatoMensal.qtd_nfse_emitidas
+    ).filter(FatoMensal.cnpj == cnpj, FatoMensal.tipo_documento.in_(tipos_regime))
+    if inicio:
+        query = query.filter(FatoMensal.competencia >= inicio)
+    if fim:
+        query = query.filter(FatoMensal.competencia <= fim)
+
+    mensal: Dict[date, list] = {}
+    for competencia, tipo_documento, faturamento, tributos, notas in query:
+        valores = mensal.setdefault(competencia, [Decimal(0), Decimal(0), 0])
+        if tipo_documento in tipos_totais:
+            valores[0] += faturamento or Decimal(0)
+            valores[1] += tributos or Decimal(0)
+        if tipo_documento == "Encerramento ISS":
+            valores[2] += notas or 0
+    return {competencia: tuple(valores) for competencia, valores in mensal.items()}
+
+
+def calcular_snapshots(mensal: Dict[date, ValoresMes], meses: List[date]) -> Dict[date, Dict[str, Any]]:
+    """
+    KPIs dos meses pedidos a partir dos totais mensais. 'mensal' tem de incluir os
+    11 meses anteriores ao primeiro mês pedido (acumulados em 12 meses e no ano).
+    """
+    resultado = {}
+    for competencia in meses:
+        faturamento, tributos, notas = mensal[competencia]
+        anterior = mensal.get(_somar_meses(competencia, -1))
+        faturamento_anterior, tributos_anterior = (anterior[0], anterior[1]) if anterior else (None, None)
+
+        inicio_12m = _somar_meses(competencia, -11)
+        janela = [valores for mes, valores in mensal.items() if inicio_12m <= mes <= competencia]
+        no_ano = [valores for mes, valores in mensal.items() if mes.year == competencia.year and mes <= competencia]
+
+        resultado[competencia] = {
+            "faturamento": faturamento,
+            "tributos": tributos,
+            "qtd_nfse_emitidas": notas,
+            "carga_tributaria_percentual": _percentual(tributos / faturamento * 100) if faturamento else None,
+            "ticket_medio": _percentual(faturamento / notas) if notas else None,
+            "crescimento_faturamento_percentual": (
+                _percentual((faturamento - faturamento_anterior) / faturamento_anterior * 100)
+                if faturamento_anterior else None
+            ),
+            "variacao_tributos_percentual": (
+                _percentual((tributos / tributos_anterior - 1) * 100) if tributos_anterior else None
+            ),
+            "faturamento_acumulado_ano": sum((v[0] for v in no_ano), Decimal(0)),
+            "tributos_acumulado_ano": sum((v[1] for v in no_ano), Decimal(0)),
+            "faturamento_12m": sum((v[0] for v in janela), Decimal(0)),
+            "tributos_12m": sum((v[1] for v in janela), Decimal(0)),
+        }
+    return resultado
+
+
+def _gravar_snapshots(db: Session, *, empresa, valores: Dict[date, Dict[str, Any]], existentes: Dict[date, SnapshotKpi]) -> None:
+    """Cria ou atualiza os snapshots calculados e apaga os dos meses que deixaram de ter dados."""
+    for competencia, campos in valores.items():
+        db_snapshot = existentes.pop(competencia, None)
+        if not db_snapshot:
+            db_snapshot = SnapshotKpi(cnpj=empresa.cnpj, competencia=competencia)
+            db.add(db_snapshot)
+        db_snapshot.empresa_id = empresa.id
+        db_snapshot.regime_tributario = empresa.regime_tributario
+        for campo, valor in campos.items():
+            setattr(db_snapshot, campo, valor)
+    for db_snapshot in existentes.values():
+        db.delete(db_snapshot)
+    db.flush()
+
+
+def atualizar_snapshots(db: Session, *, cnpj: str, competencia: date) -> None:
+    """
+    Atualiza os snapshots afetados pela alteração de um mês: o próprio mês, o
+    crescimento do mês seguinte e os acumulados do resto do ano e dos 11 meses
+    seguintes. Não faz commit: corre na transação que alterou os factos.
+    """
+    fim = max(date(competencia.year, 12, 1), _somar_meses(competencia, 11))
+    existentes = {
+        s.competencia: s for s in db.query(SnapshotKpi).filter(
+            SnapshotKpi.cnpj == cnpj,
+            SnapshotKpi.competencia >= competencia,
+            SnapshotKpi.competencia <= fim
+        )
+    }
+
+    empresa = db.query(Empresa).filter(Empresa.cnpj == cnpj).first()
+    if not empresa or _regras_do_regime(empresa.regime_tributario) is None:
+        _gravar_snapshots(db, empresa=empresa, valores={}, existentes=existentes)
+        return
+
+    mensal = _valores_mensais(db, cnpj=cnpj, regime=empresa.regime_tributario, inicio=_somar_meses(competencia, -11), fim=fim)
+    meses = sorted(mes for mes in mensal if mes >= competencia)
+    _gravar_snapshots(db, empresa=empresa, valores=calcular_snapshots(mensal, meses), existentes=existentes)
+
+
+def reconstruir_snapshots(db: Session, cnpjs: list[str] | None = None) -> int:
+    """
+    Apaga e recalcula os snapshots de KPIs a partir do fato_mensal (de todas as
+    empresas ou só das indicadas), uma empresa de cada vez. Não faz commit.
+    Retorna o número de snapshots criados.
+    """
+    apagar = db.query(SnapshotKpi)
+    if cnpjs:
+        apagar = apagar.filter(SnapshotKpi.cnpj.in_(cnpjs))
+    apagar.delete(synchronize_session=False)
+
+    empresas = db.query(Empresa).filter(Empresa.cnpj.in_(db.query(FatoMensal.cnpj).distinct()))
+    if cnpjs:
+        empresas = empresas.filter(Empresa.cnpj.in_(cnpjs))
+
+    total = 0
+    for empresa in empresas.all():
+        if _regras_do_regime(empresa.regime_tributario) is None:
+            continue
+        mensal = _valores_mensais(db, cnpj=empresa.cnpj, regime=empresa.regime_tributario)
+        valores = calcular_snapshots(mensal, sorted(mensal))
+        _gravar_snapshots(db, empresa=empresa, valores=valores, existentes={})
+        total += len(valores)
+    return total
+
+
+def obter_snapshots(db: Session, *, cnpj: str, data_inicio: date, data_fim: date) -> list[SnapshotKpi]:
+    """Lê os KPIs mensais guardados de um CNPJ num período, ordenados por competência."""
+    return db.query(SnapshotKpi).filter(
+        SnapshotKpi.cnpj == cnpj,
+        SnapshotKpi.competencia >= data_inicio.replace(day=1),
+        SnapshotKpi.competencia <= data_fim
+    ).order_by(SnapshotKpi.competencia).all()
@@ -2,4 +2,8 @@
 
 from .documento import Documento
 from .dados_fiscais import DadosFiscais
-from .empresa import Empresa # Importa o modelo Empresa
\ No newline at end of file
+from .empresa import Empresa # Importa o modelo Empresa
+from .fato_mensal import FatoMensal
+from .snapshot_kpi import SnapshotKpi
+from .bloqueio_calculo import BloqueioCalculo
+from .envio_email import EnvioEmail
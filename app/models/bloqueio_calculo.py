@@ -0,0 +1,25 @@
+# Em: app/models/bloqueio_calculo.py
+
+from sqlalchemy import Column, DateTime, LargeBinary, String
+from app.core.database import Base
+
+class BloqueioCalculo(Base):
+    """
+    Bloqueio consultivo de um cálculo em curso, partilhado pelos workers.
+
+    Cada linha diz que um worker ('dono') está a calcular o resultado identificado
+    por 'chave' (hash dos parâmetros normalizados do pedido). Os outros workers
+    esperam que a linha seja concluída e leem o resultado publicado em vez de o
+    recalcular. 'expira_em' protege contra um dono que morreu a meio: passado esse
+    instante, o bloqueio pode ser tomado por outro worker. Depois de concluída, a
+    linha fica mais alguns segundos só para quem esperava ler o resultado.
+    """
+    __tablename__ = "bloqueio_calculo"
+
+    chave = Column(String(64), primary_key=True)
+    dono = Column(String, nullable=False)
+    expira_em = Column(DateTime, nullable=False, index=True)  # UTC
+
+    # Resultado serializado (None enquanto o cálculo decorre, ou se não é partilhável)
+    resultado = Column(LargeBinary, nullable=True)
+    concluido_em = Column(DateTime, nullable=True)  # UTC
@@ -0,0 +1,27 @@
+# Em: app/models/envio_email.py
+
+from sqlalchemy import Column, DateTime, Integer, String, Text
+from app.core.database import Base
+
+class EnvioEmail(Base):
+    """
+    Registo de cada email enviado (ou que falhou definitivamente) pelo email_sender.
+
+    'chave' identifica a mensagem de forma estável entre execuções (por exemplo,
+    relatório mensal + empresa + competência + destinatário): um novo envio do
+    mesmo lote salta as chaves já em estado 'enviado' e só repete as que falharam.
+    """
+    __tablename__ = "envios_email"
+
+    id = Column(Integer, primary_key=True, index=True)
+    chave = Column(String, unique=True, index=True, nullable=False)
+    destinatario = Column(String, nullable=False)
+    dominio = Column(String, nullable=False, index=True)
+    assunto = Column(String, nullable=True)
+
+    estado = Column(String, nullable=False, index=True)  # 'enviado' ou 'falhado'
+    tentativas = Column(Integer, nullable=False, default=0)  # Acumuladas entre execuções
+    erro = Column(Text, nullable=True)  # Última resposta de erro do servidor SMTP
+
+    atualizado_em = Column(DateTime, nullable=False)  # UTC
+    enviado_em = Column(DateTime, nullable=True)  # UTC
@@ -0,0 +1,60 @@
+# Em: app/models/fato_mensal.py
+
+from sqlalchemy import Column, Integer, String, JSON, Date, DateTime, Numeric, ForeignKey, UniqueConstraint
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+class FatoMensal(Base):
+    """
+    Modelo SQLAlchemy para a tabela de factos mensais.
+
+    Cada linha consolida, para uma empresa, um mês de competência e um tipo de
+    documento, os valores que os KPIs e os gráficos precisam. É mantida de forma
+    incremental sempre que os dados fiscais mudam, evitando reler o JSON de
+    impostos de cada registo em todas as consultas.
+    """
+    __tablename__ = "fato_mensal"
+    __table_args__ = (
+        UniqueConstraint("cnpj", "competencia", "tipo_documento", name="uq_fato_mensal_chave"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    # --- Chave (empresa, competência, tipo de documento) ---
+    empresa_id = Column(Integer, ForeignKey("empresas.id"), nullable=True, index=True)
+    cnpj = Column(String, nullable=False, index=True)
+    competencia = Column(Date, nullable=False, index=True)
+    tipo_documento = Column(String, nullable=False, index=True)
+
+    # --- Totais do mês ---
+    faturamento = Column(Numeric(14, 2), nullable=False, default=0)
+    # No PGDAS é o total de débitos declarado; nos outros documentos é a soma dos impostos.
+    total_tributos = Column(Numeric(14, 2), nullable=False, default=0)
+    qtd_nfse_emitidas = Column(Integer, nullable=False, default=0)
+
+    # --- Colunas por tributo ---
+    irpj = Column(Numeric(14, 2), nullable=False, default=0)
+    csll = Column(Numeric(14, 2), nullable=False, default=0)
+    cofins = Column(Numeric(14, 2), nullable=False, default=0)
+    pis_pasep = Column(Numeric(14, 2), nullable=False, default=0)
+    inss_cpp = Column(Numeric(14, 2), nullable=False, default=0)
+    icms = Column(Numeric(14, 2), nullable=False, default=0)
+    ipi = Column(Numeric(14, 2), nullable=False, default=0)
+    iss = Column(Numeric(14, 2), nullable=False, default=0)
+    iss_devido = Column(Numeric(14, 2), nullable=False, default=0)
+    iss_retido = Column(Numeric(14, 2), nullable=False, default=0)
+
+    # --- Somas acumuladas (mantidas por empresa e tipo de documento) ---
+    # Acumulado desde janeiro do ano da competência, inclusive
+    faturamento_acumulado_ano = Column(Numeric(16, 2), nullable=False, default=0)
+    tributos_acumulado_ano = Column(Numeric(16, 2), nullable=False, default=0)
+    # Acumulado dos 12 meses terminados na competência, inclusive (base do RBT12)
+    faturamento_12m = Column(Numeric(16, 2), nullable=False, default=0)
+    tributos_12m = Column(Numeric(16, 2), nullable=False, default=0)
+
+    # Soma de cada chave do JSON de impostos (ex: limites do PGDAS, créditos da EFD)
+    detalhe_impostos = Column(JSON)
+
+    # Número de registos de dados fiscais consolidados nesta linha
+    qtd_registos = Column(Integer, nullable=False, default=0)
+    data_atualizacao = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
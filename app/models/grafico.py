@@ -1,6 +1,6 @@
 # Em: app/models/grafico.py
 
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -9,15 +9,18 @@ class Grafico(Base):
     """
     Modelo SQLAlchemy para a tabela de gráficos.
 
-    Esta tabela armazena os metadados de cada gráfico gerado,
-    associando-o a um documento específico.
+    Esta tabela armazena os metadados de cada gráfico gerado. Serve também de
+    índice da cache de renderização: cada imagem é identificada pelo hash do seu
+    conteúdo e guarda o tamanho e o último acesso, usados no despejo por tamanho.
     """
     __tablename__ = "graficos"
 
     id = Column(Integer, primary_key=True, index=True)
     
     # Chave estrangeira para o documento que originou os dados do gráfico
-    documento_id = Column(Integer, ForeignKey("documentos.id"), nullable=False)
+    # (os gráficos por CNPJ e período não vêm de um único documento)
+    documento_id = Column(Integer, ForeignKey("documentos.id"), nullable=True)
+    cnpj = Column(String, index=True, nullable=True)
     
     # Tipo do gráfico (ex: 'faturamento', 'segregacao_tributos')
     tipo_grafico = Column(String, index=True, nullable=False)
@@ -25,8 +28,14 @@ class Grafico(Base):
     # Caminho onde o arquivo de imagem do gráfico foi salvo
     caminho_arquivo = Column(String, nullable=False, unique=True)
     
+    # --- Cache de renderização ---
+    # Hash de (tipo, CNPJ, dados preparados, versão do layout, dimensões)
+    chave_cache = Column(String, unique=True, index=True, nullable=True)
+    tamanho_bytes = Column(BigInteger, nullable=False, default=0)
+
     # Data e hora da criação do registro, com valor padrão automático
     data_criacao = Column(DateTime(timezone=True), server_default=func.now())
+    data_ultimo_acesso = Column(DateTime(timezone=True), server_default=func.now(), index=True)
 
     # Relação para podermos acessar o documento a partir de um objeto Grafico
     documento = relationship("Documento", back_populates="graficos")
\ No newline at end of file
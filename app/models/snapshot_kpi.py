@@ -0,0 +1,48 @@
+# Em: app/models/snapshot_kpi.py
+
+from sqlalchemy import Column, Integer, String, Date, DateTime, Numeric, ForeignKey, UniqueConstraint
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+class SnapshotKpi(Base):
+    """
+    Modelo SQLAlchemy para os KPIs mensais já calculados de cada empresa.
+
+    Cada linha guarda, para uma empresa e um mês de competência, os totais do mês
+    segundo o regime da empresa e os indicadores que dependem dos meses vizinhos
+    (crescimento face ao mês anterior e somas acumuladas). É atualizada a partir
+    do fato_mensal sempre que um mês muda, só nesse mês e nos que dele dependem,
+    para que a leitura do painel seja uma simples consulta.
+    """
+    __tablename__ = "snapshot_kpi"
+    __table_args__ = (
+        UniqueConstraint("cnpj", "competencia", name="uq_snapshot_kpi_chave"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    # --- Chave (empresa, competência) ---
+    empresa_id = Column(Integer, ForeignKey("empresas.id"), nullable=True, index=True)
+    cnpj = Column(String, nullable=False, index=True)
+    competencia = Column(Date, nullable=False, index=True)
+    regime_tributario = Column(String, nullable=False)
+
+    # --- Totais do mês (no Simples Nacional só o PGDAS conta para valores) ---
+    faturamento = Column(Numeric(14, 2), nullable=False, default=0)
+    tributos = Column(Numeric(14, 2), nullable=False, default=0)
+    qtd_nfse_emitidas = Column(Integer, nullable=False, default=0)
+
+    # --- Indicadores do mês (None quando não há base de cálculo) ---
+    carga_tributaria_percentual = Column(Numeric(9, 2), nullable=True)
+    ticket_medio = Column(Numeric(14, 2), nullable=True)
+    # Face ao mês imediatamente anterior
+    crescimento_faturamento_percentual = Column(Numeric(12, 2), nullable=True)
+    variacao_tributos_percentual = Column(Numeric(12, 2), nullable=True)
+
+    # --- Somas acumuladas ---
+    faturamento_acumulado_ano = Column(Numeric(16, 2), nullable=False, default=0)
+    tributos_acumulado_ano = Column(Numeric(16, 2), nullable=False, default=0)
+    faturamento_12m = Column(Numeric(16, 2), nullable=False, default=0)
+    tributos_12m = Column(Numeric(16, 2), nullable=False, default=0)
+
+    data_atualizacao = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
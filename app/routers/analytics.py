@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from datetime import date 
+from typing import List, Optional
 # Importa o módulo da  aplicação
 from app.core.database import SessionLocal # Assume que get_db está aqui
 from app.services import analytics_service # Importa o serviço de analytics
+from app.services import simulacao
+from app.services import voo_unico
+from app.crud import snapshot_kpi as crud_snapshot_kpi
 from app.schemas import analytics_schema as schemas_analytics # Importa os schemas de analytics
 from app.services.analytics_service import _formatar_monetario, _formatar_percentual
 from app.schemas.tipos import RegimeTributario 
@@ -39,35 +43,163 @@ def obter_kpis_por_periodo(
     com base nos documentos fiscais processados para um CNPJ num
     determinado intervalo de datas.
     """
-    # Chama cada uma das nossas funções de serviço para calcular os KPIs
-   # carga_tributaria = analytics_service.calcular_carga_tributaria(
-   #     db, cnpj=cnpj, regime=regime, data_inicio=data_inicio, data_fim=data_fim
-   # )
-    carga_tributaria_projetada = analytics_service.projetar_carga_tributaria(
-       db, cnpj=cnpj, regime=regime.value, data_inicio=data_inicio, data_fim=data_fim
-    )
+    # Pedidos simultâneos iguais (vários separadores do dashboard) partilham um único cálculo
+    def calcular():
+        # Chama cada uma das nossas funções de serviço para calcular os KPIs
+        carga_tributaria_projetada = analytics_service.projetar_carga_tributaria(
+            db, cnpj=cnpj, regime=regime.value, data_inicio=data_inicio, data_fim=data_fim
+        )
     
-    # 2. As outras chamadas continuam como estavam
-    ticket_medio = analytics_service.calcular_ticket_medio(
-        db, cnpj=cnpj, regime=regime.value, data_inicio=data_inicio, data_fim=data_fim
+        # 2. As outras chamadas continuam como estavam
+        ticket_medio = analytics_service.calcular_ticket_medio(
+            db, cnpj=cnpj, regime=regime.value, data_inicio=data_inicio, data_fim=data_fim
+        )
+        impostos_agregados = analytics_service.calcular_impostos_por_tipo(
+            db, cnpj=cnpj, regime=regime.value, data_inicio=data_inicio, data_fim=data_fim
+        )
+        crescimento = analytics_service.calcular_crescimento_faturamento(
+            db, cnpj=cnpj, regime=regime.value, data_inicio_atual=data_inicio, data_fim_atual=data_fim
+        )
+
+        # 3. Montar a resposta com o novo formato para a carga tributária
+        resposta = schemas_analytics.KpiResponse(
+            cnpj_consultado=cnpj,
+            regime_consultado=regime.value,
+            periodo_inicio=data_inicio,
+            periodo_fim=data_fim,
+            carga_tributaria_percentual=carga_tributaria_projetada, # Agora é um dicionário
+            ticket_medio=_formatar_monetario(ticket_medio),
+            crescimento_faturamento_percentual=_formatar_percentual(crescimento),
+            total_impostos_por_tipo=impostos_agregados,
+        )
+    
+        return resposta
+
+    return voo_unico.executar(
+        ("kpis", cnpj, regime.value, data_inicio, data_fim), calcular, db=db,
+        serializar=lambda resposta: resposta.model_dump_json().encode(),
+        desserializar=schemas_analytics.KpiResponse.model_validate_json,
     )
-    impostos_agregados = analytics_service.calcular_impostos_por_tipo(
-        db, cnpj=cnpj, regime=regime.value, data_inicio=data_inicio, data_fim=data_fim
+
+
+@router.get(
+    "/kpis/lote",
+    response_model=schemas_analytics.KpiLoteResponse,
+    summary="Calcula os KPIs de várias (ou todas as) empresas num período."
+)
+def obter_kpis_em_lote(
+    data_inicio: date,
+    data_fim: date,
+    cnpjs: Optional[List[str]] = Query(None, description="CNPJs a incluir. Se omitido, inclui todas as empresas com dados no período."),
+    db: Session = Depends(get_db)
+):
+    """
+    Calcula carga tributária, ticket médio e crescimento do faturamento de toda
+    a carteira com uma única consulta, devolvendo uma resposta colunar.
+    """
+    if data_inicio > data_fim:
+        raise HTTPException(status_code=400, detail="A data de início deve ser anterior à data de fim.")
+
+    colunas = analytics_service.calcular_kpis_em_lote(
+        db, data_inicio=data_inicio, data_fim=data_fim, cnpjs=cnpjs
     )
-    crescimento = analytics_service.calcular_crescimento_faturamento(
-        db, cnpj=cnpj, regime=regime.value, data_inicio_atual=data_inicio, data_fim_atual=data_fim
+    return schemas_analytics.KpiLoteResponse(
+        periodo_inicio=data_inicio,
+        periodo_fim=data_fim,
+        **colunas
     )
 
-    # 3. Montar a resposta com o novo formato para a carga tributária
-    resposta = schemas_analytics.KpiResponse(
+
+@router.get(
+    "/kpis/serie",
+    response_model=schemas_analytics.KpiSerieResponse,
+    summary="Série mensal de KPIs (crescimento e variação mês a mês) para um CNPJ."
+)
+def obter_serie_kpis(
+    cnpj: str,
+    regime: RegimeTributario,
+    data_inicio: date,
+    data_fim: date,
+    db: Session = Depends(get_db)
+):
+    """
+    Devolve, para cada mês do intervalo, o faturamento, os tributos, a carga tributária,
+    o crescimento face ao mês anterior e os acumulados, calculados numa única consulta.
+    """
+    if data_inicio > data_fim:
+        raise HTTPException(status_code=400, detail="A data de início deve ser anterior à data de fim.")
+
+    meses = analytics_service.calcular_serie_kpis(
+        db, cnpj=cnpj, regime=regime.value, data_inicio=data_inicio, data_fim=data_fim
+    )
+    return schemas_analytics.KpiSerieResponse(
         cnpj_consultado=cnpj,
         regime_consultado=regime.value,
         periodo_inicio=data_inicio,
         periodo_fim=data_fim,
-        carga_tributaria_percentual=carga_tributaria_projetada, # Agora é um dicionário
-        ticket_medio=_formatar_monetario(ticket_medio),
-        crescimento_faturamento_percentual=_formatar_percentual(crescimento),
-        total_impostos_por_tipo=impostos_agregados,
+        meses=meses
+    )
+
+
+@router.get(
+    "/kpis/mensais",
+    response_model=schemas_analytics.KpiSnapshotResponse,
+    summary="KPIs mensais já calculados de um CNPJ (leitura dos snapshots)."
+)
+def obter_kpis_mensais(
+    cnpj: str,
+    data_inicio: date,
+    data_fim: date,
+    db: Session = Depends(get_db)
+):
+    """
+    Devolve os KPIs de cada mês do intervalo tal como foram guardados na última
+    alteração dos dados fiscais, sem qualquer cálculo no pedido.
+    """
+    if data_inicio > data_fim:
+        raise HTTPException(status_code=400, detail="A data de início deve ser anterior à data de fim.")
+
+    snapshots = crud_snapshot_kpi.obter_snapshots(db, cnpj=cnpj, data_inicio=data_inicio, data_fim=data_fim)
+    return schemas_analytics.KpiSnapshotResponse(
+        cnpj_consultado=cnpj,
+        regime_tributario=snapshots[0].regime_tributario if snapshots else None,
+        periodo_inicio=data_inicio,
+        periodo_fim=data_fim,
+        meses=snapshots
+    )
+
+
+@router.post(
+    "/simulacao",
+    response_model=schemas_analytics.SimulacaoResponse,
+    summary="Simula uma grelha de cenários de carga tributária (crescimento, regime e Fator R)."
+)
+def simular_cenarios(
+    pedido: schemas_analytics.SimulacaoRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Projeta os tributos de cada cenário da grelha a partir dos últimos 12 meses de
+    receita da empresa e devolve a matriz completa de cenários.
+    """
+    try:
+        resultado = simulacao.simular_cenarios_empresa(
+            db,
+            cnpj=pedido.cnpj,
+            regime=pedido.regime,
+            data_base=pedido.data_base,
+            taxas_crescimento=pedido.taxas_crescimento,
+            fatores_r=pedido.fatores_r,
+            regimes=pedido.regimes,
+            horizonte_meses=pedido.horizonte_meses,
+            aliquota_iss=pedido.aliquota_iss,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return schemas_analytics.SimulacaoResponse(
+        cnpj_consultado=pedido.cnpj,
+        data_base=pedido.data_base,
+        horizonte_meses=pedido.horizonte_meses,
+        **resultado
     )
-    
-    return resposta
\ No newline at end of file
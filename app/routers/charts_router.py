@@ -1,19 +1,24 @@
 # app/routers/charts_router.py
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
 from sqlalchemy.orm import Session
-from starlette.responses import FileResponse
+from starlette.responses import FileResponse, JSONResponse, RedirectResponse, Response
+from dataclasses import dataclass
 from datetime import date
-from typing import Optional
+from typing import Dict, Optional
 import pandas as pd
 from collections import defaultdict
 from app.crud import grafico as crud_grafico
 from app.crud import documento as crud_documento
 from pathlib import Path 
 
+from app.core.config import settings
 from app.core.database import SessionLocal
 from app.services import charts as charts_service
 from app.crud import dados_fiscais as crud_dados_fiscais
 from app.services import analytics_service 
+from app.services import pacote_graficos
+from app.services import voo_unico
+from app.schemas.grafico import PacoteGraficosResponse
 
 router = APIRouter(
     prefix="/charts",
@@ -27,6 +32,145 @@ def get_db():
     finally:
         db.close()
 
+@dataclass
+class OpcoesGrafico:
+    """Variante pedida de um gráfico e cabeçalhos condicionais do pedido."""
+    formato: Optional[str]
+    largura: Optional[int]
+    escala: Optional[float]
+    accept: Optional[str]
+    if_none_match: Optional[str]
+    resposta: str = "imagem"
+
+def opcoes_grafico(
+    formato: Optional[str] = Query(None, pattern="^(png|svg|webp|json)$", description="'png', 'svg', 'webp' (imagem) ou 'json' (figura Plotly). Por omissão segue o cabeçalho Accept."),
+    largura: Optional[int] = Query(None, ge=200, le=2400, description="Largura da imagem em pontos (a altura mantém a proporção). Por omissão, a do gráfico."),
+    escala: Optional[float] = Query(None, ge=0.5, le=3, description="Fator de resolução (2 = ecrãs de alta densidade). Ignorado em SVG."),
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    resposta: str = Query("imagem", pattern="^(imagem|url)$", description="'imagem' (o ficheiro) ou 'url' (JSON com a URL imutável da imagem em CHARTS_STATIC_URL)."),
+) -> OpcoesGrafico:
+    return OpcoesGrafico(formato=formato, largura=largura, escala=escala, accept=accept, if_none_match=if_none_match, resposta=resposta)
+
+def _preparar(preparar, db: Session, cnpj: str, data_inicio: date, data_fim: date):
+    """
+    Dados de um gráfico, calculados uma única vez para os pedidos simultâneos com os
+    mesmos parâmetros (as rotas de um regime partilham a mesma preparação).
+    """
+    return voo_unico.executar(
+        ("charts", preparar.__name__, cnpj, data_inicio, data_fim),
+        lambda: preparar(db, cnpj, data_inicio, data_fim),
+    )
+
+# Formatos negociáveis pelo Accept, pela ordem de preferência em caso de empate
+_FORMATOS_ACCEPT = (("png", "image/png"), ("svg", "image/svg+xml"), ("webp", "image/webp"), ("json", "application/json"))
+
+def _qualidades_accept(accept: str) -> Dict[str, float]:
+    """Media ranges do Accept com o respetivo q (1 por omissão; q inválido conta como 0)."""
+    qualidades = {}
+    for intervalo in accept.split(","):
+        media_type, *parametros = [parte.strip() for parte in intervalo.split(";")]
+        if not media_type:
+            continue
+        q = 1.0
+        for parametro in parametros:
+            nome, _, valor = parametro.partition("=")
+            if nome.strip().lower() == "q":
+                try:
+                    q = min(max(float(valor), 0.0), 1.0)
+                except ValueError:
+                    q = 0.0
+        qualidades[media_type.lower()] = q
+    return qualidades
+
+def _negociar_formato(opcoes: OpcoesGrafico) -> str:
+    """
+    Formato explícito ou, na falta dele, o suportado com maior q no cabeçalho Accept.
+    Cada formato usa o q do media range mais específico que o abrange (image/png,
+    depois image/*, depois */*); q=0 exclui-o. Em caso de empate ganha o PNG (os
+    browsers anunciam image/webp e */* em todos os pedidos de <img>), e sem Accept
+    ou sem nenhum formato aceitável responde-se também em PNG.
+    """
+    if opcoes.formato:
+        return opcoes.formato
+    if not opcoes.accept:
+        return "png"
+    qualidades = _qualidades_accept(opcoes.accept)
+    melhor, melhor_q = "png", 0.0
+    for formato, media_type in _FORMATOS_ACCEPT:
+        for intervalo in (media_type, media_type.split("/")[0] + "/*", "*/*"):
+            if intervalo in qualidades:
+                if qualidades[intervalo] > melhor_q:
+                    melhor, melhor_q = formato, qualidades[intervalo]
+                break
+    return melhor
+
+def _etag_corresponde(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    etiquetas = {valor.strip().removeprefix("W/") for valor in if_none_match.split(",")}
+    return "*" in etiquetas or etag in etiquetas
+
+def _responder_grafico(gerar, dados, cnpj: str, db: Session, opcoes: OpcoesGrafico):
+    """
+    Devolve a imagem do gráfico (PNG, SVG ou WebP, na largura e escala pedidas) ou,
+    com formato=json (ou 'Accept: application/json'), a especificação da figura
+    Plotly para o frontend desenhar sem renderização no servidor.
+
+    O ETag é o hash do conteúdo da variante (forte: a mesma chave serve sempre o
+    mesmo ficheiro) e calcula-se sem renderizar, por isso um If-None-Match igual
+    recebe 304 sem montar a figura.
+    """
+    formato = _negociar_formato(opcoes)
+    if opcoes.resposta == "url":
+        return _responder_url(gerar, dados, cnpj, db, opcoes, "png" if formato == "json" and not opcoes.formato else formato)
+    variante = {"formato": "json"} if formato == "json" else {"formato": formato, "largura": opcoes.largura, "escala": opcoes.escala}
+    etag = f'"{gerar.chave(dados, cnpj, **variante)}"'
+    cabecalhos = {"ETag": etag, "Cache-Control": settings.CHARTS_HTTP_CACHE_CONTROL}
+    if not opcoes.formato:
+        cabecalhos["Vary"] = "Accept"
+
+    if _etag_corresponde(opcoes.if_none_match, etag):
+        return Response(status_code=304, headers=cabecalhos)
+    if formato == "json":
+        return Response(gerar.figura_json(dados, cnpj), media_type="application/json", headers=cabecalhos)
+    imagem = gerar.renderizar_em_cache(dados, cnpj, db=db, **variante)
+    charts_service.registar_no_indice(db, imagem)
+    # A mesma imagem no espaço estático imutável, para o cliente a reutilizar sem voltar aqui
+    cabecalhos["Content-Location"] = imagem.url_estatica
+    return FileResponse(imagem.caminho, media_type=imagem.media_type, headers=cabecalhos)
+
+def _responder_url(gerar, dados, cnpj: str, db: Session, opcoes: OpcoesGrafico, formato: str):
+    """
+    Renderiza (se preciso) e devolve só a URL imutável da imagem: o cliente descarrega-a
+    do espaço estático, e as visualizações seguintes do mesmo relatório vêm da sua cache.
+    """
+    if formato == "json":
+        raise HTTPException(status_code=400, detail="resposta=url só está disponível para imagens (png, svg ou webp).")
+    imagem = gerar.renderizar_em_cache(dados, cnpj, db=db, formato=formato, largura=opcoes.largura, escala=opcoes.escala)
+    charts_service.registar_no_indice(db, imagem)
+    # JSONResponse explícito: as rotas declaram response_class=FileResponse
+    return JSONResponse(
+        {"url": imagem.url_estatica, "media_type": imagem.media_type, "em_cache": not imagem.renderizado},
+        headers={"Cache-Control": settings.CHARTS_HTTP_CACHE_CONTROL},
+    )
+
+def _responder_pacote(db: Session, *, regime: str, cnpj: str, data_inicio: date, data_fim: date, formato: str):
+    """Gera o pacote de gráficos do regime e devolve o manifesto JSON ou o ZIP das imagens."""
+    try:
+        manifesto = pacote_graficos.gerar_pacote_graficos(
+            db, cnpj=cnpj, regime=regime, data_inicio=data_inicio, data_fim=data_fim
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    if formato == "zip":
+        nome = f"graficos_{''.join(filter(str.isdigit, cnpj))}_{data_inicio:%Y%m}_{data_fim:%Y%m}.zip"
+        return Response(
+            pacote_graficos.compactar_pacote(manifesto), media_type="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="{nome}"'}
+        )
+    return manifesto
+
 # =============================================================================
 # --- Endpoints - SIMPLES NACIONAL ---
 # =============================================================================
@@ -36,91 +180,101 @@ def get_grafico_sn_faturamento(
     cnpj: str = Query(..., description="CNPJ da empresa.", example="20.295.854/0001-50"),
     data_inicio: date = Query(..., description="Data de início do período (YYYY-MM-DD)."),
     data_fim: date = Query(..., description="Data de fim do período (YYYY-MM-DD)."),
+    opcoes: OpcoesGrafico = Depends(opcoes_grafico),
     db: Session = Depends(get_db)
 ):
-    df_dados = analytics_service.preparar_dados_para_graficos(db, cnpj, data_inicio, data_fim)
+    df_dados = _preparar(analytics_service.preparar_dados_para_graficos, db, cnpj, data_inicio, data_fim)
     if df_dados is None or df_dados.empty:
         raise HTTPException(status_code=404, detail="Dados insuficientes para gerar o gráfico.")
-    caminho_grafico = charts_service.gerar_grafico_sn_faturamento(df_dados, cnpj)
-    return FileResponse(caminho_grafico, media_type="image/png")
+    return _responder_grafico(charts_service.gerar_grafico_sn_faturamento, df_dados, cnpj, db, opcoes)
 
 @router.get("/simples-nacional/receita-crescimento", summary="[SN] Gera gráfico de Receita vs Crescimento", response_class=FileResponse)
 def get_grafico_sn_receita_crescimento(
     cnpj: str = Query(..., description="CNPJ da empresa."),
     data_inicio: date = Query(..., description="Data de início do período."),
     data_fim: date = Query(..., description="Data de fim do período."),
+    opcoes: OpcoesGrafico = Depends(opcoes_grafico),
     db: Session = Depends(get_db)
 ):
-    df_dados = analytics_service.preparar_dados_para_graficos(db, cnpj, data_inicio, data_fim)
+    df_dados = _preparar(analytics_service.preparar_dados_para_graficos, db, cnpj, data_inicio, data_fim)
     if df_dados is None or df_dados.empty:
         raise HTTPException(status_code=404, detail="Dados insuficientes para o gráfico de receita e crescimento.")
-    caminho_grafico = charts_service.gerar_grafico_sn_receita_crescimento(df_dados, cnpj)
-    return FileResponse(caminho_grafico, media_type="image/png")
+    return _responder_grafico(charts_service.gerar_grafico_sn_receita_crescimento, df_dados, cnpj, db, opcoes)
 
 @router.get("/simples-nacional/impostos-carga", summary="[SN] Gera gráfico de Impostos vs Carga Tributária", response_class=FileResponse)
 def get_grafico_sn_impostos_carga(
     cnpj: str = Query(..., description="CNPJ da empresa."),
     data_inicio: date = Query(..., description="Data de início do período."),
     data_fim: date = Query(..., description="Data de fim do período."),
+    opcoes: OpcoesGrafico = Depends(opcoes_grafico),
     db: Session = Depends(get_db)
 ):
-    df_dados = analytics_service.preparar_dados_para_graficos(db, cnpj, data_inicio, data_fim)
+    df_dados = _preparar(analytics_service.preparar_dados_para_graficos, db, cnpj, data_inicio, data_fim)
     if df_dados is None or df_dados.empty:
         raise HTTPException(status_code=404, detail="Dados insuficientes para o gráfico de impostos e carga tributária.")
-    caminho_grafico = charts_service.gerar_grafico_sn_impostos_carga(df_dados, cnpj)
-    return FileResponse(caminho_grafico, media_type="image/png")
+    return _responder_grafico(charts_service.gerar_grafico_sn_impostos_carga, df_dados, cnpj, db, opcoes)
 
 @router.get("/simples-nacional/acumulado-anual", summary="[SN] Gera gráfico de Faturamento e Impostos Acumulados", response_class=FileResponse)
 def get_grafico_sn_acumulado(
     cnpj: str = Query(..., description="CNPJ da empresa."),
     data_inicio: date = Query(..., description="Data de início do período."),
     data_fim: date = Query(..., description="Data de fim do período."),
+    opcoes: OpcoesGrafico = Depends(opcoes_grafico),
     db: Session = Depends(get_db)
 ):
-    df_dados = analytics_service.preparar_dados_para_graficos(db, cnpj, data_inicio, data_fim)
+    df_dados = _preparar(analytics_service.preparar_dados_para_graficos, db, cnpj, data_inicio, data_fim)
     if df_dados is None or df_dados.empty:
         raise HTTPException(status_code=404, detail="Dados insuficientes para o gráfico de valores acumulados.")
-    caminho_grafico = charts_service.gerar_grafico_sn_acumulado(df_dados, cnpj)
-    return FileResponse(caminho_grafico, media_type="image/png")
+    return _responder_grafico(charts_service.gerar_grafico_sn_acumulado, df_dados, cnpj, db, opcoes)
 
 @router.get("/simples-nacional/limite-faturamento", summary="[SN] Gera gráfico de medidor para o Limite de Faturamento", response_class=FileResponse)
 def get_grafico_sn_limite_faturamento(
     cnpj: str = Query(..., description="CNPJ da empresa."),
     data_inicio: date = Query(..., description="Data de início do período."),
     data_fim: date = Query(..., description="Data de fim do período."),
+    opcoes: OpcoesGrafico = Depends(opcoes_grafico),
     db: Session = Depends(get_db)
 ):
-    dados_kpis = analytics_service.preparar_dados_para_kpis_visuais(db, cnpj, data_inicio, data_fim)
+    dados_kpis = _preparar(analytics_service.preparar_dados_para_kpis_visuais, db, cnpj, data_inicio, data_fim)
     if not dados_kpis or not dados_kpis.get("medidor"):
         raise HTTPException(status_code=404, detail="Dados de PGDAS não encontrados para o gráfico de limite de faturamento.")
-    caminho_grafico = charts_service.gerar_grafico_sn_limite_faturamento(dados_kpis["medidor"], cnpj)
-    return FileResponse(caminho_grafico, media_type="image/png")
+    return _responder_grafico(charts_service.gerar_grafico_sn_limite_faturamento, dados_kpis["medidor"], cnpj, db, opcoes)
 
 @router.get("/simples-nacional/sublimite-receita", summary="[SN] Gera gráfico de medidor para o Sublimite de Receita", response_class=FileResponse)
 def get_grafico_sn_sublimite_receita(
     cnpj: str = Query(..., description="CNPJ da empresa."),
     data_inicio: date = Query(..., description="Data de início do período."),
     data_fim: date = Query(..., description="Data de fim do período."),
+    opcoes: OpcoesGrafico = Depends(opcoes_grafico),
     db: Session = Depends(get_db)
 ):
-    dados_kpis = analytics_service.preparar_dados_para_kpis_visuais(db, cnpj, data_inicio, data_fim)
+    dados_kpis = _preparar(analytics_service.preparar_dados_para_kpis_visuais, db, cnpj, data_inicio, data_fim)
     if not dados_kpis or not dados_kpis.get("medidor") or not dados_kpis["medidor"].get("sublimite"):
         raise HTTPException(status_code=404, detail="Dados de PGDAS com sublimite válido não encontrados.")
-    caminho_grafico = charts_service.gerar_grafico_sn_sublimite_receita(dados_kpis["medidor"], cnpj)
-    return FileResponse(caminho_grafico, media_type="image/png")
+    return _responder_grafico(charts_service.gerar_grafico_sn_sublimite_receita, dados_kpis["medidor"], cnpj, db, opcoes)
 
 @router.get("/simples-nacional/segregacao-tributos", summary="[SN] Gera gráfico de rosca para a Segregação dos Tributos", response_class=FileResponse)
 def get_grafico_sn_segregacao_tributos(
     cnpj: str = Query(..., description="CNPJ da empresa."),
     data_inicio: date = Query(..., description="Data de início do período."),
     data_fim: date = Query(..., description="Data de fim do período."),
+    opcoes: OpcoesGrafico = Depends(opcoes_grafico),
     db: Session = Depends(get_db)
 ):
-    dados_kpis = analytics_service.preparar_dados_para_kpis_visuais(db, cnpj, data_inicio, data_fim)
+    dados_kpis = _preparar(analytics_service.preparar_dados_para_kpis_visuais, db, cnpj, data_inicio, data_fim)
     if not dados_kpis or not dados_kpis.get("rosca"):
         raise HTTPException(status_code=404, detail="Dados de PGDAS sem valores de tributos para o gráfico de segregação.")
-    caminho_grafico = charts_service.gerar_grafico_sn_segregacao_tributos(dados_kpis["rosca"], cnpj)
-    return FileResponse(caminho_grafico, media_type="image/png")
+    return _responder_grafico(charts_service.gerar_grafico_sn_segregacao_tributos, dados_kpis["rosca"], cnpj, db, opcoes)
+
+@router.get("/simples-nacional/pacote", summary="[SN] Gera todos os gráficos do Simples Nacional de uma vez", response_model=PacoteGraficosResponse)
+def get_pacote_graficos_sn(
+    cnpj: str = Query(..., description="CNPJ da empresa."),
+    data_inicio: date = Query(..., description="Data de início do período."),
+    data_fim: date = Query(..., description="Data de fim do período."),
+    formato: str = Query("json", pattern="^(json|zip)$", description="'json' (manifesto com as URLs) ou 'zip' (as imagens)."),
+    db: Session = Depends(get_db)
+):
+    return _responder_pacote(db, regime="Simples Nacional", cnpj=cnpj, data_inicio=data_inicio, data_fim=data_fim, formato=formato)
 
 # =============================================================================
 # --- Endpoints - LUCRO PRESUMIDO SERVIÇOS ---
@@ -131,83 +285,103 @@ def get_grafico_lp_receita_crescimento(
     cnpj: str = Query(..., description="CNPJ da empresa."),
     data_inicio: date = Query(..., description="Data de início do período."),
     data_fim: date = Query(..., description="Data de fim do período."),
+    opcoes: OpcoesGrafico = Depends(opcoes_grafico),
     db: Session = Depends(get_db)
 ):
-    df_dados = analytics_service.preparar_dados_para_graficos(db, cnpj, data_inicio, data_fim)
+    df_dados = _preparar(analytics_service.preparar_dados_para_graficos, db, cnpj, data_inicio, data_fim)
     if df_dados is None or df_dados.empty:
         raise HTTPException(status_code=404, detail="Dados insuficientes para gerar o gráfico.")
-    caminho_grafico = charts_service.gerar_grafico_lp_receita_crescimento(df_dados, cnpj)
-    return FileResponse(caminho_grafico, media_type="image/png")
+    return _responder_grafico(charts_service.gerar_grafico_lp_receita_crescimento, df_dados, cnpj, db, opcoes)
 
 @router.get("/lucro-presumido/impostos-carga", summary="[LP] Gera gráfico de Total de Tributos e Carga Tributária", response_class=FileResponse)
 def get_grafico_lp_impostos_carga(
     cnpj: str = Query(..., description="CNPJ da empresa."),
     data_inicio: date = Query(..., description="Data de início do período."),
     data_fim: date = Query(..., description="Data de fim do período."),
+    opcoes: OpcoesGrafico = Depends(opcoes_grafico),
     db: Session = Depends(get_db)
 ):
-    df_dados = analytics_service.preparar_dados_para_graficos(db, cnpj, data_inicio, data_fim)
+    df_dados = _preparar(analytics_service.preparar_dados_para_graficos, db, cnpj, data_inicio, data_fim)
     if df_dados is None or df_dados.empty:
         raise HTTPException(status_code=404, detail="Dados insuficientes para o gráfico de impostos e carga.")
-    caminho_grafico = charts_service.gerar_grafico_lp_impostos_carga(df_dados, cnpj)
-    return FileResponse(caminho_grafico, media_type="image/png")
+    return _responder_grafico(charts_service.gerar_grafico_lp_impostos_carga, df_dados, cnpj, db, opcoes)
 
 @router.get("/lucro-presumido/acumulado", summary="[LP] Gera gráfico de Faturamento e Tributos Acumulados", response_class=FileResponse)
 def get_grafico_lp_acumulado(
     cnpj: str = Query(..., description="CNPJ da empresa."),
     data_inicio: date = Query(..., description="Data de início do período."),
     data_fim: date = Query(..., description="Data de fim do período."),
+    opcoes: OpcoesGrafico = Depends(opcoes_grafico),
     db: Session = Depends(get_db)
 ):
-    df_dados = analytics_service.preparar_dados_para_graficos(db, cnpj, data_inicio, data_fim)
+    df_dados = _preparar(analytics_service.preparar_dados_para_graficos, db, cnpj, data_inicio, data_fim)
     if df_dados is None or df_dados.empty:
         raise HTTPException(status_code=404, detail="Dados insuficientes para o gráfico de acumulados.")
-    caminho_grafico = charts_service.gerar_grafico_lp_acumulado(df_dados, cnpj)
-    return FileResponse(caminho_grafico, media_type="image/png")
+    return _responder_grafico(charts_service.gerar_grafico_lp_acumulado, df_dados, cnpj, db, opcoes)
 
 @router.get("/lucro-presumido/tributos-detalhado", summary="[LP] Gera gráfico de Tributos Retidos vs Devidos", response_class=FileResponse)
 def get_grafico_lp_tributos_detalhado(
     cnpj: str = Query(..., description="CNPJ da empresa."),
     data_inicio: date = Query(..., description="Data de início do período."),
     data_fim: date = Query(..., description="Data de fim do período."),
+    opcoes: OpcoesGrafico = Depends(opcoes_grafico),
     db: Session = Depends(get_db)
 ):
     df_dados = analytics_service.preparar_dados_tributos_lp(db, cnpj, data_inicio, data_fim)
     if df_dados is None or df_dados.empty:
         raise HTTPException(status_code=404, detail="Dados insuficientes para o gráfico detalhado de tributos.")
-    caminho_grafico = charts_service.gerar_grafico_lp_tributos_detalhado(df_dados, cnpj)
-    return FileResponse(caminho_grafico, media_type="image/png")
+    return _responder_grafico(charts_service.gerar_grafico_lp_tributos_detalhado, df_dados, cnpj, db, opcoes)
     
 @router.get("/lucro-presumido/tributos-ano", summary="[LP] Gera gráfico de rosca com o percentual de tributos no ano", response_class=FileResponse)
 def get_grafico_lp_tributos_ano(
     cnpj: str = Query(..., description="CNPJ da empresa."),
     data_inicio: date = Query(..., description="Data de início do período."),
     data_fim: date = Query(..., description="Data de fim do período."),
+    opcoes: OpcoesGrafico = Depends(opcoes_grafico),
     db: Session = Depends(get_db)
 ):
-    dados_kpis = analytics_service.preparar_dados_para_kpis_visuais(db, cnpj, data_inicio, data_fim)
+    dados_kpis = _preparar(analytics_service.preparar_dados_para_kpis_visuais, db, cnpj, data_inicio, data_fim)
     if not dados_kpis or not dados_kpis.get("rosca"):
         raise HTTPException(status_code=404, detail="Dados de tributos não encontrados para o período.")
-    caminho_grafico = charts_service.gerar_grafico_lp_tributos_ano(dados_kpis["rosca"], cnpj)
-    return FileResponse(caminho_grafico, media_type="image/png")
+    return _responder_grafico(charts_service.gerar_grafico_lp_tributos_ano, dados_kpis["rosca"], cnpj, db, opcoes)
 
 @router.get("/lucro-presumido/limite-faturamento", summary="[LP] Gera gráfico de velocímetro do limite de faturamento", response_class=FileResponse)
 def get_grafico_lp_limite_faturamento(
     cnpj: str = Query(..., description="CNPJ da empresa."),
     data_inicio: date = Query(..., description="Data de início do período."),
     data_fim: date = Query(..., description="Data de fim do período."),
+    opcoes: OpcoesGrafico = Depends(opcoes_grafico),
     db: Session = Depends(get_db)
 ):
     faturamento_exercicio = analytics_service.calcular_faturamento_no_exercicio(db, cnpj=cnpj, regime="Lucro Presumido (Serviços)", data_inicio=data_inicio, data_fim=data_fim)
     dados_medidor = {'faturamento_exercicio': float(faturamento_exercicio)}
     
-    caminho_grafico = charts_service.gerar_grafico_lp_limite_faturamento(dados_medidor, cnpj)
-    return FileResponse(caminho_grafico, media_type="image/png")
+    return _responder_grafico(charts_service.gerar_grafico_lp_limite_faturamento, dados_medidor, cnpj, db, opcoes)
+
+@router.get("/lucro-presumido/pacote", summary="[LP] Gera todos os gráficos do Lucro Presumido de uma vez", response_model=PacoteGraficosResponse)
+def get_pacote_graficos_lp(
+    cnpj: str = Query(..., description="CNPJ da empresa."),
+    data_inicio: date = Query(..., description="Data de início do período."),
+    data_fim: date = Query(..., description="Data de fim do período."),
+    formato: str = Query("json", pattern="^(json|zip)$", description="'json' (manifesto com as URLs) ou 'zip' (as imagens)."),
+    db: Session = Depends(get_db)
+):
+    return _responder_pacote(db, regime="Lucro Presumido (Serviços)", cnpj=cnpj, data_inicio=data_inicio, data_fim=data_fim, formato=formato)
 
 # =============================================================================
 # --- GERAL ---
 # =============================================================================
 
+@router.get("/arquivo/{nome_arquivo}", summary="Redireciona para a imagem no espaço estático de gráficos", response_class=RedirectResponse)
+def get_arquivo_grafico(nome_arquivo: str):
+    caminho = charts_service.CHARTS_DIR / nome_arquivo
+    media_type = charts_service.FORMATOS_IMAGEM.get(Path(nome_arquivo).suffix.lstrip("."))
+    # Só nomes simples de ficheiros de imagem da pasta de gráficos (sem subpastas nem '..')
+    if Path(nome_arquivo).name != nome_arquivo or media_type is None or not caminho.is_file():
+        raise HTTPException(status_code=404, detail="Gráfico não encontrado.")
+    # Rota antiga: os nomes são hashes do conteúdo, por isso o redirecionamento é permanente
+    return RedirectResponse(f"{settings.CHARTS_STATIC_URL}/{nome_arquivo}", status_code=308)
+
 @router.get(
     "/{documento_id}",
     summary="Lista os gráficos associados a um documento"
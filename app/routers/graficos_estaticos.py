@@ -0,0 +1,54 @@
+# app/routers/graficos_estaticos.py
+"""
+Espaço de URLs estático e imutável das imagens de gráficos.
+
+Os ficheiros de static/charts têm no nome o hash do conteúdo da variante
+(tipo, CNPJ, dados, versão do layout, formato e dimensões): um nome nunca passa a
+designar outra imagem, porque dados diferentes dão outro nome. Por isso podem ser
+servidos com 'Cache-Control: immutable' e um max-age longo: o navegador (ou uma
+CDN à frente da API) volta a mostrar o mesmo relatório sem qualquer pedido.
+
+As rotas de cálculo (/charts/...) renderizam e devolvem a URL daqui (resposta=url,
+manifesto do pacote, cabeçalho Content-Location); a transferência deixa de ocupar o
+worker que renderizou. O FileResponse do Starlette usa a extensão 'pathsend' do
+servidor ASGI quando existe (sendfile); em produção, o proxy reverso pode servir
+CHARTS_STATIC_URL diretamente da pasta, sem passar pela aplicação.
+"""
+
+import os
+from pathlib import Path
+
+from starlette.exceptions import HTTPException
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+from app.core.config import settings
+from app.services import charts as charts_service
+
+
+class GraficosEstaticos(StaticFiles):
+    """StaticFiles sobre a pasta de gráficos, com cabeçalhos de cache imutável."""
+
+    def __init__(self) -> None:
+        super().__init__(directory=None, check_dir=False)
+
+    # A pasta é lida em cada pedido (charts_service.CHARTS_DIR pode ser redefinida, p. ex. nos testes)
+    @property
+    def all_directories(self):
+        return [Path(charts_service.CHARTS_DIR)]
+
+    @all_directories.setter
+    def all_directories(self, valor) -> None:
+        pass
+
+    async def get_response(self, path: str, scope: Scope):
+        # Só imagens da pasta, sem subpastas nem ficheiros temporários ('.nome.tmp')
+        nome = os.path.basename(path)
+        if nome != path or nome.startswith(".") or Path(nome).suffix.lstrip(".") not in charts_service.FORMATOS_IMAGEM:
+            raise HTTPException(status_code=404)
+        return await super().get_response(path, scope)
+
+    def file_response(self, full_path, stat_result, scope: Scope, status_code: int = 200):
+        resposta = super().file_response(full_path, stat_result, scope, status_code)
+        resposta.headers["Cache-Control"] = settings.CHARTS_STATIC_CACHE_CONTROL
+        return resposta
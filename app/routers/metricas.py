@@ -0,0 +1,18 @@
+# app/routers/metricas.py
+from fastapi import APIRouter
+
+from app.core.admissao import controlo_admissao
+
+router = APIRouter(
+    prefix="/metricas",
+    tags=["Métricas"],
+)
+
+@router.get("/admissao", summary="Estado do controlo de admissão das rotas pesadas")
+async def get_metricas_admissao():
+    """
+    Por classe de rota: pedidos em execução e em espera (profundidade da fila),
+    admitidos, rejeitados (fila cheia ou espera esgotada) e o tempo de espera
+    (média, máximo e histograma).
+    """
+    return controlo_admissao.metricas()
@@ -0,0 +1,61 @@
+# app/routers/relatorios.py
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from sqlalchemy.orm import Session
+from starlette.responses import Response
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services import report_generator
+from app.services import resumidor
+
+router = APIRouter(
+    prefix="/relatorios",
+    tags=["Relatórios"],
+)
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+@router.get("/mensal", summary="Relatório mensal de uma empresa (HTML ou PDF) com KPIs e gráficos embutidos")
+def get_relatorio_mensal(
+    cnpj: str = Query(..., description="CNPJ da empresa."),
+    competencia: date = Query(..., description="Qualquer dia do mês de competência (YYYY-MM-DD)."),
+    formato: str = Query("html", pattern="^(html|pdf)$", description="'html' ou 'pdf' (requer weasyprint)."),
+    imagens: str = Query("svg", pattern="^(svg|png)$", description="Gráficos do HTML em SVG inline ou PNG (data URI). O PDF usa sempre PNG."),
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Junta os KPIs da competência e os gráficos do exercício num único documento.
+    O ETag é a versão do relatório (empresa, competência, dados e formato): um
+    If-None-Match igual recebe 304 sem gerar nada, e o relatório só é gerado de
+    novo quando os dados fiscais do período mudam. Um relatório a que falta o
+    resumo (backend sem resposta) segue sem ETag e sem cache.
+    """
+    if formato == "pdf" and not report_generator.pdf_disponivel():
+        raise HTTPException(status_code=501, detail="A exportação para PDF não está disponível neste servidor (requer o pacote 'weasyprint').")
+    try:
+        _, chave = report_generator.chave_do_relatorio(db, cnpj=cnpj, data_competencia=competencia, formato=formato, formato_imagens=imagens)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except resumidor.ConfiguracaoResumoError as e:
+        raise HTTPException(status_code=503, detail=f"Resumos indisponíveis neste servidor: {e}")
+
+    etag = f'"{chave}"'
+    cabecalhos = {"ETag": etag, "Cache-Control": settings.CHARTS_HTTP_CACHE_CONTROL}
+    if if_none_match and etag in {valor.strip().removeprefix("W/") for valor in if_none_match.split(",")}:
+        return Response(status_code=304, headers=cabecalhos)
+
+    relatorio = report_generator.gerar_relatorio(db, cnpj=cnpj, data_competencia=competencia, formato=formato, formato_imagens=imagens)
+    if not relatorio.completo:
+        cabecalhos = {"Cache-Control": "no-store"}
+    disposicao = "attachment" if formato == "pdf" else "inline"
+    cabecalhos["Content-Disposition"] = f'{disposicao}; filename="{relatorio.nome_ficheiro}"'
+    return Response(relatorio.conteudo, media_type=relatorio.media_type, headers=cabecalhos)
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Dict, Any
+from pydantic import BaseModel, Field
+from typing import Annotated, Dict, Any, List
 from datetime import date
 from decimal import Decimal
 
@@ -21,4 +21,104 @@ class KpiResponse(BaseModel):
     total_impostos_por_tipo: Dict[str, Any] 
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class KpiLoteResponse(BaseModel):
+    """Schema colunar para os KPIs de várias empresas num mesmo período."""
+
+    periodo_inicio: date
+    periodo_fim: date
+
+    # Cada lista é uma coluna; a posição i de todas as listas refere-se à mesma empresa.
+    cnpj: List[str]
+    regime: List[str]
+    faturamento: List[float]
+    total_impostos: List[float]
+    carga_tributaria_percentual: List[float]
+    ticket_medio: List[float]
+    crescimento_faturamento_percentual: List[float]
+
+class KpiMensal(BaseModel):
+    """KPIs de uma competência dentro da série temporal."""
+
+    competencia: date
+    faturamento: Decimal
+    tributos: Decimal
+    carga_tributaria_percentual: Decimal | None
+    crescimento_faturamento_percentual: Decimal | None  # Face ao mês anterior; None sem mês anterior
+    variacao_tributos_percentual: Decimal | None
+    faturamento_acumulado: Decimal  # Acumulado desde o início do intervalo pedido
+    tributos_acumulado: Decimal
+
+class KpiSerieResponse(BaseModel):
+    """Schema para a série mensal de KPIs de um CNPJ."""
+
+    cnpj_consultado: str
+    regime_consultado: str
+    periodo_inicio: date
+    periodo_fim: date
+    meses: List[KpiMensal]
+
+
+class KpiSnapshot(BaseModel):
+    """KPIs guardados de uma competência, segundo o regime da empresa."""
+
+    competencia: date
+    faturamento: Decimal
+    tributos: Decimal
+    qtd_nfse_emitidas: int
+    carga_tributaria_percentual: Decimal | None
+    ticket_medio: Decimal | None
+    crescimento_faturamento_percentual: Decimal | None  # Face ao mês anterior; None sem mês anterior
+    variacao_tributos_percentual: Decimal | None
+    faturamento_acumulado_ano: Decimal
+    tributos_acumulado_ano: Decimal
+    faturamento_12m: Decimal
+    tributos_12m: Decimal
+
+    class Config:
+        from_attributes = True
+
+class KpiSnapshotResponse(BaseModel):
+    """Schema para os KPIs mensais já calculados de um CNPJ."""
+
+    cnpj_consultado: str
+    regime_tributario: str | None
+    periodo_inicio: date
+    periodo_fim: date
+    meses: List[KpiSnapshot]
+
+class SimulacaoRequest(BaseModel):
+    """Grelha de cenários a simular para uma empresa."""
+
+    cnpj: str
+    regime: str  # Regime atual: define os documentos usados como histórico de receita
+    data_base: date  # Último mês do histórico
+    # Crescimento mensal (0.02 = 2%); abaixo de -100% a receita projetada ficaria negativa
+    taxas_crescimento: List[Annotated[float, Field(gt=-1, le=1)]] = Field(default_factory=lambda: [0.0], min_length=1)
+    fatores_r: List[float] = Field(default_factory=lambda: [0.28], min_length=1)  # Folha 12 meses / RBT12
+    regimes: List[str] = Field(default_factory=lambda: ["Simples Nacional", "Lucro Presumido (Serviços)"], min_length=1)
+    horizonte_meses: int = Field(12, ge=1, le=60)
+    aliquota_iss: float = Field(0.05, ge=0, le=0.05)
+
+class CenariosSimulados(BaseModel):
+    """Matriz de cenários em formato colunar: a posição i de cada lista é o mesmo cenário."""
+
+    taxa_crescimento: List[float]
+    regime: List[str]
+    fator_r: List[float]
+    anexo_simples: List[str | None]
+    excede_limite_simples: List[bool]
+    faturamento_total: List[float]
+    tributos_total: List[float]
+    carga_tributaria_percentual: List[float]
+    tributos_mensais: List[List[float]]
+
+class SimulacaoResponse(BaseModel):
+    """Schema para a resposta do simulador de cenários."""
+
+    cnpj_consultado: str
+    data_base: date
+    horizonte_meses: int
+    meses_historico: int
+    cenarios: CenariosSimulados
@@ -1,7 +1,7 @@
 # app/schemas/grafico.py
-from app.schemas.grafico import GraficoResponse
 from pydantic import BaseModel
 from datetime import datetime
+from typing import List
 
 # Você precisará de um schema Pydantic para a resposta.
 class GraficoResponse(BaseModel):
@@ -13,5 +13,15 @@ class GraficoResponse(BaseModel):
          from_attributes = True
 
 
+class GraficoDoPacote(BaseModel):
+    grafico: str           # Nome do gráfico (o mesmo da rota individual)
+    url: str               # URL imutável da imagem (CHARTS_STATIC_URL)
+    caminho_arquivo: str
+    em_cache: bool         # True se a imagem já existia e não foi renderizada
 
-
+class PacoteGraficosResponse(BaseModel):
+    """Manifesto do pacote de gráficos de um regime."""
+    cnpj: str
+    regime: str
+    graficos: List[GraficoDoPacote]
+    omitidos: List[str]    # Gráficos sem dados no período
@@ -1,14 +1,19 @@
 # app/services/analytics_service.py
 from sqlalchemy.orm import Session
+import calendar
 from datetime import date, timedelta
-from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from decimal import Decimal, ROUND_HALF_UP
 from collections import defaultdict
 from typing import Dict, Any, Tuple, Optional
+import numpy as np
 import pandas as pd
 
 
 # Importamos as nossas funções de CRUD
-from app.crud import dados_fiscais as crud_dados_fiscais
+from app.crud import fato_mensal as crud_fato_mensal
+from app.crud import snapshot_kpi as crud_snapshot_kpi
+from app.core import moeda
+from app.core.moeda import converter_decimal_armazenado
 
 # Dicionário central que define as regras de negócio para os regimes tributários
 GRUPOS_POR_REGIME = {
@@ -44,26 +49,12 @@ GRUPOS_POR_REGIME = {
     ]
 }
 
-# --- Funções Auxiliares (Helpers) ---
+# Limites anuais de receita bruta do Simples Nacional (LC 123/2006)
+LIMITE_SIMPLES_NACIONAL = Decimal("4800000.00")
+SUBLIMITE_SIMPLES_NACIONAL = Decimal("3600000.00")
 
-# -----------------------------------------------------------------
-# --- ALTERAÇÃO 1: FUNÇÃO _converter_valor CORRIGIDA E SIMPLIFICADA ---
-# -----------------------------------------------------------------
-def _converter_valor(valor_str: Any) -> Decimal | None:
-    """Converte uma string de valor para um objeto Decimal de forma segura."""
-    if valor_str is None:
-        return None
-    try:
-        s = str(valor_str).replace("R$", "").strip()
-        # Se a string contém vírgula, assume-se formato brasileiro (ex: 1.234,56)
-        if ',' in s:
-            s = s.replace('.', '').replace(',', '.')
-        # Se não há vírgula, o ponto (se existir) é tratado como decimal padrão
-        return Decimal(s)
-    except (TypeError, InvalidOperation):
-        return None
+# --- Funções Auxiliares (Helpers) ---
 
-    
 def _formatar_monetario(valor: Decimal | None) -> str:
     """Formata um Decimal para a string R$ 1.234,56"""
     if valor is None: return "N/A"
@@ -77,65 +68,91 @@ def _formatar_percentual(valor: Decimal | None) -> str:
 #        FUNÇÃO AUXILIAR PARA PEGAR OS DOCUMENTOS RELEVANTES
 # -----------------------------------------------------------------
 def _get_documentos_relevantes(db: Session, *, cnpj: str, regime: str, data_inicio: date, data_fim: date):
-    """Função helper para buscar os documentos corretos com base no regime."""
+    """
+    Função helper para buscar os factos mensais dos documentos corretos com base no regime.
+    Lê da tabela fato_mensal, já consolidada por competência e tipo de documento.
+    """
     tipos_documento_relevantes = GRUPOS_POR_REGIME.get(regime)
     if not tipos_documento_relevantes:
         raise ValueError(f"O regime tributário '{regime}' não é válido ou não foi definido.")
     
-    return crud_dados_fiscais.obter_dados_por_periodo(
+    return crud_fato_mensal.obter_fatos_por_periodo(
         db, 
         cnpj=cnpj, 
         data_inicio=data_inicio, 
         data_fim=data_fim,
         tipos_documento=tipos_documento_relevantes
     )
+def tipos_para_totais(regime: str) -> list[str]:
+    """
+    Tipos de documento que entram no faturamento e nos tributos de um regime:
+    no Simples Nacional só o PGDAS; nos outros, todos os documentos do regime.
+    """
+    tipos_documento_relevantes = GRUPOS_POR_REGIME.get(regime)
+    if not tipos_documento_relevantes:
+        raise ValueError(f"O regime tributário '{regime}' não é válido ou não foi definido.")
+    if regime == "Simples Nacional":
+        return ["PGDAS"]
+    return tipos_documento_relevantes
+def _somar_serie(serie, campo: str, data_inicio: date, data_fim: date) -> Decimal:
+    """Soma um campo das linhas da série mensal cuja competência cai no intervalo."""
+    return sum(
+        (getattr(linha, campo) or Decimal(0) for linha in serie if data_inicio <= linha.competencia <= data_fim),
+        Decimal(0)
+    )
+
+def _mes_anterior(competencia: date) -> date:
+    return (competencia.replace(day=1) - timedelta(days=1)).replace(day=1)
+
+def _obter_snapshots_do_regime(db: Session, *, cnpj: str, regime: str, data_inicio: date, data_fim: date) -> list | None:
+    """
+    KPIs mensais guardados (snapshot_kpi) do período, ou None quando não servem para
+    o pedido: não há snapshots ou foram calculados sob outro regime. Têm os mesmos
+    campos 'competencia', 'faturamento' e 'tributos' da série mensal do fato_mensal.
+    """
+    snapshots = crud_snapshot_kpi.obter_snapshots(db, cnpj=cnpj, data_inicio=data_inicio, data_fim=data_fim)
+    if not snapshots or any(s.regime_tributario != regime for s in snapshots):
+        return None
+    return snapshots
 # -----------------------------------------------------------------
 #        FUNÇÃO AUXILIAR PARA CALCULAR FATURAMENTO E IMPOSTOS   
 # -----------------------------------------------------------------
-def _get_faturamento_e_impostos_por_regime(registos: list, regime: str) -> Tuple[Decimal, Decimal, int]:
+def _get_faturamento_e_impostos_por_regime(registos, regime: str) -> Tuple[Decimal, Decimal, int]:
     """
     Centraliza a lógica para extrair faturamento, total de impostos e número de notas
-    com base no regime tributário.
+    com base no regime tributário, a partir dos factos mensais do período.
+
+    Percorre os registos uma única vez, por isso aceita tanto listas como iteradores
+    (ex.: linhas lidas em fluxo), com memória constante.
     """
     faturamento_total = Decimal(0)
     total_impostos = Decimal(0)
     numero_de_notas = 0
 
-    if not registos:
-        return faturamento_total, total_impostos, numero_de_notas
-
     if regime == "Simples Nacional":
-        pgdas_reg = next((reg for reg in registos if reg.documento.tipo_documento == 'PGDAS'), None)
-        iss_reg = next((reg for reg in registos if reg.documento.tipo_documento == 'Encerramento ISS'), None)
-        
-        if pgdas_reg:
-            faturamento_total = pgdas_reg.valor_total or Decimal(0)
-            if pgdas_reg.impostos:
-                total_impostos = _converter_valor(pgdas_reg.impostos.get('total_debitos_tributos')) or Decimal(0)
-        
-        if iss_reg and iss_reg.impostos:
-            numero_de_notas = int(iss_reg.impostos.get('qtd_nfse_emitidas', 0))
-
-
+        pgdas_visto = iss_visto = False
+        for reg in registos:
+            if reg.tipo_documento == 'PGDAS' and not pgdas_visto:
+                pgdas_visto = True
+                faturamento_total = reg.faturamento or Decimal(0)
+                total_impostos = reg.total_tributos or Decimal(0)
+            elif reg.tipo_documento == 'Encerramento ISS' and not iss_visto:
+                iss_visto = True
+                numero_de_notas = reg.qtd_nfse_emitidas or 0
 
-       
 # -----------------------------------------------------------------
 #--------------- Lógica para Lucro Presumido e Lucro Real----------
 # -----------------------------------------------------------------
 
-    else: 
-        impostos_agregados = defaultdict(Decimal)
-        
+    else:
+        faturamento_centavos = tributos_centavos = 0
         for reg in registos:
-            faturamento_total += reg.valor_total or Decimal(0)
-            if reg.documento.tipo_documento == 'Encerramento ISS' and reg.impostos:
-                 numero_de_notas += int(reg.impostos.get('qtd_nfse_emitidas', 0))
-
-            if reg.impostos:
-                for nome_imposto, valor_imposto in reg.impostos.items():
-                    impostos_agregados[nome_imposto] += _converter_valor(valor_imposto) or Decimal(0)
-        
-        total_impostos = sum(impostos_agregados.values())
+            faturamento_centavos += moeda.para_centavos(reg.faturamento) or 0
+            tributos_centavos += moeda.para_centavos(reg.total_tributos) or 0
+            if reg.tipo_documento == 'Encerramento ISS':
+                numero_de_notas += reg.qtd_nfse_emitidas or 0
+        faturamento_total = moeda.centavos_para_decimal(faturamento_centavos)
+        total_impostos = moeda.centavos_para_decimal(tributos_centavos)
 
     return faturamento_total, total_impostos, numero_de_notas
 
@@ -147,15 +164,14 @@ def preparar_dados_tributos_lp(db: Session, cnpj: str, data_inicio: date, data_f
     dados_mensais = defaultdict(lambda: {'Devido': Decimal(0), 'Retido': Decimal(0)})
     
     for reg in registos:
-        if reg.data_competencia and reg.impostos:
-            mes = reg.data_competencia.strftime('%Y-%m')
-            if reg.documento.tipo_documento == 'Encerramento ISS':
-                dados_mensais[mes]['Retido'] += _converter_valor(reg.impostos.get('iss_retido')) or Decimal(0)
-                dados_mensais[mes]['Devido'] += _converter_valor(reg.impostos.get('iss_devido')) or Decimal(0)
-            elif reg.documento.tipo_documento == 'MIT':
-                dados_mensais[mes]['Devido'] += _converter_valor(reg.impostos.get('csll')) or Decimal(0)
-                dados_mensais[mes]['Devido'] += _converter_valor(reg.impostos.get('irpj')) or Decimal(0)
-                dados_mensais[mes]['Devido'] += _converter_valor(reg.impostos.get('ipi')) or Decimal(0)
+        mes = reg.competencia.strftime('%Y-%m')
+        if reg.tipo_documento == 'Encerramento ISS':
+            dados_mensais[mes]['Retido'] += reg.iss_retido or Decimal(0)
+            dados_mensais[mes]['Devido'] += reg.iss_devido or Decimal(0)
+        elif reg.tipo_documento == 'MIT':
+            dados_mensais[mes]['Devido'] += reg.csll or Decimal(0)
+            dados_mensais[mes]['Devido'] += reg.irpj or Decimal(0)
+            dados_mensais[mes]['Devido'] += reg.ipi or Decimal(0)
 
     lista_para_df = []
     for mes, valores in dados_mensais.items():
@@ -215,22 +231,24 @@ def calcular_ticket_medio(db: Session, *, cnpj: str, regime: str, data_inicio: d
 # Função para calcular o crescimento do faturamento 
 #-----------------------------------------------------------------
 def calcular_crescimento_faturamento(db: Session, *, cnpj: str, regime: str, data_inicio_atual: date, data_fim_atual: date) -> Decimal | None:
-    
-    def _get_faturamento_do_periodo(data_inicio, data_fim):
-        registos = _get_documentos_relevantes(db, cnpj=cnpj, regime=regime, data_inicio=data_inicio, data_fim=data_fim)
-        faturamento, _, _ = _get_faturamento_e_impostos_por_regime(registos, regime)
-        return faturamento
-
-    faturamento_atual = _get_faturamento_do_periodo(data_inicio_atual, data_fim_atual)
-    if faturamento_atual is None:
-        return None
-
+    """
+    Crescimento do faturamento face ao período anterior com a mesma duração.
+    Os dois períodos saem de uma única leitura dos totais mensais guardados
+    (ou da série mensal do fato_mensal, quando não há snapshots do regime).
+    """
     duracao_periodo = data_fim_atual - data_inicio_atual
     data_fim_anterior = data_inicio_atual - timedelta(days=1)
     data_inicio_anterior = data_fim_anterior - duracao_periodo
-    
-    faturamento_anterior = _get_faturamento_do_periodo(data_inicio_anterior, data_fim_anterior)
-    if faturamento_anterior is None or faturamento_anterior == 0:
+
+    serie = _obter_snapshots_do_regime(
+        db, cnpj=cnpj, regime=regime, data_inicio=data_inicio_anterior, data_fim=data_fim_atual
+    ) or crud_fato_mensal.obter_serie_mensal(
+        db, cnpj=cnpj, data_inicio=data_inicio_anterior, data_fim=data_fim_atual,
+        tipos_documento=tipos_para_totais(regime)
+    )
+    faturamento_atual = _somar_serie(serie, "faturamento", data_inicio_atual, data_fim_atual)
+    faturamento_anterior = _somar_serie(serie, "faturamento", data_inicio_anterior, data_fim_anterior)
+    if faturamento_anterior == 0:
         return Decimal("0.00")
 
     crescimento = ((faturamento_atual - faturamento_anterior) / faturamento_anterior) * 100
@@ -243,30 +261,34 @@ def calcular_crescimento_faturamento(db: Session, *, cnpj: str, regime: str, dat
 
 def calcular_impostos_por_tipo(db: Session, *, cnpj: str, regime: str, data_inicio: date, data_fim: date) -> Dict[str, str]:
     registos = _get_documentos_relevantes(db, cnpj=cnpj, regime=regime, data_inicio=data_inicio, data_fim=data_fim)
+    return _agregar_impostos_por_tipo(registos, regime)
+
+def _agregar_impostos_por_tipo(registos, regime: str) -> Dict[str, Any]:
+    """Agrega e formata os impostos por tipo a partir dos factos mensais (lista ou iterador, numa só passagem)."""
     impostos_agregados = defaultdict(Decimal)
 
     if regime == "Simples Nacional":
-        pgdas_reg = next((reg for reg in registos if reg.documento.tipo_documento == 'PGDAS'), None)
-        iss_reg = next((reg for reg in registos if reg.documento.tipo_documento == 'Encerramento ISS'), None)
-        
-        if pgdas_reg:
-            # Adiciona os impostos do PGDAS
-            if pgdas_reg.impostos:
-                for k, v in pgdas_reg.impostos.items():
-                    impostos_agregados[k] = _converter_valor(v) or Decimal(0)
-            # Adiciona o faturamento total do PGDAS
-            impostos_agregados['faturamento_total'] = pgdas_reg.valor_total or Decimal(0)
-        
-        if iss_reg and iss_reg.impostos:
-            # Adiciona a quantidade de notas do Encerramento ISS
-            impostos_agregados['qtd_nfse_emitidas'] = Decimal(iss_reg.impostos.get('qtd_nfse_emitidas', 0))
+        # Uma só passagem: o primeiro PGDAS e o primeiro Encerramento ISS, como antes
+        pgdas_visto = iss_visto = False
+        for reg in registos:
+            if reg.tipo_documento == 'PGDAS' and not pgdas_visto:
+                pgdas_visto = True
+                # Adiciona os impostos do PGDAS
+                for k, v in (reg.detalhe_impostos or {}).items():
+                    impostos_agregados[k] = converter_decimal_armazenado(v) or Decimal(0)
+                # Adiciona o faturamento total do PGDAS
+                impostos_agregados['faturamento_total'] = reg.faturamento or Decimal(0)
+            elif reg.tipo_documento == 'Encerramento ISS' and not iss_visto:
+                iss_visto = True
+                # Adiciona a quantidade de notas do Encerramento ISS
+                impostos_agregados['qtd_nfse_emitidas'] = Decimal(reg.qtd_nfse_emitidas or 0)
 
     else:
         # A lógica para outros regimes permanece a mesma
         for reg in registos:
-            if reg.impostos:
-                for nome_imposto, valor_imposto in reg.impostos.items():
-                    impostos_agregados[nome_imposto] += _converter_valor(valor_imposto) or Decimal(0)
+            if reg.detalhe_impostos:
+                for nome_imposto, valor_imposto in reg.detalhe_impostos.items():
+                    impostos_agregados[nome_imposto] += converter_decimal_armazenado(valor_imposto) or Decimal(0)
     
     # --- LÓGICA DE FORMATAÇÃO ---
     impostos_formatados = {}
@@ -278,6 +300,72 @@ def calcular_impostos_por_tipo(db: Session, *, cnpj: str, regime: str, data_inic
 
     return impostos_formatados
 
+#-----------------------------------------------------------------
+# Função para calcular os KPIs de várias empresas de uma só vez
+#-----------------------------------------------------------------
+
+def calcular_kpis_em_lote(db: Session, *, data_inicio: date, data_fim: date, cnpjs: list[str] | None = None) -> Dict[str, list]:
+    """
+    Calcula carga tributária, ticket médio e crescimento do faturamento para várias
+    empresas (ou todas) a partir de uma única consulta à tabela fato_mensal.
+
+    O período anterior, usado no crescimento, tem a mesma duração do período pedido,
+    tal como em calcular_crescimento_faturamento. O resultado é colunar: cada chave
+    é uma coluna e cada posição das listas corresponde a uma empresa.
+    """
+    duracao_periodo = data_fim - data_inicio
+    data_fim_anterior = data_inicio - timedelta(days=1)
+    data_inicio_anterior = data_fim_anterior - duracao_periodo
+
+    colunas = ["cnpj", "regime", "faturamento", "total_impostos",
+               "carga_tributaria_percentual", "ticket_medio", "crescimento_faturamento_percentual"]
+
+    linhas = crud_fato_mensal.obter_fatos_para_lote(
+        db, data_inicio=data_inicio_anterior, data_fim=data_fim, cnpjs=cnpjs
+    )
+    registos = [
+        (cnpj, regime, tipo_documento, competencia,
+         moeda.para_centavos(faturamento) or 0, moeda.para_centavos(total_tributos) or 0, qtd_nfse or 0)
+        for cnpj, regime, tipo_documento, competencia, faturamento, total_tributos, qtd_nfse in linhas
+        if tipo_documento in GRUPOS_POR_REGIME.get(regime, [])
+    ]
+    if not registos:
+        return {coluna: [] for coluna in colunas}
+
+    # Valores em centavos (int64): somas exatas e arredondamento half-up só nos KPIs
+    df = pd.DataFrame(registos, columns=["cnpj", "regime", "tipo_documento", "data_competencia",
+                                         "valor_total", "total_tributos", "qtd_nfse"])
+
+    # 1. No Simples Nacional só o PGDAS conta para faturamento e impostos;
+    #    nos outros regimes somam-se todos os documentos relevantes.
+    simples = df["regime"] == "Simples Nacional"
+    conta_valores = ~simples | (df["tipo_documento"] == "PGDAS")
+    df["faturamento"] = df["valor_total"].where(conta_valores, 0)
+    df["total_impostos"] = df["total_tributos"].where(conta_valores, 0)
+
+    # 2. Totais por empresa e mês, depois por empresa e período (atual / anterior).
+    df["mes"] = pd.to_datetime(df["data_competencia"]).dt.to_period("M")
+    df["atual"] = df["data_competencia"] >= data_inicio
+    mensal = df.groupby(["cnpj", "regime", "atual", "mes"], as_index=False)[["faturamento", "total_impostos", "qtd_nfse"]].sum()
+
+    atual = mensal[mensal["atual"]].groupby(["cnpj", "regime"])[["faturamento", "total_impostos", "qtd_nfse"]].sum()
+    anterior = mensal[~mensal["atual"]].groupby(["cnpj", "regime"])["faturamento"].sum()
+    resultado = atual.join(anterior.rename("faturamento_anterior"), how="left").fillna({"faturamento_anterior": 0})
+
+    # 3. KPIs vetorizados em inteiros (divisões por zero resultam em 0, como nas funções individuais).
+    faturamento = resultado["faturamento"].to_numpy(dtype="int64")
+    impostos = resultado["total_impostos"].to_numpy(dtype="int64")
+    notas = resultado["qtd_nfse"].to_numpy(dtype="int64")
+    anterior_fat = resultado["faturamento_anterior"].to_numpy(dtype="int64")
+    resultado["carga_tributaria_percentual"] = moeda.percentual_centesimos(impostos, faturamento) / 100
+    resultado["ticket_medio"] = moeda.dividir_arredondado(faturamento, notas) / 100
+    resultado["crescimento_faturamento_percentual"] = moeda.percentual_centesimos(faturamento - anterior_fat, anterior_fat) / 100
+    resultado["faturamento"] = faturamento / 100
+    resultado["total_impostos"] = impostos / 100
+
+    resultado = resultado.reset_index().sort_values("cnpj")
+    return {coluna: resultado[coluna].tolist() for coluna in colunas}
+
 #-----------------------------------------------------------------
 # Função para validar documentos do Simples Nacional    
 #-----------------------------------------------------------------
@@ -290,10 +378,10 @@ def validar_documentos_simples(pgdas: Any, encerramento_iss: Any) -> Dict[str, A
     avisos = []
 
     # --- 1. Receita Bruta ---
-    receita_pgdas = _converter_valor(pgdas.valor_total) or Decimal(0)
+    receita_pgdas = converter_decimal_armazenado(pgdas.valor_total) or Decimal(0)
     receita_iss = Decimal(0)
     if encerramento_iss and encerramento_iss.impostos:
-        receita_iss = _converter_valor(encerramento_iss.impostos.get("valor_total_servicos")) or Decimal(0)
+        receita_iss = converter_decimal_armazenado(encerramento_iss.impostos.get("valor_total_servicos")) or Decimal(0)
 
     if receita_pgdas != receita_iss and receita_iss > 0:
         avisos.append(f"Inconsistência: Receita Bruta PGDAS (R$ {receita_pgdas:,.2f}) "
@@ -301,11 +389,11 @@ def validar_documentos_simples(pgdas: Any, encerramento_iss: Any) -> Dict[str, A
 
     # --- 2. Tributos ---
     impostos = pgdas.impostos or {}
-    total_impostos = _converter_valor(impostos.get("total_debitos_tributos")) or Decimal(0)
+    total_impostos = converter_decimal_armazenado(impostos.get("total_debitos_tributos")) or Decimal(0)
 
     TRIBUTOS_VALIDOS = {"irpj", "csll", "cofins", "pis_pasep", "inss_cpp", "icms", "ipi", "iss"}
     soma_individual = sum(
-        _converter_valor(impostos.get(t)) or Decimal(0) for t in TRIBUTOS_VALIDOS if t in impostos
+        converter_decimal_armazenado(impostos.get(t)) or Decimal(0) for t in TRIBUTOS_VALIDOS if t in impostos
     )
 
     if soma_individual != total_impostos:
@@ -321,8 +409,8 @@ def validar_documentos_simples(pgdas: Any, encerramento_iss: Any) -> Dict[str, A
         avisos.append("Atenção: Nenhuma NFSe encontrada no Encerramento ISS (ticket médio pode ficar incorreto).")
 
     # --- 4. Limites ---
-    limite_faturamento = _converter_valor(impostos.get("limite_receita_bruta"))
-    sublimite_receita = _converter_valor(impostos.get("sublimite_receita"))
+    limite_faturamento = converter_decimal_armazenado(impostos.get("limite_receita_bruta"))
+    sublimite_receita = converter_decimal_armazenado(impostos.get("sublimite_receita"))
 
     if not limite_faturamento:
         avisos.append("Limite de faturamento não informado no PGDASD.")
@@ -339,34 +427,63 @@ def validar_documentos_simples(pgdas: Any, encerramento_iss: Any) -> Dict[str, A
 # Função para gerar relatório analítico completo do Simples Nacional    
 #-----------------------------------------------------------------
 
-def gerar_relatorio_simples_nacional(db: Session, *, cnpj: str, data_competencia: date) -> Dict[str, Any]:
+def janela_relatorio_mensal(data_competencia: date) -> Tuple[date, date]:
     """
-    Gera um relatório analítico completo para o regime Simples Nacional para um mês de competência.
+    Intervalo de factos de que os relatórios mensais precisam: do início do exercício
+    (ou do mês anterior, se este for de outro ano) até ao fim do mês de competência.
     """
-
-    # --- 1. BUSCAR DADOS DO PERÍODO ATUAL ---
     data_inicio_atual = data_competencia.replace(day=1)
-    
-    # --- ALTERAÇÃO: Lógica mais robusta para encontrar o último dia de qualquer mês ---
     proximo_mes_primeiro_dia = (data_inicio_atual.replace(day=28) + timedelta(days=4)).replace(day=1)
     data_fim_atual = proximo_mes_primeiro_dia - timedelta(days=1)
+    return min(date(data_inicio_atual.year, 1, 1), _mes_anterior(data_inicio_atual)), data_fim_atual
+
+def _obter_linhas_relatorio(db: Session, *, cnpj: str, regime: str, data_competencia: date) -> list:
+    data_inicio, data_fim = janela_relatorio_mensal(data_competencia)
+    return _get_documentos_relevantes(db, cnpj=cnpj, regime=regime, data_inicio=data_inicio, data_fim=data_fim)
+
+def _linha_do_mes(linhas, competencia: date, tipo_documento: str):
+    return next((reg for reg in linhas if reg.competencia == competencia and reg.tipo_documento == tipo_documento), None)
+
+def _acumulado_ano_de_linhas(linhas, competencia: date, tipos_documento: list[str]) -> Tuple[Decimal, Decimal]:
+    """Versão em memória de calcular_acumulados_no_exercicio: última linha do ano por tipo de documento."""
+    inicio_ano = date(competencia.year, 1, 1)
+    ultimas = {}
+    for reg in linhas:
+        if reg.tipo_documento in tipos_documento and inicio_ano <= reg.competencia <= competencia:
+            if reg.tipo_documento not in ultimas or reg.competencia > ultimas[reg.tipo_documento].competencia:
+                ultimas[reg.tipo_documento] = reg
+    faturamento = sum((reg.faturamento_acumulado_ano or Decimal(0) for reg in ultimas.values()), Decimal(0))
+    tributos = sum((reg.tributos_acumulado_ano or Decimal(0) for reg in ultimas.values()), Decimal(0))
+    return faturamento, tributos
 
-    registos_atuais = _get_documentos_relevantes(
-        db, cnpj=cnpj, regime="Simples Nacional",
-        data_inicio=data_inicio_atual, data_fim=data_fim_atual
-    )
+def gerar_relatorio_simples_nacional(db: Session, *, cnpj: str, data_competencia: date) -> Dict[str, Any]:
+    """
+    Gera um relatório analítico completo para o regime Simples Nacional para um mês de competência.
+    """
+    linhas = _obter_linhas_relatorio(db, cnpj=cnpj, regime="Simples Nacional", data_competencia=data_competencia)
+    return montar_relatorio_simples_nacional(linhas, data_competencia)
 
-    pgdas_atual = next((reg for reg in registos_atuais if reg.documento.tipo_documento == 'PGDAS'), None)
-    iss_atual = next((reg for reg in registos_atuais if reg.documento.tipo_documento == 'Encerramento ISS'), None)
+def montar_relatorio_simples_nacional(linhas, data_competencia: date) -> Dict[str, Any]:
+    """
+    Monta o relatório do Simples Nacional a partir dos factos mensais já carregados
+    (ver janela_relatorio_mensal). Não acede à base de dados, pelo que pode correr
+    noutro processo (ver app/services/relatorios_lote.py).
+    """
+
+    # --- 1. DADOS DO PERÍODO ATUAL ---
+    data_inicio_atual = data_competencia.replace(day=1)
+
+    pgdas_atual = _linha_do_mes(linhas, data_inicio_atual, 'PGDAS')
+    iss_atual = _linha_do_mes(linhas, data_inicio_atual, 'Encerramento ISS')
 
     if not pgdas_atual:
         return {"erro": "Documento PGDAS não encontrado para o período de competência."}
 
-    impostos_pgdas = pgdas_atual.impostos or {}
+    impostos_pgdas = pgdas_atual.detalhe_impostos or {}
     
     # --- 2. EXTRAIR VALORES BASE ---
-    receita_bruta_atual = pgdas_atual.valor_total or Decimal(0)
-    total_impostos_atual = _converter_valor(impostos_pgdas.get("total_debitos_tributos")) or Decimal(0)
+    receita_bruta_atual = pgdas_atual.faturamento or Decimal(0)
+    total_impostos_atual = pgdas_atual.total_tributos or Decimal(0)
 
     # --- 3. CÁLCULO DOS KPIs ---
 
@@ -375,23 +492,16 @@ def gerar_relatorio_simples_nacional(db: Session, *, cnpj: str, data_competencia
 
     # Ticket Médio
     numero_de_notas = 0
-    if iss_atual and iss_atual.impostos:
-        numero_de_notas = int(iss_atual.impostos.get('qtd_nfse_emitidas', 0))
+    if iss_atual:
+        numero_de_notas = iss_atual.qtd_nfse_emitidas or 0
     ticket_medio = receita_bruta_atual / Decimal(numero_de_notas) if numero_de_notas > 0 else Decimal(0)
 
     # Crescimento do Faturamento
-    data_fim_anterior = data_inicio_atual - timedelta(days=1)
-    data_inicio_anterior = data_fim_anterior.replace(day=1)
-    
-    registos_anteriores = _get_documentos_relevantes(
-        db, cnpj=cnpj, regime="Simples Nacional",
-        data_inicio=data_inicio_anterior, data_fim=data_fim_anterior
-    )
-    pgdas_anterior = next((reg for reg in registos_anteriores if reg.documento.tipo_documento == 'PGDAS'), None)
+    pgdas_anterior = _linha_do_mes(linhas, _mes_anterior(data_inicio_atual), 'PGDAS')
     
     crescimento_faturamento = None
-    if pgdas_anterior and pgdas_anterior.valor_total and pgdas_anterior.valor_total > 0:
-        faturamento_anterior = pgdas_anterior.valor_total
+    if pgdas_anterior and pgdas_anterior.faturamento and pgdas_anterior.faturamento > 0:
+        faturamento_anterior = pgdas_anterior.faturamento
         crescimento = ((receita_bruta_atual - faturamento_anterior) / faturamento_anterior) * 100
         crescimento_faturamento = crescimento
 
@@ -400,17 +510,22 @@ def gerar_relatorio_simples_nacional(db: Session, *, cnpj: str, data_competencia
     segregacao_tributos = {}
     if total_impostos_atual > 0:
         # --- ALTERAÇÃO: Garante que a soma para o percentual é feita apenas com os tributos válidos ---
-        soma_tributos_individuais = sum(_converter_valor(v) or Decimal(0) for k, v in impostos_pgdas.items() if k.lower() in TRIBUTOS_VALIDOS)
+        soma_tributos_individuais = sum(converter_decimal_armazenado(v) or Decimal(0) for k, v in impostos_pgdas.items() if k.lower() in TRIBUTOS_VALIDOS)
         if soma_tributos_individuais > 0:
             for imposto, valor in impostos_pgdas.items():
                 if imposto.lower() in TRIBUTOS_VALIDOS:
-                    valor_decimal = _converter_valor(valor)
+                    valor_decimal = converter_decimal_armazenado(valor)
                     if valor_decimal is not None:
                         percentual = (valor_decimal / soma_tributos_individuais) * 100
                         # --- ALTERAÇÃO: Usa a função de formatação para manter a consistência ---
                         segregacao_tributos[imposto.upper()] = _formatar_percentual(percentual)
 
 
+    # Acumulados e limites: a linha do PGDAS do mês já traz as somas acumuladas
+    faturamento_acumulado = pgdas_atual.faturamento_acumulado_ano or Decimal(0)
+    impostos_acumulados = pgdas_atual.tributos_acumulado_ano or Decimal(0)
+    limites = _limites_simples_nacional(pgdas_atual.faturamento_12m or Decimal(0), faturamento_acumulado)
+
     # --- 4. RELATÓRIO FINAL ---
     # --- ALTERAÇÃO: Centralização da formatação e remoção de duplicados ---
     relatorio = {
@@ -424,7 +539,16 @@ def gerar_relatorio_simples_nacional(db: Session, *, cnpj: str, data_competencia
         },
         "Ticket Médio": _formatar_monetario(ticket_medio),
         "Segregação dos Tributos": segregacao_tributos,
-        # Adicione os outros grupos de KPIs (Acumulados, Limites, Variações) aqui quando a lógica estiver pronta.
+        "Acumulados no Exercício": {
+            "Faturamento Acumulado": _formatar_monetario(faturamento_acumulado),
+            "Impostos Acumulados": _formatar_monetario(impostos_acumulados)
+        },
+        "Limites do Simples Nacional": {
+            "Receita Bruta 12 Meses (RBT12)": _formatar_monetario(limites["rbt12"]),
+            "Uso do Limite": _formatar_percentual(limites["percentual_limite"]),
+            "Uso do Sublimite (ICMS/ISS)": _formatar_percentual(limites["percentual_sublimite"])
+        },
+        # Adicione os outros grupos de KPIs (Variações) aqui quando a lógica estiver pronta.
     }
 
     return relatorio
@@ -442,12 +566,7 @@ def projetar_carga_tributaria(db: Session, *, cnpj: str, regime: str, data_inici
     faturamento_total, total_impostos, _ = _get_faturamento_e_impostos_por_regime(registos, regime)
 
     # Encontra o valor do IRPJ nos impostos do período
-    irpj = Decimal(0)
-    for reg in registos:
-        if reg.impostos:
-            valor_irpj_str = reg.impostos.get('irpj')
-            if valor_irpj_str:
-                irpj += _converter_valor(valor_irpj_str) or Decimal(0)
+    irpj = sum((reg.irpj or Decimal(0) for reg in registos), Decimal(0))
     
     # Se o faturamento for zero, não há como projetar
     if faturamento_total == 0:
@@ -483,12 +602,12 @@ def calcular_peso_entradas_sobre_receita(db: Session, *, cnpj: str, regime: str,
     
     faturamento_total, _, _ = _get_faturamento_e_impostos_por_regime(registos, regime)
     
-    entradas_reg = next((reg for reg in registos if reg.documento.tipo_documento == 'Relatório de Entradas'), None)
+    entradas_reg = next((reg for reg in registos if reg.tipo_documento == 'Relatório de Entradas'), None)
     
     if not entradas_reg or faturamento_total == 0:
         return Decimal(0)
         
-    total_entradas = entradas_reg.valor_total or Decimal(0)
+    total_entradas = entradas_reg.faturamento or Decimal(0)
     
     peso_entradas = (total_entradas / faturamento_total) * 100
     return peso_entradas.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
@@ -498,37 +617,138 @@ def calcular_variacao_tributos_mensal(db: Session, *, cnpj: str, regime: str, da
     Calcula a variação percentual do total de tributos em relação ao mês anterior.
     Fórmula: VaT = (Tributos Mês Atual / Tributos Mês Anterior) - 1
     """
-    def _get_tributos_do_periodo(data_inicio, data_fim):
-        registos = _get_documentos_relevantes(db, cnpj=cnpj, regime=regime, data_inicio=data_inicio, data_fim=data_fim)
-        _, total_tributos, _ = _get_faturamento_e_impostos_por_regime(registos, regime)
-        return total_tributos
-
-    tributos_atuais = _get_tributos_do_periodo(data_inicio_atual, data_fim_atual)
-
     # Calcula o período anterior
     data_fim_anterior = data_inicio_atual - timedelta(days=1)
     data_inicio_anterior = data_fim_anterior.replace(day=1)
-    
-    tributos_anteriores = _get_tributos_do_periodo(data_inicio_anterior, data_fim_anterior)
 
-    if tributos_anteriores is None or tributos_anteriores == 0:
+    serie = _obter_snapshots_do_regime(
+        db, cnpj=cnpj, regime=regime, data_inicio=data_inicio_anterior, data_fim=data_fim_atual
+    ) or crud_fato_mensal.obter_serie_mensal(
+        db, cnpj=cnpj, data_inicio=data_inicio_anterior, data_fim=data_fim_atual,
+        tipos_documento=tipos_para_totais(regime)
+    )
+    tributos_atuais = _somar_serie(serie, "tributos", data_inicio_atual, data_fim_atual)
+    tributos_anteriores = _somar_serie(serie, "tributos", data_inicio_anterior, data_fim_anterior)
+
+    if tributos_anteriores == 0:
         return None # Evita divisão por zero e retorna None se não houver dados anteriores
 
     variacao = ((tributos_atuais / tributos_anteriores) - 1) * 100
     return variacao.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
 
+def calcular_serie_kpis(db: Session, *, cnpj: str, regime: str, data_inicio: date, data_fim: date) -> list[Dict[str, Any]]:
+    """
+    KPIs mês a mês num intervalo arbitrário: faturamento, tributos, carga tributária,
+    crescimento do faturamento e variação dos tributos face ao mês anterior, e os
+    totais acumulados no intervalo. Os indicadores de cada mês lêem-se dos snapshots
+    do regime; sem eles, vêm de uma única consulta com funções de janela.
+    """
+    snapshots = _obter_snapshots_do_regime(db, cnpj=cnpj, regime=regime, data_inicio=data_inicio, data_fim=data_fim)
+    if snapshots is not None:
+        return _serie_kpis_de_snapshots(snapshots)
+
+    serie = crud_fato_mensal.obter_serie_mensal(
+        db, cnpj=cnpj, data_inicio=data_inicio, data_fim=data_fim,
+        tipos_documento=tipos_para_totais(regime)
+    )
+
+    def _percentual(valor: Decimal) -> Decimal:
+        return valor.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+    resultado = []
+    for linha in serie:
+        faturamento = linha.faturamento or Decimal(0)
+        tributos = linha.tributos or Decimal(0)
+
+        # O LAG devolve a linha anterior existente; só conta se for o mês imediatamente anterior
+        mes_contiguo = linha.competencia_anterior == _mes_anterior(linha.competencia)
+        faturamento_anterior = linha.faturamento_anterior if mes_contiguo else None
+        tributos_anterior = linha.tributos_anterior if mes_contiguo else None
+
+        resultado.append({
+            "competencia": linha.competencia,
+            "faturamento": faturamento,
+            "tributos": tributos,
+            "carga_tributaria_percentual": _percentual(tributos / faturamento * 100) if faturamento else None,
+            "crescimento_faturamento_percentual": (
+                _percentual((faturamento - faturamento_anterior) / faturamento_anterior * 100)
+                if faturamento_anterior else None
+            ),
+            "variacao_tributos_percentual": (
+                _percentual((tributos / tributos_anterior - 1) * 100) if tributos_anterior else None
+            ),
+            "faturamento_acumulado": linha.faturamento_acumulado or Decimal(0),
+            "tributos_acumulado": linha.tributos_acumulado or Decimal(0),
+        })
+    return resultado
+
+def _serie_kpis_de_snapshots(snapshots) -> list[Dict[str, Any]]:
+    """
+    Série de KPIs a partir dos snapshots: os indicadores do mês são os guardados e
+    os acumulados no intervalo são a soma corrente dos totais mensais guardados.
+    """
+    resultado = []
+    faturamento_acumulado = tributos_acumulado = Decimal(0)
+    for snapshot in snapshots:
+        faturamento_acumulado += snapshot.faturamento
+        tributos_acumulado += snapshot.tributos
+        resultado.append({
+            "competencia": snapshot.competencia,
+            "faturamento": snapshot.faturamento,
+            "tributos": snapshot.tributos,
+            "carga_tributaria_percentual": snapshot.carga_tributaria_percentual,
+            "crescimento_faturamento_percentual": snapshot.crescimento_faturamento_percentual,
+            "variacao_tributos_percentual": snapshot.variacao_tributos_percentual,
+            "faturamento_acumulado": faturamento_acumulado,
+            "tributos_acumulado": tributos_acumulado,
+        })
+    return resultado
+
+def calcular_acumulados_no_exercicio(db: Session, *, cnpj: str, regime: str, data_fim: date) -> Tuple[Decimal, Decimal]:
+    """
+    Devolve o faturamento e os tributos acumulados do início do ano fiscal até a data_fim.
+    Lê as somas acumuladas da tabela fato_mensal: uma linha por tipo de documento.
+    """
+    linhas = crud_fato_mensal.obter_acumulados(
+        db, cnpj=cnpj, competencia=data_fim, tipos_documento=tipos_para_totais(regime)
+    )
+    faturamento = sum((linha.faturamento_acumulado_ano or Decimal(0) for linha in linhas), Decimal(0))
+    tributos = sum((linha.tributos_acumulado_ano or Decimal(0) for linha in linhas), Decimal(0))
+    return faturamento, tributos
+
 def calcular_faturamento_no_exercicio(db: Session, *, cnpj: str, regime: str, data_inicio: date, data_fim: date) -> Decimal:
     """
     Soma o faturamento total do início do ano fiscal até a data_fim.
     """
-    ano_corrente = data_fim.year
-    inicio_ano = date(ano_corrente, 1, 1)
-    
-    registos = _get_documentos_relevantes(db, cnpj=cnpj, regime=regime, data_inicio=inicio_ano, data_fim=data_fim)
-    faturamento_total, _, _ = _get_faturamento_e_impostos_por_regime(registos, regime)
-    
+    faturamento_total, _ = calcular_acumulados_no_exercicio(db, cnpj=cnpj, regime=regime, data_fim=data_fim)
     return faturamento_total
 
+def calcular_receita_bruta_12_meses(db: Session, *, cnpj: str, regime: str, data_competencia: date) -> Decimal:
+    """
+    Receita bruta dos 12 meses terminados na competência (base do RBT12 e dos limites).
+    """
+    faturamento, _ = crud_fato_mensal.obter_totais_12_meses(
+        db, cnpj=cnpj, competencia=data_competencia, tipos_documento=tipos_para_totais(regime)
+    )
+    return faturamento
+
+def calcular_limites_simples_nacional(db: Session, *, cnpj: str, data_competencia: date) -> Dict[str, Decimal]:
+    """
+    Calcula o uso do limite e do sublimite do Simples Nacional com base no RBT12
+    e na receita acumulada no ano (RBA).
+    """
+    rbt12 = calcular_receita_bruta_12_meses(db, cnpj=cnpj, regime="Simples Nacional", data_competencia=data_competencia)
+    rba, _ = calcular_acumulados_no_exercicio(db, cnpj=cnpj, regime="Simples Nacional", data_fim=data_competencia)
+    return _limites_simples_nacional(rbt12, rba)
+
+def _limites_simples_nacional(rbt12: Decimal, rba: Decimal) -> Dict[str, Decimal]:
+    return {
+        "rbt12": rbt12,
+        "rba": rba,
+        "percentual_limite": (rbt12 / LIMITE_SIMPLES_NACIONAL * 100).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
+        "percentual_sublimite": (rbt12 / SUBLIMITE_SIMPLES_NACIONAL * 100).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
+    }
+
 def calcular_limite_faturamento_lp(faturamento_exercicio: Decimal) -> Decimal:
     """
     Calcula o percentual de uso do limite de faturamento para Lucro Presumido.
@@ -548,36 +768,49 @@ def gerar_relatorio_lucro_presumido_servicos(db: Session, *, cnpj: str, data_com
     """
     Gera um relatório analítico completo para o regime Lucro Presumido - Serviços.
     """
+    linhas = _obter_linhas_relatorio(db, cnpj=cnpj, regime="Lucro Presumido (Serviços)", data_competencia=data_competencia)
+    return montar_relatorio_lucro_presumido_servicos(linhas, data_competencia)
+
+def montar_relatorio_lucro_presumido_servicos(linhas, data_competencia: date) -> Dict[str, Any]:
+    """
+    Monta o relatório do Lucro Presumido - Serviços a partir dos factos mensais já
+    carregados (ver janela_relatorio_mensal), sem acesso à base de dados.
+    O mês anterior é o mês civil anterior à competência.
+    """
     regime = "Lucro Presumido (Serviços)"
     
     # --- 1. DEFINIR PERÍODOS ---
     data_inicio_atual = data_competencia.replace(day=1)
-    proximo_mes_primeiro_dia = (data_inicio_atual.replace(day=28) + timedelta(days=4)).replace(day=1)
-    data_fim_atual = proximo_mes_primeiro_dia - timedelta(days=1)
+    data_inicio_anterior = _mes_anterior(data_inicio_atual)
+    registos_atuais = [reg for reg in linhas if reg.competencia == data_inicio_atual]
+    registos_anteriores = [reg for reg in linhas if reg.competencia == data_inicio_anterior]
+
+    faturamento_atual, tributos_atuais, _ = _get_faturamento_e_impostos_por_regime(registos_atuais, regime)
+    faturamento_anterior, tributos_anteriores, _ = _get_faturamento_e_impostos_por_regime(registos_anteriores, regime)
+
+    def _percentual(valor: Decimal) -> Decimal:
+        return valor.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
 
     # --- 2. CÁLCULO DOS KPIs ---
     
-    # KPIs Mensais
-    crescimento_receita = calcular_crescimento_faturamento(
-        db, cnpj=cnpj, regime=regime, data_inicio_atual=data_inicio_atual, data_fim_atual=data_fim_atual
-    )
-    carga_tributaria = calcular_carga_tributaria(
-        db, cnpj=cnpj, regime=regime, data_inicio=data_inicio_atual, data_fim=data_fim_atual
+    # KPIs Mensais (mesmas fórmulas das funções calcular_* individuais)
+    crescimento_receita = (
+        _percentual((faturamento_atual - faturamento_anterior) / faturamento_anterior * 100)
+        if faturamento_anterior else Decimal("0.00")
     )
-    peso_entradas = calcular_peso_entradas_sobre_receita(
-        db, cnpj=cnpj, regime=regime, data_inicio=data_inicio_atual, data_fim=data_fim_atual
+    carga_tributaria = _percentual(tributos_atuais / faturamento_atual * 100) if faturamento_atual else Decimal(0)
+    entradas_reg = next((reg for reg in registos_atuais if reg.tipo_documento == 'Relatório de Entradas'), None)
+    peso_entradas = (
+        _percentual((entradas_reg.faturamento or Decimal(0)) / faturamento_atual * 100)
+        if entradas_reg and faturamento_atual else Decimal(0)
     )
-    variacao_tributos = calcular_variacao_tributos_mensal(
-        db, cnpj=cnpj, regime=regime, data_inicio_atual=data_inicio_atual, data_fim_atual=data_fim_atual
-    )
-    impostos_por_tipo = calcular_impostos_por_tipo(
-        db, cnpj=cnpj, regime=regime, data_inicio=data_inicio_atual, data_fim=data_fim_atual
+    variacao_tributos = (
+        _percentual((tributos_atuais / tributos_anteriores - 1) * 100) if tributos_anteriores else None
     )
+    impostos_por_tipo = _agregar_impostos_por_tipo(registos_atuais, regime)
 
     # KPIs Anuais/Exercício
-    faturamento_exercicio = calcular_faturamento_no_exercicio(
-        db, cnpj=cnpj, regime=regime, data_inicio=data_inicio_atual, data_fim=data_fim_atual
-    )
+    faturamento_exercicio, _ = _acumulado_ano_de_linhas(linhas, data_inicio_atual, tipos_para_totais(regime))
     limite_faturamento_percentual = calcular_limite_faturamento_lp(faturamento_exercicio)
 
     # --- 3. MONTAGEM DO RELATÓRIO ---
@@ -600,12 +833,98 @@ def gerar_relatorio_lucro_presumido_servicos(db: Session, *, cnpj: str, data_com
 # Funções para preparar dados para gráficos
 #-----------------------------------------------------------------
 
-def preparar_dados_para_graficos(db: Session, cnpj: str, data_inicio: date, data_fim: date) -> Optional[pd.DataFrame]:
+def montar_dataframe_graficos(competencias, faturamento_centavos, impostos_centavos, grupos=None, *,
+                              carga_guardada=None, crescimento_guardado=None) -> pd.DataFrame:
     """
-    Busca dados fiscais de PGDAS no período, calcula métricas e retorna um DataFrame.
+    Constrói o DataFrame dos gráficos a partir de arrays numéricos (centavos int64).
+
+    Todo o cálculo é inteiro: percentagens em centésimos de ponto com arredondamento
+    half-up, acumulados por cumsum em centavos. Só na fronteira os valores passam a
+    float (para o Plotly) e a texto (formatação vetorizada em BRL).
+
+    'grupos' (ex.: o CNPJ de cada linha) permite preparar várias empresas numa só
+    chamada; crescimento e acumulados recomeçam em cada grupo.
+
+    'carga_guardada' e 'crescimento_guardado' são percentagens já calculadas (Decimal
+    ou None, como nos snapshot_kpi), na ordem das competências; quando dadas, são
+    usadas em vez do cálculo.
     """
-    # 1. Busca os dados relevantes (apenas PGDAS para estes gráficos)
-    registos = crud_dados_fiscais.obter_dados_por_periodo(
+    competencias = pd.to_datetime(pd.Series(competencias)).to_numpy()
+    faturamento = np.asarray(faturamento_centavos, dtype=np.int64)
+    impostos = np.asarray(impostos_centavos, dtype=np.int64)
+    agrupado = grupos is not None
+    grupos = np.asarray(grupos) if agrupado else np.zeros(len(faturamento), dtype=np.int64)
+
+    ordem = np.lexsort((competencias, grupos))
+    competencias, faturamento, impostos, grupos = competencias[ordem], faturamento[ordem], impostos[ordem], grupos[ordem]
+    n = len(faturamento)
+    inicio_grupo = np.ones(n, dtype=bool)
+    inicio_grupo[1:] = grupos[1:] != grupos[:-1]
+
+    # Rótulos de data (equivalentes a strftime '%b/%Y', '%Y' e '%B') por aritmética de meses
+    meses_desde_1970 = competencias.astype('datetime64[M]').astype(np.int64)
+    rotulos_ano = (meses_desde_1970 // 12 + 1970).astype(str)
+    numero_mes = meses_desde_1970 % 12 + 1
+    rotulos_mes = np.array(calendar.month_name, dtype=object)[numero_mes]
+    rotulos_mes_ano = np.strings.add(np.strings.add(np.array(calendar.month_abbr)[numero_mes], "/"), rotulos_ano).astype(object)
+    rotulos_ano = rotulos_ano.astype(object)
+
+    # Carga Tributária (centésimos de ponto percentual)
+    if carga_guardada is None:
+        carga_valida = faturamento != 0
+        carga = moeda.percentual_centesimos(impostos, faturamento)
+    else:
+        carga, carga_valida = _centesimos_guardados(carga_guardada, ordem)
+
+    # Taxa de Crescimento face ao mês anterior da mesma série
+    if crescimento_guardado is None:
+        anterior = np.zeros(n, dtype=np.int64)
+        anterior[1:] = faturamento[:-1]
+        anterior[inicio_grupo] = 0
+        crescimento_valido = anterior != 0
+        crescimento = moeda.percentual_centesimos(faturamento - anterior, anterior)
+    else:
+        crescimento, crescimento_valido = _centesimos_guardados(crescimento_guardado, ordem)
+
+    # Valores acumulados: cumsum global menos o que já estava somado no início do grupo
+    inicio_do_meu_grupo = np.maximum.accumulate(np.where(inicio_grupo, np.arange(n), 0))
+    def _acumular(valores: np.ndarray) -> np.ndarray:
+        soma = np.cumsum(valores)
+        return soma - (soma - valores)[inicio_do_meu_grupo]
+    faturamento_acumulado = _acumular(faturamento)
+    impostos_acumulados = _acumular(impostos)
+
+    colunas = {
+        'data_competencia': competencias,
+        'faturamento': faturamento / 100,
+        'total_impostos': impostos / 100,
+        'mes_ano': rotulos_mes_ano,
+        'ano': rotulos_ano,
+        'mes': rotulos_mes,
+        'faturamento_formatado': moeda.formatar_brl_array(faturamento),
+        'impostos_formatado': moeda.formatar_brl_array(impostos),
+        'carga_tributaria': np.where(carga_valida, carga / 100, np.nan),
+        'carga_formatado': moeda.formatar_percentual_array(carga, carga_valida),
+        'taxa_crescimento': np.where(crescimento_valido, crescimento / 100, np.nan),
+        'crescimento_formatado': moeda.formatar_percentual_array(crescimento, crescimento_valido),
+        'faturamento_acumulado': faturamento_acumulado / 100,
+        'impostos_acumulados': impostos_acumulados / 100,
+        'faturamento_acumulado_formatado': moeda.formatar_brl_array(faturamento_acumulado),
+        'impostos_acumulados_formatado': moeda.formatar_brl_array(impostos_acumulados),
+    }
+    if agrupado:
+        colunas = {'grupo': grupos, **colunas}
+    return pd.DataFrame(colunas)
+
+def _centesimos_guardados(percentuais, ordem: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Percentagens guardadas (Decimal ou None) em centésimos de ponto, reordenadas, e onde são válidas."""
+    percentuais = list(percentuais)
+    validos = np.fromiter((p is not None for p in percentuais), dtype=bool, count=len(percentuais))
+    return moeda.centavos_array(percentuais)[ordem], validos[ordem]
+
+def _obter_fatos_pgdas(db: Session, cnpj: str, data_inicio: date, data_fim: date) -> list:
+    """Factos mensais de PGDAS no período, a base comum dos gráficos."""
+    return crud_fato_mensal.obter_fatos_por_periodo(
         db,
         cnpj=cnpj,
         data_inicio=data_inicio,
@@ -613,88 +932,87 @@ def preparar_dados_para_graficos(db: Session, cnpj: str, data_inicio: date, data
         tipos_documento=["PGDAS"]
     )
 
-    if not registos:
+def preparar_dados_para_graficos(db: Session, cnpj: str, data_inicio: date, data_fim: date) -> Optional[pd.DataFrame]:
+    """
+    Monta o DataFrame da série mensal dos gráficos. Numa empresa do Simples Nacional
+    lê os KPIs mensais guardados; sem snapshots, calcula-os a partir dos factos de PGDAS.
+    """
+    return _serie_graficos(db, cnpj, data_inicio, data_fim)
+
+def _serie_graficos(db: Session, cnpj: str, data_inicio: date, data_fim: date, registos=None) -> Optional[pd.DataFrame]:
+    snapshots = _obter_snapshots_do_regime(db, cnpj=cnpj, regime="Simples Nacional", data_inicio=data_inicio, data_fim=data_fim)
+    if snapshots is not None:
+        return _dataframe_graficos_de_snapshots(snapshots)
+    # Apenas PGDAS para estes gráficos
+    if registos is None:
+        registos = _obter_fatos_pgdas(db, cnpj, data_inicio, data_fim)
+    return _dataframe_graficos_de_fatos(registos)
+
+def _dataframe_graficos_de_snapshots(snapshots) -> Optional[pd.DataFrame]:
+    # No Simples Nacional os totais guardados são os do PGDAS; meses só com o Encerramento ISS ficam de fora
+    snapshots = [s for s in snapshots if s.faturamento or s.tributos]
+    if not snapshots:
         return None
+    return montar_dataframe_graficos(
+        [s.competencia for s in snapshots],
+        moeda.centavos_array(s.faturamento for s in snapshots),
+        moeda.centavos_array(s.tributos for s in snapshots),
+        carga_guardada=[s.carga_tributaria_percentual for s in snapshots],
+        crescimento_guardado=[s.crescimento_faturamento_percentual for s in snapshots],
+    )
 
-    # 2. Extrai os dados para uma lista de dicionários
-    dados_grafico = []
-    for reg in registos:
-        impostos = reg.impostos or {}
-        dados_grafico.append({
-            'data_competencia': reg.data_competencia,
-            'faturamento': reg.valor_total or Decimal(0),
-            'total_impostos': _converter_valor(impostos.get("total_debitos_tributos")) or Decimal(0)
-        })
-
-    if not dados_grafico:
+def _dataframe_graficos_de_fatos(registos) -> Optional[pd.DataFrame]:
+    if not registos:
         return None
 
-    # 3. Converte para DataFrame e ordena por data
-    df = pd.DataFrame(dados_grafico)
-    df = df.sort_values(by='data_competencia').reset_index(drop=True)
-
-    # 4. Cálculos para os gráficos
-    df['mes_ano'] = df['data_competencia'].dt.strftime('%b/%Y')
-    df['ano'] = df['data_competencia'].dt.strftime('%Y')
-    df['mes'] = df['data_competencia'].dt.strftime('%B')
-    
-    # Formatações para exibição
-    df['faturamento_formatado'] = df['faturamento'].apply(lambda x: f"R$ {x:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."))
-    df['impostos_formatado'] = df['total_impostos'].apply(lambda x: f"R$ {x:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."))
-
-    # Cálculo da Carga Tributária
-    df['carga_tributaria'] = (df['total_impostos'] / df['faturamento']) * 100
-    df['carga_formatado'] = df['carga_tributaria'].apply(lambda x: f"{x:.2f}%")
-
-    # Cálculo da Taxa de Crescimento
-    df['taxa_crescimento'] = df['faturamento'].pct_change() * 100
-    df['crescimento_formatado'] = df['taxa_crescimento'].apply(lambda x: f"{x:.2f}%" if pd.notna(x) else "0.00%")
-
-    # Cálculo dos valores acumulados
-    df['faturamento_acumulado'] = df['faturamento'].cumsum()
-    df['impostos_acumulados'] = df['total_impostos'].cumsum()
-    df['faturamento_acumulado_formatado'] = df['faturamento_acumulado'].apply(lambda x: f"R$ {x:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."))
-    df['impostos_acumulados_formatado'] = df['impostos_acumulados'].apply(lambda x: f"R$ {x:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."))
-
-    return df
+    # 2. Extrai colunas numéricas (centavos) e delega os cálculos ao núcleo vetorizado
+    return montar_dataframe_graficos(
+        [reg.competencia for reg in registos],
+        moeda.centavos_array(reg.faturamento for reg in registos),
+        moeda.centavos_array(reg.total_tributos for reg in registos),
+    )
 
 def preparar_dados_para_kpis_visuais(db: Session, cnpj: str, data_inicio: date, data_fim: date) -> Optional[Dict[str, Any]]:
     """
     Busca o PGDAS mais recente no período e prepara os dados para os gráficos
     de medidor (gauge) e rosca (pie).
     """
-    registos = crud_dados_fiscais.obter_dados_por_periodo(
-        db,
-        cnpj=cnpj,
-        data_inicio=data_inicio,
-        data_fim=data_fim,
-        tipos_documento=["PGDAS"]
-    )
+    return _kpis_visuais_de_fatos(db, cnpj, _obter_fatos_pgdas(db, cnpj, data_inicio, data_fim))
 
+def _kpis_visuais_de_fatos(db: Session, cnpj: str, registos) -> Optional[Dict[str, Any]]:
     if not registos:
         return None
 
     # Pega o último registro do período para os KPIs
-    ultimo_reg = max(registos, key=lambda r: r.data_competencia)
-    impostos = ultimo_reg.impostos or {}
+    ultimo_reg = max(registos, key=lambda r: r.competencia)
+    impostos = ultimo_reg.detalhe_impostos or {}
+
+    # Dados para o gráfico de Medidor (Limite de Faturamento).
+    # Quando o PGDAS não traz os valores, usam-se as somas acumuladas e os limites legais.
+    rba = converter_decimal_armazenado(impostos.get("receita_bruta_acumulada_rba"))
+    rbt12 = converter_decimal_armazenado(impostos.get("receita_bruta_acumulada_rbt12"))
+    if not rba:
+        rba, _ = calcular_acumulados_no_exercicio(db, cnpj=cnpj, regime="Simples Nacional", data_fim=ultimo_reg.competencia)
+    if not rbt12:
+        rbt12 = calcular_receita_bruta_12_meses(db, cnpj=cnpj, regime="Simples Nacional", data_competencia=ultimo_reg.competencia)
 
-    # Dados para o gráfico de Medidor (Limite de Faturamento)
     dados_medidor = {
-        "rba": _converter_valor(impostos.get("receita_bruta_acumulada_rba")),
-        "limite": _converter_valor(impostos.get("limite_faturamento")),
-        "sublimite": _converter_valor(impostos.get("sublimite_receita"))
+        "rba": rba,
+        "rbt12": rbt12,
+        "limite": converter_decimal_armazenado(impostos.get("limite_faturamento")) or LIMITE_SIMPLES_NACIONAL,
+        "sublimite": converter_decimal_armazenado(impostos.get("sublimite_receita")) or SUBLIMITE_SIMPLES_NACIONAL
     }
 
     # Dados para o gráfico de Rosca (Segregação de Tributos)
     tributos_rosca = {
-        "IRPJ": _converter_valor(impostos.get("irpj")),
-        "CSLL": _converter_valor(impostos.get("csll")),
-        "COFINS": _converter_valor(impostos.get("cofins")),
-        "PIS_PASEP": _converter_valor(impostos.get("pis_pasep")),
-        "INSS_CPP": _converter_valor(impostos.get("inss_cpp")),
-        "IPI": _converter_valor(impostos.get("ipi")),
-        "ICMS": _converter_valor(impostos.get("icms")),
-        "ISS": _converter_valor(impostos.get("iss")),
+        "IRPJ": converter_decimal_armazenado(impostos.get("irpj")),
+        "CSLL": converter_decimal_armazenado(impostos.get("csll")),
+        "COFINS": converter_decimal_armazenado(impostos.get("cofins")),
+        "PIS_PASEP": converter_decimal_armazenado(impostos.get("pis_pasep")),
+        "INSS_CPP": converter_decimal_armazenado(impostos.get("inss_cpp")),
+        "IPI": converter_decimal_armazenado(impostos.get("ipi")),
+        "ICMS": converter_decimal_armazenado(impostos.get("icms")),
+        "ISS": converter_decimal_armazenado(impostos.get("iss")),
     }
     
     # Filtra apenas os tributos que têm valor
@@ -703,4 +1021,24 @@ def preparar_dados_para_kpis_visuais(db: Session, cnpj: str, data_inicio: date,
     return {
         "medidor": dados_medidor,
         "rosca": dados_rosca
-    }
\ No newline at end of file
+    }
+
+def preparar_dados_pacote_graficos(db: Session, *, cnpj: str, regime: str, data_inicio: date, data_fim: date) -> Dict[str, Any]:
+    """
+    Prepara de uma só vez os dados de todos os gráficos de um regime: os factos de
+    PGDAS são lidos uma única vez e partilhados pela série mensal (quando não há
+    snapshots) e pelos KPIs visuais. Cada chave é None quando não há dados para os
+    gráficos que dela dependem.
+    """
+    registos = _obter_fatos_pgdas(db, cnpj, data_inicio, data_fim)
+    kpis = _kpis_visuais_de_fatos(db, cnpj, registos) or {}
+    dados = {
+        "serie": _serie_graficos(db, cnpj, data_inicio, data_fim, registos),
+        "medidor": kpis.get("medidor"),
+        "rosca": kpis.get("rosca") or None,
+    }
+    if regime == "Lucro Presumido (Serviços)":
+        dados["tributos_lp"] = preparar_dados_tributos_lp(db, cnpj, data_inicio, data_fim)
+        faturamento_exercicio = calcular_faturamento_no_exercicio(db, cnpj=cnpj, regime=regime, data_inicio=data_inicio, data_fim=data_fim)
+        dados["medidor_lp"] = {'faturamento_exercicio': float(faturamento_exercicio)}
+    return dados
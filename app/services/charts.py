@@ -1,14 +1,34 @@
 # app/services/charts.py
+import functools
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass
 import plotly.graph_objects as go
+import plotly.io as pio
 import pandas as pd
 from pathlib import Path
-import uuid
-from typing import List, Dict, Any
+from typing import Any, Callable, List, Dict
 from plotly.subplots import make_subplots
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.crud import grafico as crud_grafico
+from app.services import renderizador
+from app.services import voo_unico
 
 CHARTS_DIR = Path("static/charts")
 CHARTS_DIR.mkdir(parents=True, exist_ok=True)
 
+# Formatos de imagem suportados e respetivo media type
+FORMATOS_IMAGEM = {"png": "image/png", "svg": "image/svg+xml", "webp": "image/webp"}
+
+# Versão do aspeto dos gráficos: incrementar sempre que cores, títulos ou layout
+# mudarem, para que as imagens já em cache deixem de ser servidas.
+VERSAO_LAYOUT = 1
+
 # --- Paleta de Cores e Configurações Globais ---
 COLOR_PAPER = '#0A192F'
 COLOR_TEXT = '#CCD6F6'
@@ -17,282 +37,442 @@ COLOR_PALETTE_BARS = ['#1E90FF', '#FF5733']
 COLOR_PALETTE_PIE = ['#D4AF37', '#1E90FF', '#1EFF65', '#C70039', '#FF5733', '#DAF7A6', '#FFC300', '#581845']
 
 # =============================================================================
-# --- GRÁFICOS SIMPLES NACIONAL ---
+# --- CACHE DE RENDERIZAÇÃO ---
 # =============================================================================
 
-def gerar_grafico_sn_faturamento(dados: pd.DataFrame, cnpj: str) -> str:
-    """ Gera um gráfico de barras do faturamento mensal com uma tabela de dados. """
-    fig = make_subplots(
-        rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.05,
-        row_heights=[0.75, 0.25], specs=[[{"secondary_y": False}], [{"type": "table"}]]
-    )
-    fig.add_trace(go.Bar(
-        x=dados['mes_ano'], y=dados['faturamento'], name='Faturamento',
-        marker_color="#1EFF65", text=dados['faturamento_formatado'], textposition='outside',
-    ), row=1, col=1)
-    fig.add_trace(go.Table(
-        header=dict(values=['Ano', 'Mês', 'Faturamento'], fill_color='royalblue', align='center', font=dict(color='white', size=12)),
-        cells=dict(values=[dados.ano, dados.mes, dados.faturamento_formatado], fill_color='lavender', align=['center', 'left', 'right'], font=dict(color='darkslategray', size=11))
-    ), row=2, col=1)
-    fig.update_layout(
-        height=800, title_text=f'Evolução do Faturamento Mensal - CNPJ: {cnpj}',
-        plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)',
-        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
-    )
-    fig.update_yaxes(title_text="Faturamento (R$)", row=1, col=1)
-    nome_arquivo = f"faturamento_{cnpj.replace('/', '').replace('.', '').replace('-', '')}_{uuid.uuid4()}.png"
-    caminho_completo = CHARTS_DIR / nome_arquivo
-    fig.write_image(caminho_completo, width=1200, height=800, scale=2)
-    return str(caminho_completo).replace('\\', '/')
+def _cnpj_limpo(cnpj: str) -> str:
+    return cnpj.replace('/', '').replace('.', '').replace('-', '')
 
-def gerar_grafico_sn_receita_crescimento(dados: pd.DataFrame, cnpj: str) -> str:
-    """ Gera um gráfico combinado de Faturamento (barras) e Taxa de Crescimento (linha) com uma tabela de dados. """
-    fig = make_subplots(
-        rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.05,
-        row_heights=[0.75, 0.25], specs=[[{"secondary_y": True}], [{"type": "table"}]]
-    )
-    fig.add_trace(go.Bar(x=dados['mes_ano'], y=dados['faturamento'], name='Faturamento', marker_color='#F28C28'), row=1, col=1, secondary_y=False)
-    fig.add_trace(go.Scatter(x=dados['mes_ano'], y=dados['taxa_crescimento'], name='Taxa de Crescimento', mode='lines+markers', marker_color='#000000'), row=1, col=1, secondary_y=True)
-    
-    fig.add_trace(go.Table(
-        header=dict(values=['Ano', 'Mês', 'Faturamento', 'Taxa de Crescimento'], fill_color='royalblue', align='center', font=dict(color='white', size=12)),
-        cells=dict(values=[dados.ano, dados.mes, dados.faturamento_formatado, dados.crescimento_formatado], fill_color='lavender', align=['center', 'left', 'right', 'right'], font=dict(color='darkslategray', size=11))
-    ), row=2, col=1)
+def _serializar_dados(dados: Any) -> bytes:
+    """Representação estável dos dados preparados (DataFrame ou dicionário) para o hash."""
+    if isinstance(dados, pd.DataFrame):
+        return dados.to_json(orient="split", date_format="iso", default_handler=str).encode()
+    return json.dumps(dados, sort_keys=True, default=str).encode()
 
-    fig.update_layout(height=800, title_text=f'Faturamento e Taxa de Crescimento por Mês - CNPJ: {cnpj}', plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1))
-    fig.update_yaxes(title_text="Faturamento (R$)", secondary_y=False, row=1, col=1)
-    fig.update_yaxes(title_text="Crescimento (%)", secondary_y=True, row=1, col=1)
+def chave_do_grafico(tipo: str, cnpj: str, dados: Any, *, largura: int, altura: int, escala: float = 2, formato: str = "png") -> str:
+    """Hash do conteúdo de um gráfico: tipo, CNPJ, dados preparados, versão do layout, variante (formato e dimensões) e backend."""
+    cabecalho = f"{tipo}|{cnpj}|v{VERSAO_LAYOUT}|{formato}|{largura}x{altura}@{escala:g}|{settings.CHARTS_RENDER_BACKEND}|".encode()
+    return hashlib.sha256(cabecalho + _serializar_dados(dados)).hexdigest()
 
-    nome_arquivo = f"receita_crescimento_{cnpj.replace('/', '').replace('.', '').replace('-', '')}_{uuid.uuid4()}.png"
-    caminho_completo = CHARTS_DIR / nome_arquivo
-    fig.write_image(caminho_completo, width=1200, height=800, scale=2)
-    return str(caminho_completo).replace('\\', '/')
+@dataclass(frozen=True)
+class ImagemEmCache:
+    """Imagem de um gráfico na cache de static/charts."""
+    tipo: str
+    cnpj: str
+    chave: str
+    caminho: Path
+    renderizado: bool  # False quando a imagem já existia
+    formato: str = "png"
 
-def gerar_grafico_sn_impostos_carga(dados: pd.DataFrame, cnpj: str) -> str:
-    """ Gera um gráfico combinado de Total de Impostos (barras) e Carga Tributária (linha) com tabela. """
+    @property
+    def url(self) -> str:
+        return str(self.caminho).replace('\\', '/')
+
+    @property
+    def url_estatica(self) -> str:
+        """URL imutável da imagem no espaço estático (CHARTS_STATIC_URL)."""
+        return f"{settings.CHARTS_STATIC_URL}/{self.caminho.name}"
+
+    @property
+    def media_type(self) -> str:
+        return FORMATOS_IMAGEM[self.formato]
+
+def registar_no_indice(db: Session, imagem: ImagemEmCache) -> None:
+    """
+    Regista a imagem no índice de gráficos (tabela 'graficos') ou marca o acesso,
+    e, quando houve renderização nova, despeja as entradas menos usadas acima do limite.
+    """
+    db_grafico = crud_grafico.get_grafico_por_chave(db, imagem.chave)
+    if db_grafico:
+        crud_grafico.registar_acesso(db, db_grafico)
+    else:
+        try:
+            crud_grafico.criar_grafico(
+                db, imagem.tipo, imagem.url, cnpj=imagem.cnpj, chave_cache=imagem.chave,
+                tamanho_bytes=imagem.caminho.stat().st_size
+            )
+        except IntegrityError:  # Outro pedido registou a mesma imagem entretanto
+            db.rollback()
+    if imagem.renderizado:
+        crud_grafico.despejar_por_tamanho(db, settings.CHARTS_CACHE_MAX_BYTES, manter=imagem.chave)
+
+def _grafico_em_cache(tipo: str, *, largura: int, altura: int, escala: float = 2):
+    """
+    Transforma uma função que monta a figura numa função que devolve o caminho da imagem.
+    A função resultante expõe ainda 'figura_json', que devolve a especificação da
+    figura para o frontend a desenhar, sem qualquer renderização no servidor,
+    'chave', o hash de uma variante sem a renderizar (para ETags), e 'montar_figura',
+    a função original.
+
+    O nome do ficheiro deriva do hash do conteúdo: um pedido igual a outro já feito
+    serve a imagem existente sem montar a figura nem passar pelo renderizador. Com uma
+    sessão ('db'), a imagem fica registada no índice de gráficos e a pasta é mantida
+    abaixo de CHARTS_CACHE_MAX_BYTES, despejando as imagens acedidas há mais tempo.
+
+    Cada variante (formato, largura pedida e escala) é uma entrada própria da cache;
+    'largura' e 'altura' do decorador são as dimensões de referência, e uma largura
+    pedida mantém a proporção.
+    """
+    largura_base, altura_base, escala_base = largura, altura, escala
+
+    def variante(formato: str, largura: int | None, escala: float | None) -> tuple:
+        if formato not in FORMATOS_IMAGEM:
+            raise ValueError(f"Formato de imagem não suportado: '{formato}'.")
+        largura = largura or largura_base
+        altura = round(altura_base * largura / largura_base)
+        # SVG é vetorial: a escala não muda o ficheiro, não vale uma variante própria
+        escala = 1 if formato == "svg" else (escala or escala_base)
+        return largura, altura, escala
+
+    def decorador(montar_figura: Callable[[Any, str], go.Figure]) -> Callable[..., str]:
+        def chave(dados: Any, cnpj: str, *, formato: str = "png", largura: int | None = None, escala: float | None = None) -> str:
+            """Hash da variante pedida (ou, com formato='json', da figura), sem renderizar nada."""
+            if formato == "json":
+                return chave_do_grafico(tipo, cnpj, dados, largura=largura_base, altura=altura_base, escala=0, formato="json")
+            largura, altura, escala = variante(formato, largura, escala)
+            return chave_do_grafico(tipo, cnpj, dados, largura=largura, altura=altura, escala=escala, formato=formato)
+
+        def renderizar_em_cache(dados: Any, cnpj: str, *, formato: str = "png", largura: int | None = None,
+                                escala: float | None = None, db: Session | None = None) -> ImagemEmCache:
+            """
+            Devolve a imagem em cache, renderizando-a só se ainda não existir. Pedidos
+            simultâneos da mesma imagem partilham uma única renderização; com 'db', também
+            entre workers (a sessão só é usada para o bloqueio, não para o índice).
+            """
+            largura, altura, escala = variante(formato, largura, escala)
+            chave = chave_do_grafico(tipo, cnpj, dados, largura=largura, altura=altura, escala=escala, formato=formato)
+            caminho = CHARTS_DIR / f"{tipo}_{_cnpj_limpo(cnpj)}_{chave[:32]}.{formato}"
+
+            def renderizar() -> ImagemEmCache:
+                renderizado = not caminho.exists()  # Outro pedido pode tê-la criado entretanto
+                if renderizado:
+                    fig = montar_figura(dados, cnpj)
+                    # Escrita atómica: um pedido concorrente nunca lê uma imagem a meio
+                    temporario = caminho.with_name(f".{caminho.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+                    temporario.write_bytes(renderizador.renderizar_imagem(
+                        fig, formato=formato, largura=largura, altura=altura, escala=escala,
+                        backend=settings.CHARTS_RENDER_BACKEND,
+                    ))
+                    os.replace(temporario, caminho)
+                return ImagemEmCache(tipo=tipo, cnpj=cnpj, chave=chave, caminho=caminho, renderizado=renderizado, formato=formato)
+
+            if caminho.exists():
+                return renderizar()
+            return voo_unico.executar(("grafico", chave), renderizar, db=db)
+
+        @functools.wraps(montar_figura)
+        def gerar(dados: Any, cnpj: str, db: Session | None = None, *, formato: str = "png",
+                  largura: int | None = None, escala: float | None = None) -> str:
+            imagem = renderizar_em_cache(dados, cnpj, formato=formato, largura=largura, escala=escala, db=db)
+            if db is not None:
+                registar_no_indice(db, imagem)
+            return imagem.url
+
+        def figura_json(dados: Any, cnpj: str) -> bytes:
+            """Especificação da figura (data + layout) em JSON compacto, para o Plotly do frontend."""
+            return montar_figura(dados, cnpj).to_json(engine="orjson", validate=False).encode()
+
+        gerar.montar_figura = montar_figura
+        gerar.chave = chave
+        gerar.renderizar_em_cache = renderizar_em_cache
+        gerar.figura_json = figura_json
+        return gerar
+    return decorador
+
+def _mesmo_grafico(original: Callable[..., str]):
+    """Marca uma função como outro nome para um gráfico já existente, herdando os seus modos (cache e JSON)."""
+    def decorador(funcao):
+        funcao.montar_figura = original.montar_figura
+        funcao.chave = original.chave
+        funcao.renderizar_em_cache = original.renderizar_em_cache
+        funcao.figura_json = original.figura_json
+        return funcao
+    return decorador
+
+# =============================================================================
+# --- TEMPLATE E ESQUELETOS DE FIGURA ---
+# =============================================================================
+#
+# Validar cada propriedade (cores, fontes, eixos, grelha de subplots, estilo das
+# tabelas) era a maior parte do tempo de montagem de uma figura. O aspeto comum fica
+# num template Plotly registado e cada tipo de gráfico tem um esqueleto: a figura
+# completa sem dados, montada e validada uma única vez por processo e guardada como
+# dicionário. Em cada pedido, o esqueleto é combinado com os dados (listas simples)
+# e embrulhado num go.Figure sem nova validação.
+
+TEMPLATE_GRAFICOS = "lucid_count"
+
+LEGENDA_TOPO = dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+CABECALHO_TABELA = dict(fill_color='royalblue', align='center', font=dict(color='white', size=12))
+CELULAS_TABELA = dict(fill_color='lavender', font=dict(color='darkslategray', size=11))
+FAIXAS_MEDIDOR = [(0, 0.5, '#2a5a3b'), (0.5, 0.8, '#6e6114'), (0.8, 1, '#701c1c')]
+
+def _registar_template() -> None:
+    """Template base dos gráficos: o 'plotly' por omissão, com fundo transparente, legenda no topo e tabelas no estilo da casa."""
+    template = go.layout.Template(pio.templates["plotly"])
+    template.layout.update(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', legend=LEGENDA_TOPO)
+    template.data.table = [go.Table(header=CABECALHO_TABELA, cells=CELULAS_TABELA)]
+    pio.templates[TEMPLATE_GRAFICOS] = template
+
+_registar_template()
+
+def _fundir(base: Dict[str, Any], extra: Dict[str, Any]) -> Dict[str, Any]:
+    """Cópia de 'base' com 'extra' por cima (dicionários aninhados fundidos; o resto substituído)."""
+    fundido = dict(base)
+    for chave, valor in extra.items():
+        if isinstance(valor, dict) and isinstance(base.get(chave), dict):
+            fundido[chave] = _fundir(base[chave], valor)
+        else:
+            fundido[chave] = valor
+    return fundido
+
+def _valores(coluna) -> list:
+    """Coluna ou sequência em lista de tipos nativos (o esqueleto já não passa pela validação do Plotly)."""
+    return coluna.tolist() if hasattr(coluna, "tolist") else list(coluna)
+
+def _figura(esqueleto: Dict[str, Any], tracos: List[Dict[str, Any]], layout: Dict[str, Any]) -> go.Figure:
+    """Figura do pedido: cada traço e o layout do esqueleto com os dados por cima, sem revalidar."""
+    return go.Figure({
+        "data": [_fundir(base, extra) for base, extra in zip(esqueleto["data"], tracos)],
+        "layout": _fundir(esqueleto["layout"], layout),
+    }, _validate=False)
+
+def _esqueleto_serie_com_tabela(tracos: List[Any], colunas: List[str], alinhamento: List[str], *,
+                                titulos_y: List[str], alturas: tuple = (0.75, 0.25), **layout) -> Dict[str, Any]:
+    """
+    Série mensal (barras/linhas na linha de cima, eixo y secundário opcional) com
+    a tabela dos dados por baixo. Com dois títulos em 'titulos_y', o último traço
+    vai para o eixo secundário.
+    """
+    secundario = len(titulos_y) == 2
     fig = make_subplots(
         rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.05,
-        row_heights=[0.75, 0.25], specs=[[{"secondary_y": True}], [{"type": "table"}]]
+        row_heights=list(alturas), specs=[[{"secondary_y": secundario}], [{"type": "table"}]]
     )
-    fig.add_trace(go.Bar(x=dados['mes_ano'], y=dados['total_impostos'], name='Total Impostos', marker_color='#C70039'), row=1, col=1, secondary_y=False)
-    fig.add_trace(go.Scatter(x=dados['mes_ano'], y=dados['carga_tributaria'], name='Carga Tributária', mode='lines+markers', marker_color='#000000'), row=1, col=1, secondary_y=True)
-    
-    fig.add_trace(go.Table(
-        header=dict(values=['Mês/Ano', 'Total de Impostos', 'Carga Tributária'], fill_color='royalblue', align='center', font=dict(color='white', size=12)),
-        cells=dict(values=[dados.mes_ano, dados.impostos_formatado, dados.carga_formatado], fill_color='lavender', align=['center', 'right', 'right'], font=dict(color='darkslategray', size=11))
-    ), row=2, col=1)
+    for i, traco in enumerate(tracos):
+        fig.add_trace(traco, row=1, col=1, secondary_y=secundario and i == len(tracos) - 1)
+    fig.add_trace(go.Table(header=dict(values=colunas), cells=dict(align=alinhamento)), row=2, col=1)
+    fig.update_layout(template=TEMPLATE_GRAFICOS, height=800, **layout)
+    for i, titulo in enumerate(titulos_y):
+        fig.update_yaxes(title_text=titulo, row=1, col=1, **({"secondary_y": i == 1} if secundario else {}))
+    return fig.to_plotly_json()
+
+def _esqueleto_medidor(indicador: go.Indicator, **layout) -> Dict[str, Any]:
+    """Medidor (ou outro gráfico de um só traço) sobre o fundo escuro do dashboard."""
+    fig = go.Figure(indicador)
+    fig.update_layout(template=TEMPLATE_GRAFICOS, paper_bgcolor=COLOR_PAPER, font={'color': COLOR_TEXT}, **layout)
+    return fig.to_plotly_json()
+
+def _faixas_medidor(limite: float) -> List[Dict[str, Any]]:
+    return [{'range': [limite * inicio, limite * fim], 'color': cor} for inicio, fim, cor in FAIXAS_MEDIDOR]
+
+@functools.cache
+def _esqueleto(nome: str) -> Dict[str, Any]:
+    """Esqueleto validado de um tipo de gráfico, construído no primeiro uso e reutilizado pelo processo."""
+    if nome == "faturamento":
+        return _esqueleto_serie_com_tabela(
+            [go.Bar(name='Faturamento', marker_color="#1EFF65", textposition='outside')],
+            ['Ano', 'Mês', 'Faturamento'], ['center', 'left', 'right'], titulos_y=["Faturamento (R$)"],
+        )
+    if nome == "receita_crescimento":
+        return _esqueleto_serie_com_tabela(
+            [go.Bar(name='Faturamento', marker_color='#F28C28'),
+             go.Scatter(name='Taxa de Crescimento', mode='lines+markers', marker_color='#000000')],
+            ['Ano', 'Mês', 'Faturamento', 'Taxa de Crescimento'], ['center', 'left', 'right', 'right'],
+            titulos_y=["Faturamento (R$)", "Crescimento (%)"],
+        )
+    if nome == "impostos_carga":
+        return _esqueleto_serie_com_tabela(
+            [go.Bar(name='Total Impostos', marker_color='#C70039'),
+             go.Scatter(name='Carga Tributária', mode='lines+markers', marker_color='#000000')],
+            ['Mês/Ano', 'Total de Impostos', 'Carga Tributária'], ['center', 'right', 'right'],
+            titulos_y=["Impostos (R$)", "Carga Tributária (%)"],
+        )
+    if nome == "acumulado":
+        return _esqueleto_serie_com_tabela(
+            [go.Scatter(name='Faturamento Acumulado', mode='lines+markers', line=dict(color='#1E90FF', width=3)),
+             go.Scatter(name='Impostos Acumulados', mode='lines+markers', line=dict(color='#FF5733', width=3))],
+            ['Mês/Ano', 'Faturamento Acumulado', 'Impostos Acumulados'], ['center', 'right', 'right'],
+            titulos_y=["Valor Acumulado (R$)"],
+        )
+    if nome == "lp_tributos_detalhado":
+        return _esqueleto_serie_com_tabela(
+            [go.Bar(name=tipo, textposition='inside', marker_color=COLOR_PALETTE_BARS[i % len(COLOR_PALETTE_BARS)])
+             for i, tipo in enumerate(['Devido', 'Retido'])],
+            ['Mês', 'Tributo', 'Percentual'], ['center', 'left', 'right'],
+            titulos_y=["Percentual (%)"], alturas=(0.7, 0.3), barmode='stack',
+        )
+    if nome == "limite_faturamento":
+        return _esqueleto_medidor(go.Indicator(
+            mode="gauge+number",
+            number={'prefix': "R$ ", 'valueformat': ',.2f'},
+            title={'font': {'color': COLOR_TEXT, 'size': 16}},
+            domain={'x': [0, 1], 'y': [0, 1]},
+            gauge={
+                'axis': {'tickwidth': 1, 'tickcolor': "darkgrey"},
+                'bar': {'color': COLOR_PRIMARY},
+                'bgcolor': "rgba(0,0,0,0)",
+            },
+        ))
+    if nome == "sublimite_receita":
+        return _esqueleto_medidor(go.Indicator(
+            mode="number+gauge",
+            gauge={'shape': "angular",
+                   'bar': {'color': COLOR_PRIMARY, 'thickness': 0.3},
+                   'axis': {'visible': False},
+                   'bgcolor': "rgba(0,0,0,0)",
+                   },
+            number={'valueformat': '.2f', 'suffix': '%', 'font': {'size': 50, 'color': COLOR_PRIMARY}},
+            domain={'x': [0.1, 0.9], 'y': [0.1, 0.9]},
+            title={'font': {'size': 20, 'color': COLOR_TEXT}},
+        ), height=500)
+    if nome == "segregacao_tributos":
+        return _esqueleto_medidor(
+            go.Pie(hole=.5, textinfo='percent+label', marker_colors=COLOR_PALETTE_PIE),
+            plot_bgcolor=COLOR_PAPER,
+            legend=dict(orientation="h", yanchor="bottom", y=-0.2, xanchor="center", x=0.5),
+        )
+    raise ValueError(f"Esqueleto de gráfico desconhecido: '{nome}'.")
+
+# =============================================================================
+# --- GRÁFICOS SIMPLES NACIONAL ---
+# =============================================================================
+
+@_grafico_em_cache("faturamento", largura=1200, altura=800)
+def gerar_grafico_sn_faturamento(dados: pd.DataFrame, cnpj: str) -> go.Figure:
+    """ Gera um gráfico de barras do faturamento mensal com uma tabela de dados. """
+    return _figura(_esqueleto("faturamento"), [
+        {'x': _valores(dados['mes_ano']), 'y': _valores(dados['faturamento']), 'text': _valores(dados['faturamento_formatado'])},
+        {'cells': {'values': [_valores(dados.ano), _valores(dados.mes), _valores(dados.faturamento_formatado)]}},
+    ], {'title': {'text': f'Evolução do Faturamento Mensal - CNPJ: {cnpj}'}})
 
-    fig.update_layout(height=800, title_text=f'Impostos e Carga Tributária por Mês - CNPJ: {cnpj}', plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1))
-    fig.update_yaxes(title_text="Impostos (R$)", secondary_y=False, row=1, col=1)
-    fig.update_yaxes(title_text="Carga Tributária (%)", secondary_y=True, row=1, col=1)
+@_grafico_em_cache("receita_crescimento", largura=1200, altura=800)
+def gerar_grafico_sn_receita_crescimento(dados: pd.DataFrame, cnpj: str) -> go.Figure:
+    """ Gera um gráfico combinado de Faturamento (barras) e Taxa de Crescimento (linha) com uma tabela de dados. """
+    meses = _valores(dados['mes_ano'])
+    return _figura(_esqueleto("receita_crescimento"), [
+        {'x': meses, 'y': _valores(dados['faturamento'])},
+        {'x': meses, 'y': _valores(dados['taxa_crescimento'])},
+        {'cells': {'values': [_valores(dados.ano), _valores(dados.mes), _valores(dados.faturamento_formatado), _valores(dados.crescimento_formatado)]}},
+    ], {'title': {'text': f'Faturamento e Taxa de Crescimento por Mês - CNPJ: {cnpj}'}})
 
-    nome_arquivo = f"impostos_carga_{cnpj.replace('/', '').replace('.', '').replace('-', '')}_{uuid.uuid4()}.png"
-    caminho_completo = CHARTS_DIR / nome_arquivo
-    fig.write_image(caminho_completo, width=1200, height=800, scale=2)
-    return str(caminho_completo).replace('\\', '/')
+@_grafico_em_cache("impostos_carga", largura=1200, altura=800)
+def gerar_grafico_sn_impostos_carga(dados: pd.DataFrame, cnpj: str) -> go.Figure:
+    """ Gera um gráfico combinado de Total de Impostos (barras) e Carga Tributária (linha) com tabela. """
+    meses = _valores(dados['mes_ano'])
+    return _figura(_esqueleto("impostos_carga"), [
+        {'x': meses, 'y': _valores(dados['total_impostos'])},
+        {'x': meses, 'y': _valores(dados['carga_tributaria'])},
+        {'cells': {'values': [meses, _valores(dados.impostos_formatado), _valores(dados.carga_formatado)]}},
+    ], {'title': {'text': f'Impostos e Carga Tributária por Mês - CNPJ: {cnpj}'}})
 
-def gerar_grafico_sn_acumulado(dados: pd.DataFrame, cnpj: str) -> str:
+@_grafico_em_cache("acumulado", largura=1200, altura=800)
+def gerar_grafico_sn_acumulado(dados: pd.DataFrame, cnpj: str) -> go.Figure:
     """ Gera um gráfico de linhas para Faturamento e Tributos Acumulados com tabela. """
-    fig = make_subplots(
-        rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.05,
-        row_heights=[0.75, 0.25], specs=[[{"secondary_y": False}], [{"type": "table"}]]
-    )
-    fig.add_trace(go.Scatter(x=dados['mes_ano'], y=dados['faturamento_acumulado'], name='Faturamento Acumulado', mode='lines+markers', line=dict(color='#1E90FF', width=3)), row=1, col=1)
-    fig.add_trace(go.Scatter(x=dados['mes_ano'], y=dados['impostos_acumulados'], name='Impostos Acumulados', mode='lines+markers', line=dict(color='#FF5733', width=3)), row=1, col=1)
-    
-    fig.add_trace(go.Table(
-        header=dict(values=['Mês/Ano', 'Faturamento Acumulado', 'Impostos Acumulados'], fill_color='royalblue', align='center', font=dict(color='white', size=12)),
-        cells=dict(values=[dados.mes_ano, dados.faturamento_acumulado_formatado, dados.impostos_acumulados_formatado], fill_color='lavender', align=['center', 'right', 'right'], font=dict(color='darkslategray', size=11))
-    ), row=2, col=1)
-    
-    fig.update_layout(height=800, title_text=f'Faturamento e Impostos Acumulados no Exercício - CNPJ: {cnpj}', plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)', legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1))
-    fig.update_yaxes(title_text="Valor Acumulado (R$)", row=1, col=1)
-    
-    nome_arquivo = f"acumulado_{cnpj.replace('/', '').replace('.', '').replace('-', '')}_{uuid.uuid4()}.png"
-    caminho_completo = CHARTS_DIR / nome_arquivo
-    fig.write_image(caminho_completo, width=1200, height=800, scale=2)
-    return str(caminho_completo).replace('\\', '/')
+    meses = _valores(dados['mes_ano'])
+    return _figura(_esqueleto("acumulado"), [
+        {'x': meses, 'y': _valores(dados['faturamento_acumulado'])},
+        {'x': meses, 'y': _valores(dados['impostos_acumulados'])},
+        {'cells': {'values': [meses, _valores(dados.faturamento_acumulado_formatado), _valores(dados.impostos_acumulados_formatado)]}},
+    ], {'title': {'text': f'Faturamento e Impostos Acumulados no Exercício - CNPJ: {cnpj}'}})
 
-def gerar_grafico_sn_limite_faturamento(dados: dict, cnpj: str) -> str:
+@_grafico_em_cache("limite_faturamento", largura=800, altura=500)
+def gerar_grafico_sn_limite_faturamento(dados: dict, cnpj: str) -> go.Figure:
     """ Gera um gráfico de medidor para o limite de faturamento. """
-    value = dados.get('rba', 0)
-    limit = dados.get('limite', 1) # Evita divisão por zero
+    # Os valores chegam como Decimal; o plotly e as contas das faixas usam float
+    value = float(dados.get('rba') or 0)
+    limit = float(dados.get('limite') or 1) # Evita divisão por zero
     percentage = (value / limit) * 100 if limit > 0 else 0
-    
-    fig = go.Figure(go.Indicator(
-        mode="gauge+number",
-        value=value,
-        number={'prefix': "R$ ", 'valueformat': ',.2f'},
-        title={'text': f"Faturamento Acumulado vs Limite ({percentage:.2f}%)", 'font': {'color': COLOR_TEXT, 'size': 16}},
-        domain={'x': [0, 1], 'y': [0, 1]},
-        gauge={
-            'axis': {'range': [None, limit], 'tickwidth': 1, 'tickcolor': "darkgrey"},
-            'bar': {'color': COLOR_PRIMARY},
-            'bgcolor': "rgba(0,0,0,0)",
-            'steps': [
-                {'range': [0, limit * 0.5], 'color': '#2a5a3b'},
-                {'range': [limit * 0.5, limit * 0.8], 'color': '#6e6114'},
-                {'range': [limit * 0.8, limit], 'color': '#701c1c'}],
-        }
-    ))
-    fig.update_layout(
-        title_text=f'Limite de Faturamento - CNPJ: {cnpj}',
-        paper_bgcolor=COLOR_PAPER,
-        font={'color': COLOR_TEXT}
-    )
-    nome_arquivo = f"limite_faturamento_{cnpj.replace('/', '').replace('.', '').replace('-', '')}_{uuid.uuid4()}.png"
-    caminho_completo = CHARTS_DIR / nome_arquivo
-    fig.write_image(caminho_completo, width=800, height=500, scale=2)
-    return str(caminho_completo).replace('\\', '/')
 
-def gerar_grafico_sn_sublimite_receita(dados: dict, cnpj: str) -> str:
+    return _figura(_esqueleto("limite_faturamento"), [{
+        'value': value,
+        'title': {'text': f"Faturamento Acumulado vs Limite ({percentage:.2f}%)"},
+        'gauge': {'axis': {'range': [None, limit]}, 'steps': _faixas_medidor(limit)},
+    }], {'title': {'text': f'Limite de Faturamento - CNPJ: {cnpj}'}})
+
+@_grafico_em_cache("sublimite_receita", largura=600, altura=600)
+def gerar_grafico_sn_sublimite_receita(dados: dict, cnpj: str) -> go.Figure:
     """ Gera um gráfico de medidor (estilo rosca) para o sublimite de receita. """
-    value = dados.get('rba', 0)
-    sublimit = dados.get('sublimite', 1) # Evita divisão por zero
+    value = float(dados.get('rba') or 0)
+    sublimit = float(dados.get('sublimite') or 1) # Evita divisão por zero
     percentage = (value / sublimit) * 100 if sublimit > 0 else 0
 
-    fig = go.Figure(go.Indicator(
-        mode = "number+gauge",
-        gauge = {'shape': "angular",
-                 'bar': {'color': COLOR_PRIMARY, 'thickness': 0.3},
-                 'axis': {'range': [None, sublimit], 'visible': False},
-                 'bgcolor': "rgba(0,0,0,0)",
-                },
-        number={'valueformat': '.2f', 'suffix': '%', 'font': {'size': 50, 'color': COLOR_PRIMARY}},
-        value = percentage,
-        domain = {'x': [0.1, 0.9], 'y': [0.1, 0.9]},
-        title = {'text': f"Uso do Sublimite<br>R$ {value:,.2f} / R$ {sublimit:,.2f}", 'font': {'size': 20, 'color': COLOR_TEXT}}))
-
-    fig.update_layout(
-        title_text=f'Sublimite de Receita (ICMS/ISS) - CNPJ: {cnpj}',
-        paper_bgcolor=COLOR_PAPER,
-        font={'color': COLOR_TEXT},
-        height=500
-    )
+    return _figura(_esqueleto("sublimite_receita"), [{
+        'value': percentage,
+        'gauge': {'axis': {'range': [None, sublimit]}},
+        'title': {'text': f"Uso do Sublimite<br>R$ {value:,.2f} / R$ {sublimit:,.2f}"},
+    }], {'title': {'text': f'Sublimite de Receita (ICMS/ISS) - CNPJ: {cnpj}'}})
 
-    nome_arquivo = f"sublimite_receita_{cnpj.replace('/', '').replace('.', '').replace('-', '')}_{uuid.uuid4()}.png"
-    caminho_completo = CHARTS_DIR / nome_arquivo
-    fig.write_image(caminho_completo, width=600, height=600, scale=2)
-    return str(caminho_completo).replace('\\', '/')
-
-def gerar_grafico_sn_segregacao_tributos(dados: dict, cnpj: str) -> str:
+@_grafico_em_cache("segregacao_tributos", largura=800, altura=800)
+def gerar_grafico_sn_segregacao_tributos(dados: dict, cnpj: str) -> go.Figure:
     """ Gera um gráfico de rosca para a segregação de tributos. """
     labels = list(dados.keys())
-    values = list(dados.values())
-    
-    fig = go.Figure(data=[go.Pie(
-        labels=labels, 
-        values=values, 
-        hole=.5,
-        textinfo='percent+label',
-        marker_colors=COLOR_PALETTE_PIE,
-        pull=[0.02] * len(labels)
-    )])
-    
-    fig.update_layout(
-        title_text=f'Segregação dos Tributos no Período - CNPJ: {cnpj}',
-        paper_bgcolor=COLOR_PAPER,
-        plot_bgcolor=COLOR_PAPER,
-        font={'color': COLOR_TEXT},
-        legend=dict(orientation="h", yanchor="bottom", y=-0.2, xanchor="center", x=0.5)
-    )
-    
-    nome_arquivo = f"segregacao_tributos_{cnpj.replace('/', '').replace('.', '').replace('-', '')}_{uuid.uuid4()}.png"
-    caminho_completo = CHARTS_DIR / nome_arquivo
-    fig.write_image(caminho_completo, width=800, height=800, scale=2)
-    return str(caminho_completo).replace('\\', '/')
+    values = [float(v) for v in dados.values()]
+
+    return _figura(_esqueleto("segregacao_tributos"), [
+        {'labels': labels, 'values': values, 'pull': [0.02] * len(labels)},
+    ], {'title': {'text': f'Segregação dos Tributos no Período - CNPJ: {cnpj}'}})
 
 
 # =============================================================================
 # --- GRÁFICOS LUCRO PRESUMIDO - SERVIÇOS ---
 # =============================================================================
 
-def gerar_grafico_lp_receita_crescimento(dados: pd.DataFrame, cnpj: str) -> str:
+@_mesmo_grafico(gerar_grafico_sn_receita_crescimento)
+def gerar_grafico_lp_receita_crescimento(dados: pd.DataFrame, cnpj: str, db: Session | None = None, **variante) -> str:
     """[LP] Gráfico de Faturamento e Taxa de Crescimento."""
     # Reutiliza a mesma lógica do Simples Nacional
-    return gerar_grafico_sn_receita_crescimento(dados, cnpj)
+    return gerar_grafico_sn_receita_crescimento(dados, cnpj, db, **variante)
 
-def gerar_grafico_lp_impostos_carga(dados: pd.DataFrame, cnpj: str) -> str:
+@_mesmo_grafico(gerar_grafico_sn_impostos_carga)
+def gerar_grafico_lp_impostos_carga(dados: pd.DataFrame, cnpj: str, db: Session | None = None, **variante) -> str:
     """[LP] Gráfico de Total de Impostos e Carga Tributária."""
     # Reutiliza a mesma lógica do Simples Nacional
-    return gerar_grafico_sn_impostos_carga(dados, cnpj)
+    return gerar_grafico_sn_impostos_carga(dados, cnpj, db, **variante)
 
-def gerar_grafico_lp_acumulado(dados: pd.DataFrame, cnpj: str) -> str:
+@_mesmo_grafico(gerar_grafico_sn_acumulado)
+def gerar_grafico_lp_acumulado(dados: pd.DataFrame, cnpj: str, db: Session | None = None, **variante) -> str:
     """[LP] Gráfico de Faturamento e Tributos Acumulados no Exercício."""
     # Reutiliza a mesma lógica do Simples Nacional
-    return gerar_grafico_sn_acumulado(dados, cnpj)
+    return gerar_grafico_sn_acumulado(dados, cnpj, db, **variante)
     
-def gerar_grafico_lp_tributos_detalhado(dados: pd.DataFrame, cnpj: str) -> str:
+@_grafico_em_cache("lp_tributos_detalhado", largura=1200, altura=800)
+def gerar_grafico_lp_tributos_detalhado(dados: pd.DataFrame, cnpj: str) -> go.Figure:
     """[LP] Gera um gráfico de barras empilhadas para tributos devidos e retidos."""
-    fig = make_subplots(
-        rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.05,
-        row_heights=[0.7, 0.3], specs=[[{"secondary_y": False}], [{"type": "table"}]]
-    )
-    
-    # Adiciona as barras empilhadas
-    for i, tributo_tipo in enumerate(['Devido', 'Retido']):
+    # Uma série de barras empilhadas por tipo de tributo (a ordem é a do esqueleto)
+    barras = []
+    for tributo_tipo in ['Devido', 'Retido']:
         df_filtrado = dados[dados['Tributo'] == tributo_tipo]
-        fig.add_trace(go.Bar(
-            name=tributo_tipo,
-            x=df_filtrado['Mês'], 
-            y=df_filtrado['Percentual'],
-            text=[f'{p:.2f}%' for p in df_filtrado['Percentual']],
-            textposition='inside',
-            marker_color=COLOR_PALETTE_BARS[i % len(COLOR_PALETTE_BARS)]
-        ), row=1, col=1)
-
-    # Adiciona a tabela de dados
-    fig.add_trace(go.Table(
-        header=dict(values=['Mês', 'Tributo', 'Percentual'], fill_color='royalblue', align='center', font=dict(color='white', size=12)),
-        cells=dict(values=[dados.Mês, dados.Tributo, dados.Percentual.apply(lambda x: f'{x:.2f}%')],
-                   fill_color='lavender', align=['center', 'left', 'right'], font=dict(color='darkslategray', size=11))
-    ), row=2, col=1)
-
-    fig.update_layout(
-        barmode='stack',
-        height=800, title_text=f'Tributos Apurados por Mês, Retidos e Devidos (% Sobre o Total) - CNPJ: {cnpj}',
-        plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)',
-        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
-    )
-    fig.update_yaxes(title_text="Percentual (%)", row=1, col=1)
+        barras.append({
+            'x': _valores(df_filtrado['Mês']),
+            'y': _valores(df_filtrado['Percentual']),
+            'text': [f'{p:.2f}%' for p in df_filtrado['Percentual']],
+        })
+
+    # Tabela de dados
+    tabela = {'cells': {'values': [_valores(dados.Mês), _valores(dados.Tributo), [f'{x:.2f}%' for x in dados.Percentual]]}}
 
-    nome_arquivo = f"lp_tributos_detalhado_{cnpj.replace('/', '').replace('.', '').replace('-', '')}_{uuid.uuid4()}.png"
-    caminho_completo = CHARTS_DIR / nome_arquivo
-    fig.write_image(caminho_completo, width=1200, height=800, scale=2)
-    return str(caminho_completo).replace('\\', '/')
+    return _figura(_esqueleto("lp_tributos_detalhado"), barras + [tabela], {
+        'title': {'text': f'Tributos Apurados por Mês, Retidos e Devidos (% Sobre o Total) - CNPJ: {cnpj}'},
+    })
 
-def gerar_grafico_lp_tributos_ano(dados: dict, cnpj: str) -> str:
+@_mesmo_grafico(gerar_grafico_sn_segregacao_tributos)
+def gerar_grafico_lp_tributos_ano(dados: dict, cnpj: str, db: Session | None = None, **variante) -> str:
     """[LP] Gera um gráfico de rosca para a segregação de tributos no ano."""
     # Reutiliza a mesma lógica do Simples Nacional
-    return gerar_grafico_sn_segregacao_tributos(dados, cnpj)
+    return gerar_grafico_sn_segregacao_tributos(dados, cnpj, db, **variante)
 
-def gerar_grafico_lp_limite_faturamento(dados: dict, cnpj: str) -> str:
+
+@_grafico_em_cache("lp_limite_faturamento", largura=800, altura=500)
+def gerar_grafico_lp_limite_faturamento(dados: dict, cnpj: str) -> go.Figure:
     """[LP] Gera um gráfico de medidor para o limite de faturamento."""
     value = dados.get('faturamento_exercicio', 0)
     limit = 78000000  # Limite para Lucro Presumido
     percentage = (value / limit) * 100 if limit > 0 else 0
-    
-    fig = go.Figure(go.Indicator(
-        mode="gauge+number",
-        value=value,
-        number={'prefix': "R$ ", 'valueformat': ',.2f'},
-        title={'text': f"Faturamento Acumulado vs Limite ({percentage:.2f}%)", 'font': {'color': COLOR_TEXT, 'size': 16}},
-        domain={'x': [0, 1], 'y': [0, 1]},
-        gauge={
-            'axis': {'range': [None, limit], 'tickwidth': 1, 'tickcolor': "darkgrey"},
-            'bar': {'color': COLOR_PRIMARY},
-            'bgcolor': "rgba(0,0,0,0)",
-            'steps': [
-                {'range': [0, limit * 0.5], 'color': '#2a5a3b'},
-                {'range': [limit * 0.5, limit * 0.8], 'color': '#6e6114'},
-                {'range': [limit * 0.8, limit], 'color': '#701c1c'}],
-        }
-    ))
-    fig.update_layout(
-        title_text=f'Limite de Faturamento (Lucro Presumido) - CNPJ: {cnpj}',
-        paper_bgcolor=COLOR_PAPER, font={'color': COLOR_TEXT}
-    )
-    nome_arquivo = f"lp_limite_faturamento_{cnpj.replace('/', '').replace('.', '').replace('-', '')}_{uuid.uuid4()}.png"
-    caminho_completo = CHARTS_DIR / nome_arquivo
-    fig.write_image(caminho_completo, width=800, height=500, scale=2)
-    return str(caminho_completo).replace('\\', '/')
\ No newline at end of file
+
+    # Mesmo medidor do Simples Nacional, com o limite do Lucro Presumido
+    return _figura(_esqueleto("limite_faturamento"), [{
+        'value': value,
+        'title': {'text': f"Faturamento Acumulado vs Limite ({percentage:.2f}%)"},
+        'gauge': {'axis': {'range': [None, limit]}, 'steps': _faixas_medidor(limit)},
+    }], {'title': {'text': f'Limite de Faturamento (Lucro Presumido) - CNPJ: {cnpj}'}})
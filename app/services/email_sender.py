@@ -0,0 +1,392 @@
+# app/services/email_sender.py
+"""
+Envio por email dos relatórios mensais (e de qualquer lote de mensagens).
+
+- PoolSMTP mantém ligações SMTP persistentes e reutiliza-as entre mensagens: o
+  custo da ligação, do EHLO, do STARTTLS e da autenticação paga-se uma vez por
+  ligação, não por mensagem. Uma ligação inativa que o servidor entretanto fechou
+  é substituída sem contar como tentativa.
+- enviar_lote envia um lote em paralelo (uma thread por ligação do pool), com
+  limite de taxa por domínio do destinatário e novas tentativas com espera
+  exponencial para os erros temporários (respostas 4xx, ligação perdida). As
+  respostas 5xx são definitivas e não se repetem.
+- Cada resultado fica na tabela envios_email, com uma chave estável por
+  mensagem: voltar a correr o mesmo lote só envia o que ainda não foi entregue.
+"""
+
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date
+from email.message import EmailMessage
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.crud import envio_email as crud_envio_email
+from app.models.empresa import Empresa
+from app.services import report_generator
+
+
+@dataclass(frozen=True)
+class MensagemEmail:
+    """Uma mensagem do lote. 'chave' identifica-a entre execuções (registo de envios)."""
+    chave: str
+    destinatario: str
+    assunto: str
+    corpo: str
+    anexos: Tuple[Tuple[str, bytes, str], ...] = ()  # (nome do ficheiro, conteúdo, media type)
+
+    @property
+    def dominio(self) -> str:
+        return self.destinatario.rsplit("@", 1)[-1].lower()
+
+    def para_email(self, remetente: str) -> EmailMessage:
+        mensagem = EmailMessage()
+        mensagem["From"] = remetente
+        mensagem["To"] = self.destinatario
+        mensagem["Subject"] = self.assunto
+        mensagem.set_content(self.corpo)
+        for nome, conteudo, media_type in self.anexos:
+            principal, _, secundario = media_type.partition(";")[0].partition("/")
+            mensagem.add_attachment(conteudo, maintype=principal, subtype=secundario, filename=nome)
+        return mensagem
+
+
+# --- CLASSIFICAÇÃO DOS ERROS ---
+
+def _codigo_smtp(erro: BaseException) -> Optional[int]:
+    """Código de resposta SMTP do erro (o mais grave, se vários destinatários foram recusados)."""
+    if isinstance(erro, smtplib.SMTPResponseException):
+        return erro.smtp_code
+    if isinstance(erro, smtplib.SMTPRecipientsRefused) and erro.recipients:
+        return max(codigo for codigo, _ in erro.recipients.values())
+    return None
+
+
+def erro_temporario(erro: BaseException) -> bool:
+    """
+    Vale a pena tentar de novo: resposta 4xx, ligação perdida ou erro de rede. Os
+    restantes erros SMTP sem código (extensão não suportada, STARTTLS ou autenticação
+    impossíveis) são definitivos, apesar de SMTPException ser um OSError.
+    """
+    codigo = _codigo_smtp(erro)
+    if codigo is not None:
+        return 400 <= codigo < 500
+    if isinstance(erro, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(erro, smtplib.SMTPException):
+        return False
+    return isinstance(erro, OSError)
+
+
+def _ligacao_reutilizavel(erro: BaseException) -> bool:
+    """Depois de uma recusa normal o smtplib faz RSET e a ligação continua boa; 421 = o servidor vai fechá-la."""
+    codigo = _codigo_smtp(erro)
+    return codigo is not None and codigo != 421
+
+
+def _descrever(erro: BaseException) -> str:
+    if isinstance(erro, smtplib.SMTPResponseException):
+        mensagem = erro.smtp_error.decode(errors="replace") if isinstance(erro.smtp_error, bytes) else str(erro.smtp_error)
+        return f"{erro.smtp_code} {mensagem}"
+    if isinstance(erro, smtplib.SMTPRecipientsRefused):
+        return "; ".join(
+            f"{destinatario}: {codigo} {resposta.decode(errors='replace') if isinstance(resposta, bytes) else resposta}"
+            for destinatario, (codigo, resposta) in erro.recipients.items()
+        )
+    return f"{type(erro).__name__}: {erro}"
+
+
+# --- POOL DE LIGAÇÕES ---
+
+class PoolSMTP:
+    """
+    Ligações SMTP persistentes partilhadas por várias threads, cada uma usada por
+    uma só thread de cada vez. Abre ligações a pedido, até 'tamanho'; renova cada
+    ligação ao fim de 'mensagens_por_ligacao' mensagens (limite comum nos servidores).
+    """
+
+    def __init__(self, host: Optional[str] = None, port: Optional[int] = None, *,
+                 tamanho: Optional[int] = None, timeout_s: Optional[float] = None,
+                 usuario: Optional[str] = None, senha: Optional[str] = None,
+                 starttls: Optional[bool] = None, usar_ssl: Optional[bool] = None,
+                 mensagens_por_ligacao: Optional[int] = None):
+        self.host = host or settings.SMTP_HOST
+        self.port = port or settings.SMTP_PORT
+        self.tamanho = max(tamanho or settings.SMTP_LIGACOES, 1)
+        self.timeout_s = timeout_s or settings.SMTP_TIMEOUT_S
+        self.usuario = usuario if usuario is not None else settings.SMTP_USUARIO
+        self.senha = senha if senha is not None else settings.SMTP_SENHA
+        self.starttls = settings.SMTP_STARTTLS if starttls is None else starttls
+        self.usar_ssl = settings.SMTP_SSL if usar_ssl is None else usar_ssl
+        self.mensagens_por_ligacao = mensagens_por_ligacao or settings.SMTP_MENSAGENS_POR_LIGACAO
+
+        self._lock = threading.Lock()
+        self._vagas = threading.BoundedSemaphore(self.tamanho)
+        self._livres: List[list] = []  # [ligação, mensagens enviadas nela]
+        self._fechado = False
+        self.ligacoes_abertas = 0  # Total aberto desde a criação (diagnóstico)
+
+    def _abrir(self) -> smtplib.SMTP:
+        classe = smtplib.SMTP_SSL if self.usar_ssl else smtplib.SMTP
+        smtp = classe(self.host, self.port, timeout=self.timeout_s)
+        try:
+            if self.starttls and not self.usar_ssl:
+                smtp.starttls()
+            if self.usuario:
+                smtp.login(self.usuario, self.senha or "")
+        except BaseException:
+            self._fechar_ligacao(smtp)
+            raise
+        with self._lock:
+            self.ligacoes_abertas += 1
+        return smtp
+
+    @staticmethod
+    def _fechar_ligacao(smtp: smtplib.SMTP) -> None:
+        try:
+            smtp.quit()
+        except Exception:
+            smtp.close()
+
+    def _devolver(self, item: list) -> None:
+        """Volta a pôr a ligação entre as livres ou, com o pool já fechado, termina-a."""
+        with self._lock:
+            if not self._fechado:
+                self._livres.append(item)
+                return
+        self._fechar_ligacao(item[0])
+
+    @contextmanager
+    def ligacao(self):
+        """Empresta uma ligação: (smtp, reutilizada). Ligações com erro de protocolo são descartadas."""
+        with self._vagas:
+            with self._lock:
+                item = self._livres.pop() if self._livres else None
+            reutilizada = item is not None
+            if item is None:
+                item = [self._abrir(), 0]
+            try:
+                yield item[0], reutilizada
+            except BaseException as erro:
+                if _ligacao_reutilizavel(erro):
+                    self._devolver(item)
+                else:
+                    self._fechar_ligacao(item[0])
+                raise
+            item[1] += 1
+            if item[1] >= self.mensagens_por_ligacao:
+                self._fechar_ligacao(item[0])
+            else:
+                self._devolver(item)
+
+    def enviar(self, mensagem: EmailMessage) -> None:
+        """Envia uma mensagem. Se a ligação reutilizada já estava fechada pelo servidor, repete numa nova."""
+        while True:
+            reutilizada = False
+            try:
+                with self.ligacao() as (smtp, reutilizada):
+                    smtp.send_message(mensagem)
+                return
+            except smtplib.SMTPServerDisconnected:
+                if not reutilizada:
+                    raise
+
+    def fechar(self) -> None:
+        """Termina (QUIT) as ligações inativas. As emprestadas fecham quando forem devolvidas ao pool fechado."""
+        with self._lock:
+            self._fechado = True
+            livres, self._livres = self._livres, []
+        for smtp, _ in livres:
+            self._fechar_ligacao(smtp)
+
+    def __enter__(self) -> "PoolSMTP":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.fechar()
+
+
+# --- LIMITE DE TAXA POR DOMÍNIO ---
+
+class LimitadorDominio:
+    """
+    Balde de fichas por domínio do destinatário: até 'rajada' mensagens seguidas e
+    depois 'taxa' mensagens por segundo. aguardar() reserva a próxima ficha do
+    domínio e dorme até ela estar disponível, sem bloquear os outros domínios.
+    """
+
+    def __init__(self, taxa: Optional[float] = None, rajada: Optional[int] = None):
+        self.taxa = taxa or settings.EMAIL_TAXA_POR_DOMINIO
+        self.rajada = max(rajada or settings.EMAIL_RAJADA_POR_DOMINIO, 1)
+        self._lock = threading.Lock()
+        self._baldes: Dict[str, Tuple[float, float]] = {}  # domínio -> (fichas, instante)
+
+    def aguardar(self, dominio: str) -> float:
+        """Espera pela vez do domínio; retorna o tempo de espera em segundos."""
+        with self._lock:
+            agora = time.monotonic()
+            fichas, instante = self._baldes.get(dominio, (float(self.rajada), agora))
+            fichas = min(self.rajada, fichas + (agora - instante) * self.taxa) - 1
+            self._baldes[dominio] = (fichas, agora)
+        # Fichas negativas: vagas já reservadas por outras threads à frente desta
+        espera = -fichas / self.taxa if fichas < 0 else 0.0
+        if espera:
+            time.sleep(espera)
+        return espera
+
+
+# --- ENVIO EM LOTE ---
+
+def _enviar_com_tentativas(pool: PoolSMTP, limitador: LimitadorDominio, mensagem: MensagemEmail,
+                           remetente: str, tentativas_max: int, espera_base_s: float) -> Tuple[bool, int, Optional[str]]:
+    """(enviada, tentativas feitas, último erro). Só os erros temporários voltam a ser tentados."""
+    email = mensagem.para_email(remetente)
+    for tentativa in range(1, tentativas_max + 1):
+        limitador.aguardar(mensagem.dominio)
+        try:
+            pool.enviar(email)
+            return True, tentativa, None
+        except Exception as erro:
+            if not erro_temporario(erro) or tentativa == tentativas_max:
+                return False, tentativa, _descrever(erro)
+            time.sleep(espera_base_s * 2 ** (tentativa - 1))
+    return False, 0, None  # Só com tentativas_max < 1
+
+
+def enviar_lote(db: Session, mensagens: Iterable[MensagemEmail], *, pool: Optional[PoolSMTP] = None,
+                limitador: Optional[LimitadorDominio] = None, remetente: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Envia as mensagens em paralelo pelas ligações do pool e regista cada resultado
+    em envios_email. Mensagens cuja chave já foi enviada (nesta ou numa execução
+    anterior) são ignoradas. O registo é escrito nesta thread, à medida que cada
+    envio termina, para que uma execução interrompida não perca o que já saiu.
+
+    Retorna um resumo: enviados, ignorados, falhados, a lista de falhas e o tempo.
+    """
+    inicio = time.perf_counter()
+    mensagens = list({mensagem.chave: mensagem for mensagem in mensagens}.values())
+    ja_enviadas = crud_envio_email.chaves_enviadas(db, (mensagem.chave for mensagem in mensagens))
+    pendentes = [mensagem for mensagem in mensagens if mensagem.chave not in ja_enviadas]
+    resumo: Dict[str, Any] = {"enviados": 0, "ignorados": len(mensagens) - len(pendentes), "falhados": 0, "falhas": []}
+
+    proprio_pool = pool is None
+    pool = pool or PoolSMTP()
+    limitador = limitador or LimitadorDominio()
+    remetente = remetente or settings.EMAIL_REMETENTE
+    try:
+        with ThreadPoolExecutor(max_workers=min(pool.tamanho, max(len(pendentes), 1))) as executor:
+            futuros = {
+                executor.submit(_enviar_com_tentativas, pool, limitador, mensagem, remetente,
+                                settings.EMAIL_TENTATIVAS, settings.EMAIL_ESPERA_BASE_S): mensagem
+                for mensagem in pendentes
+            }
+            for futuro in as_completed(futuros):
+                mensagem = futuros[futuro]
+                enviada, tentativas, erro = futuro.result()
+                crud_envio_email.registar_envio(
+                    db, chave=mensagem.chave, destinatario=mensagem.destinatario, assunto=mensagem.assunto,
+                    estado=crud_envio_email.ESTADO_ENVIADO if enviada else crud_envio_email.ESTADO_FALHADO,
+                    tentativas=tentativas, erro=erro,
+                )
+                if enviada:
+                    resumo["enviados"] += 1
+                else:
+                    resumo["falhados"] += 1
+                    resumo["falhas"].append({"chave": mensagem.chave, "destinatario": mensagem.destinatario, "erro": erro})
+                    print(f"AVISO: Falha no envio para {mensagem.destinatario} ({mensagem.chave}): {erro}")
+    finally:
+        if proprio_pool:
+            pool.fechar()
+
+    resumo["tempo_total_s"] = round(time.perf_counter() - inicio, 3)
+    return resumo
+
+
+# --- RELATÓRIOS MENSAIS ---
+
+def _emails_da_empresa(empresa: Empresa) -> List[str]:
+    """Emails dos contatos da empresa, sem repetidos (a comparação ignora maiúsculas)."""
+    emails: Dict[str, str] = {}
+    for contato in empresa.contatos or []:
+        email = (contato.get("email") or "").strip() if isinstance(contato, dict) else ""
+        if "@" in email:
+            emails.setdefault(email.lower(), email)
+    return list(emails.values())
+
+
+def chave_relatorio_mensal(cnpj: str, competencia: date, email: str) -> str:
+    return f"relatorio_mensal|{cnpj}|{competencia:%Y-%m}|{email.lower()}"
+
+
+def enviar_relatorios_mensais(db: Session, *, data_competencia: date, cnpjs: Optional[List[str]] = None,
+                              pool: Optional[PoolSMTP] = None, limitador: Optional[LimitadorDominio] = None) -> Dict[str, Any]:
+    """
+    Envia o relatório mensal da competência a todos os contatos com email das
+    empresas ativas (ou das indicadas). O relatório segue em anexo: PDF, se o
+    servidor o souber gerar, ou HTML autónomo com os gráficos em PNG. Empresas
+    cujos contatos já o receberam não voltam a gerar o relatório.
+
+    Retorna o resumo de enviar_lote, com as empresas sem contato e as que não
+    têm relatório (regime sem relatório ou sem dados).
+    """
+    competencia = data_competencia.replace(day=1)
+    query = db.query(Empresa)
+    query = query.filter(Empresa.cnpj.in_(cnpjs)) if cnpjs else query.filter(Empresa.ativa.isnot(False))
+    formato = "pdf" if report_generator.pdf_disponivel() else "html"
+
+    # 1. Destinatários de cada empresa e o que ainda falta enviar
+    destinos = {empresa.cnpj: (empresa, _emails_da_empresa(empresa)) for empresa in query.order_by(Empresa.cnpj).all()}
+    ja_enviadas = crud_envio_email.chaves_enviadas(
+        db, (chave_relatorio_mensal(cnpj, competencia, email) for cnpj, (_, emails) in destinos.items() for email in emails)
+    )
+
+    # 2. Relatório gerado só para as empresas com envios em falta
+    mensagens: List[MensagemEmail] = []
+    sem_contato: List[str] = []
+    sem_relatorio: List[Dict[str, str]] = []
+    ignorados = 0
+    for cnpj, (empresa, emails) in destinos.items():
+        if not emails:
+            sem_contato.append(cnpj)
+            continue
+        em_falta = [email for email in emails if chave_relatorio_mensal(cnpj, competencia, email) not in ja_enviadas]
+        ignorados += len(emails) - len(em_falta)
+        if not em_falta:
+            continue
+        try:
+            relatorio = report_generator.gerar_relatorio(db, cnpj=cnpj, data_competencia=competencia,
+                                                         formato=formato, formato_imagens="png")
+        except ValueError as e:
+            print(f"AVISO: Relatório mensal de {cnpj} não enviado: {e}")
+            sem_relatorio.append({"cnpj": cnpj, "erro": str(e)})
+            continue
+        if not relatorio.completo:
+            # Sem o resumo: fica para a próxima execução em vez de seguir incompleto
+            print(f"AVISO: Relatório mensal de {cnpj} não enviado: falhou o resumo dos KPIs.")
+            sem_relatorio.append({"cnpj": cnpj, "erro": "Falhou o resumo dos KPIs."})
+            continue
+        nome = empresa.razao_social or empresa.nome_fantasia or cnpj
+        assunto = f"Relatório mensal {competencia:%m/%Y} - {nome}"
+        corpo = (
+            f"Segue em anexo o relatório mensal de {competencia:%m/%Y} da empresa {nome} (CNPJ {cnpj}), "
+            "com os indicadores do mês e os gráficos do exercício.\n"
+        )
+        anexo = ((relatorio.nome_ficheiro, relatorio.conteudo, relatorio.media_type),)
+        mensagens.extend(
+            MensagemEmail(chave=chave_relatorio_mensal(cnpj, competencia, email), destinatario=email,
+                          assunto=assunto, corpo=corpo, anexos=anexo)
+            for email in em_falta
+        )
+
+    # 3. Envio do lote
+    resumo = enviar_lote(db, mensagens, pool=pool, limitador=limitador)
+    resumo["ignorados"] += ignorados
+    resumo["sem_contato"] = sem_contato
+    resumo["sem_relatorio"] = sem_relatorio
+    return resumo
@@ -0,0 +1,152 @@
+# app/services/manutencao_graficos.py
+"""
+Manutenção periódica da cache de gráficos (static/charts e tabela 'graficos').
+
+Corre dentro da aplicação, de CHARTS_MANUTENCAO_INTERVALO_S em CHARTS_MANUTENCAO_INTERVALO_S
+segundos, num único worker de cada vez (bloqueio consultivo em 'bloqueio_calculo').
+Cada passagem:
+
+1. apaga os gráficos sem acesso há mais de CHARTS_MAX_IDADE_DIAS, com DELETEs por lotes;
+2. reconcilia a pasta com o índice: a pasta é lida com os.scandir e comparada com a
+   leitura anterior (índice em memória: nome -> mtime e tamanho), por isso só os
+   ficheiros novos ou desaparecidos desde a última passagem são procurados na base
+   de dados (consultas IN por lotes). A primeira passagem do processo é completa;
+3. mantém o total em disco abaixo de CHARTS_CACHE_MAX_BYTES, despejando as imagens
+   acedidas há mais tempo (LRU).
+
+Ficheiros sem registo só são apagados passado CHARTS_ORFAOS_CARENCIA_S desde a sua
+escrita: uma imagem acabada de renderizar pode ainda não ter sido registada.
+"""
+
+import asyncio
+import os
+import socket
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.crud import bloqueio_calculo as crud_bloqueio
+from app.crud import grafico as crud_grafico
+from app.services import charts as charts_service
+
+CHAVE_BLOQUEIO = "manutencao_graficos"
+TAMANHO_LOTE = 500
+
+
+def _caminho(diretorio: Path, nome: str) -> str:
+    """Caminho tal como fica registado na tabela (ver ImagemEmCache.url)."""
+    return str(diretorio / nome).replace('\\', '/')
+
+
+def _ler_pasta(diretorio: Path) -> Dict[str, Tuple[float, int]]:
+    """nome -> (mtime, tamanho) de cada ficheiro da pasta, com uma única listagem."""
+    ficheiros = {}
+    with os.scandir(diretorio) as entradas:
+        for entrada in entradas:
+            if entrada.is_file(follow_symlinks=False):
+                estado = entrada.stat(follow_symlinks=False)
+                ficheiros[entrada.name] = (estado.st_mtime, estado.st_size)
+    return ficheiros
+
+
+class ManutencaoGraficos:
+    """Passagens de manutenção, com o índice da pasta mantido entre passagens."""
+
+    def __init__(self, *, fabrica_sessao: Callable[[], Session] = SessionLocal):
+        self.fabrica_sessao = fabrica_sessao
+        self._indice: Dict[str, Tuple[float, int]] | None = None
+        self._diretorio_indexado: Path | None = None
+
+    def executar(self, db: Session) -> Dict[str, int]:
+        """Faz uma passagem completa e devolve o que foi removido."""
+        diretorio = Path(charts_service.CHARTS_DIR)
+        if self._diretorio_indexado != diretorio:
+            self._indice, self._diretorio_indexado = None, diretorio
+
+        data_limite = datetime.now(timezone.utc) - timedelta(days=settings.CHARTS_MAX_IDADE_DIAS)
+        relatorio = {"expirados": crud_grafico.apagar_graficos_expirados(db, data_limite, TAMANHO_LOTE)}
+        relatorio.update(self._reconciliar(db, diretorio))
+        return relatorio
+
+    def _reconciliar(self, db: Session, diretorio: Path) -> Dict[str, int]:
+        atual = _ler_pasta(diretorio)
+
+        # Registos cujo ficheiro desapareceu
+        if self._indice is None:
+            sem_ficheiro = [
+                c for c in crud_grafico.iterar_caminhos(db, TAMANHO_LOTE)
+                if (Path(c).name not in atual if Path(c).parent == diretorio else not Path(c).exists())
+            ]
+            novos = list(atual)
+        else:
+            sem_ficheiro = [_caminho(diretorio, nome) for nome in self._indice.keys() - atual.keys()]
+            novos = [nome for nome, estado in atual.items() if self._indice.get(nome) != estado]
+        registos_sem_ficheiro = crud_grafico.apagar_por_caminhos(db, sem_ficheiro, TAMANHO_LOTE)
+
+        # Ficheiros novos desde a última passagem: só estes são procurados na base de dados
+        registados = crud_grafico.caminhos_registados(db, [_caminho(diretorio, nome) for nome in novos], TAMANHO_LOTE)
+        fim_da_carencia = time.time() - settings.CHARTS_ORFAOS_CARENCIA_S
+        ficheiros_orfaos = 0
+        bytes_por_registar = 0
+        pendentes = set()
+        for nome in novos:
+            if _caminho(diretorio, nome) in registados:
+                continue
+            mtime, tamanho = atual[nome]
+            if mtime < fim_da_carencia:
+                (diretorio / nome).unlink(missing_ok=True)
+                del atual[nome]
+                ficheiros_orfaos += 1
+            else:
+                # Ainda na carência: fica fora do índice para ser revisto na próxima passagem
+                pendentes.add(nome)
+                bytes_por_registar += tamanho
+
+        # Orçamento de disco (os ficheiros por registar também ocupam espaço)
+        despejados = crud_grafico.despejar_por_tamanho(db, max(settings.CHARTS_CACHE_MAX_BYTES - bytes_por_registar, 0))
+        if despejados:
+            atual = _ler_pasta(diretorio)
+        self._indice = {nome: estado for nome, estado in atual.items() if nome not in pendentes}
+
+        return {
+            "registos_sem_ficheiro": registos_sem_ficheiro,
+            "ficheiros_orfaos": ficheiros_orfaos,
+            "despejados": despejados,
+            "bytes_em_disco": sum(tamanho for _, tamanho in atual.values()),
+        }
+
+    def executar_agendada(self, intervalo_s: float) -> Dict[str, int] | None:
+        """
+        Passagem agendada: só corre se nenhum outro worker correu uma no último
+        intervalo (o bloqueio não é libertado, expira ao fim de ~intervalo_s).
+        """
+        db = self.fabrica_sessao()
+        try:
+            dono = f"{socket.gethostname()}:{os.getpid()}"
+            if not crud_bloqueio.adquirir_bloqueio(db, CHAVE_BLOQUEIO, dono, intervalo_s * 0.9):
+                return None
+            return self.executar(db)
+        finally:
+            db.close()
+
+
+# --- Instância da aplicação ---
+
+manutencao = ManutencaoGraficos()
+
+
+async def ciclo_periodico(intervalo_s: float) -> None:
+    """Tarefa do arranque da aplicação: uma passagem por intervalo, fora do event loop."""
+    while True:
+        await asyncio.sleep(intervalo_s)
+        try:
+            relatorio = await asyncio.to_thread(manutencao.executar_agendada, intervalo_s)
+            if relatorio:
+                print(f"Manutenção da cache de gráficos: {relatorio}")
+        except Exception as e:
+            print(f"AVISO: falha na manutenção da cache de gráficos: {e}")
@@ -0,0 +1,120 @@
+# app/services/pacote_graficos.py
+"""
+Pacote com todos os gráficos de um regime para um CNPJ e período.
+
+Os dados são preparados uma única vez (uma leitura dos factos de PGDAS partilhada
+pela série mensal e pelos KPIs visuais) e os gráficos são renderizados em paralelo:
+com o pool de renderização ativo, cada imagem em falta vai para um processo
+diferente; as já existentes na cache são servidas sem renderizar.
+"""
+
+import io
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.services import analytics_service
+from app.services import charts as charts_service
+
+# (nome do gráfico, função geradora, chave dos dados preparados). Os nomes são os
+# das rotas individuais; os gráficos do Lucro Presumido que reutilizam os do Simples
+# Nacional apontam diretamente para a função com cache.
+GRAFICOS_POR_REGIME = {
+    "Simples Nacional": [
+        ("faturamento", charts_service.gerar_grafico_sn_faturamento, "serie"),
+        ("receita-crescimento", charts_service.gerar_grafico_sn_receita_crescimento, "serie"),
+        ("impostos-carga", charts_service.gerar_grafico_sn_impostos_carga, "serie"),
+        ("acumulado-anual", charts_service.gerar_grafico_sn_acumulado, "serie"),
+        ("limite-faturamento", charts_service.gerar_grafico_sn_limite_faturamento, "medidor"),
+        ("sublimite-receita", charts_service.gerar_grafico_sn_sublimite_receita, "medidor"),
+        ("segregacao-tributos", charts_service.gerar_grafico_sn_segregacao_tributos, "rosca"),
+    ],
+    "Lucro Presumido (Serviços)": [
+        ("receita-crescimento", charts_service.gerar_grafico_sn_receita_crescimento, "serie"),
+        ("impostos-carga", charts_service.gerar_grafico_sn_impostos_carga, "serie"),
+        ("acumulado", charts_service.gerar_grafico_sn_acumulado, "serie"),
+        ("tributos-detalhado", charts_service.gerar_grafico_lp_tributos_detalhado, "tributos_lp"),
+        ("tributos-ano", charts_service.gerar_grafico_sn_segregacao_tributos, "rosca"),
+        ("limite-faturamento", charts_service.gerar_grafico_lp_limite_faturamento, "medidor_lp"),
+    ],
+}
+
+
+def _tem_dados(dados: Any) -> bool:
+    if dados is None:
+        return False
+    if hasattr(dados, "empty"):
+        return not dados.empty
+    return bool(dados)
+
+
+def preparar_tarefas(db: Session, *, cnpj: str, regime: str, data_inicio: date, data_fim: date) -> Tuple[List[Tuple[str, Any, Any]], List[str]]:
+    """
+    Prepara os dados de todos os gráficos do regime e devolve as tarefas de
+    renderização (nome, função geradora, dados) e os nomes dos gráficos sem dados.
+    """
+    dados = analytics_service.preparar_dados_pacote_graficos(
+        db, cnpj=cnpj, regime=regime, data_inicio=data_inicio, data_fim=data_fim
+    )
+    tarefas = []
+    omitidos = []
+    for nome, gerar, fonte in GRAFICOS_POR_REGIME[regime]:
+        dados_grafico = dados.get(fonte)
+        if nome == "sublimite-receita" and dados_grafico and not dados_grafico.get("sublimite"):
+            dados_grafico = None
+        if _tem_dados(dados_grafico):
+            tarefas.append((nome, gerar, dados_grafico))
+        else:
+            omitidos.append(nome)
+    return tarefas, omitidos
+
+
+def gerar_pacote_graficos(db: Session, *, cnpj: str, regime: str, data_inicio: date, data_fim: date) -> Dict[str, Any]:
+    """
+    Gera (ou obtém da cache) todos os gráficos do regime.
+
+    Retorna o manifesto: a lista de gráficos com o caminho de cada imagem e se veio
+    da cache, e a lista dos gráficos omitidos por falta de dados.
+    """
+    if regime not in GRAFICOS_POR_REGIME:
+        raise ValueError(f"Não há pacote de gráficos para o regime '{regime}'.")
+
+    # 1. Dados de todos os gráficos, preparados uma única vez
+    tarefas, omitidos = preparar_tarefas(db, cnpj=cnpj, regime=regime, data_inicio=data_inicio, data_fim=data_fim)
+    if not tarefas:
+        raise ValueError("Dados insuficientes para gerar os gráficos.")
+
+    # 2. Renderização em paralelo (sem sessão: a Session não é partilhável entre threads)
+    with ThreadPoolExecutor(max_workers=len(tarefas)) as executor:
+        imagens = list(executor.map(lambda tarefa: tarefa[1].renderizar_em_cache(tarefa[2], cnpj), tarefas))
+
+    # 3. Índice de gráficos e despejo, de volta na thread do pedido
+    for imagem in imagens:
+        charts_service.registar_no_indice(db, imagem)
+
+    return {
+        "cnpj": cnpj,
+        "regime": regime,
+        "graficos": [
+            {
+                "grafico": nome,
+                "url": imagem.url_estatica,
+                "caminho_arquivo": imagem.url,
+                "em_cache": not imagem.renderizado,
+            }
+            for (nome, _, _), imagem in zip(tarefas, imagens)
+        ],
+        "omitidos": omitidos,
+    }
+
+
+def compactar_pacote(manifesto: Dict[str, Any]) -> bytes:
+    """ZIP com as imagens do manifesto (guardadas sem recompressão: PNG já é comprimido)."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as arquivo:
+        for grafico in manifesto["graficos"]:
+            arquivo.write(grafico["caminho_arquivo"], arcname=f"{grafico['grafico']}.png")
+    return buffer.getvalue()
@@ -0,0 +1,197 @@
+# app/services/precomputacao.py
+"""
+Pré-cálculo em segundo plano ("write-behind") depois de gravar dados fiscais.
+
+Sem isto, a primeira visita ao dashboard depois de um upload pagava a análise e a
+renderização de todos os gráficos. Quando salvar_dados_fiscais (ou a atualização
+dos dados validados) conclui, a empresa e o ano da competência entram numa fila;
+uma thread de baixa prioridade prepara os dados do pacote do regime e renderiza
+os gráficos para a cache, de modo que o dashboard do ano é servido já quente.
+
+- Os pedidos repetidos da mesma empresa e ano enquanto esperam contam como um só,
+  e cada um só é processado ATRASO_S depois do último agendamento (um upload de
+  vários meses dispara um único pré-cálculo).
+- A thread cede a vez às rotas de gráficos: não renderiza enquanto houver pedidos
+  interativos de gráficos em curso ou em espera (controlo de admissão).
+- Os snapshots de KPIs já são atualizados na própria transação (fato_mensal); aqui
+  só se aquecem a preparação e a cache de imagens.
+
+Sem iniciar() (scripts, testes), agendar() não faz nada.
+"""
+
+import os
+import threading
+import time
+from datetime import date
+from typing import Callable, Dict, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.admissao import controlo_admissao
+from app.core.database import SessionLocal
+from app.crud import empresa as crud_empresa
+from app.services import charts as charts_service
+from app.services import pacote_graficos
+from app.services import renderizador
+
+# Espera máxima por um intervalo sem pedidos interativos antes de renderizar na mesma
+ESPERA_MAX_POR_GRAFICO_S = 30.0
+
+
+class PrecomputacaoPosGravacao:
+    """Fila de (cnpj, ano) a pré-calcular e a thread que a consome."""
+
+    def __init__(self, *, atraso_s: float, fabrica_sessao: Callable[[], Session] = SessionLocal):
+        self.atraso_s = atraso_s
+        self.fabrica_sessao = fabrica_sessao
+        self._pendentes: Dict[Tuple[str, int], float] = {}  # (cnpj, ano) -> instante em que fica pronto
+        self._condicao = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._a_parar = False
+        self._em_curso = False
+        # Métricas
+        self.processados = 0
+        self.graficos_renderizados = 0
+        self.falhas = 0
+
+    # --- Produtor ---
+
+    def agendar(self, cnpj: str, competencia: date | None) -> None:
+        if not cnpj or competencia is None:
+            return
+        with self._condicao:
+            self._pendentes[(cnpj, competencia.year)] = time.monotonic() + self.atraso_s
+            self._condicao.notify()
+
+    # --- Consumidor ---
+
+    def iniciar(self) -> None:
+        if self._thread is not None:
+            return
+        self._a_parar = False
+        self._thread = threading.Thread(target=self._ciclo, name="precomputacao", daemon=True)
+        self._thread.start()
+
+    def parar(self, timeout: float | None = 5) -> None:
+        with self._condicao:
+            self._a_parar = True
+            self._condicao.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def aguardar_ociosa(self, timeout: float) -> bool:
+        """Espera até a fila ficar vazia e nada estar em curso (útil em testes e scripts)."""
+        limite = time.monotonic() + timeout
+        with self._condicao:
+            while self._pendentes or self._em_curso:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    return False
+                self._condicao.wait(restante)
+        return True
+
+    def _proximo(self) -> Tuple[str, int] | None:
+        """Bloqueia até haver uma empresa pronta a processar (ou até parar)."""
+        with self._condicao:
+            while not self._a_parar:
+                agora = time.monotonic()
+                prontos = [(instante, chave) for chave, instante in self._pendentes.items() if instante <= agora]
+                if prontos:
+                    _, chave = min(prontos)
+                    del self._pendentes[chave]
+                    self._em_curso = True
+                    return chave
+                proximo = min(self._pendentes.values(), default=None)
+                self._condicao.wait(None if proximo is None else proximo - agora)
+        return None
+
+    def _ciclo(self) -> None:
+        _baixar_prioridade()
+        while (chave := self._proximo()) is not None:
+            try:
+                self.processar(*chave)
+            except Exception as e:
+                self.falhas += 1
+                print(f"AVISO: falha no pré-cálculo dos gráficos de {chave[0]} ({chave[1]}): {e}")
+            finally:
+                with self._condicao:
+                    self._em_curso = False
+                    self._condicao.notify_all()
+
+    def processar(self, cnpj: str, ano: int) -> int:
+        """Prepara e renderiza para a cache os gráficos do ano da empresa. Retorna quantos renderizou."""
+        db = self.fabrica_sessao()
+        try:
+            empresa = crud_empresa.get_empresa_por_cnpj(db, cnpj)
+            regime = empresa.regime_tributario if empresa else None
+            if regime not in pacote_graficos.GRAFICOS_POR_REGIME:
+                return 0
+
+            tarefas, _ = pacote_graficos.preparar_tarefas(
+                db, cnpj=cnpj, regime=regime, data_inicio=date(ano, 1, 1), data_fim=date(ano, 12, 31)
+            )
+            renderizados = 0
+            for _, gerar, dados in tarefas:
+                _esperar_vez()
+                imagem = _renderizar_com_paciencia(gerar, dados, cnpj, db)
+                charts_service.registar_no_indice(db, imagem)
+                renderizados += imagem.renderizado
+            self.processados += 1
+            self.graficos_renderizados += renderizados
+            return renderizados
+        finally:
+            db.close()
+
+
+def _baixar_prioridade() -> None:
+    """Baixa a prioridade de escalonamento desta thread (Linux: nice por thread)."""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+    except (AttributeError, OSError):
+        pass
+
+
+def _esperar_vez() -> None:
+    """Cede a vez enquanto houver pedidos interativos de gráficos em curso ou em espera."""
+    graficos = controlo_admissao.classes.get("graficos")
+    limite = time.monotonic() + ESPERA_MAX_POR_GRAFICO_S
+    while graficos is not None and (graficos.em_execucao or graficos.em_espera) and time.monotonic() < limite:
+        time.sleep(0.2)
+
+
+def _renderizar_com_paciencia(gerar, dados, cnpj: str, db: Session, tentativas: int = 3):
+    """Com a fila do pool cheia, o pré-cálculo espera e tenta de novo em vez de competir."""
+    for tentativa in range(tentativas):
+        try:
+            return gerar.renderizar_em_cache(dados, cnpj, db=db)
+        except renderizador.FilaCheiaError:
+            if tentativa == tentativas - 1:
+                raise
+            time.sleep(1.0 * (tentativa + 1))
+
+
+# --- Instância da aplicação ---
+
+precomputacao: PrecomputacaoPosGravacao | None = None
+
+
+def iniciar_precomputacao(*, atraso_s: float, fabrica_sessao: Callable[[], Session] = SessionLocal) -> PrecomputacaoPosGravacao:
+    global precomputacao
+    if precomputacao is None:
+        precomputacao = PrecomputacaoPosGravacao(atraso_s=atraso_s, fabrica_sessao=fabrica_sessao)
+    precomputacao.iniciar()
+    return precomputacao
+
+
+def parar_precomputacao() -> None:
+    global precomputacao
+    if precomputacao is not None:
+        precomputacao.parar()
+        precomputacao = None
+
+
+def agendar(cnpj: str, competencia: date | None) -> None:
+    """Agenda o pré-cálculo da empresa e ano (sem efeito se a thread não foi iniciada)."""
+    if precomputacao is not None:
+        precomputacao.agendar(cnpj, competencia)
@@ -17,6 +17,8 @@ import re
 import xmltodict
 import pandas as pd
 
+from app.core.moeda import converter_decimal
+
 
 
 
@@ -48,19 +50,6 @@ def _ler_texto_pdf(caminho: Path) -> str:
     return "\n".join(texto)
 
 
-def _limpar_valor_monetario(valor_str: str) -> Optional[Decimal]:
-    if valor_str is None:
-        return None
-    s = str(valor_str)
-    # remove R$, pontos de milhar e espaços
-    s = re.sub(r"[R\$\s]", "", s)
-    s = s.replace(".", "").replace(",", ".")
-    try:
-        return Decimal(s)
-    except (InvalidOperation, ValueError):
-        return None
-
-
 def _extrair_por_regex(pattern: str, texto: str, flags: int = re.IGNORECASE | re.MULTILINE) -> Optional[str]:
     m = re.search(pattern, texto, flags)
     return m.group(1).strip() if m else None
@@ -68,7 +57,7 @@ def _extrair_por_regex(pattern: str, texto: str, flags: int = re.IGNORECASE | re
 
 def _extrair_valor(pattern: str, texto: str) -> Optional[Decimal]:
     g = _extrair_por_regex(pattern, texto)
-    return _limpar_valor_monetario(g) if g is not None else None
+    return converter_decimal(g) if g is not None else None
 
 
 def _extrair_int(pattern: str, texto: str) -> Optional[int]:
@@ -153,19 +142,8 @@ def _extrair_valor(padrao: str, texto: str, multi_linha: bool = False) -> Decima
     # Assume que o valor está no primeiro grupo de captura da regex
     valor_str = match.group(1)
     
-    # Reutiliza a função de conversão que já temos para limpar e converter o valor
-    return _converter_valor(valor_str)
-
-def _converter_valor(valor_str: Any) -> Decimal | None:
-    """Converte uma string de valor (ex: 'R$ 1.234,56') para um objeto Decimal."""
-    if valor_str is None:
-        return None
-    try:
-        # Lógica corrigida: remove "R$", espaços, depois os pontos de milhar, e finalmente troca a vírgula decimal por ponto.
-        limpo = str(valor_str).replace("R$", "").strip().replace(".", "").replace(",", ".")
-        return Decimal(limpo)
-    except (TypeError, InvalidOperation):
-        return None
+    # Usa a regra monetária partilhada (app/core/moeda.py) para limpar e converter o valor
+    return converter_decimal(valor_str)
 
 def _extrair_texto(padrao: str, texto: str) -> str | None:
     match = re.search(padrao, texto, re.IGNORECASE | re.MULTILINE)
@@ -350,10 +328,10 @@ def processar_efd_contribuicoes_pdf(caminho_arquivo: Path) -> Dict[str, Any]:
     cofins_debito_str = match_debitos.group(2) if match_debitos else "0.00"
 
     # Se não encontrou créditos/débitos, tenta extrair faturamento total
-    pis_credito = _converter_valor(pis_credito_str)
-    cofins_credito = _converter_valor(cofins_credito_str)
-    pis_debito = _converter_valor(pis_debito_str)
-    cofins_debito = _converter_valor(cofins_debito_str)
+    pis_credito = converter_decimal(pis_credito_str)
+    cofins_credito = converter_decimal(cofins_credito_str)
+    pis_debito = converter_decimal(pis_debito_str)
+    cofins_debito = converter_decimal(cofins_debito_str)
 
     # --- Montar o dicionário de resultados ---
     dados = {
@@ -438,7 +416,7 @@ def processar_pgdas_pdf(caminho_arquivo: Path) -> Dict[str, Any]:
     
     if match_tributos:
         valores = match_tributos.groups()
-        irpj, csll, cofins, pis_pasep, inss_cpp, icms, ipi, iss, total_tributos = map(_converter_valor, valores)
+        irpj, csll, cofins, pis_pasep, inss_cpp, icms, ipi, iss, total_tributos = map(converter_decimal, valores)
     else:
         irpj, csll, cofins, pis_pasep, inss_cpp, icms, ipi, iss, total_tributos = [None] * 9
 
@@ -448,7 +426,7 @@ def processar_pgdas_pdf(caminho_arquivo: Path) -> Dict[str, Any]:
     if fator_r_texto:
         # Limpa a string (remove '%') antes de converter
         valor_sem_percentagem = fator_r_texto.replace("%", "").strip()
-        fator_decimal = _converter_valor(valor_sem_percentagem)
+        fator_decimal = converter_decimal(valor_sem_percentagem)
         
         # Normaliza para um valor percentual (ex: 28.5 -> 0.285)
         if fator_decimal is not None:
@@ -635,10 +613,10 @@ def processar_relatorio_saidas(caminho_arquivo: Path, cfops_nao_incidentes: Opti
 
     # normaliza faturamento/valor
     if "Faturamento" in df.columns and df["Faturamento"].notna().any():
-        df["Faturamento"] = df["Faturamento"].map(lambda v: _limpar_valor_monetario(str(v)) if pd.notna(v) else None)
+        df["Faturamento"] = df["Faturamento"].map(lambda v: converter_decimal(v) if pd.notna(v) else None)
     elif "Valor" in df.columns:
         df = df.rename(columns={"Valor": "Faturamento"})
-        df["Faturamento"] = df["Faturamento"].map(lambda v: _limpar_valor_monetario(str(v)) if pd.notna(v) else None)
+        df["Faturamento"] = df["Faturamento"].map(lambda v: converter_decimal(v) if pd.notna(v) else None)
     else:
         df["Faturamento"] = None
 
@@ -690,7 +668,7 @@ def processar_relatorio_entradas(caminho_arquivo: Path) -> Dict[str, Any]:
 
     registros = []
     for cfop, uf, valor_str in linhas_tabela:
-        valor_decimal = _converter_valor(valor_str)
+        valor_decimal = converter_decimal(valor_str)
         if valor_decimal is not None:
             registros.append({
                 "CFOP": cfop.replace("-", "."),
@@ -0,0 +1,204 @@
+# app/services/relatorios_lote.py
+"""
+Geração dos relatórios mensais de toda a carteira (fecho do mês).
+
+As empresas são agrupadas por regime tributário e os factos mensais de todas elas
+são pré-carregados numa única consulta. Os relatórios são depois calculados num
+pool de processos, com funções puras (montar_relatorio_*) que não acedem à base de
+dados. O resultado é um único artefacto JSON-lines (ou Parquet), uma linha por
+empresa, com o tempo de cálculo de cada uma e, opcionalmente, o resumo em texto
+dos KPIs (pedido ao resumidor num único lote).
+"""
+
+import json
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List, Tuple
+
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.crud import fato_mensal as crud_fato_mensal
+from app.models.empresa import Empresa
+from app.services import analytics_service
+from app.services import resumidor
+
+# Parquet é opcional: só disponível com pyarrow instalado
+try:
+    import pyarrow  # type: ignore  # noqa: F401
+except Exception:  # pragma: no cover - ambiente sem pyarrow
+    pyarrow = None
+
+GERADORES_POR_REGIME = {
+    "Simples Nacional": analytics_service.montar_relatorio_simples_nacional,
+    "Lucro Presumido (Serviços)": analytics_service.montar_relatorio_lucro_presumido_servicos,
+}
+
+FORMATOS_SUPORTADOS = ("jsonl", "parquet")
+
+PASTA_RELATORIOS = settings.BASE_DIR / "data" / "relatorios"
+
+# Campos da tabela de factos de que os relatórios precisam (enviados aos processos)
+_CAMPOS_FATO = [
+    "cnpj", "competencia", "tipo_documento", "faturamento", "total_tributos", "qtd_nfse_emitidas",
+    "detalhe_impostos", "faturamento_acumulado_ano", "tributos_acumulado_ano", "faturamento_12m", "tributos_12m",
+]
+
+EmpresaComFactos = Tuple[str, List[SimpleNamespace]]
+
+
+def _copiar_fato(fato) -> SimpleNamespace:
+    """Cópia leve (e serializável) de uma linha de factos, com os mesmos atributos."""
+    return SimpleNamespace(**{campo: getattr(fato, campo) for campo in _CAMPOS_FATO})
+
+
+def _processar_grupo(regime: str, data_competencia: date, empresas: List[EmpresaComFactos]) -> List[Dict[str, Any]]:
+    """
+    Calcula os relatórios de um lote de empresas do mesmo regime. Corre num processo
+    do pool, por isso só recebe dados já carregados.
+    """
+    gerador = GERADORES_POR_REGIME[regime]
+    resultados = []
+    for cnpj, linhas in empresas:
+        inicio = time.perf_counter()
+        try:
+            relatorio = gerador(linhas, data_competencia)
+            erro = relatorio.pop("erro", None) if isinstance(relatorio, dict) else None
+        except Exception as e:  # Uma empresa com dados inconsistentes não trava o lote
+            relatorio, erro = None, f"{type(e).__name__}: {e}"
+        resultados.append({
+            "cnpj": cnpj,
+            "regime": regime,
+            "competencia": data_competencia.isoformat(),
+            "estado": "erro" if erro else "ok",
+            "erro": erro,
+            "relatorio": None if erro else relatorio,
+            "duracao_ms": round((time.perf_counter() - inicio) * 1000, 3),
+        })
+    return resultados
+
+
+def _dividir(itens: list, tamanho: int) -> List[list]:
+    return [itens[i:i + tamanho] for i in range(0, len(itens), tamanho)]
+
+
+def _escrever_artefacto(resultados: List[Dict[str, Any]], destino: Path, formato: str) -> None:
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    if formato == "jsonl":
+        with open(destino, "w", encoding="utf-8") as f:
+            for linha in resultados:
+                f.write(json.dumps(linha, ensure_ascii=False, default=str) + "\n")
+    else:
+        # Parquet é colunar: o relatório (aninhado) vai como texto JSON
+        df = pd.DataFrame([
+            {**linha, "relatorio": json.dumps(linha["relatorio"], ensure_ascii=False, default=str)}
+            for linha in resultados
+        ])
+        df.to_parquet(destino, index=False)
+
+
+def gerar_relatorios_em_lote(
+    db: Session,
+    *,
+    data_competencia: date,
+    cnpjs: list[str] | None = None,
+    formato: str = "jsonl",
+    destino: Path | None = None,
+    processos: int | None = None,
+    tamanho_lote: int = 25,
+    resumos: bool = False,
+) -> Dict[str, Any]:
+    """
+    Gera os relatórios mensais de várias empresas (ou de todas as ativas) num único artefacto.
+
+    - processos: número de processos do pool (por omissão, o número de CPUs);
+      0 ou 1 calcula tudo no processo atual.
+    - tamanho_lote: empresas enviadas a cada tarefa do pool (amortiza a serialização).
+    - resumos: acrescenta a cada relatório calculado o resumo em texto dos KPIs.
+
+    Retorna um resumo com o caminho do artefacto, contagens e tempos.
+    """
+    if formato not in FORMATOS_SUPORTADOS:
+        raise ValueError(f"Formato '{formato}' não suportado. Use um de: {', '.join(FORMATOS_SUPORTADOS)}.")
+    if formato == "parquet" and pyarrow is None:
+        raise ValueError("O formato Parquet requer o pacote 'pyarrow'.")
+
+    inicio_total = time.perf_counter()
+    data_competencia = data_competencia.replace(day=1)
+
+    # 1. Empresas agrupadas por regime
+    query = db.query(Empresa.cnpj, Empresa.regime_tributario)
+    query = query.filter(Empresa.cnpj.in_(cnpjs)) if cnpjs else query.filter(Empresa.ativa.isnot(False))
+    por_regime: Dict[str, List[str]] = defaultdict(list)
+    for cnpj, regime in query.order_by(Empresa.cnpj).all():
+        por_regime[regime].append(cnpj)
+
+    # 2. Pré-carregamento dos factos de todas as empresas numa única consulta
+    data_inicio, data_fim = analytics_service.janela_relatorio_mensal(data_competencia)
+    todos_cnpjs = [cnpj for lista in por_regime.values() for cnpj in lista]
+    fatos_por_cnpj: Dict[str, List[SimpleNamespace]] = defaultdict(list)
+    for fato in crud_fato_mensal.obter_fatos_de_empresas(db, cnpjs=todos_cnpjs, data_inicio=data_inicio, data_fim=data_fim):
+        fatos_por_cnpj[fato.cnpj].append(_copiar_fato(fato))
+    tempo_carga = time.perf_counter() - inicio_total
+
+    # 3. Tarefas por regime; regimes sem relatório ficam registados como erro
+    resultados: List[Dict[str, Any]] = []
+    tarefas = []
+    for regime, lista_cnpjs in por_regime.items():
+        if regime not in GERADORES_POR_REGIME:
+            resultados.extend(
+                {"cnpj": cnpj, "regime": regime, "competencia": data_competencia.isoformat(), "estado": "erro",
+                 "erro": "Relatório não disponível para o regime.", "relatorio": None, "duracao_ms": 0.0}
+                for cnpj in lista_cnpjs
+            )
+            continue
+        tipos = analytics_service.GRUPOS_POR_REGIME.get(regime, [])
+        empresas = [
+            (cnpj, [f for f in fatos_por_cnpj.get(cnpj, []) if f.tipo_documento in tipos])
+            for cnpj in lista_cnpjs
+        ]
+        tarefas.extend((regime, data_competencia, lote) for lote in _dividir(empresas, tamanho_lote))
+
+    # 4. Cálculo (pool de processos ou no próprio processo)
+    if processos is None:
+        processos = os.cpu_count() or 1
+    if processos <= 1 or len(tarefas) <= 1:
+        for tarefa in tarefas:
+            resultados.extend(_processar_grupo(*tarefa))
+    else:
+        with ProcessPoolExecutor(max_workers=min(processos, len(tarefas))) as pool:
+            for parcial in pool.map(_processar_grupo, *zip(*tarefas)):
+                resultados.extend(parcial)
+    resultados.sort(key=lambda linha: linha["cnpj"])
+
+    # 4b. Resumos de todas as empresas numa única submissão (os que estão em cache não saem)
+    if resumos:
+        calculados = [linha for linha in resultados if linha["estado"] == "ok"]
+        textos = resumidor.resumir_lote(
+            resumidor.PedidoResumo(regime=linha["regime"], competencia=data_competencia, kpis=linha["relatorio"])
+            for linha in calculados
+        )
+        for linha, texto in zip(calculados, textos):
+            linha["resumo"] = texto
+
+    # 5. Artefacto único
+    if destino is None:
+        carimbo = datetime.now().strftime("%Y%m%d%H%M%S")
+        destino = PASTA_RELATORIOS / f"relatorios_{data_competencia:%Y-%m}_{carimbo}.{formato}"
+    _escrever_artefacto(resultados, destino, formato)
+
+    return {
+        "destino": str(destino),
+        "competencia": data_competencia.isoformat(),
+        "empresas": len(resultados),
+        "ok": sum(1 for linha in resultados if linha["estado"] == "ok"),
+        "erros": sum(1 for linha in resultados if linha["estado"] == "erro"),
+        "tempo_carga_s": round(tempo_carga, 3),
+        "tempo_total_s": round(time.perf_counter() - inicio_total, 3),
+    }
@@ -0,0 +1,185 @@
+# app/services/renderizador.py
+"""
+Serviço de renderização de gráficos.
+
+O kaleido arranca um subprocesso (com Chromium) na primeira imagem de cada processo,
+e essa primeira chamada custa cerca de um segundo. Este módulo mantém um pool fixo de
+processos com o kaleido já aquecido: os pedidos entram numa fila limitada, podem ser
+enviados em lote e cada renderização tem um tempo máximo. A figura viaja como
+dicionário (to_plotly_json) e o processo devolve os bytes da imagem.
+
+Sem pool iniciado (scripts, testes), renderiza-se no próprio processo.
+
+Há dois backends: "kaleido" (o renderizador oficial do Plotly) e "matplotlib"
+(renderizador_mpl: Agg, sem Chromium, mais leve em memória e no arranque).
+"""
+
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+from typing import Any, Dict, List
+
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from app.services import renderizador_mpl
+
+BACKENDS = ("kaleido", "matplotlib")
+
+
+class FilaCheiaError(RuntimeError):
+    """A fila de renderização está cheia; o pedido deve ser repetido mais tarde."""
+
+
+class TempoEsgotadoError(TimeoutError):
+    """A renderização excedeu o tempo máximo."""
+
+
+# --- Funções executadas nos processos do pool ---
+
+def _aquecer(backend: str = "kaleido") -> None:
+    """Renderiza uma imagem mínima para carregar o backend (no kaleido, arranca o subprocesso)."""
+    _renderizar({"data": [], "layout": {}}, "png", 10, 10, 1, backend)
+
+
+def _renderizar(figura: Dict[str, Any], formato: str, largura: int, altura: int, escala: float, backend: str = "kaleido") -> bytes:
+    if backend == "matplotlib":
+        return renderizador_mpl.renderizar_figura(figura, formato, largura, altura, escala)
+    if backend != "kaleido":
+        raise ValueError(f"Backend de renderização desconhecido: '{backend}'.")
+    return pio.to_image(figura, format=formato, width=largura, height=altura, scale=escala)
+
+
+# --- Pool ---
+
+class PoolRenderizacao:
+    """
+    Pool fixo de processos de renderização com fila limitada.
+
+    - workers: processos (cada um com o backend já carregado);
+    - tamanho_fila: pedidos aceites além dos que estão a ser renderizados; acima
+      disso, submeter() falha de imediato com FilaCheiaError;
+    - timeout_s: tempo máximo de espera por cada imagem.
+    """
+
+    def __init__(self, *, workers: int, tamanho_fila: int, timeout_s: float, backend: str = "kaleido"):
+        self.workers = workers
+        self.backend = backend
+        self.timeout_s = timeout_s
+        self._vagas = threading.BoundedSemaphore(workers + tamanho_fila)
+        self._executor: ProcessPoolExecutor | None = None
+
+    @property
+    def ativo(self) -> bool:
+        return self._executor is not None
+
+    def iniciar(self) -> None:
+        """Arranca os processos e espera que todos tenham o backend aquecido."""
+        if self._executor is not None:
+            return
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_aquecer,
+            initargs=(self.backend,),
+        )
+        # Uma tarefa por processo, submetidas de seguida, obriga o pool a criá-los todos já
+        aquecimentos = [self._executor.submit(_aquecer, self.backend) for _ in range(self.workers)]
+        for futuro in aquecimentos:
+            futuro.result()
+
+    def parar(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def submeter(self, figura: go.Figure | Dict[str, Any], *, formato: str = "png", largura: int, altura: int, escala: float = 2) -> Future:
+        """Coloca uma renderização na fila e devolve o Future com os bytes da imagem."""
+        if self._executor is None:
+            raise RuntimeError("O pool de renderização não foi iniciado.")
+        if not self._vagas.acquire(blocking=False):
+            raise FilaCheiaError("A fila de renderização de gráficos está cheia.")
+        if isinstance(figura, go.Figure):
+            figura = figura.to_plotly_json()
+        try:
+            futuro = self._executor.submit(_renderizar, figura, formato, largura, altura, escala, self.backend)
+        except Exception:
+            self._vagas.release()
+            raise
+        futuro.add_done_callback(lambda _: self._vagas.release())
+        return futuro
+
+    def _aguardar(self, futuro: Future) -> bytes:
+        try:
+            return futuro.result(timeout=self.timeout_s)
+        except FuturesTimeoutError:
+            futuro.cancel()  # Só tem efeito se ainda estiver na fila
+            raise TempoEsgotadoError(f"A renderização excedeu {self.timeout_s:g} s.") from None
+
+    def renderizar(self, figura: go.Figure | Dict[str, Any], **opcoes) -> bytes:
+        """Submete uma figura e espera pelo resultado (no máximo timeout_s)."""
+        return self._aguardar(self.submeter(figura, **opcoes))
+
+    def renderizar_lote(self, pedidos: List[Dict[str, Any]]) -> List[bytes]:
+        """
+        Submete várias figuras de uma vez (cada pedido tem 'figura' e as opções de
+        submeter()) e devolve as imagens pela mesma ordem. Se a fila não tiver vagas
+        para o lote inteiro, os pedidos já aceites são cancelados.
+        """
+        futuros: List[Future] = []
+        try:
+            for pedido in pedidos:
+                opcoes = {chave: valor for chave, valor in pedido.items() if chave != "figura"}
+                futuros.append(self.submeter(pedido["figura"], **opcoes))
+        except FilaCheiaError:
+            for futuro in futuros:
+                futuro.cancel()
+            raise
+        return [self._aguardar(futuro) for futuro in futuros]
+
+    async def renderizar_async(self, figura: go.Figure | Dict[str, Any], **opcoes) -> bytes:
+        """Versão para código assíncrono: espera sem bloquear o event loop."""
+        futuro = self.submeter(figura, **opcoes)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(futuro), timeout=self.timeout_s)
+        except asyncio.TimeoutError:
+            futuro.cancel()
+            raise TempoEsgotadoError(f"A renderização excedeu {self.timeout_s:g} s.") from None
+
+
+# --- Instância da aplicação ---
+
+pool_renderizacao: PoolRenderizacao | None = None
+
+
+def iniciar_pool(*, workers: int, tamanho_fila: int, timeout_s: float, backend: str = "kaleido") -> PoolRenderizacao | None:
+    """Cria e aquece o pool da aplicação (chamado no arranque). Com workers=0 não há pool."""
+    global pool_renderizacao
+    if workers <= 0:
+        return None
+    if pool_renderizacao is None:
+        pool_renderizacao = PoolRenderizacao(
+            workers=workers, tamanho_fila=tamanho_fila, timeout_s=timeout_s, backend=backend
+        )
+    pool_renderizacao.iniciar()
+    return pool_renderizacao
+
+
+def parar_pool() -> None:
+    global pool_renderizacao
+    if pool_renderizacao is not None:
+        pool_renderizacao.parar()
+        pool_renderizacao = None
+
+
+def renderizar_imagem(figura: go.Figure, *, formato: str = "png", largura: int, altura: int, escala: float = 2, backend: str = "kaleido") -> bytes:
+    """
+    Renderiza no pool quando está ativo (com o backend do pool); caso contrário, no
+    próprio processo com o backend indicado.
+    """
+    if pool_renderizacao is not None and pool_renderizacao.ativo:
+        return pool_renderizacao.renderizar(figura, formato=formato, largura=largura, altura=altura, escala=escala)
+    if backend == "matplotlib":
+        return renderizador_mpl.renderizar_figura(figura.to_plotly_json(), formato, largura, altura, escala)
+    return figura.to_image(format=formato, width=largura, height=altura, scale=escala)
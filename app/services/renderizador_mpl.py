@@ -0,0 +1,300 @@
+# app/services/renderizador_mpl.py
+"""
+Backend de renderização sem navegador, com o Agg do matplotlib.
+
+Desenha diretamente para PNG, SVG ou WebP as figuras de charts.py a partir da sua
+especificação Plotly (to_plotly_json), sem Chromium: só os tipos de traço que os
+nossos gráficos usam são suportados (barras, linhas, tabela, medidor e rosca),
+com os domínios dos subplots, o eixo y secundário e as cores definidas na figura.
+A figura continua a ser definida uma única vez, em Plotly.
+
+O matplotlib é opcional: só é preciso quando CHARTS_RENDER_BACKEND = "matplotlib".
+"""
+
+import io
+import math
+import re
+from typing import Any, Dict, List
+
+import numpy as np
+
+try:
+    import matplotlib
+    matplotlib.use("Agg")
+    from matplotlib.figure import Figure
+    from matplotlib.patches import Wedge
+except Exception:  # pragma: no cover - ambiente sem matplotlib
+    matplotlib = None
+
+FORMATOS_SUPORTADOS = ("png", "svg", "webp")
+
+_RGBA = re.compile(r"rgba?\(([^)]*)\)")
+
+
+def disponivel() -> bool:
+    return matplotlib is not None
+
+
+def _cor(valor: Any, padrao: Any = None) -> Any:
+    """Converte uma cor Plotly ('#hex', nome CSS, 'rgb(...)', 'rgba(...)') para o matplotlib."""
+    if valor is None:
+        return padrao
+    if isinstance(valor, str):
+        encontrado = _RGBA.fullmatch(valor.replace(" ", ""))
+        if encontrado:
+            partes = [float(p) for p in encontrado.group(1).split(",")]
+            alfa = partes[3] if len(partes) == 4 else 1.0
+            return (partes[0] / 255, partes[1] / 255, partes[2] / 255, alfa)
+    return valor
+
+
+def _texto(valor: Any) -> str:
+    """Texto de um título/rótulo Plotly: '<br>' passa a quebra de linha e '$' não abre mathtext."""
+    if isinstance(valor, dict):
+        valor = valor.get("text")
+    return re.sub(r"<br\s*/?>", "\n", str(valor if valor is not None else "")).replace("$", r"\$")
+
+
+def _lista(valores: Any) -> list:
+    if valores is None:
+        return []
+    return list(np.asarray(valores).tolist()) if not isinstance(valores, list) else valores
+
+
+def _numeros(valores: Any) -> np.ndarray:
+    return np.array([np.nan if v is None else float(v) for v in _lista(valores)], dtype=float)
+
+
+def _fundir(base: Dict[str, Any], extra: Dict[str, Any]) -> Dict[str, Any]:
+    fundido = dict(base)
+    for chave, valor in extra.items():
+        fundido[chave] = _fundir(base[chave], valor) if isinstance(valor, dict) and isinstance(base.get(chave), dict) else valor
+    return fundido
+
+
+def _aplicar_template(figura: Dict[str, Any]) -> tuple:
+    """
+    Layout e traços com os valores por omissão do template da figura (layout.template)
+    por baixo dos explícitos, como faz o plotly.js (p. ex. o estilo das tabelas).
+    """
+    layout = figura.get("layout") or {}
+    tracos = figura.get("data") or []
+    template = layout.get("template")
+    if not isinstance(template, dict):
+        return layout, tracos
+    por_tipo = template.get("data") or {}
+    layout = _fundir(template.get("layout") or {}, {k: v for k, v in layout.items() if k != "template"})
+    tracos = [_fundir((por_tipo.get(t.get("type")) or [{}])[0], t) for t in tracos]
+    return layout, tracos
+
+
+def _cor_do_traco(traco: Dict[str, Any]) -> Any:
+    return _cor((traco.get("marker") or {}).get("color") or (traco.get("line") or {}).get("color"))
+
+
+# --- Eixos cartesianos (barras e linhas) ---
+
+def _nome_eixo(referencia: str) -> str:
+    """'x' -> 'xaxis', 'y2' -> 'yaxis2'."""
+    return f"{referencia[0]}axis{referencia[1:]}"
+
+
+def _desenhar_cartesianos(fig, layout: Dict[str, Any], tracos: List[Dict[str, Any]], cor_texto: Any) -> list:
+    """Desenha barras e linhas nos eixos dos subplots; devolve os artistas para a legenda."""
+    eixos: Dict[str, Any] = {}
+    legenda = []
+
+    def obter_eixos(ref_x: str, ref_y: str):
+        if ref_y in eixos:
+            return eixos[ref_y]
+        config_y = layout.get(_nome_eixo(ref_y), {})
+        sobreposto = config_y.get("overlaying")
+        if sobreposto:
+            base = obter_eixos(ref_x, sobreposto)
+            ax = base.twinx()
+        else:
+            x0, x1 = layout.get(_nome_eixo(ref_x), {}).get("domain", [0, 1])
+            y0, y1 = config_y.get("domain", [0, 1])
+            # Margens semelhantes às do Plotly (título em cima, rótulos à esquerda)
+            ax = fig.add_axes([0.08 + x0 * 0.86, 0.08 + y0 * 0.8, (x1 - x0) * 0.86, (y1 - y0) * 0.8])
+        ax.set_facecolor("none")
+        ax.tick_params(colors=cor_texto, labelsize=8)
+        for borda in ax.spines.values():
+            borda.set_color(cor_texto)
+        titulo = _texto(config_y.get("title"))
+        if titulo:
+            ax.set_ylabel(titulo, color=cor_texto)
+        eixos[ref_y] = ax
+        return ax
+
+    barras = [t for t in tracos if t["type"] == "bar"]
+    empilhar = layout.get("barmode") == "stack"
+    categorias: Dict[str, int] = {}
+    for traco in tracos:
+        for x in _lista(traco.get("x")):
+            categorias.setdefault(str(x), len(categorias))
+
+    bases: Dict[str, np.ndarray] = {}
+    largura_barra = 0.8 if empilhar or len(barras) <= 1 else 0.8 / len(barras)
+    for traco in tracos:
+        ax = obter_eixos(traco.get("xaxis", "x"), traco.get("yaxis", "y"))
+        posicoes = np.array([categorias[str(x)] for x in _lista(traco.get("x"))], dtype=float)
+        y = _numeros(traco.get("y"))
+        cor = _cor_do_traco(traco)
+        nome = _texto(traco.get("name")) or None
+
+        if traco["type"] == "bar":
+            indice = barras.index(traco)
+            deslocamento = 0 if empilhar or len(barras) <= 1 else (indice - (len(barras) - 1) / 2) * largura_barra
+            base = bases.get(traco.get("yaxis", "y"), np.zeros(len(categorias)))[posicoes.astype(int)] if empilhar else 0
+            artista = ax.bar(posicoes + deslocamento, np.nan_to_num(y), largura_barra, bottom=base, color=cor, label=nome)
+            if empilhar:
+                acumulado = bases.setdefault(traco.get("yaxis", "y"), np.zeros(len(categorias)))
+                acumulado[posicoes.astype(int)] += np.nan_to_num(y)
+            textos = _lista(traco.get("text"))
+            if textos:
+                ax.bar_label(artista, labels=[_texto(t) for t in textos], fontsize=7, color=cor_texto,
+                             label_type="center" if traco.get("textposition") == "inside" else "edge")
+        else:
+            modo = traco.get("mode", "lines")
+            linha = traco.get("line") or {}
+            (artista,) = ax.plot(posicoes, y, color=cor, linewidth=linha.get("width", 2),
+                                 marker="o" if "markers" in modo else None,
+                                 linestyle="-" if "lines" in modo else "none", label=nome)
+        legenda.append(artista)
+
+    for ax in eixos.values():
+        ax.set_xticks(range(len(categorias)))
+        ax.set_xticklabels([_texto(c) for c in categorias], rotation=45 if len(categorias) > 8 else 0, ha="right" if len(categorias) > 8 else "center")
+    return legenda
+
+
+# --- Tabela ---
+
+def _desenhar_tabela(fig, traco: Dict[str, Any]) -> None:
+    dominio = traco.get("domain") or {}
+    x0, x1 = dominio.get("x", [0, 1])
+    y0, y1 = dominio.get("y", [0, 1])
+    ax = fig.add_axes([0.08 + x0 * 0.86, 0.02 + y0 * 0.86, (x1 - x0) * 0.86, (y1 - y0) * 0.86])
+    ax.axis("off")
+
+    cabecalho = traco.get("header") or {}
+    celulas = traco.get("cells") or {}
+    colunas = [_lista(coluna) for coluna in _lista(celulas.get("values"))]
+    linhas = [list(map(_texto, linha)) for linha in zip(*colunas)] if colunas else []
+    if not linhas:
+        return
+    tabela = ax.table(cellText=linhas, colLabels=[_texto(v) for v in _lista(cabecalho.get("values"))],
+                      bbox=[0, 0, 1, 1], cellLoc="center")
+    tabela.auto_set_font_size(False)
+    tabela.set_fontsize((celulas.get("font") or {}).get("size", 10) * 0.8)
+    cor_cabecalho = _cor((cabecalho.get("fill") or {}).get("color"), "white")
+    cor_celulas = _cor((celulas.get("fill") or {}).get("color"), "white")
+    for (linha, _), celula in tabela.get_celld().items():
+        celula.set_facecolor(cor_cabecalho if linha == 0 else cor_celulas)
+        fonte = (cabecalho if linha == 0 else celulas).get("font") or {}
+        celula.get_text().set_color(_cor(fonte.get("color"), "black"))
+
+
+# --- Medidor (Indicator) ---
+
+def _formatar_numero(valor: float, numero: Dict[str, Any]) -> str:
+    formato = numero.get("valueformat", "")
+    casas = int(re.search(r"\.(\d+)f", formato).group(1)) if re.search(r"\.(\d+)f", formato) else 0
+    texto = f"{valor:,.{casas}f}" if "," in formato else f"{valor:.{casas}f}"
+    return _texto(f"{numero.get('prefix', '')}{texto}{numero.get('suffix', '')}")
+
+
+def _desenhar_medidor(fig, traco: Dict[str, Any], cor_texto: Any) -> None:
+    dominio = traco.get("domain") or {}
+    x0, x1 = dominio.get("x", [0, 1])
+    y0, y1 = dominio.get("y", [0, 1])
+    ax = fig.add_axes([x0, y0 * 0.85, x1 - x0, (y1 - y0) * 0.85])
+    ax.set_aspect("equal")
+    ax.axis("off")
+    ax.set_xlim(-1.2, 1.2)
+    ax.set_ylim(-0.6, 1.3)
+
+    gauge = traco.get("gauge") or {}
+    eixo = gauge.get("axis") or {}
+    minimo, maximo = (eixo.get("range") or [0, 1])
+    minimo = float(minimo or 0)
+    maximo = float(maximo or 1) or 1.0
+    valor = float(traco.get("value") or 0)
+
+    def angulo(v: float) -> float:
+        fracao = min(max((v - minimo) / (maximo - minimo), 0.0), 1.0)
+        return 180.0 * (1 - fracao)
+
+    for faixa in gauge.get("steps") or []:
+        inicio, fim = (float(v) for v in faixa["range"])
+        ax.add_patch(Wedge((0, 0), 1.0, angulo(fim), angulo(inicio), width=0.35, color=_cor(faixa.get("color"))))
+    barra = gauge.get("bar") or {}
+    espessura = 0.35 * float(barra.get("thickness", 0.75))
+    ax.add_patch(Wedge((0, 0), 1.0 - (0.35 - espessura) / 2, angulo(valor), 180.0, width=espessura,
+                       color=_cor(barra.get("color"), "#D4AF37")))
+
+    numero = traco.get("number") or {}
+    fonte_numero = numero.get("font") or {}
+    ax.text(0, 0.05, _formatar_numero(valor, numero), ha="center", va="bottom",
+            fontsize=fonte_numero.get("size", 28) * 0.6, color=_cor(fonte_numero.get("color"), cor_texto))
+    titulo = traco.get("title") or {}
+    ax.text(0, 1.15, _texto(titulo), ha="center", va="bottom",
+            fontsize=(titulo.get("font") or {}).get("size", 14) * 0.8, color=_cor((titulo.get("font") or {}).get("color"), cor_texto))
+
+
+# --- Rosca (Pie) ---
+
+def _desenhar_rosca(fig, traco: Dict[str, Any], cor_texto: Any) -> None:
+    ax = fig.add_axes([0.1, 0.15, 0.8, 0.7])
+    valores = _numeros(traco.get("values"))
+    rotulos = [_texto(r) for r in _lista(traco.get("labels"))]
+    cores = [_cor(c) for c in _lista((traco.get("marker") or {}).get("colors"))] or None
+    buraco = float(traco.get("hole") or 0)
+    info = traco.get("textinfo", "percent")
+    ax.pie(
+        valores, labels=rotulos if "label" in info else None, colors=cores[:len(valores)] if cores else None,
+        autopct="%1.1f%%" if "percent" in info else None, explode=_lista(traco.get("pull")) or None,
+        wedgeprops={"width": 1 - buraco} if buraco else None, textprops={"color": cor_texto, "fontsize": 9},
+        startangle=90, counterclock=False,
+    )
+    ax.set_aspect("equal")
+
+
+def renderizar_figura(figura: Dict[str, Any], formato: str = "png", largura: int = 1200, altura: int = 800, escala: float = 2) -> bytes:
+    """Desenha a especificação Plotly (dicionário) e devolve os bytes da imagem."""
+    if matplotlib is None:
+        raise RuntimeError("O backend de renderização 'matplotlib' requer o pacote 'matplotlib'.")
+    if formato not in FORMATOS_SUPORTADOS:
+        raise ValueError(f"Formato '{formato}' não suportado pelo backend matplotlib.")
+
+    layout, tracos = _aplicar_template(figura)
+    fonte = layout.get("font") or {}
+    cor_texto = _cor(fonte.get("color"), "#2a3f5f")
+    fundo = _cor(layout.get("paper_bgcolor"), "white")
+
+    fig = Figure(figsize=(largura / 100, altura / 100), dpi=100)
+    fig.patch.set_facecolor(fundo)
+
+    cartesianos = [t for t in tracos if t.get("type") in ("bar", "scatter")]
+    legenda = _desenhar_cartesianos(fig, layout, cartesianos, cor_texto) if cartesianos else []
+    for traco in tracos:
+        if traco.get("type") == "table":
+            _desenhar_tabela(fig, traco)
+        elif traco.get("type") == "indicator":
+            _desenhar_medidor(fig, traco, cor_texto)
+        elif traco.get("type") == "pie":
+            _desenhar_rosca(fig, traco, cor_texto)
+
+    titulo = _texto(layout.get("title"))
+    if titulo:
+        fig.suptitle(titulo, x=0.02, ha="left", fontsize=14, color=cor_texto)
+    if legenda:
+        fig.legend(handles=legenda, loc="upper right", ncol=len(legenda), frameon=False, fontsize=9, labelcolor=cor_texto)
+
+    buffer = io.BytesIO()
+    # Compressão zlib mínima: a codificação do PNG é a parte mais cara da renderização
+    # e, mesmo assim, o ficheiro fica mais pequeno que o do kaleido
+    opcoes = {"pil_kwargs": {"compress_level": 1}} if formato == "png" else {}
+    fig.savefig(buffer, format=formato, dpi=100 * escala, facecolor=fig.get_facecolor(), **opcoes)
+    return buffer.getvalue()
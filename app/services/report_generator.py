@@ -0,0 +1,225 @@
+# app/services/report_generator.py
+"""
+Relatório mensal de uma empresa em HTML (Jinja2) ou PDF.
+
+Para uma empresa e uma competência, o relatório junta os KPIs do mês (os mesmos
+de gerar_relatorio_* do analytics_service) e todos os gráficos do regime no
+exercício até à competência, embutidos no próprio HTML: SVG inline ou PNG em
+data URI. O ficheiro resultante não depende da API para ser aberto ou enviado.
+
+- Os dados dos gráficos são preparados de uma vez (pacote_graficos) e as imagens
+  em falta são renderizadas em paralelo, enquanto a thread do pedido calcula os KPIs.
+- O resultado fica em cache em disco, com a versão dos dados (impressão digital dos
+  factos mensais do período) na chave: enquanto os factos não mudarem, o mesmo
+  relatório é servido sem recalcular nada. Pedidos simultâneos do mesmo relatório
+  partilham uma única geração (voo_unico).
+- Com RESUMO_NO_RELATORIO, o relatório abre com o resumo em texto dos KPIs
+  (resumidor), pedido assim que os KPIs estão prontos, enquanto os gráficos acabam.
+- A exportação para PDF é opcional: requer o pacote 'weasyprint'.
+"""
+
+import base64
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from markupsafe import Markup
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.crud import empresa as crud_empresa
+from app.crud import fato_mensal as crud_fato_mensal
+from app.services import analytics_service
+from app.services import charts as charts_service
+from app.services import pacote_graficos
+from app.services import resumidor
+from app.services import voo_unico
+
+# PDF é opcional: só disponível com weasyprint instalado
+try:
+    import weasyprint  # type: ignore
+except Exception:  # pragma: no cover - ambiente sem weasyprint
+    weasyprint = None
+
+# Versão do template e do conteúdo do relatório: incrementar sempre que
+# report_template.html ou os dados passados ao template mudarem.
+VERSAO_RELATORIO = 2
+
+FORMATOS_IMAGEM = ("svg", "png")
+
+PASTA_TEMPLATES = settings.BASE_DIR / "templates"
+PASTA_CACHE = settings.BASE_DIR / "data" / "relatorios" / "cache"
+
+RELATORIOS_POR_REGIME = {
+    "Simples Nacional": analytics_service.gerar_relatorio_simples_nacional,
+    "Lucro Presumido (Serviços)": analytics_service.gerar_relatorio_lucro_presumido_servicos,
+}
+
+_ambiente = Environment(loader=FileSystemLoader(PASTA_TEMPLATES), autoescape=select_autoescape(["html"]))
+
+
+@dataclass(frozen=True)
+class RelatorioGerado:
+    """Relatório pronto a servir (HTML ou PDF)."""
+    conteudo: bytes
+    media_type: str
+    chave: str         # Hash da versão: empresa, competência, dados e formato (serve de ETag)
+    nome_ficheiro: str
+    em_cache: bool     # True quando foi servido da cache sem gerar
+    completo: bool = True  # False se o resumo foi pedido mas o backend falhou (não fica em cache)
+
+
+def pdf_disponivel() -> bool:
+    return weasyprint is not None
+
+
+def _periodo(data_competencia: date) -> Tuple[date, date, date]:
+    """Competência (dia 1), início dos dados (janela dos KPIs, que inclui o exercício) e fim do mês."""
+    competencia = data_competencia.replace(day=1)
+    data_inicio, data_fim = analytics_service.janela_relatorio_mensal(competencia)
+    return competencia, data_inicio, data_fim
+
+
+def chave_do_relatorio(db: Session, *, cnpj: str, data_competencia: date, formato: str = "html",
+                       formato_imagens: str = "svg") -> Tuple[Any, str]:
+    """
+    Empresa e hash da versão do relatório, sem o gerar (só lê a impressão digital dos factos).
+    Levanta ValueError se a empresa não existir ou o regime não tiver relatório, e
+    resumidor.ConfiguracaoResumoError se o backend de resumos estiver mal configurado.
+    """
+    if formato not in ("html", "pdf"):
+        raise ValueError(f"Formato de relatório não suportado: '{formato}'.")
+    if formato_imagens not in FORMATOS_IMAGEM:
+        raise ValueError(f"Formato de imagem não suportado: '{formato_imagens}'. Use um de: {', '.join(FORMATOS_IMAGEM)}.")
+    empresa = crud_empresa.get_empresa_por_cnpj(db, cnpj)
+    if not empresa:
+        raise ValueError(f"Empresa com CNPJ {cnpj} não encontrada.")
+    if empresa.regime_tributario not in RELATORIOS_POR_REGIME:
+        raise ValueError(f"Não há relatório mensal para o regime '{empresa.regime_tributario}'.")
+
+    competencia, data_inicio, data_fim = _periodo(data_competencia)
+    versao_dados = crud_fato_mensal.versao_dos_fatos(db, cnpj=cnpj, data_inicio=data_inicio, data_fim=data_fim)
+    # O PDF leva sempre as imagens em PNG
+    formato_imagens = "png" if formato == "pdf" else formato_imagens
+    cabecalho = (
+        f"{cnpj}|{empresa.regime_tributario}|{competencia.isoformat()}|{versao_dados}|r{VERSAO_RELATORIO}"
+        f"|g{charts_service.VERSAO_LAYOUT}|{settings.CHARTS_RENDER_BACKEND}|{formato}|{formato_imagens}"
+        f"|{resumidor.obter_backend().versao if settings.RESUMO_NO_RELATORIO else 'sem-resumo'}"
+    )
+    return empresa, hashlib.sha256(cabecalho.encode()).hexdigest()
+
+
+def _grafico_embutido(gerar, dados: Any, cnpj: str, formato_imagens: str):
+    """Renderiza (ou lê da cache) a imagem de um gráfico e devolve-a pronta a embutir no HTML."""
+    imagem = gerar.renderizar_em_cache(dados, cnpj, formato=formato_imagens)
+    conteudo = imagem.caminho.read_bytes()
+    if formato_imagens == "svg":
+        # SVG do nosso próprio renderizador: entra no HTML tal como está, sem o prólogo XML
+        texto = conteudo.decode("utf-8")
+        return imagem, {"svg": Markup(texto[texto.find("<svg"):])}
+    return imagem, {"data_uri": f"data:{imagem.media_type};base64,{base64.b64encode(conteudo).decode('ascii')}"}
+
+
+def _montar_contexto(db: Session, empresa, competencia: date, data_fim: date, formato_imagens: str, versao: str) -> Dict[str, Any]:
+    """Dados do template: KPIs, resumo e gráficos, estes renderizados em paralelo com o cálculo dos KPIs."""
+    cnpj = empresa.cnpj
+    regime = empresa.regime_tributario
+
+    # 1. Dados de todos os gráficos do exercício, preparados uma única vez
+    tarefas, omitidos = pacote_graficos.preparar_tarefas(
+        db, cnpj=cnpj, regime=regime, data_inicio=date(competencia.year, 1, 1), data_fim=data_fim
+    )
+
+    # 2. Imagens em paralelo (sem sessão) enquanto esta thread calcula os KPIs;
+    #    o resumo dos KPIs segue logo depois, sem esperar pelos gráficos
+    with ThreadPoolExecutor(max_workers=len(tarefas) + 1) as executor:
+        futuros = [executor.submit(_grafico_embutido, gerar, dados, cnpj, formato_imagens) for _, gerar, dados in tarefas]
+        kpis = RELATORIOS_POR_REGIME[regime](db, cnpj=cnpj, data_competencia=competencia)
+        erro = kpis.pop("erro", None) if isinstance(kpis, dict) else None
+        futuro_resumo = None
+        if settings.RESUMO_NO_RELATORIO and not erro:
+            futuro_resumo = executor.submit(resumidor.resumir, kpis, regime=regime, competencia=competencia)
+        embutidos = [futuro.result() for futuro in futuros]
+        resumo = futuro_resumo.result() if futuro_resumo else None
+
+    # 3. Índice de gráficos, de volta na thread do pedido
+    for imagem, _ in embutidos:
+        charts_service.registar_no_indice(db, imagem)
+
+    return {
+        "empresa": empresa,
+        "competencia": competencia,
+        "kpis": kpis,
+        "erro": erro,
+        "resumo": resumo,
+        "graficos": [
+            {"nome": nome, "titulo": nome.replace("-", " ").capitalize(), **embutido}
+            for (nome, _, _), (_, embutido) in zip(tarefas, embutidos)
+        ],
+        "omitidos": omitidos,
+        "gerado_em": datetime.now(timezone.utc),
+        "versao": versao[:12],
+    }
+
+
+def _caminho_em_cache(cnpj: str, competencia: date, formato: str, formato_imagens: str, chave: str) -> Path:
+    extensao = "pdf" if formato == "pdf" else "html"
+    return PASTA_CACHE / f"relatorio_{charts_service._cnpj_limpo(cnpj)}_{competencia:%Y%m}_{formato_imagens}_{chave[:32]}.{extensao}"
+
+
+def _gravar_em_cache(caminho: Path, conteudo: bytes) -> None:
+    """Escrita atómica; as versões anteriores do mesmo relatório deixam de servir e são apagadas."""
+    PASTA_CACHE.mkdir(parents=True, exist_ok=True)
+    prefixo = caminho.name.rsplit("_", 1)[0]
+    for antigo in PASTA_CACHE.glob(f"{prefixo}_*{caminho.suffix}"):
+        if antigo != caminho:
+            antigo.unlink(missing_ok=True)
+    temporario = caminho.with_name(f".{caminho.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    temporario.write_bytes(conteudo)
+    os.replace(temporario, caminho)
+
+
+def gerar_relatorio(db: Session, *, cnpj: str, data_competencia: date, formato: str = "html",
+                    formato_imagens: str = "svg") -> RelatorioGerado:
+    """
+    Relatório mensal da empresa na competência, em HTML (imagens em SVG inline ou
+    PNG em data URI) ou PDF. Levanta ValueError se a empresa não existir, o regime
+    não tiver relatório ou o PDF for pedido sem o weasyprint instalado.
+
+    Se o resumo falhar (ex.: backend sem resposta), o relatório segue sem ele mas
+    com completo=False e não é gravado na cache: o pedido seguinte tenta de novo.
+    """
+    if formato == "pdf" and not pdf_disponivel():
+        raise ValueError("A exportação para PDF requer o pacote 'weasyprint'.")
+    empresa, chave = chave_do_relatorio(db, cnpj=cnpj, data_competencia=data_competencia,
+                                        formato=formato, formato_imagens=formato_imagens)
+    competencia, _, data_fim = _periodo(data_competencia)
+    formato_imagens = "png" if formato == "pdf" else formato_imagens
+    caminho = _caminho_em_cache(cnpj, competencia, formato, formato_imagens, chave)
+    media_type = "application/pdf" if formato == "pdf" else "text/html; charset=utf-8"
+    nome_ficheiro = f"relatorio_{charts_service._cnpj_limpo(cnpj)}_{competencia:%Y%m}.{caminho.suffix.lstrip('.')}"
+
+    def gerar() -> RelatorioGerado:
+        if caminho.exists():  # Outro pedido pode tê-lo gerado entretanto
+            return RelatorioGerado(conteudo=caminho.read_bytes(), media_type=media_type, chave=chave,
+                                   nome_ficheiro=nome_ficheiro, em_cache=True)
+        contexto = _montar_contexto(db, empresa, competencia, data_fim, formato_imagens, chave)
+        html = _ambiente.get_template("report_template.html").render(**contexto)
+        conteudo = weasyprint.HTML(string=html).write_pdf() if formato == "pdf" else html.encode("utf-8")
+        completo = not (settings.RESUMO_NO_RELATORIO and not contexto["erro"] and contexto["resumo"] is None)
+        if completo:
+            _gravar_em_cache(caminho, conteudo)
+        else:
+            print(f"AVISO: Relatório de {cnpj} ({competencia:%m/%Y}) gerado sem resumo; não fica em cache.")
+        return RelatorioGerado(conteudo=conteudo, media_type=media_type, chave=chave,
+                               nome_ficheiro=nome_ficheiro, em_cache=False, completo=completo)
+
+    if caminho.exists():
+        return gerar()
+    return voo_unico.executar(("relatorio", chave), gerar, db=db)
@@ -0,0 +1,311 @@
+# app/services/resumidor.py
+"""
+Resumo em texto corrido dos KPIs mensais de uma empresa.
+
+O resumo parte do dicionário de KPIs de gerar_relatorio_* / montar_relatorio_*
+(analytics_service) e é escrito por um backend intercambiável:
+
+- "modelo": texto montado localmente a partir de frases fixas. Determinístico,
+  sem rede nem custos; é o backend dos testes e das execuções offline.
+- "openai": modelo de linguagem da OpenAI (requer o pacote 'openai' e OPENAI_API_KEY).
+
+Cada resumo fica em cache em disco, com a chave igual ao hash do conteúdo enviado
+ao backend (regime, competência e KPIs) e da versão do backend: enquanto os KPIs
+não mudarem, o backend nunca volta a ser chamado. resumir_lote agrupa os pedidos
+em falta de muitas empresas numa única submissão ao backend, que os processa em
+paralelo (fecho do mês).
+"""
+
+import functools
+import hashlib
+import json
+import os
+import re
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+
+# O backend 'openai' é opcional: só disponível com o pacote openai instalado
+try:
+    import openai  # type: ignore
+except Exception:  # pragma: no cover - ambiente sem openai
+    openai = None
+
+# Versão das instruções e do texto gerado: incrementar sempre que o modelo de
+# frases ou o prompt mudarem (invalida os resumos em cache).
+VERSAO_RESUMO = 1
+
+PASTA_CACHE = settings.BASE_DIR / "data" / "resumos" / "cache"
+
+# Acima desta percentagem de uso de um limite do regime, o resumo deixa um alerta
+LIMITE_ALERTA_PERCENTUAL = Decimal("80")
+
+
+class ConfiguracaoResumoError(RuntimeError):
+    """RESUMO_BACKEND desconhecido ou sem as dependências instaladas (erro do servidor, não do pedido)."""
+
+
+INSTRUCOES = (
+    "És um contabilista que escreve para os clientes de um escritório de contabilidade. "
+    "Recebes, em JSON, o regime tributário, o mês de competência e os indicadores do mês "
+    "de uma empresa. Escreve em português um resumo de um a dois parágrafos curtos, sem "
+    "listas nem títulos, que explique a evolução da receita, a carga tributária, os "
+    "tributos com mais peso e a proximidade aos limites do regime. Usa apenas os valores "
+    "recebidos, tal como estão formatados, e não inventes dados."
+)
+
+
+@dataclass(frozen=True)
+class PedidoResumo:
+    """KPIs de uma empresa numa competência, tal como seguem para o backend."""
+    regime: str
+    competencia: date
+    kpis: Dict[str, Any]
+
+    def conteudo(self) -> str:
+        """JSON canónico do pedido: é o que o backend recebe e o que entra na chave da cache."""
+        return json.dumps(
+            {"regime": self.regime, "competencia": self.competencia.replace(day=1).isoformat(), "kpis": self.kpis},
+            ensure_ascii=False, sort_keys=True, default=str,
+        )
+
+
+# --- BACKENDS ---
+
+class Resumidor(ABC):
+    """
+    Interface dos backends. Cada backend implementa resumir(); resumir_lote() por
+    omissão chama-o em paralelo. 'versao' entra na chave da cache: dois backends (ou
+    modelos) diferentes nunca partilham resumos.
+    """
+    nome = ""
+
+    @property
+    def versao(self) -> str:
+        return f"{self.nome}:v{VERSAO_RESUMO}"
+
+    @abstractmethod
+    def resumir(self, pedido: PedidoResumo) -> str:
+        """Texto do resumo de um pedido; levanta exceção se o backend falhar."""
+
+    def resumir_lote(self, pedidos: List[PedidoResumo]) -> List[Optional[str]]:
+        """Um texto por pedido, pela mesma ordem; None para os que falharam (não ficam em cache)."""
+        def tentar(pedido: PedidoResumo) -> Optional[str]:
+            try:
+                return self.resumir(pedido)
+            except Exception as e:
+                print(f"AVISO: Falha no resumo ({self.nome}) de {pedido.regime} {pedido.competencia:%m/%Y}: {e}")
+                return None
+
+        if len(pedidos) <= 1:
+            return [tentar(pedido) for pedido in pedidos]
+        with ThreadPoolExecutor(max_workers=min(settings.RESUMO_PEDIDOS_PARALELOS, len(pedidos))) as executor:
+            return list(executor.map(tentar, pedidos))
+
+
+def _numero(valor: Any) -> Optional[Decimal]:
+    """Valor numérico de um KPI já formatado ('R$ 1.234,56' ou '11.48%'); None se não for numérico."""
+    if not isinstance(valor, str):
+        return None
+    texto = valor.strip()
+    if texto.startswith("R$"):
+        texto = texto[2:].strip().replace(".", "").replace(",", ".")
+    elif texto.endswith("%"):
+        texto = texto[:-1].strip()
+    else:
+        return None
+    try:
+        return Decimal(texto)
+    except InvalidOperation:
+        return None
+
+
+def _achatar(kpis: Dict[str, Any], grupo: str = "") -> List[Tuple[str, str, Any]]:
+    """(grupo, nome, valor) de todos os KPIs, incluindo os dos grupos aninhados."""
+    linhas = []
+    for nome, valor in kpis.items():
+        if isinstance(valor, dict):
+            linhas.extend(_achatar(valor, nome))
+        else:
+            linhas.append((grupo, nome, valor))
+    return linhas
+
+
+class ResumidorModelo(Resumidor):
+    """
+    Resumo montado com frases fixas a partir dos nomes dos KPIs dos dois regimes
+    (receita, crescimento, carga tributária, segregação e limites). O mesmo pedido
+    dá sempre o mesmo texto.
+    """
+    nome = "modelo"
+
+    def resumir(self, pedido: PedidoResumo) -> str:
+        linhas = _achatar(pedido.kpis)
+
+        def primeiro(*padroes: str) -> Optional[Tuple[str, Any]]:
+            for grupo, nome, valor in linhas:
+                if valor not in (None, "N/A") and any(re.search(p, nome, re.IGNORECASE) for p in padroes):
+                    return nome, valor
+            return None
+
+        frases = []
+        receita = primeiro(r"^Receita Bruta Total", r"^Total de Faturamento")
+        crescimento = primeiro(r"Crescimento da Receita")
+        if receita:
+            frase = f"Em {pedido.competencia:%m/%Y}, a receita bruta foi de {receita[1]}"
+            variacao = _numero(crescimento[1]) if crescimento else None
+            if variacao is not None:
+                if variacao > 0:
+                    frase += f", {abs(variacao):.2f}% acima do mês anterior"
+                elif variacao < 0:
+                    frase += f", {abs(variacao):.2f}% abaixo do mês anterior"
+                else:
+                    frase += ", sem variação face ao mês anterior"
+            frases.append(frase + ".")
+
+        carga = primeiro(r"^Carga Tributária")
+        if carga:
+            frases.append(f"A carga tributária ficou em {carga[1]}.")
+
+        segregacao = [
+            (nome, valor, _numero(valor)) for grupo, nome, valor in linhas
+            if grupo.startswith("Segregação dos Tributos") and _numero(valor) is not None
+        ]
+        if segregacao:
+            nome, valor, _ = max(segregacao, key=lambda item: item[2])
+            frases.append(f"O tributo com maior peso foi o {nome} ({valor}).")
+
+        for padrao, descricao in ((r"^Uso do Limite|^Percentual Atingido", "do limite de faturamento do regime"),
+                                  (r"^Uso do Sublimite", "do sublimite de ICMS/ISS")):
+            uso = primeiro(padrao)
+            percentual = _numero(uso[1]) if uso else None
+            if percentual is None:
+                continue
+            if percentual >= LIMITE_ALERTA_PERCENTUAL:
+                frases.append(f"Atenção: o faturamento já atingiu {uso[1]} {descricao}.")
+            else:
+                frases.append(f"O faturamento está em {uso[1]} {descricao}.")
+
+        if not frases:
+            # KPIs sem nenhum dos indicadores conhecidos: enumera-os
+            valores = "; ".join(f"{nome}: {valor}" for _, nome, valor in linhas)
+            frases.append(f"Indicadores de {pedido.competencia:%m/%Y} ({pedido.regime}): {valores or 'sem valores'}.")
+        return " ".join(frases)
+
+    def resumir_lote(self, pedidos: List[PedidoResumo]) -> List[Optional[str]]:
+        # Só CPU e muito rápido: não compensa o pool de threads
+        return [self.resumir(pedido) for pedido in pedidos]
+
+
+class ResumidorOpenAI(Resumidor):
+    """Resumo escrito por um modelo da OpenAI (RESUMO_OPENAI_MODELO), um pedido por empresa."""
+    nome = "openai"
+
+    def __init__(self):
+        if openai is None:
+            raise ConfiguracaoResumoError("O backend de resumos 'openai' requer o pacote 'openai'.")
+        self.modelo = settings.RESUMO_OPENAI_MODELO
+        self._cliente = openai.OpenAI(api_key=settings.OPENAI_API_KEY, timeout=settings.RESUMO_TIMEOUT_S)
+
+    @property
+    def versao(self) -> str:
+        return f"{self.nome}:{self.modelo}:v{VERSAO_RESUMO}"
+
+    def resumir(self, pedido: PedidoResumo) -> str:
+        resposta = self._cliente.chat.completions.create(
+            model=self.modelo,
+            temperature=0.2,
+            messages=[
+                {"role": "system", "content": INSTRUCOES},
+                {"role": "user", "content": pedido.conteudo()},
+            ],
+        )
+        return resposta.choices[0].message.content.strip()
+
+
+BACKENDS = {
+    ResumidorModelo.nome: ResumidorModelo,
+    ResumidorOpenAI.nome: ResumidorOpenAI,
+}
+
+
+@functools.cache
+def _instancia(nome: str) -> Resumidor:
+    return BACKENDS[nome]()
+
+
+def obter_backend(nome: Optional[str] = None) -> Resumidor:
+    """Backend configurado (RESUMO_BACKEND) ou o indicado; um por processo, reutilizado entre pedidos."""
+    nome = nome or settings.RESUMO_BACKEND
+    if nome not in BACKENDS:
+        raise ConfiguracaoResumoError(f"Backend de resumos desconhecido: '{nome}'. Use um de: {', '.join(BACKENDS)}.")
+    return _instancia(nome)
+
+
+# --- CACHE ---
+
+def chave_do_resumo(pedido: PedidoResumo, backend: Resumidor) -> str:
+    """Hash do conteúdo enviado ao backend e da versão do backend."""
+    return hashlib.sha256(f"{backend.versao}|{pedido.conteudo()}".encode("utf-8")).hexdigest()
+
+
+def _caminho_em_cache(chave: str) -> Path:
+    return PASTA_CACHE / chave[:2] / f"{chave}.txt"
+
+
+def _ler_cache(chave: str) -> Optional[str]:
+    try:
+        return _caminho_em_cache(chave).read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return None
+
+
+def _gravar_cache(chave: str, texto: str) -> None:
+    caminho = _caminho_em_cache(chave)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    temporario = caminho.with_name(f".{caminho.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    temporario.write_text(texto, encoding="utf-8")
+    os.replace(temporario, caminho)
+
+
+# --- API ---
+
+def resumir_lote(pedidos: Iterable[PedidoResumo], *, backend: Optional[Resumidor] = None) -> List[Optional[str]]:
+    """
+    Resumos de vários pedidos, pela mesma ordem. Os que estão em cache não chegam
+    ao backend; os restantes (sem repetidos) seguem numa única submissão. None nos
+    pedidos cujo resumo falhou.
+    """
+    pedidos = list(pedidos)
+    backend = backend or obter_backend()
+    chaves = [chave_do_resumo(pedido, backend) for pedido in pedidos]
+    textos: Dict[str, Optional[str]] = {}
+    em_falta: Dict[str, PedidoResumo] = {}
+    for chave, pedido in zip(chaves, pedidos):
+        if chave in textos or chave in em_falta:
+            continue
+        texto = _ler_cache(chave)
+        if texto is None:
+            em_falta[chave] = pedido
+        else:
+            textos[chave] = texto
+
+    if em_falta:
+        for chave, texto in zip(em_falta, backend.resumir_lote(list(em_falta.values()))):
+            textos[chave] = texto
+            if texto:
+                _gravar_cache(chave, texto)
+    return [textos[chave] for chave in chaves]
+
+
+def resumir(kpis: Dict[str, Any], *, regime: str, competencia: date,
+            backend: Optional[Resumidor] = None) -> Optional[str]:
+    """Resumo dos KPIs de uma empresa numa competência (da cache, se os KPIs não mudaram)."""
+    return resumir_lote([PedidoResumo(regime=regime, competencia=competencia, kpis=kpis)], backend=backend)[0]
@@ -0,0 +1,211 @@
+# app/services/simulacao.py
+"""
+Simulador de cenários de carga tributária.
+
+Avalia uma grelha de cenários (taxa de crescimento da receita x regime x Fator R)
+sobre o histórico mensal da empresa numa única passagem vetorizada em NumPy:
+as receitas projetadas formam um array (crescimentos, meses), o RBT12 de cada mês
+sai de uma soma móvel por cumsum e a faixa do Simples Nacional é encontrada com
+searchsorted, sem ciclos por cenário ou por mês.
+"""
+
+from datetime import date
+from typing import Any, Dict, List
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.crud import fato_mensal as crud_fato_mensal
+from app.services import analytics_service
+
+SIMPLES_NACIONAL = "Simples Nacional"
+LUCRO_PRESUMIDO_SERVICOS = "Lucro Presumido (Serviços)"
+REGIMES_SIMULAVEIS = (SIMPLES_NACIONAL, LUCRO_PRESUMIDO_SERVICOS)
+
+# --- Simples Nacional (LC 123/2006, redação da LC 155/2016) ---
+LIMITE_SIMPLES_NACIONAL = 4_800_000.0
+FATOR_R_MINIMO_ANEXO_III = 0.28  # Fator R >= 28% tributa serviços do Anexo V pelo Anexo III
+
+# Faixas por RBT12: teto da faixa, alíquota nominal e parcela a deduzir
+TETOS_FAIXAS = np.array([180_000.0, 360_000.0, 720_000.0, 1_800_000.0, 3_600_000.0, 4_800_000.0])
+ANEXO_III = {
+    "aliquotas": np.array([0.06, 0.112, 0.135, 0.16, 0.21, 0.33]),
+    "deducoes": np.array([0.0, 9_360.0, 17_640.0, 35_640.0, 125_640.0, 648_000.0]),
+}
+ANEXO_V = {
+    "aliquotas": np.array([0.155, 0.18, 0.195, 0.205, 0.23, 0.305]),
+    "deducoes": np.array([0.0, 4_500.0, 9_900.0, 17_100.0, 62_100.0, 540_000.0]),
+}
+
+# --- Lucro Presumido (serviços em geral) ---
+PRESUNCAO_SERVICOS = 0.32
+ALIQUOTA_IRPJ = 0.15
+ALIQUOTA_ADICIONAL_IRPJ = 0.10
+LIMITE_MENSAL_ADICIONAL_IRPJ = 20_000.0
+ALIQUOTA_CSLL = 0.09
+ALIQUOTA_PIS = 0.0065
+ALIQUOTA_COFINS = 0.03
+ALIQUOTA_ISS_PADRAO = 0.05
+
+MAXIMO_CENARIOS = 10_000
+
+
+def _aliquota_efetiva_simples(rbt12: np.ndarray, anexo: Dict[str, np.ndarray]) -> np.ndarray:
+    """Alíquota efetiva = (RBT12 x nominal - dedução) / RBT12, com a faixa escolhida por searchsorted."""
+    faixa = np.minimum(np.searchsorted(TETOS_FAIXAS, rbt12, side="left"), len(TETOS_FAIXAS) - 1)
+    rbt12_seguro = np.where(rbt12 > 0, rbt12, 1.0)
+    efetiva = (rbt12_seguro * anexo["aliquotas"][faixa] - anexo["deducoes"][faixa]) / rbt12_seguro
+    return np.where(rbt12 > 0, efetiva, anexo["aliquotas"][0])
+
+
+def _projetar_receitas(historico: np.ndarray, taxas_crescimento: np.ndarray, horizonte: int) -> np.ndarray:
+    """Receita mensal projetada (crescimentos, meses) a partir do último mês do histórico."""
+    base = historico[-1] if historico.size else 0.0
+    meses = np.arange(1, horizonte + 1)
+    return base * (1.0 + taxas_crescimento[:, None]) ** meses[None, :]
+
+
+def _rbt12_por_mes(historico: np.ndarray, receitas: np.ndarray) -> np.ndarray:
+    """
+    RBT12 de cada mês projetado: receita dos 12 meses anteriores (histórico + projeção).
+    Meses sem histórico são preenchidos com a média do histórico disponível.
+    """
+    media = historico.mean() if historico.size else 0.0
+    anteriores = np.concatenate([np.full(12 - min(historico.size, 12), media), historico[-12:]])
+    serie = np.concatenate([np.broadcast_to(anteriores, (receitas.shape[0], 12)), receitas], axis=1)
+    acumulado = np.concatenate([np.zeros((receitas.shape[0], 1)), np.cumsum(serie, axis=1)], axis=1)
+    horizonte = receitas.shape[1]
+    return acumulado[:, 12:12 + horizonte] - acumulado[:, :horizonte]
+
+
+def _tributos_simples(receitas: np.ndarray, rbt12: np.ndarray, fatores_r: np.ndarray) -> Dict[str, np.ndarray]:
+    """Tributos (crescimentos, fatores R, meses) no Simples Nacional, escolhendo o anexo pelo Fator R."""
+    usa_anexo_iii = fatores_r >= FATOR_R_MINIMO_ANEXO_III
+    efetiva = np.where(
+        usa_anexo_iii[None, :, None],
+        _aliquota_efetiva_simples(rbt12, ANEXO_III)[:, None, :],
+        _aliquota_efetiva_simples(rbt12, ANEXO_V)[:, None, :],
+    )
+    return {
+        "tributos": receitas[:, None, :] * efetiva,
+        "anexo": np.where(usa_anexo_iii, "III", "V"),
+        "excede_limite": (rbt12 > LIMITE_SIMPLES_NACIONAL).any(axis=1),
+    }
+
+
+def _tributos_presumido(receitas: np.ndarray, aliquota_iss: float) -> np.ndarray:
+    """Tributos (crescimentos, meses) no Lucro Presumido - serviços."""
+    base_presumida = receitas * PRESUNCAO_SERVICOS
+    irpj = base_presumida * ALIQUOTA_IRPJ
+    adicional = np.maximum(base_presumida - LIMITE_MENSAL_ADICIONAL_IRPJ, 0.0) * ALIQUOTA_ADICIONAL_IRPJ
+    csll = base_presumida * ALIQUOTA_CSLL
+    return irpj + adicional + csll + receitas * (ALIQUOTA_PIS + ALIQUOTA_COFINS + aliquota_iss)
+
+
+def simular_cenarios(
+    historico: np.ndarray,
+    *,
+    taxas_crescimento: List[float],
+    fatores_r: List[float],
+    regimes: List[str],
+    horizonte_meses: int = 12,
+    aliquota_iss: float = ALIQUOTA_ISS_PADRAO,
+) -> Dict[str, list]:
+    """
+    Avalia todos os cenários da grelha sobre o histórico mensal de receitas.
+
+    O resultado é colunar (uma posição por cenário, na ordem crescimento x regime x
+    Fator R), com os totais do horizonte e os tributos mês a mês.
+    """
+    regimes_invalidos = [regime for regime in regimes if regime not in REGIMES_SIMULAVEIS]
+    if regimes_invalidos:
+        raise ValueError(f"Regimes sem simulação disponível: {', '.join(regimes_invalidos)}.")
+    if len(taxas_crescimento) * len(fatores_r) * len(regimes) > MAXIMO_CENARIOS:
+        raise ValueError(f"A grelha excede o máximo de {MAXIMO_CENARIOS} cenários.")
+
+    historico = np.asarray(historico, dtype=np.float64)
+    taxas = np.asarray(taxas_crescimento, dtype=np.float64)
+    fatores = np.asarray(fatores_r, dtype=np.float64)
+    n_taxas, n_fatores = len(taxas), len(fatores)
+
+    # 1. Receitas projetadas e RBT12 para todas as taxas de crescimento de uma vez
+    receitas = _projetar_receitas(historico, taxas, horizonte_meses)        # (T, H)
+    rbt12 = _rbt12_por_mes(historico, receitas)                              # (T, H)
+
+    # 2. Tributos por regime, alargados à mesma forma (T, F, H)
+    por_regime = {}
+    if SIMPLES_NACIONAL in regimes:
+        simples = _tributos_simples(receitas, rbt12, fatores)
+        por_regime[SIMPLES_NACIONAL] = (
+            simples["tributos"],
+            np.broadcast_to(simples["anexo"][None, :], (n_taxas, n_fatores)),
+            np.broadcast_to(simples["excede_limite"][:, None], (n_taxas, n_fatores)),
+        )
+    if LUCRO_PRESUMIDO_SERVICOS in regimes:
+        presumido = np.broadcast_to(_tributos_presumido(receitas, aliquota_iss)[:, None, :], (n_taxas, n_fatores, horizonte_meses))
+        por_regime[LUCRO_PRESUMIDO_SERVICOS] = (
+            presumido,
+            np.full((n_taxas, n_fatores), None, dtype=object),
+            np.zeros((n_taxas, n_fatores), dtype=bool),
+        )
+
+    # 3. Matriz (T, R, F, H) achatada em colunas
+    tributos = np.stack([por_regime[regime][0] for regime in regimes], axis=1)
+    anexos = np.stack([por_regime[regime][1] for regime in regimes], axis=1)
+    excede = np.stack([por_regime[regime][2] for regime in regimes], axis=1)
+    forma = (n_taxas, len(regimes), n_fatores)
+
+    faturamento_total = np.broadcast_to(receitas.sum(axis=1)[:, None, None], forma)
+    tributos_total = tributos.sum(axis=3)
+    carga = np.divide(tributos_total * 100, faturamento_total,
+                      out=np.zeros(forma), where=faturamento_total > 0)
+
+    indice_taxa, indice_regime, indice_fator = np.indices(forma).reshape(3, -1)
+    return {
+        "taxa_crescimento": taxas[indice_taxa].tolist(),
+        "regime": [regimes[i] for i in indice_regime],
+        "fator_r": fatores[indice_fator].tolist(),
+        "anexo_simples": anexos.reshape(-1).tolist(),
+        "excede_limite_simples": excede.reshape(-1).tolist(),
+        "faturamento_total": np.round(faturamento_total.reshape(-1), 2).tolist(),
+        "tributos_total": np.round(tributos_total.reshape(-1), 2).tolist(),
+        "carga_tributaria_percentual": np.round(carga.reshape(-1), 2).tolist(),
+        "tributos_mensais": np.round(tributos.reshape(-1, horizonte_meses), 2).tolist(),
+    }
+
+
+def simular_cenarios_empresa(
+    db: Session,
+    *,
+    cnpj: str,
+    regime: str,
+    data_base: date,
+    taxas_crescimento: List[float],
+    fatores_r: List[float],
+    regimes: List[str],
+    horizonte_meses: int = 12,
+    aliquota_iss: float = ALIQUOTA_ISS_PADRAO,
+) -> Dict[str, Any]:
+    """
+    Simula a grelha de cenários a partir dos últimos 12 meses de receita da empresa
+    (até à data base), lidos da série mensal do fato_mensal numa única consulta.
+    """
+    data_inicio = data_base.replace(day=1)
+    data_inicio = data_inicio.replace(year=data_inicio.year - 1)
+    serie = crud_fato_mensal.obter_serie_mensal(
+        db, cnpj=cnpj, data_inicio=data_inicio, data_fim=data_base,
+        tipos_documento=analytics_service.tipos_para_totais(regime)
+    )
+    historico = np.array([float(linha.faturamento or 0) for linha in serie], dtype=np.float64)[-12:]
+    if historico.size == 0:
+        raise ValueError("Não há faturamento registado para simular a partir da data base.")
+
+    resultado = simular_cenarios(
+        historico,
+        taxas_crescimento=taxas_crescimento,
+        fatores_r=fatores_r,
+        regimes=regimes,
+        horizonte_meses=horizonte_meses,
+        aliquota_iss=aliquota_iss,
+    )
+    return {"meses_historico": int(historico.size), "cenarios": resultado}
@@ -0,0 +1,126 @@
+# app/services/voo_unico.py
+"""
+Coalescência de cálculos idênticos em curso ("single-flight").
+
+Quando um dashboard abre, vários separadores ou utilizadores pedem ao mesmo tempo
+os mesmos gráficos e KPIs, e cada pedido recalculava tudo. Aqui, pedidos
+simultâneos com os mesmos parâmetros (normalizados numa chave) partilham um único
+cálculo:
+
+- no mesmo worker, o primeiro pedido ("líder") calcula e os restantes esperam pelo
+  seu resultado (um Future), sem tocar na base de dados;
+- entre workers, com uma sessão, o líder toma um bloqueio consultivo na tabela
+  'bloqueio_calculo' e publica lá o resultado serializado; os líderes dos outros
+  workers esperam pela publicação e desserializam-no. O bloqueio usa uma sessão
+  própria, no mesmo motor da sessão do pedido: os seus commits não tocam no que o
+  pedido tem pendente. Sem serializador, o resultado
+  partilha-se por outro meio (ex.: a imagem na cache de gráficos) e quem esperava
+  volta a chamar o cálculo, que o encontra já feito.
+
+Os resultados partilhados não devem ser alterados por quem os recebe.
+"""
+
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Tuple, TypeVar
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.crud import bloqueio_calculo as crud_bloqueio
+
+T = TypeVar("T")
+
+# Intervalo entre consultas ao bloqueio de outro worker
+INTERVALO_SONDAGEM_S = 0.05
+
+_em_curso: Dict[str, Future] = {}
+_trinco = threading.Lock()
+
+
+def chave_do_pedido(*partes: Any) -> str:
+    """Hash estável dos parâmetros do pedido (datas em ISO, dicionários por ordem de chave)."""
+    return hashlib.sha256(json.dumps(partes, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _dono() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def executar(
+    partes: Tuple[Any, ...],
+    calcular: Callable[[], T],
+    *,
+    db: Session | None = None,
+    serializar: Callable[[T], bytes] | None = None,
+    desserializar: Callable[[bytes], T] | None = None,
+) -> T:
+    """
+    Executa 'calcular' uma única vez para todos os pedidos simultâneos com as mesmas
+    'partes'. Com 'db' (e VOO_UNICO_ENTRE_WORKERS ativo), coordena também os workers.
+    """
+    chave = chave_do_pedido(*partes)
+    with _trinco:
+        futuro = _em_curso.get(chave)
+        lider = futuro is None
+        if lider:
+            futuro = _em_curso[chave] = Future()
+
+    if not lider:
+        return futuro.result()
+
+    try:
+        if db is not None and settings.VOO_UNICO_ENTRE_WORKERS:
+            resultado = _executar_entre_workers(db, chave, calcular, serializar, desserializar)
+        else:
+            resultado = calcular()
+    except BaseException as e:
+        futuro.set_exception(e)
+        raise
+    else:
+        futuro.set_result(resultado)
+        return resultado
+    finally:
+        with _trinco:
+            _em_curso.pop(chave, None)
+
+
+def _sessao_de_bloqueio(db: Session) -> Session:
+    """Sessão curta, só para a tabela de bloqueios, ligada ao mesmo motor da sessão do pedido."""
+    return Session(bind=db.get_bind(), autoflush=False, expire_on_commit=False)
+
+
+def _executar_entre_workers(db: Session, chave: str, calcular, serializar, desserializar):
+    with _sessao_de_bloqueio(db) as sessao:
+        return _coordenar(sessao, chave, calcular, serializar, desserializar)
+
+
+def _coordenar(db: Session, chave: str, calcular, serializar, desserializar):
+    """'db' é a sessão dos bloqueios; 'calcular' usa a sua própria (a do pedido)."""
+    dono = _dono()
+    limite = time.monotonic() + settings.VOO_UNICO_ESPERA_MAX_S
+    while not crud_bloqueio.adquirir_bloqueio(db, chave, dono, settings.VOO_UNICO_TTL_S):
+        bloqueio = crud_bloqueio.obter_bloqueio(db, chave)
+        if bloqueio is not None and bloqueio.concluido_em is not None:
+            if bloqueio.resultado is not None and desserializar is not None:
+                return desserializar(bloqueio.resultado)
+            return calcular()  # Resultado partilhado por outro meio (ex.: ficheiro em cache)
+        if time.monotonic() >= limite:
+            return calcular()  # O outro worker está a demorar demasiado: calcula localmente
+        time.sleep(INTERVALO_SONDAGEM_S)
+
+    try:
+        resultado = calcular()
+    except BaseException:
+        crud_bloqueio.libertar_bloqueio(db, chave, dono)
+        raise
+    crud_bloqueio.concluir_bloqueio(
+        db, chave, dono, serializar(resultado) if serializar else None, settings.VOO_UNICO_RESULTADO_TTL_S
+    )
+    crud_bloqueio.apagar_bloqueios_expirados(db)
+    return resultado
@@ -10,6 +10,10 @@ from app.models.empresa import Empresa
 from app.models.documento import Documento
 from app.models.dados_fiscais import DadosFiscais
 from app.models.grafico import Grafico # <-- ADICIONADO AQUI
+from app.models.fato_mensal import FatoMensal
+from app.models.snapshot_kpi import SnapshotKpi
+from app.models.bloqueio_calculo import BloqueioCalculo
+from app.models.envio_email import EnvioEmail
 
 def create_database_tables():
     """
@@ -41,7 +45,7 @@ def create_database_tables():
         print("✅ Tabelas antigas apagadas com sucesso.")
 
         # --- Criação das tabelas ---
-        print("\nA criar novas tabelas (Empresas, Documentos, Dados Fiscais, Graficos)...") # <-- Texto atualizado
+        print("\nA criar novas tabelas (Empresas, Documentos, Dados Fiscais, Graficos, Fato Mensal, Snapshot KPI)...") # <-- Texto atualizado
         Base.metadata.create_all(bind=engine)
         print("✅ Tabelas relacionadas criadas com sucesso!")
         print("Pode agora executar o script 'adicionar_empresa.py' para popular os dados de teste.")
@@ -1,5 +1,7 @@
 # main.py 
+import asyncio
 import json
+from contextlib import asynccontextmanager
 from decimal import Decimal
 from fastapi.responses import JSONResponse
 from fastapi.encoders import jsonable_encoder
@@ -11,6 +13,15 @@ from app.routers import upload, documentos, charts_router,empresas
 # Importa o router de analytics
 from app.routers import analytics as analytics_router
 from app.routers import upload_options
+from app.routers import metricas
+from app.routers import relatorios
+from app.routers.graficos_estaticos import GraficosEstaticos
+from app.core.admissao import MiddlewareAdmissao, controlo_admissao
+from app.core.config import settings
+from app.services import manutencao_graficos
+from app.services import precomputacao
+from app.services import renderizador
+from app.services import resumidor
 # --- Serializador Personalizado ---
 # Função para ensinar o JSON a lidar com tipos de dados que ele não conhece.
 def custom_serializer(obj):
@@ -26,14 +37,48 @@ class CustomJSONResponse(JSONResponse):
         return super().render(jsonable_encoder(content, custom_encoder={Decimal: str}))
 
 
+# --- Arranque e paragem ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Aquece o pool de renderização de gráficos antes de aceitar pedidos
+    renderizador.iniciar_pool(
+        workers=settings.CHARTS_RENDER_WORKERS,
+        tamanho_fila=settings.CHARTS_RENDER_QUEUE,
+        timeout_s=settings.CHARTS_RENDER_TIMEOUT_S,
+        backend=settings.CHARTS_RENDER_BACKEND,
+    )
+    # O backend de resumos dos relatórios mensais tem de estar utilizável
+    if settings.RESUMO_NO_RELATORIO:
+        try:
+            resumidor.obter_backend()
+        except resumidor.ConfiguracaoResumoError as e:
+            print(f"AVISO: {e} Os relatórios mensais respondem 503 até RESUMO_BACKEND ser corrigido.")
+    # Pré-cálculo em segundo plano dos gráficos das empresas com dados novos
+    if settings.PRECOMPUTACAO_ATIVA:
+        precomputacao.iniciar_precomputacao(atraso_s=settings.PRECOMPUTACAO_ATRASO_S)
+    # Manutenção periódica da cache de gráficos (idade, órfãos e orçamento de disco)
+    manutencao = None
+    if settings.CHARTS_MANUTENCAO_INTERVALO_S > 0:
+        manutencao = asyncio.create_task(manutencao_graficos.ciclo_periodico(settings.CHARTS_MANUTENCAO_INTERVALO_S))
+    yield
+    if manutencao is not None:
+        manutencao.cancel()
+    precomputacao.parar_precomputacao()
+    renderizador.parar_pool()
+
+
 # Cria a instância principal da aplicação FastAPI
 app = FastAPI(
     title="LUCID-COUNT API",
     description="API para automação de relatórios e processamento de ficheiros.",
     version="0.1.0",
-    default_response_class=CustomJSONResponse   # Usa a nossa resposta personalizada
+    default_response_class=CustomJSONResponse,   # Usa a nossa resposta personalizada
+    lifespan=lifespan
 )
 
+# Controlo de admissão das rotas pesadas (dentro do CORS, para que os 503 levem os cabeçalhos CORS)
+app.add_middleware(MiddlewareAdmissao, controlo=controlo_admissao)
+
 origins = [
     "http://localhost:3000", # Endereço do seu frontend React/Next.js
 ]
@@ -46,6 +91,15 @@ app.add_middleware(
     allow_headers=["*"], # Permite todos os cabeçalhos
 )
 
+# --- Erros do pool de renderização ---
+@app.exception_handler(renderizador.FilaCheiaError)
+async def fila_renderizacao_cheia(request, exc):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "2"})
+
+@app.exception_handler(renderizador.TempoEsgotadoError)
+async def renderizacao_demorada(request, exc):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
 # Inclui as rotas de cada módulo na aplicação principal
 app.include_router(upload.router)
 app.include_router(documentos.router) #Regista o router de documentos
@@ -53,6 +107,11 @@ app.include_router(analytics_router.router) # Regista o router de analytics
 app.include_router(charts_router.router)
 app.include_router(upload_options.router)
 app.include_router(empresas.router)
+app.include_router(metricas.router)
+app.include_router(relatorios.router)
+
+# Imagens de gráficos já renderizadas, com URLs imutáveis (nome = hash do conteúdo)
+app.mount(settings.CHARTS_STATIC_URL, GraficosEstaticos(), name="graficos_estaticos")
 
 @app.get("/", tags=["Root"])
 def read_root():
@@ -0,0 +1,67 @@
+# Em: scripts/bench_figuras.py
+
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import plotly.graph_objects as go
+
+# Adiciona o diretório raiz ao path para permitir importações da 'app'
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from bench_renderizadores import CNPJ_EXEMPLO, graficos_de_exemplo
+from app.services import charts as charts_service
+
+
+def _mediana_ms(funcao, repeticoes: int) -> float:
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return statistics.median(tempos) * 1000
+
+
+def executar(repeticoes: int = 50, meses: int = 12):
+    """
+    Mede a montagem das figuras dos 13 geradores de gráficos (sem renderização):
+    a partir dos esqueletos pré-validados, como em produção, e com a validação
+    completa do Plotly da mesma figura, que era o custo de montar o layout do zero.
+    A figura vai até ao dicionário que segue para o pool (to_plotly_json).
+    """
+    graficos = graficos_de_exemplo(meses)
+
+    # Primeira montagem: inclui a construção (e validação) dos esqueletos
+    charts_service._esqueleto.cache_clear()
+    inicio = time.perf_counter()
+    figuras = {nome: gerar.montar_figura(dados, CNPJ_EXEMPLO) for nome, gerar, dados in graficos}
+    primeira = time.perf_counter() - inicio
+
+    # Cada figura montada a partir do esqueleto tem de passar na validação do Plotly
+    invalidas = []
+    for nome, figura in figuras.items():
+        try:
+            go.Figure(figura.to_plotly_json())
+        except ValueError:
+            invalidas.append(nome)
+
+    print(f"--- Benchmark de montagem de figuras ({len(graficos)} gráficos, {meses} meses, mediana de {repeticoes}) ---")
+    print(f"{'gráfico':<26}{'esqueleto':>14}{'validada':>14}")
+    totais = [0.0, 0.0]
+    for nome, gerar, dados in graficos:
+        esqueleto = _mediana_ms(lambda: gerar.montar_figura(dados, CNPJ_EXEMPLO).to_plotly_json(), repeticoes)
+        especificacao = figuras[nome].to_plotly_json()
+        validada = _mediana_ms(lambda: go.Figure(especificacao).to_plotly_json(), repeticoes)
+        totais[0] += esqueleto
+        totais[1] += validada
+        print(f"{nome:<26}{esqueleto:>11.2f} ms{validada:>11.2f} ms")
+    print(f"{'total dos 13':<26}{totais[0]:>11.2f} ms{totais[1]:>11.2f} ms")
+    print(f"Ganho: {totais[1] / totais[0]:.1f}x | primeira montagem (com esqueletos): {primeira * 1000:.1f} ms")
+    print(f"Figuras inválidas: {len(invalidas)} {invalidas or ''}")
+
+
+if __name__ == "__main__":
+    # Uso: python scripts/bench_figuras.py [REPETICOES] [MESES]
+    argumentos = [int(a) for a in sys.argv[1:3]]
+    executar(*argumentos)
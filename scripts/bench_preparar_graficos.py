@@ -0,0 +1,96 @@
+# Em: scripts/bench_preparar_graficos.py
+
+import sys
+import time
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Adiciona o diretório raiz ao path para permitir importações da 'app'
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from app.services.analytics_service import montar_dataframe_graficos
+
+def _formatar_legado(x) -> str:
+    return f"R$ {x:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+def preparar_legado(competencias, faturamento, impostos) -> pd.DataFrame:
+    """Implementação anterior (DataFrame de Decimals + apply linha a linha), para comparação."""
+    df = pd.DataFrame({'data_competencia': competencias, 'faturamento': faturamento, 'total_impostos': impostos})
+    df['data_competencia'] = pd.to_datetime(df['data_competencia'])
+    df = df.sort_values(by='data_competencia').reset_index(drop=True)
+    df['mes_ano'] = df['data_competencia'].dt.strftime('%b/%Y')
+    df['ano'] = df['data_competencia'].dt.strftime('%Y')
+    df['mes'] = df['data_competencia'].dt.strftime('%B')
+    df['faturamento_formatado'] = df['faturamento'].apply(_formatar_legado)
+    df['impostos_formatado'] = df['total_impostos'].apply(_formatar_legado)
+    df['carga_tributaria'] = (df['total_impostos'] / df['faturamento']) * 100
+    df['carga_formatado'] = df['carga_tributaria'].apply(lambda x: f"{x:.2f}%")
+    df['taxa_crescimento'] = df['faturamento'].pct_change() * 100
+    df['crescimento_formatado'] = df['taxa_crescimento'].apply(lambda x: f"{x:.2f}%" if pd.notna(x) else "0.00%")
+    df['faturamento_acumulado'] = df['faturamento'].cumsum()
+    df['impostos_acumulados'] = df['total_impostos'].cumsum()
+    df['faturamento_acumulado_formatado'] = df['faturamento_acumulado'].apply(_formatar_legado)
+    df['impostos_acumulados_formatado'] = df['impostos_acumulados'].apply(_formatar_legado)
+    return df
+
+def executar(empresas: int = 1000, meses: int = 60, semente: int = 42):
+    """
+    Mede a preparação dos dados de gráficos para 'empresas' séries de 'meses' meses,
+    comparando a implementação vetorizada (centavos int64) com a anterior.
+    """
+    rng = np.random.default_rng(semente)
+    competencias = [date(2020 + m // 12, m % 12 + 1, 1) for m in range(meses)]
+    faturamento = rng.integers(1_000_00, 5_000_000_00, size=(empresas, meses), dtype=np.int64)
+    impostos = faturamento * rng.integers(4, 19, size=(empresas, meses)) // 100
+
+    # Dados no formato de cada implementação (a conversão fica fora da medição)
+    series_decimal = [
+        ([Decimal(int(v)) / 100 for v in faturamento[i]], [Decimal(int(v)) / 100 for v in impostos[i]])
+        for i in range(empresas)
+    ]
+
+    print(f"--- Benchmark preparar_dados_para_graficos ({empresas} empresas x {meses} meses) ---")
+
+    inicio = time.perf_counter()
+    legado = [preparar_legado(competencias, fat, imp) for fat, imp in series_decimal]
+    tempo_legado = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    vetorizado = [montar_dataframe_graficos(competencias, faturamento[i], impostos[i]) for i in range(empresas)]
+    tempo_vetorizado = time.perf_counter() - inicio
+
+    # Carteira inteira numa só chamada (formatação vetorizada sobre todas as linhas)
+    inicio = time.perf_counter()
+    carteira = montar_dataframe_graficos(
+        np.tile(np.array(competencias, dtype='datetime64[D]'), empresas),
+        faturamento.ravel(), impostos.ravel(),
+        grupos=np.repeat(np.arange(empresas), meses)
+    )
+    tempo_carteira = time.perf_counter() - inicio
+
+    # As colunas monetárias formatadas têm de ser idênticas
+    colunas = ['faturamento_formatado', 'impostos_formatado',
+               'faturamento_acumulado_formatado', 'impostos_acumulados_formatado']
+    divergencias = sum(
+        int((antigo[col] != novo[col]).sum()) for antigo, novo in zip(legado, vetorizado) for col in colunas
+    )
+    divergencias += sum(
+        int((pd.concat([antigo[col] for antigo in legado], ignore_index=True) != carteira[col]).sum())
+        for col in colunas
+    )
+
+    print(f"Implementação anterior:   {tempo_legado:8.3f} s ({tempo_legado / empresas * 1000:.2f} ms/empresa)")
+    print(f"Implementação vetorizada: {tempo_vetorizado:8.3f} s ({tempo_vetorizado / empresas * 1000:.2f} ms/empresa)")
+    print(f"Carteira numa só chamada: {tempo_carteira:8.3f} s ({tempo_carteira / empresas * 1000:.2f} ms/empresa)")
+    print(f"Ganho por empresa: {tempo_legado / tempo_vetorizado:.1f}x | em lote: {tempo_legado / tempo_carteira:.1f}x")
+    print(f"Divergências na formatação BRL: {divergencias}")
+
+
+if __name__ == "__main__":
+    # Uso: python scripts/bench_preparar_graficos.py [EMPRESAS] [MESES]
+    argumentos = [int(a) for a in sys.argv[1:3]]
+    executar(*argumentos)
@@ -0,0 +1,131 @@
+# Em: scripts/bench_renderizadores.py
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Adiciona o diretório raiz ao path para permitir importações da 'app'
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+CNPJ_EXEMPLO = "20.295.854/0001-50"
+
+
+def _rss_kb(pid: int) -> int:
+    """RSS atual de um processo (kB), lido de /proc (Linux)."""
+    try:
+        for linha in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if linha.startswith("VmRSS:"):
+                return int(linha.split()[1])
+    except (FileNotFoundError, ProcessLookupError):
+        pass
+    return 0
+
+
+def _descendentes(pid: int) -> list:
+    """PIDs dos processos filhos (recursivamente): o kaleido corre num subprocesso com Chromium."""
+    filhos = []
+    for tarefa in Path(f"/proc/{pid}/task").glob("*"):
+        try:
+            filhos += [int(p) for p in (tarefa / "children").read_text().split()]
+        except FileNotFoundError:
+            continue
+    return filhos + [neto for filho in filhos for neto in _descendentes(filho)]
+
+
+def rss_total_kb(pid: int) -> int:
+    return _rss_kb(pid) + sum(_rss_kb(filho) for filho in _descendentes(pid))
+
+
+def graficos_de_exemplo(meses: int = 12):
+    """Os 13 geradores de gráficos com dados de exemplo no formato de analytics_service."""
+    from app.services import charts as charts_service
+    from app.services.analytics_service import montar_dataframe_graficos
+
+    rng = np.random.default_rng(42)
+    competencias = [date(2024 + m // 12, m % 12 + 1, 1) for m in range(meses)]
+    faturamento = rng.integers(100_000_00, 500_000_00, size=meses, dtype=np.int64)
+    serie = montar_dataframe_graficos(competencias, faturamento, faturamento * 6 // 100)
+    medidor = {"rba": 2_100_000.0, "limite": 4_800_000.0, "sublimite": 3_600_000.0}
+    rosca = {"IRPJ": 1200.0, "CSLL": 800.0, "COFINS": 2500.0, "PIS": 540.0, "ISS": 3100.0}
+    tributos_lp = pd.DataFrame([
+        {"Mês": c.strftime("%Y-%m"), "Tributo": tributo, "Valor": 0.0, "Percentual": percentual}
+        for c in competencias for tributo, percentual in (("Devido", 70.0), ("Retido", 30.0))
+    ])
+    dados = {
+        "sn_faturamento": serie, "sn_receita_crescimento": serie, "sn_impostos_carga": serie,
+        "sn_acumulado": serie, "sn_limite_faturamento": medidor, "sn_sublimite_receita": medidor,
+        "sn_segregacao_tributos": rosca, "lp_receita_crescimento": serie, "lp_impostos_carga": serie,
+        "lp_acumulado": serie, "lp_tributos_detalhado": tributos_lp, "lp_tributos_ano": rosca,
+        "lp_limite_faturamento": {"faturamento_exercicio": 9_500_000.0},
+    }
+    return [(nome, getattr(charts_service, f"gerar_grafico_{nome}"), dados[nome]) for nome in dados]
+
+
+def medir_backend(backend: str, repeticoes: int) -> dict:
+    """
+    Corre no processo filho: renderiza cada gráfico 'repeticoes' vezes com o backend
+    indicado e devolve a latência por gráfico, o arranque (primeira imagem) e o pico de RSS.
+    """
+    from app.services import renderizador
+
+    figuras = [(nome, gerar.montar_figura(dados, CNPJ_EXEMPLO).to_plotly_json()) for nome, gerar, dados in graficos_de_exemplo()]
+
+    rss_inicial = rss_total_kb(os.getpid())
+    inicio = time.perf_counter()
+    renderizador._renderizar(figuras[0][1], "png", 1200, 800, 2, backend)
+    arranque = time.perf_counter() - inicio
+
+    latencias = {}
+    pico = rss_total_kb(os.getpid())
+    for nome, figura in figuras:
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            renderizador._renderizar(figura, "png", 1200, 800, 2, backend)
+            tempos.append(time.perf_counter() - inicio)
+            pico = max(pico, rss_total_kb(os.getpid()))
+        latencias[nome] = statistics.median(tempos) * 1000
+    return {"arranque_ms": arranque * 1000, "latencias_ms": latencias, "rss_inicial_kb": rss_inicial, "rss_pico_kb": pico}
+
+
+def executar(repeticoes: int = 5, backends=("kaleido", "matplotlib")):
+    """Compara os backends de renderização, cada um num processo novo (arranque e memória isolados)."""
+    resultados = {}
+    for backend in backends:
+        processo = subprocess.run(
+            [sys.executable, __file__, "--filho", backend, str(repeticoes)],
+            capture_output=True, text=True,
+        )
+        if processo.returncode != 0:
+            print(f"[{backend}] falhou: {processo.stderr.strip().splitlines()[-1:]}")
+            continue
+        resultados[backend] = json.loads(processo.stdout.strip().splitlines()[-1])
+
+    print(f"--- Benchmark de renderização PNG 1200x800 @2x ({repeticoes} repetições, mediana por gráfico) ---")
+    nomes = next(iter(resultados.values()))["latencias_ms"] if resultados else {}
+    print(f"{'gráfico':<26}" + "".join(f"{b:>14}" for b in resultados))
+    for nome in nomes:
+        print(f"{nome:<26}" + "".join(f"{r['latencias_ms'][nome]:>11.1f} ms" for r in resultados.values()))
+    print(f"{'mediana dos 13':<26}" + "".join(
+        f"{statistics.median(r['latencias_ms'].values()):>11.1f} ms" for r in resultados.values()))
+    print(f"{'primeira imagem':<26}" + "".join(f"{r['arranque_ms']:>11.1f} ms" for r in resultados.values()))
+    print(f"{'RSS inicial':<26}" + "".join(f"{r['rss_inicial_kb'] / 1024:>11.1f} MB" for r in resultados.values()))
+    print(f"{'RSS pico (c/ filhos)':<26}" + "".join(f"{r['rss_pico_kb'] / 1024:>11.1f} MB" for r in resultados.values()))
+
+
+if __name__ == "__main__":
+    # Uso: python scripts/bench_renderizadores.py [REPETICOES] [BACKEND ...]
+    if len(sys.argv) > 1 and sys.argv[1] == "--filho":
+        print(json.dumps(medir_backend(sys.argv[2], int(sys.argv[3]))))
+    else:
+        argumentos = sys.argv[1:]
+        repeticoes = int(argumentos[0]) if argumentos else 5
+        executar(repeticoes, tuple(argumentos[1:]) or ("kaleido", "matplotlib"))
@@ -1,87 +1,35 @@
 # Em: scripts/cleanup_charts.py
 
-import os
 from pathlib import Path
-from datetime import datetime, timedelta
 import sys
 
 # Adiciona o diretório raiz ao path para permitir importações da 'app'
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 
+from app.core.config import settings
 from app.core.database import SessionLocal
-from app.models.grafico import Grafico
-from app.crud.grafico import remover_graficos_antigos
+from app.services.manutencao_graficos import ManutencaoGraficos
 
-# --- Configurações ---
-DIRETORIO_GRAFICOS = Path("static/charts")
-DIAS_PARA_MANTER = 30 # Apagar gráficos com mais de 30 dias
-
-def limpar_graficos_orfãos():
+def limpar_graficos():
     """
-    Compara o banco de dados e o sistema de arquivos para remover
-    registros sem arquivos e arquivos sem registros.
+    Passagem manual da manutenção da cache de gráficos, a mesma que a aplicação
+    corre periodicamente: gráficos sem acesso há mais de CHARTS_MAX_IDADE_DIAS,
+    registos sem ficheiro, ficheiros sem registo e orçamento de disco (LRU).
     """
-    print("--- Iniciando limpeza de gráficos órfãos ---")
-    db = SessionLocal()
-    
-    # 1. Encontrar registros no DB sem arquivo físico
-    registros_db = db.query(Grafico).all()
-    registros_a_remover = []
-    
-    for registro in registros_db:
-        if not Path(registro.caminho_arquivo).exists():
-            print(f"[DB -> FS] Arquivo não encontrado para o registro {registro.id}. Marcando para remoção.")
-            registros_a_remover.append(registro)
-
-    if registros_a_remover:
-        for registro in registros_a_remover:
-            db.delete(registro)
-        db.commit()
-        print(f"✅ {len(registros_a_remover)} registros órfãos removidos do banco de dados.")
-
-    # 2. Encontrar arquivos físicos sem registro no DB
-    caminhos_db = {g.caminho_arquivo for g in registros_db}
-    arquivos_removidos = 0
-    
-    for arquivo in DIRETORIO_GRAFICOS.glob("*.png"):
-        caminho_str = str(arquivo).replace('\\', '/')
-        if caminho_str not in caminhos_db:
-            print(f"[FS -> DB] Registro não encontrado para o arquivo {caminho_str}. Removendo arquivo.")
-            os.remove(arquivo)
-            arquivos_removidos += 1
-            
-    if arquivos_removidos > 0:
-        print(f"✅ {arquivos_removidos} arquivos órfãos removidos da pasta de gráficos.")
-
-    db.close()
-    print("--- Limpeza de órfãos concluída ---")
-
-def limpar_graficos_por_data():
-    """Remove gráficos (arquivo e registro) mais antigos que o limite definido."""
-    print(f"\n--- Iniciando limpeza de gráficos com mais de {DIAS_PARA_MANTER} dias ---")
+    print("--- Iniciando limpeza da cache de gráficos ---")
     db = SessionLocal()
-    
-    data_limite = datetime.now() - timedelta(days=DIAS_PARA_MANTER)
-    
-    graficos_antigos = db.query(Grafico).filter(Grafico.data_criacao < data_limite).all()
-    
-    if not graficos_antigos:
-        print("Nenhum gráfico antigo para remover.")
+    try:
+        relatorio = ManutencaoGraficos().executar(db)
+    finally:
         db.close()
-        return
 
-    print(f"Encontrados {len(graficos_antigos)} gráficos para remover...")
-    for grafico in graficos_antigos:
-        if Path(grafico.caminho_arquivo).exists():
-            os.remove(grafico.caminho_arquivo)
-        db.delete(grafico)
-        
-    db.commit()
-    db.close()
-    print(f"✅ {len(graficos_antigos)} gráficos antigos removidos com sucesso.")
-    print("--- Limpeza por data concluída ---")
+    print(f"✅ {relatorio['expirados']} gráficos sem acesso há mais de {settings.CHARTS_MAX_IDADE_DIAS} dias removidos.")
+    print(f"✅ {relatorio['registos_sem_ficheiro']} registos sem arquivo removidos do banco de dados.")
+    print(f"✅ {relatorio['ficheiros_orfaos']} arquivos sem registo removidos da pasta de gráficos.")
+    print(f"✅ {relatorio['despejados']} gráficos despejados para respeitar o limite de {settings.CHARTS_CACHE_MAX_BYTES / 1024 / 1024:.0f} MB.")
+    print(f"Ocupação atual: {relatorio['bytes_em_disco'] / 1024 / 1024:.1f} MB")
+    print("--- Limpeza concluída ---")
 
 
 if __name__ == "__main__":
-    limpar_graficos_orfãos()
-    limpar_graficos_por_data()
\ No newline at end of file
+    limpar_graficos()
@@ -0,0 +1,43 @@
+# Em: scripts/enviar_relatorios_mensais.py
+
+import argparse
+import sys
+from datetime import date
+from pathlib import Path
+
+# Adiciona o diretório raiz ao path para permitir importações da 'app'
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from app.core.database import SessionLocal
+from app.models.grafico import Grafico # Necessário para a relação Documento.graficos
+from app.services.email_sender import PoolSMTP, enviar_relatorios_mensais
+
+def enviar(competencia: str, cnpjs: list[str] | None, ligacoes: int | None):
+    """
+    Envia o relatório mensal da competência aos contatos de todas as empresas
+    (ou das indicadas). Pode ser repetido: o que já foi entregue não sai de novo.
+    """
+    mes, ano = map(int, competencia.split("/"))
+    print(f"--- Iniciando envio dos relatórios mensais de {competencia} ---")
+    db = SessionLocal()
+    try:
+        with PoolSMTP(tamanho=ligacoes) as pool:
+            resumo = enviar_relatorios_mensais(db, data_competencia=date(ano, mes, 1), cnpjs=cnpjs, pool=pool)
+        print(f"✅ {resumo['enviados']} enviados, {resumo['ignorados']} já enviados antes, {resumo['falhados']} com erro.")
+        print(f"Empresas sem contato: {len(resumo['sem_contato'])} | sem relatório: {len(resumo['sem_relatorio'])}")
+        print(f"Tempo: {resumo['tempo_total_s']}s ({pool.ligacoes_abertas} ligações SMTP)")
+    except Exception as e:
+        print(f"❌ Ocorreu um erro durante o envio dos relatórios: {e}")
+    finally:
+        db.close()
+    print("--- Envio concluído ---")
+
+
+if __name__ == "__main__":
+    # Uso: python scripts/enviar_relatorios_mensais.py 03/2025 [CNPJ ...] [--ligacoes 4]
+    parser = argparse.ArgumentParser(description="Envio dos relatórios mensais por email.")
+    parser.add_argument("competencia", help="Mês de competência no formato MM/AAAA")
+    parser.add_argument("cnpjs", nargs="*", help="CNPJs a incluir (por omissão, todas as empresas ativas)")
+    parser.add_argument("--ligacoes", type=int, help="Ligações SMTP em paralelo (por omissão, SMTP_LIGACOES)")
+    args = parser.parse_args()
+    enviar(args.competencia, args.cnpjs or None, args.ligacoes)
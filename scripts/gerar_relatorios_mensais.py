@@ -0,0 +1,54 @@
+# Em: scripts/gerar_relatorios_mensais.py
+
+import argparse
+import sys
+from datetime import date
+from pathlib import Path
+
+# Adiciona o diretório raiz ao path para permitir importações da 'app'
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from app.core.database import SessionLocal
+from app.models.grafico import Grafico # Necessário para a relação Documento.graficos
+from app.services.relatorios_lote import FORMATOS_SUPORTADOS, gerar_relatorios_em_lote
+
+def gerar(competencia: str, cnpjs: list[str] | None, formato: str, destino: str | None, processos: int | None,
+          resumos: bool = False):
+    """
+    Gera os relatórios do fecho do mês de todas as empresas (ou das indicadas)
+    num único ficheiro JSON-lines ou Parquet.
+    """
+    mes, ano = map(int, competencia.split("/"))
+    print(f"--- Iniciando relatórios mensais de {competencia} ---")
+    db = SessionLocal()
+    try:
+        resumo = gerar_relatorios_em_lote(
+            db,
+            data_competencia=date(ano, mes, 1),
+            cnpjs=cnpjs,
+            formato=formato,
+            destino=Path(destino) if destino else None,
+            processos=processos,
+            resumos=resumos,
+        )
+        print(f"✅ {resumo['ok']} relatórios gerados, {resumo['erros']} com erro.")
+        print(f"Tempo: {resumo['tempo_total_s']}s (carga dos dados: {resumo['tempo_carga_s']}s)")
+        print(f"Artefacto: {resumo['destino']}")
+    except Exception as e:
+        print(f"❌ Ocorreu um erro durante a geração dos relatórios: {e}")
+    finally:
+        db.close()
+    print("--- Relatórios concluídos ---")
+
+
+if __name__ == "__main__":
+    # Uso: python scripts/gerar_relatorios_mensais.py 03/2025 [CNPJ ...] [--formato parquet] [--processos 4] [--resumos]
+    parser = argparse.ArgumentParser(description="Relatórios mensais em lote.")
+    parser.add_argument("competencia", help="Mês de competência no formato MM/AAAA")
+    parser.add_argument("cnpjs", nargs="*", help="CNPJs a incluir (por omissão, todas as empresas ativas)")
+    parser.add_argument("--formato", choices=FORMATOS_SUPORTADOS, default="jsonl")
+    parser.add_argument("--saida", help="Caminho do ficheiro de saída")
+    parser.add_argument("--processos", type=int, help="Número de processos (0 para não usar pool)")
+    parser.add_argument("--resumos", action="store_true", help="Inclui o resumo em texto dos KPIs (RESUMO_BACKEND)")
+    args = parser.parse_args()
+    gerar(args.competencia, args.cnpjs or None, args.formato, args.saida, args.processos, args.resumos)
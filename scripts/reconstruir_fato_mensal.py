@@ -0,0 +1,34 @@
+# Em: scripts/reconstruir_fato_mensal.py
+
+import sys
+from pathlib import Path
+
+# Adiciona o diretório raiz ao path para permitir importações da 'app'
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from app.core.database import SessionLocal
+from app.models.grafico import Grafico # Necessário para a relação Documento.graficos
+from app.crud.fato_mensal import reconstruir_fato_mensal
+
+def reconstruir(cnpjs: list[str] | None = None):
+    """
+    Recalcula a tabela fato_mensal a partir dos dados fiscais existentes.
+    Útil para a carga inicial da tabela e para corrigir divergências.
+    """
+    alvo = ", ".join(cnpjs) if cnpjs else "todas as empresas"
+    print(f"--- Iniciando reconstrução da tabela fato_mensal ({alvo}) ---")
+    db = SessionLocal()
+    try:
+        linhas = reconstruir_fato_mensal(db, cnpjs=cnpjs)
+        print(f"✅ {linhas} linhas de factos mensais recalculadas.")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Ocorreu um erro durante a reconstrução: {e}")
+    finally:
+        db.close()
+    print("--- Reconstrução concluída ---")
+
+
+if __name__ == "__main__":
+    # Uso: python scripts/reconstruir_fato_mensal.py [CNPJ ...]
+    reconstruir(sys.argv[1:] or None)
@@ -3,6 +3,8 @@
 import sys
 import os
 import pytest
+from datetime import date
+from decimal import Decimal
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
@@ -15,6 +17,11 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 # --- Importações da sua aplicação ---
 # Estas importações só são possíveis por causa da linha `sys.path.insert` acima
 from app.core.database import Base, get_db
+from app.crud import dados_fiscais as crud_dados_fiscais
+from app.models.documento import Documento
+from app.models.empresa import Empresa
+from app.routers import analytics, charts_router, documentos, empresas, relatorios, upload
+from app.services import charts as charts_service
 from main import app
 
 # --- Configuração da Base de Dados de TESTE (em memória) ---
@@ -28,6 +35,13 @@ engine = create_engine(
 
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+CNPJ_TESTE = "20.295.854/0001-50"
+
+# Dependências de sessão da API: além da geral, cada router tem o seu get_db
+_DEPENDENCIAS_DB = (
+    get_db, analytics.get_db, charts_router.get_db, documentos.get_db, empresas.get_db, relatorios.get_db, upload.get_db,
+)
+
 
 # --- Função para Substituir a Base de Dados ---
 def override_get_db():
@@ -64,4 +78,83 @@ def client():
     Base.metadata.drop_all(bind=engine)
     
     # 5. (Pós-teste) Remove a substituição para não afetar outros possíveis testes
-    app.dependency_overrides.clear()
\ No newline at end of file
+    app.dependency_overrides.clear()
+
+@pytest.fixture(scope="function")
+def db():
+    """
+    Fornece uma sessão da base de dados de teste, com as tabelas criadas,
+    para os testes que chamam diretamente os serviços e o CRUD.
+    """
+    Base.metadata.create_all(bind=engine)
+    sessao = TestingSessionLocal()
+    try:
+        yield sessao
+    finally:
+        sessao.close()
+        Base.metadata.drop_all(bind=engine)
+
+
+def criar_registo_fiscal(db, empresa, tipo_documento, competencia, valor_total, impostos):
+    """
+    Cria um documento para a empresa e salva os seus dados fiscais pelo CRUD,
+    tal como acontece após o processamento de um upload.
+    """
+    documento = Documento(
+        empresa_id=empresa.id,
+        tipo_documento=tipo_documento,
+        nome_arquivo_original="teste.pdf",
+        nome_arquivo_unico=f"{empresa.id}-{tipo_documento}-{competencia.isoformat()}.pdf",
+        tipo_arquivo="application/pdf",
+        caminho_arquivo="data/uploads/teste.pdf",
+    )
+    db.add(documento)
+    db.commit()
+    crud_dados_fiscais.salvar_dados_fiscais(
+        db,
+        documento_id=documento.id,
+        dados_extraidos={
+            "cnpj": empresa.cnpj,
+            "periodo": competencia.strftime("%m/%Y"),
+            "valor_total": Decimal(str(valor_total)),
+            **impostos,
+        },
+    )
+    return documento
+
+
+@pytest.fixture(scope="function")
+def cliente_api(db):
+    """Cliente da API com todas as rotas ligadas à base de dados de teste (a do fixture db)."""
+    for dependencia in _DEPENDENCIAS_DB:
+        app.dependency_overrides[dependencia] = override_get_db
+    try:
+        yield TestClient(app)
+    finally:
+        for dependencia in _DEPENDENCIAS_DB:
+            app.dependency_overrides.pop(dependencia, None)
+
+
+@pytest.fixture(scope="function")
+def charts_dir(tmp_path, monkeypatch):
+    """Pasta temporária, vazia, no lugar de static/charts (charts_service.CHARTS_DIR)."""
+    pasta = tmp_path / "charts"
+    pasta.mkdir()
+    monkeypatch.setattr(charts_service, "CHARTS_DIR", pasta)
+    return pasta
+
+
+@pytest.fixture(scope="function")
+def empresa_sn(db):
+    """Empresa do Simples Nacional com o CNPJ_TESTE, ainda sem dados fiscais."""
+    empresa = Empresa(cnpj=CNPJ_TESTE, regime_tributario="Simples Nacional", razao_social="Empresa Teste Lda")
+    db.add(empresa)
+    db.commit()
+    return empresa
+
+
+@pytest.fixture(scope="function")
+def empresa_sn_com_pgdas(db, empresa_sn):
+    """empresa_sn com o PGDAS de 02/2025: faturamento de 1000, tributos de 60 (IRPJ 10)."""
+    criar_registo_fiscal(db, empresa_sn, "PGDAS", date(2025, 2, 1), "1000.00", {"total_debitos_tributos": "60.00", "irpj": "10.00"})
+    return empresa_sn
@@ -0,0 +1,113 @@
+# tests/test_admissao.py
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.admissao import ClasseAdmissao, ControloAdmissao, MiddlewareAdmissao, SobrecargaError
+from main import app
+
+
+def test_fila_limitada_e_passagem_da_vaga():
+    async def cenario():
+        classe = ClasseAdmissao("graficos", limite=1, tamanho_fila=1, espera_max_s=5)
+        await classe.entrar()
+        segundo = asyncio.create_task(classe.entrar())
+        await asyncio.sleep(0)
+        assert (classe.em_execucao, classe.em_espera) == (1, 1)
+
+        # Fila cheia: rejeição imediata, sem esperar
+        with pytest.raises(SobrecargaError):
+            await classe.entrar()
+
+        classe.sair()  # A vaga passa diretamente ao pedido em espera
+        await segundo
+        assert (classe.em_execucao, classe.em_espera) == (1, 0)
+        classe.sair()
+        return classe.metricas()
+
+    metricas = asyncio.run(cenario())
+    assert metricas["em_execucao"] == 0
+    assert metricas["admitidos"] == 2
+    assert metricas["rejeitados_fila_cheia"] == 1
+    assert metricas["espera_max_s"] > 0
+    assert sum(metricas["histograma_espera_s"].values()) == 2
+
+
+def test_espera_esgotada_e_desistencia_libertam_a_fila():
+    async def cenario():
+        classe = ClasseAdmissao("documentos", limite=1, tamanho_fila=2, espera_max_s=0.05)
+        await classe.entrar()
+        with pytest.raises(SobrecargaError):
+            await classe.entrar()
+
+        desistente = asyncio.create_task(classe.entrar())
+        await asyncio.sleep(0)
+        desistente.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await desistente
+        assert classe.em_espera == 0
+
+        classe.sair()
+        return classe.metricas()
+
+    metricas = asyncio.run(cenario())
+    assert metricas["rejeitados_tempo_esgotado"] == 1
+    assert (metricas["em_execucao"], metricas["em_espera"]) == (0, 0)
+
+
+def test_middleware_responde_503_so_na_classe_saturada():
+    respostas = []
+
+    async def cenario():
+        evento = asyncio.Event()
+
+        async def aplicacao(scope, receive, send):
+            if scope["path"].startswith("/charts/"):
+                await evento.wait()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"ok"})
+
+        controlo = ControloAdmissao(
+            [ClasseAdmissao("graficos", limite=1, tamanho_fila=0, espera_max_s=1)],
+            [("GET", r"^/charts/", "graficos")], retry_after_s=3,
+        )
+        middleware = MiddlewareAdmissao(aplicacao, controlo)
+
+        async def pedido(caminho):
+            mensagens = []
+
+            async def receive():
+                return {"type": "http.request", "body": b""}
+
+            async def send(mensagem):
+                mensagens.append(mensagem)
+
+            await middleware({"type": "http", "method": "GET", "path": caminho, "headers": []}, receive, send)
+            respostas.append((caminho, mensagens[0]["status"], dict(mensagens[0]["headers"])))
+
+        lento = asyncio.create_task(pedido("/charts/simples-nacional/faturamento"))
+        await asyncio.sleep(0)
+        await pedido("/charts/simples-nacional/acumulado-anual")
+        await pedido("/empresas/")
+        evento.set()
+        await lento
+        return controlo.metricas()
+
+    metricas = asyncio.run(cenario())
+    assert respostas[0][:2] == ("/charts/simples-nacional/acumulado-anual", 503)
+    assert respostas[0][2][b"retry-after"] == b"3"
+    assert respostas[1][:2] == ("/empresas/", 200)
+    assert respostas[2][:2] == ("/charts/simples-nacional/faturamento", 200)
+    assert metricas["graficos"]["rejeitados_fila_cheia"] == 1
+    assert metricas["graficos"]["em_execucao"] == 0
+
+
+def test_endpoint_de_metricas():
+    resposta = TestClient(app).get("/metricas/admissao")
+
+    assert resposta.status_code == 200
+    corpo = resposta.json()
+    assert set(corpo) == {"documentos", "graficos"}
+    assert {"em_espera", "em_execucao", "espera_media_s", "histograma_espera_s"} <= set(corpo["graficos"])
@@ -0,0 +1,134 @@
+# tests/test_analytics_lote.py
+
+from datetime import date
+from decimal import Decimal
+
+from app.models.empresa import Empresa
+from app.services import analytics_service
+from tests.conftest import criar_registo_fiscal
+
+CNPJ_SN = "20.295.854/0001-50"
+CNPJ_LP = "12.811.719/0001-31"
+
+
+def _popular_carteira(db):
+    sn = Empresa(cnpj=CNPJ_SN, regime_tributario="Simples Nacional")
+    lp = Empresa(cnpj=CNPJ_LP, regime_tributario="Lucro Presumido (Serviços)")
+    db.add_all([sn, lp])
+    db.flush()
+
+    criar_registo_fiscal(db, sn, "PGDAS", date(2025, 2, 1), "1000.00", {"total_debitos_tributos": "60.00"})
+    criar_registo_fiscal(db, sn, "PGDAS", date(2025, 3, 1), "1500.00", {"total_debitos_tributos": "90.00"})
+    criar_registo_fiscal(db, sn, "Encerramento ISS", date(2025, 3, 1), "1500.00", {"qtd_nfse_emitidas": 3})
+
+    criar_registo_fiscal(db, lp, "MIT", date(2025, 2, 1), "2000.00", {"csll": "20.00", "irpj": "30.00"})
+    criar_registo_fiscal(db, lp, "MIT", date(2025, 3, 1), "1000.00", {"csll": "10.00", "irpj": "15.00"})
+    db.commit()
+
+
+def test_kpis_em_lote_calcula_todas_as_empresas(db):
+    _popular_carteira(db)
+
+    colunas = analytics_service.calcular_kpis_em_lote(db, data_inicio=date(2025, 3, 1), data_fim=date(2025, 3, 31))
+
+    assert colunas["cnpj"] == [CNPJ_LP, CNPJ_SN]
+    por_cnpj = {cnpj: i for i, cnpj in enumerate(colunas["cnpj"])}
+
+    sn = por_cnpj[CNPJ_SN]
+    assert colunas["faturamento"][sn] == 1500.0
+    assert colunas["carga_tributaria_percentual"][sn] == 6.0
+    assert colunas["ticket_medio"][sn] == 500.0
+    assert colunas["crescimento_faturamento_percentual"][sn] == 50.0
+
+    lp = por_cnpj[CNPJ_LP]
+    assert colunas["faturamento"][lp] == 1000.0
+    assert colunas["total_impostos"][lp] == 25.0
+    assert colunas["crescimento_faturamento_percentual"][lp] == -50.0
+
+
+def test_kpis_em_lote_coincide_com_kpis_individuais(db):
+    _popular_carteira(db)
+    inicio, fim = date(2025, 3, 1), date(2025, 3, 31)
+
+    colunas = analytics_service.calcular_kpis_em_lote(db, data_inicio=inicio, data_fim=fim, cnpjs=[CNPJ_SN])
+
+    assert colunas["cnpj"] == [CNPJ_SN]
+    carga = analytics_service.calcular_carga_tributaria(db, cnpj=CNPJ_SN, regime="Simples Nacional", data_inicio=inicio, data_fim=fim)
+    ticket = analytics_service.calcular_ticket_medio(db, cnpj=CNPJ_SN, regime="Simples Nacional", data_inicio=inicio, data_fim=fim)
+    assert Decimal(str(colunas["carga_tributaria_percentual"][0])) == carga
+    assert Decimal(str(colunas["ticket_medio"][0])) == ticket
+
+
+def test_endpoint_kpis_em_lote(db, cliente_api):
+    _popular_carteira(db)
+    response = cliente_api.get(
+        "/analytics/kpis/lote",
+        params={"data_inicio": "2025-03-01", "data_fim": "2025-03-31"}
+    )
+
+    assert response.status_code == 200, response.text
+    corpo = response.json()
+    assert corpo["cnpj"] == [CNPJ_LP, CNPJ_SN]
+    assert len(corpo["ticket_medio"]) == 2
+
+
+def test_serie_kpis_usa_mes_anterior_e_acumula(db):
+    _popular_carteira(db)
+    sn = db.query(Empresa).filter(Empresa.cnpj == CNPJ_SN).one()
+    # Abril em falta: maio não pode comparar com março
+    criar_registo_fiscal(db, sn, "PGDAS", date(2025, 5, 1), "2000.00", {"total_debitos_tributos": "100.00"})
+
+    serie = analytics_service.calcular_serie_kpis(
+        db, cnpj=CNPJ_SN, regime="Simples Nacional", data_inicio=date(2025, 3, 1), data_fim=date(2025, 5, 31)
+    )
+
+    assert [mes["competencia"] for mes in serie] == [date(2025, 3, 1), date(2025, 5, 1)]
+    marco, maio = serie
+    assert marco["crescimento_faturamento_percentual"] == Decimal("50.00")
+    assert marco["variacao_tributos_percentual"] == Decimal("50.00")
+    assert marco["faturamento_acumulado"] == Decimal("1500.00")
+    assert maio["crescimento_faturamento_percentual"] is None
+    assert maio["faturamento_acumulado"] == Decimal("3500.00")
+    assert maio["carga_tributaria_percentual"] == Decimal("5.00")
+
+    # Os KPIs por período reutilizam a mesma série
+    assert analytics_service.calcular_crescimento_faturamento(
+        db, cnpj=CNPJ_SN, regime="Simples Nacional",
+        data_inicio_atual=date(2025, 3, 1), data_fim_atual=date(2025, 3, 31)
+    ) == Decimal("50.00")
+    assert analytics_service.calcular_variacao_tributos_mensal(
+        db, cnpj=CNPJ_SN, regime="Simples Nacional",
+        data_inicio_atual=date(2025, 3, 1), data_fim_atual=date(2025, 3, 31)
+    ) == Decimal("50.00")
+
+
+def test_endpoint_serie_kpis(db, cliente_api):
+    _popular_carteira(db)
+    resposta = cliente_api.get("/analytics/kpis/serie", params={
+        "cnpj": CNPJ_LP, "regime": "Lucro Presumido (Serviços)",
+        "data_inicio": "2025-02-01", "data_fim": "2025-03-31",
+    })
+
+    assert resposta.status_code == 200
+    meses = resposta.json()["meses"]
+    assert len(meses) == 2
+    assert meses[0]["crescimento_faturamento_percentual"] is None
+    assert float(meses[1]["crescimento_faturamento_percentual"]) == -50.0
+
+
+def test_montar_dataframe_graficos_por_empresa_em_centavos():
+    df = analytics_service.montar_dataframe_graficos(
+        [date(2025, 2, 1), date(2025, 1, 1), date(2025, 1, 1), date(2025, 2, 1)],
+        [150_000_00, 100_000_00, 200_00, 0],
+        [9_000_00, 6_000_00, 1_00, 0],
+        grupos=["B", "B", "A", "A"],
+    )
+
+    assert list(df["grupo"]) == ["A", "A", "B", "B"]
+    assert list(df["mes_ano"]) == ["Jan/2025", "Feb/2025", "Jan/2025", "Feb/2025"]
+    assert list(df["faturamento_formatado"]) == ["R$ 200,00", "R$ 0,00", "R$ 100.000,00", "R$ 150.000,00"]
+    assert list(df["carga_formatado"]) == ["0.50%", "0.00%", "6.00%", "6.00%"]
+    # O crescimento e os acumulados recomeçam em cada empresa
+    assert list(df["crescimento_formatado"]) == ["0.00%", "-100.00%", "0.00%", "50.00%"]
+    assert list(df["faturamento_acumulado_formatado"])[2:] == ["R$ 100.000,00", "R$ 250.000,00"]
+    assert df["faturamento_acumulado"].iloc[3] == 250000.0
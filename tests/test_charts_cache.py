@@ -0,0 +1,45 @@
+# tests/test_charts_cache.py
+
+from app.core.config import settings
+from app.models.grafico import Grafico
+from app.services import charts as charts_service
+from tests.conftest import CNPJ_TESTE
+
+
+def test_pedido_repetido_serve_a_imagem_em_cache(db, charts_dir, monkeypatch):
+    renderizacoes = []
+    original = charts_service.renderizador.renderizar_imagem
+    monkeypatch.setattr(charts_service.renderizador, "renderizar_imagem",
+                        lambda fig, **opcoes: renderizacoes.append(1) or original(fig, **opcoes))
+
+    dados = {"IRPJ": 10.0, "CSLL": 5.0}
+    primeiro = charts_service.gerar_grafico_sn_segregacao_tributos(dados, CNPJ_TESTE, db)
+    segundo = charts_service.gerar_grafico_sn_segregacao_tributos(dict(dados), CNPJ_TESTE, db)
+    # O alias do Lucro Presumido é o mesmo gráfico: também é servido da cache
+    terceiro = charts_service.gerar_grafico_lp_tributos_ano(dados, CNPJ_TESTE, db)
+
+    assert primeiro == segundo == terceiro
+    assert len(renderizacoes) == 1
+    assert [p.name for p in charts_dir.iterdir()] == [primeiro.rsplit("/", 1)[-1]]
+
+    registo = db.query(Grafico).one()
+    assert registo.cnpj == CNPJ_TESTE
+    assert registo.tipo_grafico == "segregacao_tributos"
+    assert registo.tamanho_bytes > 0
+
+    # Dados diferentes geram outra imagem
+    outro = charts_service.gerar_grafico_sn_segregacao_tributos({"IRPJ": 11.0}, CNPJ_TESTE, db)
+    assert outro != primeiro
+    assert len(renderizacoes) == 2
+
+
+def test_despejo_por_tamanho_remove_a_menos_usada(db, charts_dir, monkeypatch):
+    antigo = charts_service.gerar_grafico_sn_segregacao_tributos({"IRPJ": 1.0}, CNPJ_TESTE, db)
+    tamanho = db.query(Grafico).one().tamanho_bytes
+    monkeypatch.setattr(settings, "CHARTS_CACHE_MAX_BYTES", tamanho + tamanho // 2)
+
+    novo = charts_service.gerar_grafico_sn_segregacao_tributos({"IRPJ": 2.0}, CNPJ_TESTE, db)
+
+    assert [g.caminho_arquivo for g in db.query(Grafico).all()] == [novo]
+    assert [p.name for p in charts_dir.iterdir()] == [novo.rsplit("/", 1)[-1]]
+    assert antigo != novo
@@ -0,0 +1,64 @@
+# tests/test_charts_formatos.py
+
+import pytest
+
+from app.models.grafico import Grafico
+from app.routers import charts_router
+from tests.conftest import CNPJ_TESTE
+
+PARAMS = {"cnpj": CNPJ_TESTE, "data_inicio": "2025-01-01", "data_fim": "2025-03-31"}
+ROTA = "/charts/lucro-presumido/tributos-ano"
+
+
+def test_cada_variante_tem_entrada_propria_na_cache(db, empresa_sn_com_pgdas, charts_dir, cliente_api):
+    png = cliente_api.get(ROTA, params=PARAMS)
+    miniatura = cliente_api.get(ROTA, params={**PARAMS, "largura": 400, "escala": 1})
+    svg = cliente_api.get(ROTA, params={**PARAMS, "formato": "svg", "escala": 3})
+    webp = cliente_api.get(ROTA, params=PARAMS, headers={"Accept": "image/webp, image/png;q=0.8, */*;q=0.5"})
+
+    assert png.headers["content-type"] == "image/png"
+    assert len(miniatura.content) < len(png.content)
+    assert svg.headers["content-type"] == "image/svg+xml" and b"<svg" in svg.content
+    assert webp.headers["content-type"] == "image/webp" and webp.headers["vary"] == "Accept"
+    assert "vary" not in svg.headers
+
+    assert len({png.headers["etag"], miniatura.headers["etag"], svg.headers["etag"], webp.headers["etag"]}) == 4
+    assert sorted(p.suffix for p in charts_dir.iterdir()) == [".png", ".png", ".svg", ".webp"]
+    assert db.query(Grafico).count() == 4
+
+
+def test_if_none_match_devolve_304_sem_renderizar(empresa_sn_com_pgdas, charts_dir, cliente_api):
+    primeira = cliente_api.get(ROTA, params={**PARAMS, "formato": "png"})
+    etag = primeira.headers["etag"]
+    for imagem in charts_dir.iterdir():
+        imagem.unlink()
+    segunda = cliente_api.get(ROTA, params={**PARAMS, "formato": "png"}, headers={"If-None-Match": f'"outro", {etag}'})
+    json_ = cliente_api.get(ROTA, params={**PARAMS, "formato": "json"}, headers={"If-None-Match": etag})
+
+    assert primeira.status_code == 200
+    assert primeira.headers["cache-control"] == "private, no-cache"
+    assert etag.startswith('"') and not etag.startswith("W/")
+    assert segunda.status_code == 304 and segunda.content == b""
+    assert segunda.headers["etag"] == etag
+    assert list(charts_dir.iterdir()) == []  # O 304 não voltou a renderizar a imagem
+
+    # A figura JSON tem o seu próprio ETag
+    assert json_.status_code == 200 and json_.headers["etag"] != etag
+
+
+@pytest.mark.parametrize("accept, esperado", [
+    (None, "png"),
+    ("image/png, image/svg+xml;q=0.1", "png"),
+    ("image/svg+xml, image/png;q=0.9", "svg"),
+    ("image/webp;q=0, image/png;q=0.5", "png"),
+    ("image/webp;q=0, */*", "png"),
+    ("image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8", "png"),  # <img> de um browser
+    ("image/webp, image/*;q=0.5", "webp"),
+    ("application/json", "json"),
+    ("application/json, image/png", "png"),
+    ("application/json;q=0.9, image/*;q=0.2", "json"),
+    ("text/html", "png"),
+])
+def test_accept_respeita_q_e_desempata_em_png(accept, esperado):
+    opcoes = charts_router.OpcoesGrafico(formato=None, largura=None, escala=None, accept=accept, if_none_match=None)
+    assert charts_router._negociar_formato(opcoes) == esperado
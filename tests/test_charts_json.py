@@ -0,0 +1,53 @@
+# tests/test_charts_json.py
+
+from datetime import date
+
+import numpy as np
+import orjson
+import pandas as pd
+import plotly.graph_objects as go
+
+from app.services import charts as charts_service
+from app.services import pacote_graficos
+from app.services.analytics_service import montar_dataframe_graficos
+from tests.conftest import CNPJ_TESTE
+
+PARAMS = {"cnpj": CNPJ_TESTE, "data_inicio": "2025-01-01", "data_fim": "2025-03-31"}
+
+
+def test_todos_os_graficos_tem_modo_json():
+    geradores = [nome for nome in dir(charts_service) if nome.startswith("gerar_grafico_")]
+    assert len(geradores) == 13
+    assert all(callable(getattr(getattr(charts_service, nome), "figura_json", None)) for nome in geradores)
+
+
+def test_rotas_devolvem_figura_json_sem_renderizar(empresa_sn_com_pgdas, charts_dir, cliente_api):
+    por_parametro = cliente_api.get("/charts/simples-nacional/faturamento", params={**PARAMS, "formato": "json"})
+    por_accept = cliente_api.get("/charts/lucro-presumido/tributos-ano", params=PARAMS,
+                                 headers={"Accept": "application/json"})
+
+    assert por_parametro.status_code == 200
+    assert por_parametro.headers["content-type"] == "application/json"
+    figura = orjson.loads(por_parametro.content)
+    assert figura["data"][0]["type"] == "bar"
+    assert f"CNPJ: {CNPJ_TESTE}" in figura["layout"]["title"]["text"]
+
+    assert orjson.loads(por_accept.content)["data"][0]["type"] == "pie"
+    assert list(charts_dir.iterdir()) == []
+
+
+def test_figuras_montadas_a_partir_dos_esqueletos_sao_validas():
+    competencias = [date(2025, mes, 1) for mes in (1, 2, 3)]
+    serie = montar_dataframe_graficos(competencias, np.array([100000, 150000, 120000]), np.array([6000, 9000, 7200]))
+    tributos_lp = pd.DataFrame([
+        {"Mês": c.strftime("%Y-%m"), "Tributo": tributo, "Valor": 0.0, "Percentual": percentual}
+        for c in competencias for tributo, percentual in (("Devido", 70.0), ("Retido", 30.0))
+    ])
+    dados = {"serie": serie, "medidor": {"rba": 2_100_000.0, "limite": 4_800_000.0, "sublimite": 3_600_000.0},
+             "rosca": {"IRPJ": 10.0, "ISS": 80.0}, "tributos_lp": tributos_lp, "medidor_lp": {"faturamento_exercicio": 9_500_000.0}}
+
+    for _, gerar, fonte in pacote_graficos.GRAFICOS_POR_REGIME["Simples Nacional"] + pacote_graficos.GRAFICOS_POR_REGIME["Lucro Presumido (Serviços)"]:
+        especificacao = gerar.montar_figura(dados[fonte], CNPJ_TESTE).to_plotly_json()
+        figura = go.Figure(especificacao)  # Validação completa do Plotly: levanta ValueError se algo for inválido
+        assert figura.layout.template.layout.legend.orientation == "h"  # Template da casa
+        assert CNPJ_TESTE in figura.layout.title.text
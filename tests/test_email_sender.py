@@ -0,0 +1,187 @@
+# tests/test_email_sender.py
+
+import smtplib
+import socket
+import time
+from datetime import date
+from email import message_from_bytes, policy
+
+import pytest
+
+pytest.importorskip("aiosmtpd")
+from aiosmtpd.controller import Controller
+
+from app.core.config import settings
+from app.models.empresa import Empresa
+from app.models.envio_email import EnvioEmail
+from app.services import email_sender, report_generator, resumidor
+from tests.conftest import criar_registo_fiscal
+
+
+class ServidorSMTP:
+    """Servidor SMTP local: guarda as mensagens e recusa os destinatários configurados."""
+
+    def __init__(self):
+        self.mensagens = []
+        self.respostas_rcpt = {}  # destinatário -> lista de respostas a dar (a última repete-se)
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        respostas = self.respostas_rcpt.get(address)
+        if respostas:
+            resposta = respostas.pop(0) if len(respostas) > 1 else respostas[0]
+            if not resposta.startswith("250"):
+                return resposta
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.mensagens.append((envelope.rcpt_tos[0], message_from_bytes(envelope.content, policy=policy.default)))
+        return "250 Mensagem aceite"
+
+
+@pytest.fixture
+def servidor(monkeypatch):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        porta = s.getsockname()[1]
+    tratador = ServidorSMTP()
+    controlador = Controller(tratador, hostname="127.0.0.1", port=porta)
+    controlador.start()
+    monkeypatch.setattr(settings, "SMTP_HOST", "127.0.0.1")
+    monkeypatch.setattr(settings, "SMTP_PORT", porta)
+    monkeypatch.setattr(settings, "EMAIL_ESPERA_BASE_S", 0.01)
+    monkeypatch.setattr(settings, "EMAIL_TAXA_POR_DOMINIO", 1000.0)
+    try:
+        yield tratador
+    finally:
+        controlador.stop()
+
+
+def _mensagem(email, numero=0):
+    return email_sender.MensagemEmail(chave=f"teste|{email}|{numero}", destinatario=email,
+                                      assunto=f"Assunto {numero}", corpo="Olá")
+
+
+def test_enviar_lote_reutiliza_ligacoes_e_nao_repete_o_que_ja_saiu(db, servidor):
+    mensagens = [_mensagem(f"cliente{i}@{'a' if i % 2 else 'b'}.pt", i) for i in range(12)]
+
+    with email_sender.PoolSMTP(tamanho=3) as pool:
+        resumo = email_sender.enviar_lote(db, mensagens, pool=pool)
+    assert (resumo["enviados"], resumo["ignorados"], resumo["falhados"]) == (12, 0, 0)
+    assert len(servidor.mensagens) == 12
+    # Doze mensagens por no máximo três ligações persistentes
+    assert 1 <= pool.ligacoes_abertas <= 3
+    assert {m["Subject"] for _, m in servidor.mensagens} == {f"Assunto {i}" for i in range(12)}
+    assert db.query(EnvioEmail).filter(EnvioEmail.estado == "enviado").count() == 12
+
+    # Nova execução do mesmo lote: nada sai
+    resumo = email_sender.enviar_lote(db, mensagens + [_mensagem("novo@a.pt")])
+    assert (resumo["enviados"], resumo["ignorados"]) == (1, 12)
+    assert len(servidor.mensagens) == 13
+
+
+def test_enviar_lote_repete_so_os_erros_temporarios(db, servidor):
+    servidor.respostas_rcpt = {
+        "ocupado@c.pt": ["451 Tente mais tarde", "250 OK"],
+        "inexistente@c.pt": ["550 Caixa inexistente"],
+        "sempre_ocupado@c.pt": ["452 Sem espaço"],
+    }
+    mensagens = [_mensagem(email) for email in ("ok@c.pt", "ocupado@c.pt", "inexistente@c.pt", "sempre_ocupado@c.pt")]
+
+    resumo = email_sender.enviar_lote(db, mensagens)
+
+    assert (resumo["enviados"], resumo["falhados"]) == (2, 2)
+    assert sorted(destino for destino, _ in servidor.mensagens) == ["ocupado@c.pt", "ok@c.pt"]
+    envios = {envio.destinatario: envio for envio in db.query(EnvioEmail).all()}
+    assert (envios["ocupado@c.pt"].estado, envios["ocupado@c.pt"].tentativas) == ("enviado", 2)
+    assert (envios["inexistente@c.pt"].estado, envios["inexistente@c.pt"].tentativas) == ("falhado", 1)
+    assert "550" in envios["inexistente@c.pt"].erro
+    assert (envios["sempre_ocupado@c.pt"].estado, envios["sempre_ocupado@c.pt"].tentativas) == ("falhado", settings.EMAIL_TENTATIVAS)
+
+    # Os que falharam voltam a ser tentados numa nova execução
+    servidor.respostas_rcpt = {}
+    resumo = email_sender.enviar_lote(db, mensagens)
+    assert (resumo["enviados"], resumo["ignorados"]) == (2, 2)
+
+
+def test_ligacao_devolvida_depois_de_fechar_o_pool_e_terminada(servidor):
+    pool = email_sender.PoolSMTP(tamanho=2)
+    with pool.ligacao() as (livre, _):
+        pass
+    with pool.ligacao() as (emprestada, _):
+        pool.fechar()  # Fecha a livre; a emprestada só quando voltar
+
+    assert livre is emprestada  # A mesma ligação, reutilizada
+    assert pool._livres == []
+    with pytest.raises(smtplib.SMTPServerDisconnected):
+        emprestada.noop()
+
+
+def test_classificacao_dos_erros():
+    assert email_sender.erro_temporario(smtplib.SMTPResponseException(451, b"Tente mais tarde"))
+    assert email_sender.erro_temporario(smtplib.SMTPServerDisconnected("ligação perdida"))
+    assert email_sender.erro_temporario(ConnectionRefusedError())
+    assert not email_sender.erro_temporario(smtplib.SMTPResponseException(550, b"Caixa inexistente"))
+    assert not email_sender.erro_temporario(smtplib.SMTPRecipientsRefused({"a@b.pt": (550, b"Recusado")}))
+    # Erros SMTP sem código não se resolvem a tentar de novo
+    assert not email_sender.erro_temporario(smtplib.SMTPNotSupportedError("STARTTLS não suportado"))
+    assert not email_sender.erro_temporario(smtplib.SMTPException("Nenhum método de autenticação"))
+
+
+def test_limitador_respeita_a_taxa_por_dominio():
+    limitador = email_sender.LimitadorDominio(taxa=20.0, rajada=2)
+    inicio = time.monotonic()
+    for _ in range(6):
+        limitador.aguardar("lento.pt")
+    limitador.aguardar("outro.pt")
+    # Duas na rajada e quatro a 20/s; o outro domínio não espera
+    assert time.monotonic() - inicio >= 0.19
+    assert limitador.aguardar("outro.pt") == 0.0
+
+
+def test_enviar_relatorios_mensais_anexa_o_relatorio_aos_contatos(db, servidor, empresa_sn, charts_dir, tmp_path, monkeypatch):
+    empresa_sn.contatos = [{"nome": "Ana", "email": "ana@cliente.pt"}, {"nome": "Rui", "email": "ANA@cliente.pt"},
+                           {"nome": "Sem email"}, {"nome": "Bia", "email": "bia@outro.pt"}]
+    db.add(Empresa(cnpj="11.111.111/0001-11", regime_tributario="Simples Nacional"))
+    db.commit()
+    criar_registo_fiscal(db, empresa_sn, "PGDAS", date(2025, 3, 1), "3000.00", {"total_debitos_tributos": "90.00"})
+    monkeypatch.setattr(report_generator, "PASTA_CACHE", tmp_path / "relatorios")
+    monkeypatch.setattr(report_generator, "weasyprint", None)
+    monkeypatch.setattr(resumidor, "PASTA_CACHE", tmp_path / "resumos")
+    geracoes = []
+    original = report_generator.gerar_relatorio
+    monkeypatch.setattr(report_generator, "gerar_relatorio", lambda *a, **k: geracoes.append(1) or original(*a, **k))
+
+    resumo = email_sender.enviar_relatorios_mensais(db, data_competencia=date(2025, 3, 15))
+    de_novo = email_sender.enviar_relatorios_mensais(db, data_competencia=date(2025, 3, 1))
+
+    assert resumo["enviados"] == 2 and resumo["sem_contato"] == ["11.111.111/0001-11"]
+    assert sorted(destino for destino, _ in servidor.mensagens) == ["ana@cliente.pt", "bia@outro.pt"]
+    _, mensagem = servidor.mensagens[0]
+    assert mensagem["Subject"] == "Relatório mensal 03/2025 - Empresa Teste Lda"
+    anexo = next(mensagem.iter_attachments())
+    assert anexo.get_filename() == "relatorio_20295854000150_202503.html"
+    assert "data:image/png;base64," in anexo.get_content()
+    # Segunda execução: nem envia nem volta a gerar o relatório
+    assert (de_novo["enviados"], de_novo["ignorados"]) == (0, 2)
+    assert geracoes == [1]
+
+
+def test_relatorio_sem_resumo_fica_para_a_execucao_seguinte(db, servidor, empresa_sn, charts_dir, tmp_path, monkeypatch):
+    empresa_sn.contatos = [{"nome": "Ana", "email": "ana@cliente.pt"}]
+    db.commit()
+    criar_registo_fiscal(db, empresa_sn, "PGDAS", date(2025, 3, 1), "3000.00", {"total_debitos_tributos": "90.00"})
+    monkeypatch.setattr(report_generator, "PASTA_CACHE", tmp_path / "relatorios")
+    monkeypatch.setattr(report_generator, "weasyprint", None)
+    monkeypatch.setattr(resumidor, "PASTA_CACHE", tmp_path / "resumos")
+    original = resumidor.resumir
+    monkeypatch.setattr(resumidor, "resumir", lambda *a, **k: None)
+
+    sem_resumo = email_sender.enviar_relatorios_mensais(db, data_competencia=date(2025, 3, 1))
+    monkeypatch.setattr(resumidor, "resumir", original)
+    com_resumo = email_sender.enviar_relatorios_mensais(db, data_competencia=date(2025, 3, 1))
+
+    assert sem_resumo["enviados"] == 0 and sem_resumo["sem_relatorio"][0]["cnpj"] == empresa_sn.cnpj
+    assert com_resumo["enviados"] == 1
+    _, mensagem = servidor.mensagens[0]
+    assert '<section class="resumo">' in next(mensagem.iter_attachments()).get_content()
@@ -0,0 +1,123 @@
+# tests/test_fato_mensal.py
+
+from datetime import date
+from decimal import Decimal
+
+from app.crud import dados_fiscais as crud_dados_fiscais
+from app.crud import documento as crud_documento
+from app.crud import fato_mensal as crud_fato_mensal
+from app.models.fato_mensal import FatoMensal
+from tests.conftest import CNPJ_TESTE, criar_registo_fiscal
+
+
+def _fatos(db):
+    return {
+        (f.competencia, f.tipo_documento): f
+        for f in db.query(FatoMensal).order_by(FatoMensal.competencia).all()
+    }
+
+
+def test_salvar_dados_fiscais_atualiza_fato_mensal(db, empresa_sn):
+    criar_registo_fiscal(db, empresa_sn, "PGDAS", date(2025, 3, 1), "1500.00",
+                         {"total_debitos_tributos": "R$ 90,00", "irpj": "10,00", "iss": "80,00"})
+    criar_registo_fiscal(db, empresa_sn, "Encerramento ISS", date(2025, 3, 1), "1500.00",
+                         {"qtd_nfse_emitidas": 3, "iss_devido": "75,00", "iss_retido": "5,00"})
+
+    fatos = _fatos(db)
+    pgdas = fatos[(date(2025, 3, 1), "PGDAS")]
+    assert pgdas.empresa_id == empresa_sn.id
+    assert pgdas.faturamento == Decimal("1500.00")
+    assert pgdas.total_tributos == Decimal("90.00")
+    assert pgdas.irpj == Decimal("10.00")
+    assert pgdas.iss == Decimal("80.00")
+
+    iss = fatos[(date(2025, 3, 1), "Encerramento ISS")]
+    assert iss.qtd_nfse_emitidas == 3
+    assert iss.iss_devido == Decimal("75.00")
+    assert iss.iss_retido == Decimal("5.00")
+
+
+def test_atualizar_e_apagar_mantem_fato_mensal(db, empresa_sn):
+    documento = criar_registo_fiscal(db, empresa_sn, "PGDAS", date(2025, 3, 1), "1500.00",
+                                     {"total_debitos_tributos": "90.00"})
+
+    # A correção muda a competência: o facto antigo desaparece e nasce o novo
+    db_dados = crud_dados_fiscais.obter_dados_por_documento_id(db, documento.id)
+    crud_dados_fiscais.atualizar_dados_fiscais(db, db_dados, {
+        "cnpj": CNPJ_TESTE, "periodo": "04/2025", "valor_total": Decimal("2000.00"),
+        "total_debitos_tributos": "120.00",
+    })
+    fatos = _fatos(db)
+    assert list(fatos) == [(date(2025, 4, 1), "PGDAS")]
+    assert fatos[(date(2025, 4, 1), "PGDAS")].total_tributos == Decimal("120.00")
+
+    crud_documento.apagar_documento_por_id(db, documento.id)
+    assert _fatos(db) == {}
+
+
+def test_reconstruir_fato_mensal_coincide_com_incremental(db, empresa_sn):
+    for mes in (1, 2, 3):
+        criar_registo_fiscal(db, empresa_sn, "PGDAS", date(2025, mes, 1), f"{mes}000.00",
+                             {"total_debitos_tributos": f"{mes}0,00", "cofins": "1,50"})
+
+    campos = lambda f: (f.faturamento, f.total_tributos, f.cofins, f.faturamento_acumulado_ano, f.tributos_12m)
+    incremental = {chave: campos(f) for chave, f in _fatos(db).items()}
+    # Lotes de 1 linha: obriga a gravar e libertar a sessão a meio do fluxo
+    assert crud_fato_mensal.reconstruir_fato_mensal(db, tamanho_lote=1) == 3
+    reconstruido = {chave: campos(f) for chave, f in _fatos(db).items()}
+
+    assert reconstruido == incremental
+
+
+def test_somas_acumuladas_exercicio_e_12_meses(db, empresa_sn):
+    # Inserção fora de ordem: as somas dos meses seguintes têm de ser recalculadas
+    documentos = {}
+    for ano, mes in ((2024, 11), (2025, 2), (2024, 12), (2025, 1)):
+        documentos[(ano, mes)] = criar_registo_fiscal(db, empresa_sn, "PGDAS", date(ano, mes, 1), "1000.00",
+                                                      {"total_debitos_tributos": "60,00"})
+
+    fatos = _fatos(db)
+    fevereiro = fatos[(date(2025, 2, 1), "PGDAS")]
+    assert fevereiro.faturamento_acumulado_ano == Decimal("2000.00")
+    assert fevereiro.tributos_acumulado_ano == Decimal("120.00")
+    assert fevereiro.faturamento_12m == Decimal("4000.00")
+    assert fatos[(date(2024, 12, 1), "PGDAS")].faturamento_acumulado_ano == Decimal("2000.00")
+
+    # Leituras diretas: mês sem registo usa o último acumulado do ano
+    acumulados = crud_fato_mensal.obter_acumulados(
+        db, cnpj=CNPJ_TESTE, competencia=date(2025, 3, 31), tipos_documento=["PGDAS"]
+    )
+    assert [f.faturamento_acumulado_ano for f in acumulados] == [Decimal("2000.00")]
+    assert crud_fato_mensal.obter_totais_12_meses(
+        db, cnpj=CNPJ_TESTE, competencia=date(2025, 11, 1), tipos_documento=["PGDAS"]
+    ) == (Decimal("3000.00"), Decimal("180.00"))
+
+    # Apagar um mês intermédio corrige as somas posteriores
+    crud_documento.apagar_documento_por_id(db, documentos[(2025, 1)].id)
+    fevereiro = _fatos(db)[(date(2025, 2, 1), "PGDAS")]
+    assert fevereiro.faturamento_acumulado_ano == Decimal("1000.00")
+    assert fevereiro.faturamento_12m == Decimal("3000.00")
+
+
+def test_leitura_em_fluxo_e_agregacao_por_iterador(db, empresa_sn):
+    from app.services import analytics_service
+
+    for mes in (1, 2):
+        criar_registo_fiscal(db, empresa_sn, "PGDAS", date(2025, mes, 1), "1000.00", {"total_debitos_tributos": "60,00"})
+        criar_registo_fiscal(db, empresa_sn, "Encerramento ISS", date(2025, mes, 1), "1000.00", {"qtd_nfse_emitidas": 2})
+
+    linhas = crud_dados_fiscais.iterar_dados_por_periodo(
+        db, cnpj=[CNPJ_TESTE], data_inicio=date(2025, 1, 1), data_fim=date(2025, 12, 31), tamanho_lote=1
+    )
+    assert not isinstance(linhas, list)
+    assert [(l.tipo_documento, l.data_competencia.month) for l in linhas] == [
+        ("Encerramento ISS", 1), ("Encerramento ISS", 2), ("PGDAS", 1), ("PGDAS", 2)
+    ]
+
+    # Os agregadores aceitam geradores (uma só passagem)
+    fatos = db.query(FatoMensal).filter(FatoMensal.competencia == date(2025, 1, 1)).all()
+    assert analytics_service._get_faturamento_e_impostos_por_regime((f for f in fatos), "Simples Nacional") == (
+        Decimal("1000.00"), Decimal("60.00"), 2
+    )
+    faturamento, _, notas = analytics_service._get_faturamento_e_impostos_por_regime((f for f in fatos), "Lucro Presumido (Serviços)")
+    assert (faturamento, notas) == (Decimal("2000.00"), 2)
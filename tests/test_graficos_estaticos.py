@@ -0,0 +1,48 @@
+# tests/test_graficos_estaticos.py
+
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from main import app
+from tests.conftest import CNPJ_TESTE
+
+PARAMS = {"cnpj": CNPJ_TESTE, "data_inicio": "2025-01-01", "data_fim": "2025-03-31"}
+ROTA = "/charts/lucro-presumido/tributos-ano"
+
+
+def test_rota_de_calculo_devolve_url_imutavel(empresa_sn_com_pgdas, charts_dir, cliente_api):
+    primeira = cliente_api.get(ROTA, params={**PARAMS, "resposta": "url"})
+    segunda = cliente_api.get(ROTA, params={**PARAMS, "resposta": "url"})
+    imagem = cliente_api.get(primeira.json()["url"])
+    revalidacao = cliente_api.get(primeira.json()["url"], headers={"If-None-Match": imagem.headers["etag"]})
+    direta = cliente_api.get(ROTA, params=PARAMS)
+    sem_imagem = cliente_api.get(ROTA, params={**PARAMS, "formato": "json", "resposta": "url"})
+
+    url = primeira.json()["url"]
+    assert url.startswith(f"{settings.CHARTS_STATIC_URL}/") and url.endswith(".png")
+    assert (primeira.json()["em_cache"], segunda.json()["em_cache"]) == (False, True)
+    assert imagem.status_code == 200
+    assert imagem.headers["content-type"] == "image/png"
+    assert imagem.headers["cache-control"] == settings.CHARTS_STATIC_CACHE_CONTROL
+    assert revalidacao.status_code == 304
+    assert direta.headers["content-location"] == url
+    assert direta.content == imagem.content
+    assert sem_imagem.status_code == 400
+
+
+def test_espaco_estatico_so_serve_imagens_da_pasta(charts_dir):
+    (charts_dir / "grafico.png").write_bytes(b"png")
+    (charts_dir / ".grafico.png.1.2.tmp").write_bytes(b"a meio")
+    (charts_dir / "notas.txt").write_bytes(b"x")
+
+    cliente = TestClient(app)
+    base = settings.CHARTS_STATIC_URL
+
+    assert cliente.get(f"{base}/grafico.png").content == b"png"
+    assert cliente.get(f"{base}/.grafico.png.1.2.tmp").status_code == 404
+    assert cliente.get(f"{base}/notas.txt").status_code == 404
+    assert cliente.get(f"{base}/..%2Fmain.py").status_code == 404
+
+    antiga = cliente.get("/charts/arquivo/grafico.png", follow_redirects=False)
+    assert antiga.status_code == 308
+    assert antiga.headers["location"] == f"{base}/grafico.png"
@@ -0,0 +1,82 @@
+# tests/test_manutencao_graficos.py
+
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from app.core.config import settings
+from app.crud import grafico as crud_grafico
+from app.models.grafico import Grafico
+from app.services import charts as charts_service
+from app.services.manutencao_graficos import ManutencaoGraficos
+from tests.conftest import CNPJ_TESTE
+
+
+def _gerar(db, valor):
+    return charts_service.gerar_grafico_sn_segregacao_tributos({"IRPJ": valor}, CNPJ_TESTE, db)
+
+
+def _envelhecer(caminho, segundos):
+    instante = time.time() - segundos
+    os.utime(caminho, (instante, instante))
+
+
+def test_passagem_remove_expirados_orfaos_e_registos_sem_ficheiro(db, charts_dir):
+    antigo, sem_ficheiro, atual = _gerar(db, 1.0), _gerar(db, 2.0), _gerar(db, 3.0)
+    db.query(Grafico).filter(Grafico.caminho_arquivo == antigo).update(
+        {"data_ultimo_acesso": datetime.now(timezone.utc) - timedelta(days=settings.CHARTS_MAX_IDADE_DIAS + 1)}
+    )
+    db.commit()
+    os.remove(sem_ficheiro)
+    orfao = charts_dir / "orfao.png"
+    orfao.write_bytes(b"x")
+    _envelhecer(orfao, settings.CHARTS_ORFAOS_CARENCIA_S + 1)
+    recente = charts_dir / "acabado_de_renderizar.png"
+    recente.write_bytes(b"x")
+
+    relatorio = ManutencaoGraficos().executar(db)
+
+    assert relatorio["expirados"] == 1
+    assert relatorio["registos_sem_ficheiro"] == 1
+    assert relatorio["ficheiros_orfaos"] == 1
+    assert [g.caminho_arquivo for g in db.query(Grafico).all()] == [atual]
+    # O ficheiro ainda na carência fica (pode estar prestes a ser registado)
+    assert sorted(p.name for p in charts_dir.iterdir()) == sorted([os.path.basename(atual), recente.name])
+
+
+def test_passagens_seguintes_so_olham_para_as_diferencas(db, charts_dir, monkeypatch):
+    manutencao = ManutencaoGraficos()
+    primeiro = _gerar(db, 1.0)
+    manutencao.executar(db)
+
+    # Um ficheiro apagado à mão e outro novo sem registo (já fora da carência)
+    os.remove(primeiro)
+    orfao = charts_dir / "orfao.png"
+    orfao.write_bytes(b"x")
+    _envelhecer(orfao, settings.CHARTS_ORFAOS_CARENCIA_S + 1)
+    consultados = []
+    original = crud_grafico.caminhos_registados
+    monkeypatch.setattr(crud_grafico, "caminhos_registados",
+                        lambda db, caminhos, *a: consultados.extend(caminhos) or original(db, caminhos, *a))
+
+    relatorio = manutencao.executar(db)
+
+    assert consultados == [str(charts_dir / "orfao.png")]
+    assert (relatorio["registos_sem_ficheiro"], relatorio["ficheiros_orfaos"]) == (1, 1)
+    assert db.query(Grafico).count() == 0
+
+
+def test_orcamento_de_disco_despeja_os_menos_usados(db, charts_dir, monkeypatch):
+    menos_usado = _gerar(db, 1.0)
+    mais_usado = _gerar(db, 2.0)
+    db.query(Grafico).filter(Grafico.caminho_arquivo == menos_usado).update(
+        {"data_ultimo_acesso": datetime.now(timezone.utc) - timedelta(days=1)}
+    )
+    db.commit()
+    monkeypatch.setattr(settings, "CHARTS_CACHE_MAX_BYTES", os.path.getsize(mais_usado))
+
+    relatorio = ManutencaoGraficos().executar(db)
+
+    assert relatorio["despejados"] == 1
+    assert [g.caminho_arquivo for g in db.query(Grafico).all()] == [mais_usado]
+    assert relatorio["bytes_em_disco"] == os.path.getsize(mais_usado)
@@ -0,0 +1,57 @@
+# tests/test_moeda.py
+
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from app.core import moeda
+
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("R$ 1.234,56", Decimal("1234.56")),
+    ("1.234.567", Decimal("1234567")),
+    ("R$ 1.234", Decimal("1234")),         # valor impresso sem centavos
+    ("1.500", Decimal("1500")),
+    ("28.5", Decimal("28.5")),             # Fator R impresso com ponto
+    ("28,5", Decimal("28.5")),
+    ("-R$ 10,00", Decimal("-10.00")),
+    ("0,285", Decimal("0.285")),
+    ("1E+2", Decimal("100")),
+    ("N/A", None),
+    ("", None),
+    (None, None),
+])
+def test_converter_decimal_segue_regra_unica(texto, esperado):
+    assert moeda.converter_decimal(texto) == esperado
+
+
+@pytest.mark.parametrize("valor, esperado", [
+    ("1234.500", Decimal("1234.500")),      # str(Decimal) no JSON: o ponto é sempre decimal
+    ("0.285", Decimal("0.285")),
+    (Decimal("90.00"), Decimal("90.00")),
+    ("R$ 90,00", Decimal("90.00")),         # texto BRL que a extração deixou por converter
+    ("1.234.567", Decimal("1234567")),
+    ("N/A", None),
+])
+def test_converter_decimal_armazenado_le_o_json_da_aplicacao(valor, esperado):
+    assert moeda.converter_decimal_armazenado(valor) == esperado
+
+
+def test_para_centavos_arredonda_half_up():
+    assert moeda.para_centavos("R$ 1.234,56") == 123456
+    assert moeda.para_centavos("1.500") == 150000
+    assert moeda.para_centavos("R$ 1.234") == 123400
+    assert moeda.para_centavos("0,005") == 1
+    assert moeda.para_centavos("-0,015") == -2
+    assert moeda.para_centavos(Decimal("10.125")) == 1013
+    assert moeda.para_centavos(7) == 700
+    assert moeda.para_centavos("abc") is None
+
+
+def test_operacoes_em_massa():
+    centavos = moeda.centavos_array(["1.000,00", None, "R$ 0,50", Decimal("2.25")])
+    assert centavos.dtype == np.int64
+    assert list(centavos) == [100000, 0, 50, 225]
+    assert list(moeda.percentual_centesimos([6_00, 1, 5], [100_00, 0, -3])) == [600, 0, -16667]
+    assert list(moeda.formatar_brl_array([123456789, -5, 0])) == ["R$ 1.234.567,89", "R$ -0,05", "R$ 0,00"]
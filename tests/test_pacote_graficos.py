@@ -0,0 +1,53 @@
+# tests/test_pacote_graficos.py
+
+import io
+import zipfile
+from datetime import date
+
+from app.crud import fato_mensal as crud_fato_mensal
+from tests.conftest import CNPJ_TESTE, criar_registo_fiscal
+
+PARAMS = {"cnpj": CNPJ_TESTE, "data_inicio": "2025-01-01", "data_fim": "2025-03-31"}
+
+
+def test_pacote_sn_prepara_uma_vez_e_serve_da_cache(db, empresa_sn, charts_dir, cliente_api, monkeypatch):
+    for mes in (2, 3):
+        criar_registo_fiscal(db, empresa_sn, "PGDAS", date(2025, mes, 1), f"{mes}000.00",
+                             {"total_debitos_tributos": "90.00", "irpj": "10.00", "iss": "80.00"})
+    leituras = []
+    original = crud_fato_mensal.obter_fatos_por_periodo
+    monkeypatch.setattr(crud_fato_mensal, "obter_fatos_por_periodo",
+                        lambda *args, **kwargs: leituras.append(1) or original(*args, **kwargs))
+
+    primeira = cliente_api.get("/charts/simples-nacional/pacote", params=PARAMS)
+    segunda = cliente_api.get("/charts/simples-nacional/pacote", params=PARAMS)
+    compactado = cliente_api.get("/charts/simples-nacional/pacote", params={**PARAMS, "formato": "zip"})
+    imagem = cliente_api.get(primeira.json()["graficos"][0]["url"])
+
+    assert primeira.status_code == 200
+    manifesto = primeira.json()
+    assert [g["grafico"] for g in manifesto["graficos"]] == [
+        "faturamento", "receita-crescimento", "impostos-carga", "acumulado-anual",
+        "limite-faturamento", "sublimite-receita", "segregacao-tributos",
+    ]
+    assert manifesto["omitidos"] == []
+    assert not any(g["em_cache"] for g in manifesto["graficos"])
+    assert all(g["em_cache"] for g in segunda.json()["graficos"])
+    assert leituras == [1, 1, 1]  # Uma leitura dos factos por pacote
+
+    assert compactado.headers["content-type"] == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(compactado.content)) as arquivo:
+        assert len(arquivo.namelist()) == 7
+    assert imagem.status_code == 200
+    assert imagem.headers["content-type"] == "image/png"
+
+
+def test_pacote_sem_dados_omite_graficos_e_arquivo_invalido(charts_dir, cliente_api):
+    sem_dados = cliente_api.get("/charts/lucro-presumido/pacote", params=PARAMS)
+    invalido = cliente_api.get("/charts/arquivo/..%2Fmain.py")
+
+    # Como na rota individual, o medidor de limite do LP é gerado mesmo sem faturamento
+    assert sem_dados.status_code == 200
+    assert [g["grafico"] for g in sem_dados.json()["graficos"]] == ["limite-faturamento"]
+    assert sem_dados.json()["omitidos"] == ["receita-crescimento", "impostos-carga", "acumulado", "tributos-detalhado", "tributos-ano"]
+    assert invalido.status_code == 404
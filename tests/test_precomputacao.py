@@ -0,0 +1,43 @@
+# tests/test_precomputacao.py
+
+from datetime import date
+
+from app.models.grafico import Grafico
+from app.services import charts as charts_service
+from app.services import precomputacao
+from tests.conftest import CNPJ_TESTE, TestingSessionLocal, criar_registo_fiscal
+
+
+def test_primeira_visita_ao_dashboard_ja_esta_em_cache(db, charts_dir, empresa_sn_com_pgdas, cliente_api, monkeypatch):
+    renderizados = precomputacao.PrecomputacaoPosGravacao(atraso_s=0, fabrica_sessao=TestingSessionLocal).processar(CNPJ_TESTE, 2025)
+    assert renderizados > 0
+    assert db.query(Grafico).count() == renderizados
+
+    renderizacoes = []
+    original = charts_service.renderizador.renderizar_imagem
+    monkeypatch.setattr(charts_service.renderizador, "renderizar_imagem",
+                        lambda fig, **opcoes: renderizacoes.append(1) or original(fig, **opcoes))
+    resposta = cliente_api.get("/charts/simples-nacional/faturamento", params={
+        "cnpj": CNPJ_TESTE, "data_inicio": "2025-01-01", "data_fim": "2025-12-31",
+    })
+
+    assert resposta.status_code == 200
+    assert renderizacoes == []
+
+
+def test_gravacoes_seguidas_disparam_um_unico_precalculo(db, charts_dir, empresa_sn):
+    servico = precomputacao.iniciar_precomputacao(atraso_s=0.2, fabrica_sessao=TestingSessionLocal)
+    try:
+        criar_registo_fiscal(db, empresa_sn, "PGDAS", date(2025, 2, 1), "1000.00", {"total_debitos_tributos": "60.00", "irpj": "10.00"})
+        criar_registo_fiscal(db, empresa_sn, "PGDAS", date(2025, 3, 1), "1500.00", {"total_debitos_tributos": "90.00"})
+        assert servico.aguardar_ociosa(timeout=30)
+    finally:
+        precomputacao.parar_precomputacao()
+
+    assert (servico.processados, servico.falhas) == (1, 0)
+    assert servico.graficos_renderizados == len(list(charts_dir.iterdir())) > 0
+
+
+def test_sem_iniciar_nao_agenda_nada(charts_dir, empresa_sn_com_pgdas):
+    assert precomputacao.precomputacao is None
+    assert list(charts_dir.iterdir()) == []
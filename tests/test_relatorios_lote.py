@@ -0,0 +1,73 @@
+# tests/test_relatorios_lote.py
+
+import json
+from datetime import date
+
+from app.models.empresa import Empresa
+from app.services import analytics_service
+from app.services.relatorios_lote import gerar_relatorios_em_lote
+from tests.conftest import criar_registo_fiscal
+
+CNPJ_SN = "20.295.854/0001-50"
+CNPJ_LP = "12.811.719/0001-31"
+CNPJ_LR = "11.222.333/0001-81"
+COMPETENCIA = date(2025, 3, 1)
+
+
+def _popular_carteira(db):
+    sn = Empresa(cnpj=CNPJ_SN, regime_tributario="Simples Nacional")
+    lp = Empresa(cnpj=CNPJ_LP, regime_tributario="Lucro Presumido (Serviços)")
+    lr = Empresa(cnpj=CNPJ_LR, regime_tributario="Lucro Real (Serviços)")
+    db.add_all([sn, lp, lr])
+    db.flush()
+
+    criar_registo_fiscal(db, sn, "PGDAS", date(2025, 2, 1), "1000.00", {"total_debitos_tributos": "60.00"})
+    criar_registo_fiscal(db, sn, "PGDAS", date(2025, 3, 1), "1500.00",
+                         {"total_debitos_tributos": "90.00", "irpj": "30.00", "iss": "60.00"})
+    criar_registo_fiscal(db, sn, "Encerramento ISS", date(2025, 3, 1), "1500.00", {"qtd_nfse_emitidas": 3})
+
+    criar_registo_fiscal(db, lp, "MIT", date(2025, 1, 1), "3000.00", {"csll": "30.00", "irpj": "45.00"})
+    criar_registo_fiscal(db, lp, "MIT", date(2025, 2, 1), "2000.00", {"csll": "20.00", "irpj": "30.00"})
+    criar_registo_fiscal(db, lp, "MIT", date(2025, 3, 1), "1000.00", {"csll": "10.00", "irpj": "15.00"})
+    criar_registo_fiscal(db, lp, "Relatório de Entradas", date(2025, 3, 1), "250.00", {})
+    db.commit()
+
+
+def test_relatorios_em_lote_coincidem_com_os_individuais(db, tmp_path):
+    _popular_carteira(db)
+    destino = tmp_path / "relatorios.jsonl"
+
+    # tamanho_lote=1 obriga a usar várias tarefas no pool de processos
+    resumo = gerar_relatorios_em_lote(
+        db, data_competencia=COMPETENCIA, destino=destino, processos=2, tamanho_lote=1
+    )
+
+    assert resumo["empresas"] == 3 and resumo["ok"] == 2 and resumo["erros"] == 1
+    linhas = {linha["cnpj"]: linha for linha in map(json.loads, destino.read_text(encoding="utf-8").splitlines())}
+    assert linhas[CNPJ_LR]["estado"] == "erro"
+    assert all(linha["duracao_ms"] >= 0 for linha in linhas.values())
+
+    assert linhas[CNPJ_SN]["relatorio"] == analytics_service.gerar_relatorio_simples_nacional(
+        db, cnpj=CNPJ_SN, data_competencia=COMPETENCIA
+    )
+    assert linhas[CNPJ_LP]["relatorio"] == analytics_service.gerar_relatorio_lucro_presumido_servicos(
+        db, cnpj=CNPJ_LP, data_competencia=COMPETENCIA
+    )
+
+
+def test_relatorio_lp_usa_as_mesmas_formulas_dos_kpis(db):
+    _popular_carteira(db)
+    regime = "Lucro Presumido (Serviços)"
+    periodo = dict(cnpj=CNPJ_LP, regime=regime, data_inicio=COMPETENCIA, data_fim=date(2025, 3, 31))
+
+    relatorio = analytics_service.gerar_relatorio_lucro_presumido_servicos(db, cnpj=CNPJ_LP, data_competencia=COMPETENCIA)
+
+    assert relatorio["Carga Tributária (Mês)"] == analytics_service._formatar_percentual(
+        analytics_service.calcular_carga_tributaria(db, **periodo))
+    assert relatorio["Peso das Entradas sobre a Receita (Mês)"] == analytics_service._formatar_percentual(
+        analytics_service.calcular_peso_entradas_sobre_receita(db, **periodo))
+    assert relatorio["Variação dos Tributos (Mês)"] == analytics_service._formatar_percentual(
+        analytics_service.calcular_variacao_tributos_mensal(
+            db, cnpj=CNPJ_LP, regime=regime, data_inicio_atual=COMPETENCIA, data_fim_atual=date(2025, 3, 31)))
+    assert relatorio["Total de Faturamento no Período (Exercício)"] == "R$ 6.250,00"
+    assert relatorio["Segregação dos Tributos (Mês)"] == {"CSLL": "R$ 10,00", "IRPJ": "R$ 15,00"}
@@ -0,0 +1,41 @@
+# tests/test_renderizador.py
+
+import plotly.graph_objects as go
+import pytest
+
+from app.services import renderizador
+
+PNG = b"\x89PNG"
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = renderizador.PoolRenderizacao(workers=1, tamanho_fila=2, timeout_s=60)
+    pool.iniciar()
+    yield pool
+    pool.parar()
+
+
+def _figura(valor):
+    return go.Figure(go.Bar(x=["a", "b"], y=[valor, valor * 2]))
+
+
+def test_lote_devolve_as_imagens_pela_ordem(pool):
+    imagens = pool.renderizar_lote([
+        {"figura": _figura(i), "largura": 200, "altura": 100 + i * 50, "escala": 1} for i in range(3)
+    ])
+    assert [imagem[:4] for imagem in imagens] == [PNG] * 3
+    assert len({len(imagem) for imagem in imagens}) == 3
+
+
+def test_fila_cheia_recusa_de_imediato(pool):
+    # 1 worker + 2 lugares na fila: o quarto pedido pendente é recusado
+    futuros = [pool.submeter(_figura(i), largura=200, altura=100) for i in range(3)]
+    with pytest.raises(renderizador.FilaCheiaError):
+        pool.submeter(_figura(4), largura=200, altura=100)
+    assert [futuro.result(timeout=60)[:4] for futuro in futuros] == [PNG] * 3
+
+
+def test_sem_pool_renderiza_no_processo():
+    assert renderizador.pool_renderizacao is None
+    assert renderizador.renderizar_imagem(_figura(1), largura=200, altura=100, escala=1)[:4] == PNG
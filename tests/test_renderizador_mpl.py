@@ -0,0 +1,61 @@
+# tests/test_renderizador_mpl.py
+
+from datetime import date
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("matplotlib")
+
+from app.core.config import settings
+from app.services import charts as charts_service
+from app.services import renderizador
+from app.services.analytics_service import montar_dataframe_graficos
+from tests.conftest import CNPJ_TESTE
+
+PNG = b"\x89PNG\r\n\x1a\n"
+
+
+def _dados_de_exemplo():
+    serie = montar_dataframe_graficos([date(2025, 1, 1), date(2025, 2, 1)], [100000, 150000], [6000, 9000])
+    medidor = {"rba": 2_100_000.0, "limite": 4_800_000.0, "sublimite": 3_600_000.0}
+    rosca = {"IRPJ": 10.0, "CSLL": 5.0}
+    tributos_lp = pd.DataFrame([
+        {"Mês": "2025-01", "Tributo": "Devido", "Valor": 7.0, "Percentual": 70.0},
+        {"Mês": "2025-01", "Tributo": "Retido", "Valor": 3.0, "Percentual": 30.0},
+    ])
+    return {
+        "sn_faturamento": serie, "sn_receita_crescimento": serie, "sn_impostos_carga": serie,
+        "sn_acumulado": serie, "sn_limite_faturamento": medidor, "sn_sublimite_receita": medidor,
+        "sn_segregacao_tributos": rosca, "lp_receita_crescimento": serie, "lp_impostos_carga": serie,
+        "lp_acumulado": serie, "lp_tributos_detalhado": tributos_lp, "lp_tributos_ano": rosca,
+        "lp_limite_faturamento": {"faturamento_exercicio": 9_500_000.0},
+    }
+
+
+@pytest.mark.parametrize("nome, dados", list(_dados_de_exemplo().items()))
+def test_todos_os_graficos_renderizam_com_matplotlib(nome, dados):
+    figura = getattr(charts_service, f"gerar_grafico_{nome}").montar_figura(dados, CNPJ_TESTE)
+
+    imagem = renderizador._renderizar(figura.to_plotly_json(), "png", 800, 500, 1, "matplotlib")
+    assert imagem.startswith(PNG)
+
+
+def test_svg_e_formato_invalido():
+    figura = charts_service.gerar_grafico_sn_segregacao_tributos.montar_figura({"IRPJ": 1.0}, CNPJ_TESTE)
+
+    svg = renderizador._renderizar(figura.to_plotly_json(), "svg", 400, 400, 1, "matplotlib")
+    assert b"<svg" in svg
+    with pytest.raises(ValueError):
+        renderizador._renderizar(figura.to_plotly_json(), "pdf", 400, 400, 1, "matplotlib")
+
+
+def test_backend_configurado_entra_na_chave_da_cache(db, charts_dir, monkeypatch):
+    dados = {"IRPJ": 10.0, "CSLL": 5.0}
+
+    com_kaleido = charts_service.chave_do_grafico("segregacao_tributos", CNPJ_TESTE, dados, largura=800, altura=800)
+    monkeypatch.setattr(settings, "CHARTS_RENDER_BACKEND", "matplotlib")
+    url = charts_service.gerar_grafico_sn_segregacao_tributos(dados, CNPJ_TESTE, db)
+
+    assert charts_service.chave_do_grafico("segregacao_tributos", CNPJ_TESTE, dados, largura=800, altura=800) != com_kaleido
+    assert (charts_dir / url.rsplit("/", 1)[-1]).read_bytes().startswith(PNG)
@@ -0,0 +1,91 @@
+# tests/test_report_generator.py
+
+from datetime import date
+
+import pytest
+
+from app.services import report_generator, resumidor
+from tests.conftest import CNPJ_TESTE, criar_registo_fiscal
+
+PARAMS = {"cnpj": CNPJ_TESTE, "competencia": "2025-03-01"}
+
+
+@pytest.fixture
+def empresa(db, empresa_sn, charts_dir, tmp_path, monkeypatch):
+    """empresa_sn com o PGDAS de 02 e 03/2025, e as caches do relatório numa pasta temporária."""
+    for mes in (2, 3):
+        criar_registo_fiscal(db, empresa_sn, "PGDAS", date(2025, mes, 1), f"{mes}000.00",
+                             {"total_debitos_tributos": "90.00", "irpj": "10.00", "iss": "80.00"})
+    monkeypatch.setattr(report_generator, "PASTA_CACHE", tmp_path / "relatorios")
+    monkeypatch.setattr(resumidor, "PASTA_CACHE", tmp_path / "resumos")
+    return empresa_sn
+
+
+def test_relatorio_html_embute_kpis_e_graficos_e_fica_em_cache(db, empresa, cliente_api, tmp_path, monkeypatch):
+    geracoes = []
+    original = report_generator._montar_contexto
+    monkeypatch.setattr(report_generator, "_montar_contexto", lambda *a: geracoes.append(1) or original(*a))
+
+    primeira = cliente_api.get("/relatorios/mensal", params=PARAMS)
+    segunda = cliente_api.get("/relatorios/mensal", params=PARAMS)
+    revalidacao = cliente_api.get("/relatorios/mensal", params=PARAMS, headers={"If-None-Match": primeira.headers["etag"]})
+    # Dados novos no período: outra versão do relatório
+    criar_registo_fiscal(db, empresa, "PGDAS", date(2025, 1, 1), "1000.00", {"total_debitos_tributos": "50.00"})
+    depois = cliente_api.get("/relatorios/mensal", params=PARAMS)
+
+    assert primeira.status_code == 200
+    assert primeira.headers["content-type"].startswith("text/html")
+    html = primeira.text
+    assert "Empresa Teste Lda" in html and "03/2025" in html
+    assert "Receita Bruta Total" in html and "R$ 3.000,00" in html
+    assert "Resumo do mês" in html and "a receita bruta foi de R$ 3.000,00, 50.00% acima do mês anterior" in html
+    # Todos os gráficos do Simples Nacional, em SVG inline
+    assert html.count('<figure id="grafico-') == 7 and "<svg" in html and "data:image" not in html
+
+    assert segunda.content == primeira.content
+    assert revalidacao.status_code == 304
+    assert depois.headers["etag"] != primeira.headers["etag"]
+    assert geracoes == [1, 1]
+    # Só a versão atual fica na cache
+    assert len(list((tmp_path / "relatorios").glob("*.html"))) == 1
+
+
+def test_relatorio_com_imagens_png_e_erros(empresa, cliente_api, monkeypatch):
+    monkeypatch.setattr(report_generator, "weasyprint", None)
+
+    png = cliente_api.get("/relatorios/mensal", params={**PARAMS, "imagens": "png"})
+    pdf = cliente_api.get("/relatorios/mensal", params={**PARAMS, "formato": "pdf"})
+    sem_empresa = cliente_api.get("/relatorios/mensal", params={**PARAMS, "cnpj": "00.000.000/0001-00"})
+
+    assert png.status_code == 200
+    assert png.text.count('src="data:image/png;base64,') == 7
+    assert "<svg" not in png.text
+    assert pdf.status_code == 501
+    assert sem_empresa.status_code == 404
+
+
+def test_relatorio_sem_resumo_nao_fica_em_cache(empresa, cliente_api, tmp_path, monkeypatch):
+    original = resumidor.resumir
+    monkeypatch.setattr(resumidor, "resumir", lambda *a, **k: None)
+    sem_resumo = cliente_api.get("/relatorios/mensal", params=PARAMS)
+    monkeypatch.setattr(resumidor, "resumir", original)
+    com_resumo = cliente_api.get("/relatorios/mensal", params=PARAMS)
+
+    assert sem_resumo.status_code == 200
+    assert "Resumo do mês" not in sem_resumo.text
+    assert "etag" not in sem_resumo.headers and sem_resumo.headers["cache-control"] == "no-store"
+    # O pedido seguinte gera de novo, agora com o resumo, e só esse fica em cache
+    assert "Resumo do mês" in com_resumo.text
+    assert "etag" in com_resumo.headers
+    assert len(list((tmp_path / "relatorios").glob("*.html"))) == 1
+
+
+def test_backend_de_resumos_mal_configurado_e_erro_do_servidor(empresa, cliente_api, monkeypatch):
+    monkeypatch.setattr(report_generator.settings, "RESUMO_BACKEND", "nao-existe")
+
+    relatorio = cliente_api.get("/relatorios/mensal", params=PARAMS)
+    sem_empresa = cliente_api.get("/relatorios/mensal", params={**PARAMS, "cnpj": "00.000.000/0001-00"})
+
+    assert relatorio.status_code == 503
+    assert "nao-existe" in relatorio.json()["detail"]
+    assert sem_empresa.status_code == 404
@@ -0,0 +1,122 @@
+# tests/test_resumidor.py
+
+import json
+from datetime import date
+
+import pytest
+
+from app.services import resumidor
+from app.services.relatorios_lote import gerar_relatorios_em_lote
+from tests.test_relatorios_lote import CNPJ_LP, CNPJ_LR, CNPJ_SN, COMPETENCIA, _popular_carteira
+
+KPIS_SN = {
+    "Receita Bruta e Taxa de Crescimento": {
+        "Receita Bruta Total": "R$ 1.500,00",
+        "Taxa de Crescimento da Receita": "-12.50%",
+    },
+    "Total de Impostos e Carga Tributária": {
+        "Simples Nacional (Total Impostos)": "R$ 90,00",
+        "Carga Tributária Total": "6.00%",
+    },
+    "Segregação dos Tributos": {"IRPJ": "33.33%", "ISS": "66.67%"},
+    "Limites do Simples Nacional": {
+        "Uso do Limite": "85.00%",
+        "Uso do Sublimite (ICMS/ISS)": "20.00%",
+    },
+}
+
+
+class ResumidorContado(resumidor.ResumidorModelo):
+    """Backend local que conta os pedidos que lhe chegam."""
+
+    def __init__(self):
+        self.lotes = []
+
+    def resumir_lote(self, pedidos):
+        self.lotes.append(len(pedidos))
+        return super().resumir_lote(pedidos)
+
+
+@pytest.fixture(autouse=True)
+def cache_temporaria(tmp_path, monkeypatch):
+    monkeypatch.setattr(resumidor, "PASTA_CACHE", tmp_path / "resumos")
+
+
+def test_modelo_e_deterministico_e_cobre_os_kpis():
+    texto = resumidor.resumir(KPIS_SN, regime="Simples Nacional", competencia=date(2025, 3, 20))
+
+    assert texto == (
+        "Em 03/2025, a receita bruta foi de R$ 1.500,00, 12.50% abaixo do mês anterior. "
+        "A carga tributária ficou em 6.00%. O tributo com maior peso foi o ISS (66.67%). "
+        "Atenção: o faturamento já atingiu 85.00% do limite de faturamento do regime. "
+        "O faturamento está em 20.00% do sublimite de ICMS/ISS."
+    )
+    # KPIs desconhecidos: enumera-os
+    assert resumidor.ResumidorModelo().resumir(
+        resumidor.PedidoResumo("Outro", date(2025, 3, 1), {"Indicador": "1"})
+    ) == "Indicadores de 03/2025 (Outro): Indicador: 1."
+
+
+def test_kpis_iguais_nao_voltam_ao_backend():
+    backend = ResumidorContado()
+    outros = {**KPIS_SN, "Ticket Médio": "R$ 10,00"}
+    pedidos = [
+        resumidor.PedidoResumo("Simples Nacional", date(2025, 3, 1), KPIS_SN),
+        resumidor.PedidoResumo("Simples Nacional", date(2025, 3, 31), dict(reversed(KPIS_SN.items()))),  # Mesmo conteúdo
+        resumidor.PedidoResumo("Simples Nacional", date(2025, 3, 1), outros),
+    ]
+
+    primeiros = resumidor.resumir_lote(pedidos, backend=backend)
+    segundos = resumidor.resumir_lote(pedidos, backend=backend)
+
+    # Uma única submissão com os dois pedidos distintos; depois tudo da cache
+    assert backend.lotes == [2]
+    assert primeiros == segundos and primeiros[0] == primeiros[1]
+
+    # KPIs alterados: só o pedido novo chega ao backend
+    alterado = {**outros, "Ticket Médio": "R$ 11,00"}
+    resumidor.resumir(alterado, regime="Simples Nacional", competencia=date(2025, 3, 1), backend=backend)
+    assert backend.lotes == [2, 1]
+
+
+def test_falhas_do_backend_nao_ficam_em_cache():
+    class ResumidorInstavel(resumidor.Resumidor):
+        nome = "instavel"
+        chamadas = 0
+
+        def resumir(self, pedido):
+            ResumidorInstavel.chamadas += 1
+            if ResumidorInstavel.chamadas == 1:
+                raise TimeoutError("sem resposta")
+            return "Resumo."
+
+    backend = ResumidorInstavel()
+    assert resumidor.resumir(KPIS_SN, regime="Simples Nacional", competencia=COMPETENCIA, backend=backend) is None
+    assert resumidor.resumir(KPIS_SN, regime="Simples Nacional", competencia=COMPETENCIA, backend=backend) == "Resumo."
+    assert resumidor.resumir(KPIS_SN, regime="Simples Nacional", competencia=COMPETENCIA, backend=backend) == "Resumo."
+    assert ResumidorInstavel.chamadas == 2
+
+
+def test_backend_desconhecido():
+    with pytest.raises(resumidor.ConfiguracaoResumoError):
+        resumidor.obter_backend("nao-existe")
+
+
+def test_backend_sem_resumir_nao_instancia():
+    class ResumidorIncompleto(resumidor.Resumidor):
+        nome = "incompleto"
+
+    with pytest.raises(TypeError):
+        ResumidorIncompleto()
+
+
+def test_relatorios_em_lote_com_resumos(db, tmp_path):
+    _popular_carteira(db)
+    destino = tmp_path / "relatorios.jsonl"
+
+    gerar_relatorios_em_lote(db, data_competencia=COMPETENCIA, destino=destino, processos=0, resumos=True)
+
+    linhas = {linha["cnpj"]: linha for linha in map(json.loads, destino.read_text(encoding="utf-8").splitlines())}
+    assert linhas[CNPJ_SN]["resumo"].startswith("Em 03/2025, a receita bruta foi de R$ 1.500,00, 50.00% acima")
+    assert "A carga tributária ficou em" in linhas[CNPJ_LP]["resumo"]
+    assert "resumo" not in linhas[CNPJ_LR]
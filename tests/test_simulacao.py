@@ -0,0 +1,67 @@
+# tests/test_simulacao.py
+
+from datetime import date
+
+import numpy as np
+import pytest
+
+from app.services import simulacao
+from tests.conftest import CNPJ_TESTE, criar_registo_fiscal
+
+
+def test_grelha_de_cenarios_vetorizada():
+    historico = np.full(12, 20_000.0)  # RBT12 de 240 mil: 2.ª faixa
+
+    cenarios = simulacao.simular_cenarios(
+        historico,
+        taxas_crescimento=[0.0, 0.10],
+        fatores_r=[0.20, 0.30],
+        regimes=["Simples Nacional", "Lucro Presumido (Serviços)"],
+        horizonte_meses=3,
+    )
+
+    assert len(cenarios["regime"]) == 8
+    # Ordem: crescimento x regime x Fator R
+    assert cenarios["regime"][:4] == ["Simples Nacional"] * 2 + ["Lucro Presumido (Serviços)"] * 2
+    assert cenarios["anexo_simples"][:4] == ["V", "III", None, None]
+
+    # Sem crescimento: Anexo V 16,125%, Anexo III 7,3%, Presumido 16,33% (com ISS de 5%)
+    assert cenarios["tributos_mensais"][0] == [3225.0] * 3
+    assert cenarios["tributos_mensais"][1] == [1460.0] * 3
+    assert cenarios["tributos_mensais"][2] == [3266.0] * 3
+    assert cenarios["carga_tributaria_percentual"][1] == 7.3
+
+    # Com crescimento a receita e a alíquota efetiva sobem
+    assert cenarios["faturamento_total"][4] > cenarios["faturamento_total"][0]
+    assert cenarios["carga_tributaria_percentual"][5] > cenarios["carga_tributaria_percentual"][1]
+
+
+def test_regime_sem_simulacao_e_rejeitado():
+    with pytest.raises(ValueError):
+        simulacao.simular_cenarios(np.ones(3), taxas_crescimento=[0], fatores_r=[0.28], regimes=["Lucro Real (Serviços)"])
+
+
+def test_endpoint_simulacao(db, empresa_sn, cliente_api):
+    for mes in range(1, 13):
+        criar_registo_fiscal(db, empresa_sn, "PGDAS", date(2024, mes, 1), "20000.00", {"total_debitos_tributos": "1460.00"})
+
+    resposta = cliente_api.post("/analytics/simulacao", json={
+        "cnpj": CNPJ_TESTE, "regime": "Simples Nacional", "data_base": "2024-12-01",
+        "taxas_crescimento": [0.0, 0.05], "fatores_r": [0.28], "horizonte_meses": 6,
+    })
+    invalido = cliente_api.post("/analytics/simulacao", json={
+        "cnpj": CNPJ_TESTE, "regime": "Simples Nacional", "data_base": "2024-12-01",
+        "regimes": ["Lucro Real (Serviços)"],
+    })
+    taxa_invalida = cliente_api.post("/analytics/simulacao", json={
+        "cnpj": CNPJ_TESTE, "regime": "Simples Nacional", "data_base": "2024-12-01",
+        "taxas_crescimento": [0.02, -1.0],
+    })
+
+    assert resposta.status_code == 200
+    corpo = resposta.json()
+    assert corpo["meses_historico"] == 12
+    assert len(corpo["cenarios"]["regime"]) == 4
+    assert corpo["cenarios"]["tributos_mensais"][0] == [1460.0] * 6
+    assert invalido.status_code == 400
+    assert taxa_invalida.status_code == 422
@@ -0,0 +1,105 @@
+# tests/test_snapshot_kpi.py
+
+from datetime import date
+from decimal import Decimal
+
+from app.crud import documento as crud_documento
+from app.crud import fato_mensal as crud_fato_mensal
+from app.crud import snapshot_kpi as crud_snapshot_kpi
+from app.models.snapshot_kpi import SnapshotKpi
+from app.services import analytics_service
+from tests.conftest import CNPJ_TESTE, criar_registo_fiscal
+
+CAMPOS = [
+    "faturamento", "tributos", "qtd_nfse_emitidas", "carga_tributaria_percentual", "ticket_medio",
+    "crescimento_faturamento_percentual", "variacao_tributos_percentual",
+    "faturamento_acumulado_ano", "tributos_acumulado_ano", "faturamento_12m", "tributos_12m",
+]
+
+
+def _snapshots(db):
+    return {
+        s.competencia: {campo: getattr(s, campo) for campo in CAMPOS}
+        for s in db.query(SnapshotKpi).order_by(SnapshotKpi.competencia).all()
+    }
+
+
+def test_novo_mes_atualiza_o_mes_e_os_dependentes(db, empresa_sn):
+    criar_registo_fiscal(db, empresa_sn, "PGDAS", date(2025, 3, 1), "1500.00", {"total_debitos_tributos": "90.00"})
+    criar_registo_fiscal(db, empresa_sn, "Encerramento ISS", date(2025, 3, 1), "1500.00", {"qtd_nfse_emitidas": 3})
+    assert _snapshots(db)[date(2025, 3, 1)]["crescimento_faturamento_percentual"] is None
+
+    # Chega o mês anterior: o crescimento de março e os acumulados passam a contar com ele
+    criar_registo_fiscal(db, empresa_sn, "PGDAS", date(2025, 2, 1), "1000.00", {"total_debitos_tributos": "60.00"})
+    snapshots = _snapshots(db)
+    assert list(snapshots) == [date(2025, 2, 1), date(2025, 3, 1)]
+
+    marco = snapshots[date(2025, 3, 1)]
+    assert marco["faturamento"] == Decimal("1500.00")  # Só o PGDAS conta no Simples Nacional
+    assert marco["qtd_nfse_emitidas"] == 3
+    assert marco["ticket_medio"] == Decimal("500.00")
+    assert marco["carga_tributaria_percentual"] == Decimal("6.00")
+    assert marco["crescimento_faturamento_percentual"] == Decimal("50.00")
+    assert marco["faturamento_acumulado_ano"] == Decimal("2500.00")
+    assert marco["tributos_12m"] == Decimal("150.00")
+
+
+def test_apagar_documento_e_reconstruir_mantem_snapshots(db, empresa_sn):
+    for mes in (1, 2, 3):
+        criar_registo_fiscal(db, empresa_sn, "PGDAS", date(2025, mes, 1), f"{mes}000.00", {"total_debitos_tributos": f"{mes}0.00"})
+    documento = criar_registo_fiscal(db, empresa_sn, "PGDAS", date(2025, 4, 1), "4000.00", {"total_debitos_tributos": "40.00"})
+
+    crud_documento.apagar_documento_por_id(db, documento.id)
+    incremental = _snapshots(db)
+    assert date(2025, 4, 1) not in incremental
+    assert incremental[date(2025, 3, 1)]["faturamento_acumulado_ano"] == Decimal("6000.00")
+
+    crud_fato_mensal.reconstruir_fato_mensal(db)
+    assert _snapshots(db) == incremental
+
+
+def test_endpoint_kpis_mensais_le_snapshots(db, empresa_sn, cliente_api):
+    criar_registo_fiscal(db, empresa_sn, "PGDAS", date(2025, 2, 1), "1000.00", {"total_debitos_tributos": "60.00"})
+    criar_registo_fiscal(db, empresa_sn, "PGDAS", date(2025, 3, 1), "1500.00", {"total_debitos_tributos": "90.00"})
+
+    resposta = cliente_api.get("/analytics/kpis/mensais", params={
+        "cnpj": CNPJ_TESTE, "data_inicio": "2025-03-01", "data_fim": "2025-03-31",
+    })
+
+    assert resposta.status_code == 200
+    corpo = resposta.json()
+    assert corpo["regime_tributario"] == "Simples Nacional"
+    assert len(corpo["meses"]) == 1
+    assert float(corpo["meses"][0]["crescimento_faturamento_percentual"]) == 50.0
+    assert crud_snapshot_kpi.obter_snapshots(db, cnpj=CNPJ_TESTE, data_inicio=date(2025, 1, 1), data_fim=date(2025, 1, 31)) == []
+
+
+def test_serie_crescimento_e_graficos_leem_os_snapshots(db, empresa_sn):
+    criar_registo_fiscal(db, empresa_sn, "PGDAS", date(2025, 2, 1), "1000.00", {"total_debitos_tributos": "60.00"})
+    criar_registo_fiscal(db, empresa_sn, "PGDAS", date(2025, 3, 1), "1500.00", {"total_debitos_tributos": "90.00"})
+    # Um valor guardado diferente do que os factos dariam mostra de onde vem a leitura
+    marco = db.query(SnapshotKpi).filter(SnapshotKpi.competencia == date(2025, 3, 1)).one()
+    marco.crescimento_faturamento_percentual = Decimal("49.00")
+    marco.carga_tributaria_percentual = Decimal("5.90")
+    db.commit()
+    inicio, fim = date(2025, 2, 1), date(2025, 3, 31)
+
+    serie = analytics_service.calcular_serie_kpis(db, cnpj=CNPJ_TESTE, regime="Simples Nacional", data_inicio=inicio, data_fim=fim)
+    assert serie[1]["crescimento_faturamento_percentual"] == Decimal("49.00")
+    assert serie[1]["faturamento_acumulado"] == Decimal("2500.00")
+
+    df = analytics_service.preparar_dados_para_graficos(db, CNPJ_TESTE, inicio, fim)
+    assert list(df["crescimento_formatado"]) == ["0.00%", "49.00%"]
+    assert df["carga_tributaria"].iloc[1] == 5.9
+    assert list(df["faturamento_acumulado"]) == [1000.0, 2500.0]
+
+    assert analytics_service.calcular_crescimento_faturamento(
+        db, cnpj=CNPJ_TESTE, regime="Simples Nacional",
+        data_inicio_atual=date(2025, 3, 1), data_fim_atual=date(2025, 3, 31)
+    ) == Decimal("50.00")
+
+    # Pedidos noutro regime não usam os snapshots do Simples Nacional
+    serie_lp = analytics_service.calcular_serie_kpis(
+        db, cnpj=CNPJ_TESTE, regime="Lucro Presumido (Serviços)", data_inicio=inicio, data_fim=fim
+    )
+    assert serie_lp == []
@@ -0,0 +1,128 @@
+# tests/test_voo_unico.py
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import pytest
+
+from app.core.config import settings
+from app.crud import bloqueio_calculo as crud_bloqueio
+from app.crud.bloqueio_calculo import _agora
+from app.models.bloqueio_calculo import BloqueioCalculo
+from app.models.empresa import Empresa
+from app.services import voo_unico
+from tests.conftest import CNPJ_TESTE, TestingSessionLocal
+
+PARTES = ("kpis", CNPJ_TESTE, "Simples Nacional", date(2025, 1, 1), date(2025, 3, 31))
+
+
+def test_pedidos_simultaneos_partilham_um_calculo():
+    chamadas = []
+    liberar = threading.Event()
+
+    def calcular():
+        chamadas.append(1)
+        liberar.wait(5)
+        return {"faturamento": 1000}
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        futuros = [executor.submit(voo_unico.executar, PARTES, calcular) for _ in range(5)]
+        time.sleep(0.1)
+        liberar.set()
+        resultados = [f.result() for f in futuros]
+
+    assert len(chamadas) == 1
+    assert all(r is resultados[0] for r in resultados)
+
+    # Terminado o cálculo, um novo pedido volta a calcular
+    voo_unico.executar(PARTES, calcular)
+    assert len(chamadas) == 2
+
+
+def test_erro_do_lider_chega_a_quem_esperava():
+    liberar = threading.Event()
+
+    def calcular():
+        liberar.wait(5)
+        raise ValueError("Dados insuficientes")
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futuros = [executor.submit(voo_unico.executar, PARTES, calcular) for _ in range(3)]
+        time.sleep(0.1)
+        liberar.set()
+        for futuro in futuros:
+            with pytest.raises(ValueError):
+                futuro.result()
+
+
+def test_lider_publica_o_resultado_para_os_outros_workers(db):
+    resultado = voo_unico.executar(PARTES, lambda: {"valor": 1}, db=db, serializar=lambda r: b'{"valor": 1}')
+
+    bloqueio = db.query(BloqueioCalculo).one()
+    assert resultado == {"valor": 1}
+    assert bloqueio.chave == voo_unico.chave_do_pedido(*PARTES)
+    assert bloqueio.resultado == b'{"valor": 1}' and bloqueio.concluido_em is not None
+
+
+def test_outro_worker_le_o_resultado_publicado(db):
+    db.add(BloqueioCalculo(
+        chave=voo_unico.chave_do_pedido(*PARTES), dono="outro:1:1", expira_em=_agora() + timedelta(seconds=5),
+        resultado=b"42", concluido_em=_agora(),
+    ))
+    db.commit()
+
+    calcular = lambda: pytest.fail("Não devia recalcular")  # noqa: E731
+    assert voo_unico.executar(PARTES, calcular, db=db, desserializar=int) == 42
+
+
+def test_bloqueio_de_worker_lento_ou_morto(db, monkeypatch):
+    chave = voo_unico.chave_do_pedido(*PARTES)
+    db.add(BloqueioCalculo(chave=chave, dono="outro:1:1", expira_em=_agora() + timedelta(seconds=60)))
+    db.commit()
+
+    # O dono não conclui a tempo: calcula-se localmente, sem mexer no bloqueio alheio
+    monkeypatch.setattr(settings, "VOO_UNICO_ESPERA_MAX_S", 0.1)
+    assert voo_unico.executar(PARTES, lambda: "local", db=db) == "local"
+    assert db.query(BloqueioCalculo).one().dono == "outro:1:1"
+
+    # Bloqueio expirado (dono morreu): é tomado e o cálculo é publicado
+    db.query(BloqueioCalculo).update({"expira_em": _agora() - timedelta(seconds=1)})
+    db.commit()
+    assert voo_unico.executar(PARTES, lambda: "novo", db=db) == "novo"
+    assert db.query(BloqueioCalculo).one().concluido_em is not None
+
+
+def test_bloqueio_nao_faz_commit_nem_rollback_da_sessao_do_pedido(db):
+    empresa = Empresa(cnpj=CNPJ_TESTE, regime_tributario="Simples Nacional")
+    db.add(empresa)
+
+    assert voo_unico.executar(PARTES, lambda: 1, db=db) == 1
+    with pytest.raises(ValueError):
+        voo_unico.executar(("outro",), lambda: (_ for _ in ()).throw(ValueError("falhou")), db=db)
+
+    # O objeto pendente continua pendente: nem foi gravado pelo bloqueio nem descartado pela falha
+    assert empresa in db.new
+    db.rollback()
+    assert db.query(Empresa).count() == 0
+
+
+def test_bloqueio_libertado_durante_a_sondagem(db, monkeypatch):
+    chave = voo_unico.chave_do_pedido(*PARTES)
+    db.add(BloqueioCalculo(chave=chave, dono="outro:1:1", expira_em=_agora() + timedelta(seconds=60)))
+    db.commit()
+    original = crud_bloqueio.obter_bloqueio
+
+    def obter_e_libertar(sessao, chave_lida):
+        # O dono falha e liberta o bloqueio logo depois de o seguidor o ler
+        estado = original(sessao, chave_lida)
+        with TestingSessionLocal() as outra:
+            crud_bloqueio.libertar_bloqueio(outra, chave_lida, "outro:1:1")
+        return estado
+
+    monkeypatch.setattr(crud_bloqueio, "obter_bloqueio", obter_e_libertar)
+
+    # O seguidor lê o estado já lido sem voltar à linha apagada e toma o bloqueio
+    assert voo_unico.executar(PARTES, lambda: "local", db=db, serializar=str.encode) == "local"
+    assert db.query(BloqueioCalculo).one().resultado == b"local"